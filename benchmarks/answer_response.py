@@ -0,0 +1,102 @@
+"""Benchmark building and serializing the /answer response.
+
+Compares the validated path, where the AnswerResponse is validated on construction and
+FastAPI validates and serializes it again through response_model, with the trusted path,
+where the server-built response is constructed without validation and serialized once
+with pydantic-core. Times the CPU per response on synthetic answers with 10, 100 and 1000
+citations.
+
+Usage:
+    poetry run python benchmarks/answer_response.py [--citations 10 100 1000]
+"""
+
+import argparse
+import asyncio
+import time
+import timeit
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+from answer_app.model import AnswerResponse
+from answer_app.responses import ModelJSONResponse
+
+from sample_data import make_response
+
+
+RESPONSE_FIELD = create_model_field(name="Response_answer", type_=AnswerResponse)
+
+
+def validated_body(response_dict: dict[str, Any]) -> bytes:
+    """Validate on construction, then validate and serialize through response_model."""
+    answer_response = AnswerResponse(
+        question="question", markdown="bWFya2Rvd24=", latency=1.0, **response_dict
+    )
+    content = asyncio.run(
+        serialize_response(
+            field=RESPONSE_FIELD, response_content=answer_response, is_coroutine=True
+        )
+    )
+
+    return JSONResponse(content).body
+
+
+def trusted_body(response_dict: dict[str, Any]) -> bytes:
+    """Construct without validation and serialize once with pydantic-core."""
+    answer_response = AnswerResponse.model_construct(
+        question="question",
+        markdown="bWFya2Rvd24=",
+        latency=1.0,
+        answer=response_dict["answer"],
+        session=response_dict.get("session"),
+        answer_query_token=response_dict["answer_query_token"],
+    )
+
+    return ModelJSONResponse(answer_response).body
+
+
+def best_time(function: Callable[[], object]) -> float:
+    """Return the best CPU time of one call in seconds."""
+    timer = timeit.Timer(function, timer=time.process_time)
+    number, _ = timer.autorange()
+
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def empty_event_loop() -> None:
+    """Run an empty coroutine, the event loop overhead included in validated_body."""
+
+    async def noop() -> None:
+        return
+
+    asyncio.run(noop())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--citations", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+    loop_overhead = best_time(empty_event_loop)
+
+    print(f"{'citations':>9}{'validated ms':>14}{'trusted ms':>12}{'speedup':>9}")
+    for citations in args.citations:
+        response_dict = AnswerQueryResponse.to_dict(
+            instance=make_response(citations=citations),
+            use_integers_for_enums=False,
+        )
+        if validated_body(response_dict) != trusted_body(response_dict):
+            raise SystemExit(f"Bodies differ at {citations} citations.")
+
+        validated = best_time(lambda: validated_body(response_dict)) - loop_overhead
+        trusted = best_time(lambda: trusted_body(response_dict))
+        print(
+            f"{citations:>9}{validated * 1e3:>14.3f}{trusted * 1e3:>12.3f}"
+            f"{validated / trusted:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
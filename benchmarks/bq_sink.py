@@ -0,0 +1,132 @@
+"""Compare the CPU cost of the BigQuery sinks for answer rows.
+
+Runs both sinks against in-process stand-ins that only serialize the request payload,
+as the HTTP and gRPC transports would, so the numbers are client-side CPU per row.
+
+Usage:
+    poetry run python benchmarks/bq_sink.py [--rows 20000] [--batch-size 1 100 500]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator
+
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import bigquery
+from google.cloud.bigquery_storage_v1 import types
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+from answer_app.bq_storage import BigQueryStorageWriter
+from answer_app.bq_storage import load_schema
+from answer_app.bq_writer import new_insert_id
+from answer_app.model import AnswerResponse
+
+from sample_data import make_response
+
+
+TABLE = "project.dataset.table"
+
+
+class SerializingWriteClient:
+    """A BigQuery Write stand-in that serializes each request like the gRPC transport."""
+
+    def __init__(self) -> None:
+        self.bytes_sent = 0
+
+    async def append_rows(
+        self,
+        requests: AsyncIterator[types.AppendRowsRequest],
+        metadata: Any = (),
+    ) -> AsyncIterator[types.AppendRowsResponse]:
+        async for request in requests:
+            self.bytes_sent += len(types.AppendRowsRequest.serialize(request))
+
+        async def responses() -> AsyncIterator[types.AppendRowsResponse]:
+            yield types.AppendRowsResponse()
+
+        return responses()
+
+
+def _answer_row() -> dict[str, Any]:
+    """Return an answer row as main.answer dumps it for BigQuery."""
+    response = make_response(citations=10)
+    return AnswerResponse(
+        question="What is the answer?",
+        markdown="bWFya2Rvd24=",
+        latency=1.0,
+        **AnswerQueryResponse.to_dict(response, use_integers_for_enums=False),
+    ).model_dump()
+
+
+def bench_insert_rows_json(
+    row: dict[str, Any], rows: int, batch_size: int
+) -> tuple[float, int]:
+    """Return the CPU seconds and request bytes to insert rows with insert_rows_json."""
+    client = bigquery.Client(project="project", credentials=AnonymousCredentials())
+    bytes_sent = 0
+
+    def call_api(retry: Any, data: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        # Serialize the request body as the HTTP connection would, without sending it.
+        nonlocal bytes_sent
+        bytes_sent += len(json.dumps(data).encode("utf-8"))
+        return {}
+
+    client._call_api = call_api
+    batch = [row] * batch_size
+    # The batched writer computes the insert IDs for both sinks.
+    row_ids = [new_insert_id() for _ in range(batch_size)]
+
+    start = time.process_time()
+    for _ in range(rows // batch_size):
+        client.insert_rows_json(table=TABLE, json_rows=batch, row_ids=row_ids)
+
+    return time.process_time() - start, bytes_sent
+
+
+def bench_storage_write(
+    row: dict[str, Any], rows: int, batch_size: int
+) -> tuple[float, int]:
+    """Return the CPU seconds and request bytes to append rows with the Storage Write API."""
+    client = SerializingWriteClient()
+    writer = BigQueryStorageWriter(
+        schemas={TABLE: load_schema("schema.json")},
+        client=client,
+    )
+    batch = [row] * batch_size
+
+    async def run() -> float:
+        start = time.process_time()
+        for _ in range(rows // batch_size):
+            await writer.insert_rows(TABLE, batch)
+        return time.process_time() - start
+
+    return asyncio.run(run()), client.bytes_sent
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 100, 500])
+    args = parser.parse_args()
+
+    row = _answer_row()
+    print(f"Row JSON size: {len(json.dumps(row))} bytes")
+    print(f"{'sink':<18}{'batch':>7}{'µs CPU/row':>13}{'rows/s':>12}{'bytes/row':>12}")
+
+    for batch_size in args.batch_size:
+        for name, bench in (
+            ("insert_rows_json", bench_insert_rows_json),
+            ("storage_write", bench_storage_write),
+        ):
+            cpu_seconds, bytes_sent = bench(row, args.rows, batch_size)
+            rows = args.rows // batch_size * batch_size
+            print(
+                f"{name:<18}{batch_size:>7}{cpu_seconds / rows * 1e6:>13.1f}"
+                f"{rows / cpu_seconds:>12,.0f}{bytes_sent / rows:>12,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Measure answer call tail latency through the Discovery Engine client pool.
+
+Runs a local fake ConversationalSearchService gRPC server in a separate process. It
+answers after a fixed delay and caps the concurrent streams of each HTTP/2 connection,
+as the Google front end does. Calls are made at a fixed concurrency through ClientPool with 1, 2, 4 and 8
+channels, and the latency percentiles are reported for each pool size.
+
+Usage:
+    poetry run python benchmarks/client_pool.py [--concurrency 100] [--calls 2000]
+        [--max-streams 32] [--delay-ms 50] [--sizes 1 2 4 8]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+from typing import Callable
+
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import discoveryengine_v1 as discoveryengine
+from google.cloud.discoveryengine_v1.services.conversational_search_service.transports import (
+    ConversationalSearchServiceGrpcAsyncIOTransport,
+)
+import grpc
+from grpc import aio
+
+from answer_app.client_pool import ClientPool
+
+from sample_data import make_response
+
+
+SERVICE = "google.cloud.discoveryengine.v1.ConversationalSearchService"
+
+
+async def serve(max_streams: int, delay: float, ports: multiprocessing.Queue) -> None:
+    """Serve fake answers on a free local port until the process is terminated.
+
+    Args:
+        max_streams (int): The concurrent stream limit of each connection.
+        delay (float): The answer delay in seconds.
+        ports (multiprocessing.Queue): The queue to put the port on once serving.
+    """
+    response = make_response(citations=10)
+
+    async def answer_query(
+        request: discoveryengine.AnswerQueryRequest,
+        context: aio.ServicerContext,
+    ) -> discoveryengine.AnswerQueryResponse:
+        await asyncio.sleep(delay)
+        return response
+
+    handler = grpc.method_handlers_generic_handler(
+        SERVICE,
+        {
+            "AnswerQuery": grpc.unary_unary_rpc_method_handler(
+                answer_query,
+                request_deserializer=discoveryengine.AnswerQueryRequest.deserialize,
+                response_serializer=discoveryengine.AnswerQueryResponse.serialize,
+            )
+        },
+    )
+    # Without overload protection the client queues streams over the limit rather
+    # than the server refusing them.
+    server = aio.server(
+        options=[
+            ("grpc.max_concurrent_streams", max_streams),
+            ("grpc.http.overload_protection", 0),
+        ]
+    )
+    server.add_generic_rpc_handlers((handler,))
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    ports.put(port)
+    await server.wait_for_termination()
+
+
+def run_server(max_streams: int, delay: float, ports: multiprocessing.Queue) -> None:
+    """Run the fake answer server in this process."""
+    asyncio.run(serve(max_streams, delay, ports))
+
+
+def client_factory(
+    target: str,
+) -> Callable[[int], discoveryengine.ConversationalSearchServiceAsyncClient]:
+    """Return a factory of clients with their own insecure local channels."""
+
+    def create_client(
+        index: int,
+    ) -> discoveryengine.ConversationalSearchServiceAsyncClient:
+        channel = aio.insecure_channel(
+            target, options=[("grpc.use_local_subchannel_pool", 1)]
+        )
+        transport = ConversationalSearchServiceGrpcAsyncIOTransport(
+            channel=channel, credentials=AnonymousCredentials()
+        )
+        return discoveryengine.ConversationalSearchServiceAsyncClient(
+            transport=transport
+        )
+
+    return create_client
+
+
+async def run(target: str, size: int, concurrency: int, calls: int) -> list[float]:
+    """Make the calls at the given concurrency and return their latencies in seconds."""
+    pool = ClientPool(client_factory=client_factory(target), size=size)
+    request = discoveryengine.AnswerQueryRequest(
+        serving_config="projects/p/locations/global/collections/c/engines/e/"
+        "servingConfigs/default_serving_config",
+        query=discoveryengine.Query(text="What is the answer?"),
+    )
+    latencies: list[float] = []
+    remaining = calls
+
+    # Warm up every channel so connection setup is not measured.
+    for client in pool.clients:
+        await client.answer_query(request)
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            with pool.acquire() as client:
+                await client.answer_query(request)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    await pool.close()
+
+    return latencies
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return the value at the given fraction of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--max-streams", type=int, default=32)
+    parser.add_argument("--delay-ms", type=float, default=50.0)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    ports: multiprocessing.Queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=run_server, args=(args.max_streams, args.delay_ms / 1e3, ports)
+    )
+    server.start()
+    target = f"127.0.0.1:{ports.get(timeout=30)}"
+    print(
+        f"concurrency {args.concurrency}, {args.calls} calls, "
+        f"{args.max_streams} streams per connection, {args.delay_ms:g} ms answers"
+    )
+    print(f"{'channels':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    try:
+        for size in args.sizes:
+            latencies = await run(target, size, args.concurrency, args.calls)
+            print(
+                f"{size:>8}{statistics.median(latencies) * 1e3:>9.1f}"
+                f"{percentile(latencies, 0.95) * 1e3:>9.1f}"
+                f"{percentile(latencies, 0.99) * 1e3:>9.1f}"
+                f"{max(latencies) * 1e3:>9.1f}"
+            )
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""Benchmark response compression of /answer and /sessions/ payloads.
+
+Builds full /answer JSON bodies for synthetic answers with 10, 30 and 100 citations and a
+/sessions/ body with 20 sessions of 5 full turns, then reports the compressed size and
+CPU time per response for gzip and Brotli at a few levels.
+
+Usage:
+    poetry run python benchmarks/compression.py [--citations 10 30 100]
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import time
+import timeit
+from typing import Callable
+
+import brotli
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+from answer_app.render import render_markdown
+
+from sample_data import make_response
+
+
+def answer_body(citations: int) -> bytes:
+    """Return a full /answer JSON body."""
+    response = make_response(citations=citations)
+    body = {
+        "question": "What is the capital of France?",
+        "markdown": base64.b64encode(
+            render_markdown(response.answer).encode("utf-8")
+        ).decode("utf-8"),
+        "latency": 1.5,
+        **AnswerQueryResponse.to_dict(instance=response, use_integers_for_enums=False),
+    }
+
+    return json.dumps(body).encode("utf-8")
+
+
+def sessions_body(sessions: int = 20, turns: int = 5) -> bytes:
+    """Return a /sessions/ JSON body with full turns."""
+    turn = {
+        "query": {"text": "What is the capital of France?", "query_id": "q"},
+        "answer": "projects/p/locations/global/collections/c/engines/e/sessions/s/answers/a",
+    }
+    body = {
+        "sessions": [
+            {
+                "name": f"projects/p/locations/global/collections/c/engines/e/sessions/{n}",
+                "state": "IN_PROGRESS",
+                "user_pseudo_id": "user@example.com",
+                "turns": [turn] * turns,
+                "start_time": "2025-01-01T00:00:00Z",
+                "end_time": "2025-01-01T00:05:00Z",
+            }
+            for n in range(sessions)
+        ]
+    }
+
+    return json.dumps(body).encode("utf-8")
+
+
+CODECS: dict[str, Callable[[bytes], bytes]] = {
+    "gzip-1": lambda data: gzip.compress(data, compresslevel=1, mtime=0),
+    "gzip-6": lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+    "gzip-9": lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+    "br-1": lambda data: brotli.compress(data, mode=brotli.MODE_TEXT, quality=1),
+    "br-4": lambda data: brotli.compress(data, mode=brotli.MODE_TEXT, quality=4),
+    "br-11": lambda data: brotli.compress(data, mode=brotli.MODE_TEXT, quality=11),
+}
+
+
+def best_time(function: Callable[[], object]) -> float:
+    """Return the best CPU time of one call in seconds."""
+    timer = timeit.Timer(function, timer=time.process_time)
+    number, _ = timer.autorange()
+
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--citations", type=int, nargs="+", default=[10, 30, 100])
+    args = parser.parse_args()
+
+    bodies = {f"answer-{citations}": answer_body(citations) for citations in args.citations}
+    bodies["sessions-20x5"] = sessions_body()
+
+    print(f"{'payload':<15}{'codec':<8}{'KiB':>8}{'saved':>8}{'CPU ms':>9}")
+    for name, body in bodies.items():
+        print(f"{name:<15}{'none':<8}{len(body) / 1024:>8.1f}{'':>8}{'':>9}")
+        for codec, compress in CODECS.items():
+            size = len(compress(body))
+            cpu = best_time(lambda: compress(body))
+            print(
+                f"{'':<15}{codec:<8}{size / 1024:>8.1f}"
+                f"{1 - size / len(body):>8.1%}{cpu * 1e3:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
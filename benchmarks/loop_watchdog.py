@@ -0,0 +1,93 @@
+"""Benchmark the overhead and detection of the event loop watchdog.
+
+Runs a busy event loop of short callbacks, like a worker handling many requests, with
+and without the watchdog, in alternation, and reports the callback throughput of
+each. Then blocks the loop for a known time and reports the stall the watchdog
+recorded.
+
+Usage:
+    cd benchmarks && PYTHONPATH=../src python loop_watchdog.py [--seconds 1]
+        [--threshold-ms 100] [--interval-ms 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+from answer_app.metrics import Counter
+from answer_app.metrics import Histogram
+from answer_app.watchdog import LoopWatchdog
+
+
+def make_watchdog(threshold: float, interval: float) -> LoopWatchdog:
+    """Create a watchdog with its own metrics."""
+    return LoopWatchdog(
+        Histogram("blocked_seconds", "Blocked.", bounds=(threshold,)),
+        Counter("blocked", "Blocked.", label="site"),
+        threshold_seconds=threshold,
+        interval_seconds=interval,
+    )
+
+
+async def callbacks_per_second(seconds: float) -> float:
+    """Yield to the event loop as often as possible for a fixed time."""
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(0)
+        count += 1
+
+    return count / seconds
+
+
+async def throughput(seconds: float, threshold: float, interval: float) -> None:
+    """Compare the callback throughput with and without the watchdog."""
+    without, with_watchdog = [], []
+    for _ in range(5):
+        without.append(await callbacks_per_second(seconds))
+        watchdog = make_watchdog(threshold, interval)
+        watchdog.start()
+        with_watchdog.append(await callbacks_per_second(seconds))
+        await watchdog.stop()
+
+    best_without, best_with = max(without), max(with_watchdog)
+    print(f"Callbacks per second without the watchdog: {best_without:12,.0f}")
+    print(f"Callbacks per second with the watchdog:    {best_with:12,.0f}")
+    overhead = 1 - best_with / best_without
+    print(f"Overhead:                                  {overhead:12.2%}")
+
+
+async def detection(threshold: float, interval: float) -> None:
+    """Block the loop and report the stall the watchdog recorded."""
+    watchdog = make_watchdog(threshold, interval)
+    watchdog.start()
+    await asyncio.sleep(interval * 2)
+    time.sleep(threshold * 3)
+    await asyncio.sleep(interval * 2)
+    await watchdog.stop()
+
+    histogram = watchdog._blocked_seconds
+    print(
+        f"Blocked for {threshold * 3 * 1e3:.0f} ms, recorded {histogram.count} stall "
+        f"of {histogram.sum * 1e3:.0f} ms in {watchdog._blocked_sites.samples()}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--threshold-ms", type=float, default=100.0)
+    parser.add_argument("--interval-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    # Keep the stack logged during the stall out of the report.
+    logging.basicConfig(level=logging.ERROR)
+
+    threshold, interval = args.threshold_ms / 1e3, args.interval_ms / 1e3
+    asyncio.run(throughput(args.seconds, threshold, interval))
+    asyncio.run(detection(threshold, interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark the per-request overhead of the /metrics instrumentation.
+
+Times the metric updates of one /answer request: the in-flight gauge, the end-to-end
+histogram and the Discovery Engine and render histograms observed by the timing
+stages. Each stage is timed with and without its histogram inside a request, so the
+difference is the cost of the histogram alone. Also times the background collection
+of the buffered values into the buckets, and rendering the exposition text that a
+scrape returns.
+
+Usage:
+    cd benchmarks && PYTHONPATH=../src python metrics_overhead.py [--number 200000]
+"""
+
+import argparse
+import random
+import timeit
+
+from answer_app.metrics import Histogram
+from answer_app.metrics import answer_seconds
+from answer_app.metrics import answers_in_flight
+from answer_app.metrics import discoveryengine_seconds
+from answer_app.metrics import errors
+from answer_app.metrics import registry
+from answer_app.metrics import render_seconds
+from answer_app.timing import request_timings
+from answer_app.timing import stage
+
+
+def observe_and_collect(histogram: Histogram, values: list[float]) -> None:
+    """Observe every value, then collect them into the buckets."""
+    for value in values:
+        histogram.observe(value)
+    histogram.collect()
+
+
+def observe(histogram: Histogram, values: list[float]) -> None:
+    """Observe every value, then discard them."""
+    for value in values:
+        histogram.observe(value)
+    del histogram._pending[:]
+
+
+def request_metrics() -> None:
+    """The metric updates of an /answer request outside its timing stages."""
+    answers_in_flight.inc()
+    answer_seconds.observe(0.8)
+    answers_in_flight.dec()
+
+
+def stages(with_histograms: bool) -> None:
+    """The Discovery Engine and render stages of an /answer request."""
+    with stage("discoveryengine", discoveryengine_seconds if with_histograms else None):
+        pass
+    with stage("render", render_seconds if with_histograms else None):
+        pass
+
+
+def per_call_us(statement: object, number: int) -> float:
+    """Return the best time of one call in microseconds, over five repeats."""
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def paired_per_call_us(
+    first: object, second: object, number: int, repeat: int = 15
+) -> tuple[float, float]:
+    """Return the best times of two statements, timed in alternation so that noise
+    from other processes affects both alike.
+    """
+    first_times, second_times = [], []
+    for _ in range(repeat):
+        first_times.append(timeit.timeit(first, number=number))
+        second_times.append(timeit.timeit(second, number=number))
+
+    return min(first_times) / number * 1e6, min(second_times) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args()
+
+    # Latencies spread over the histogram range, so the bucket search is typical.
+    values = [random.lognormvariate(0, 1.5) for _ in range(1000)]
+    observe_us, observe_and_collect_us = (
+        us / len(values)
+        for us in paired_per_call_us(
+            lambda: observe(answer_seconds, values),
+            lambda: observe_and_collect(answer_seconds, values),
+            args.number // 1000,
+        )
+    )
+    request_us = per_call_us(request_metrics, args.number)
+    with request_timings():
+        bare_us, instrumented_us = paired_per_call_us(
+            lambda: stages(False),
+            lambda: stages(True),
+            args.number // 10,
+            repeat=50,
+        )
+    per_request_us = request_us + instrumented_us - bare_us
+
+    # Fill the error counter so the scrape includes a few labelled samples.
+    for name in ("ValueError", "TimeoutError", "GoogleAPICallError"):
+        errors.inc(name)
+    text = registry.render()
+    render_us = per_call_us(registry.render, 1000)
+
+    print(f"Histogram.observe:                 {observe_us:8.3f} us")
+    print(
+        f"Histogram.collect per value:       "
+        f"{observe_and_collect_us - observe_us:8.3f} us (background)"
+    )
+    print(f"Gauge inc/dec and end-to-end:      {request_us:8.3f} us")
+    print(f"Two stages without histograms:     {bare_us:8.3f} us")
+    print(f"Two stages with histograms:        {instrumented_us:8.3f} us")
+    print(f"Metrics overhead per request:      {per_request_us:8.3f} us")
+    print(
+        f"Scrape render:                     {render_us:8.1f} us "
+        f"({len(text.splitlines())} lines, {len(text)} bytes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark the overhead of the /debug/profile stack sampler.
+
+Runs CPU-bound work, like a worker rendering answers, with and without the sampler
+running in a thread, in alternation, and reports the work throughput of each and the
+CPU time the sampler thread takes for each stack sample.
+
+Usage:
+    cd benchmarks && PYTHONPATH=../src python profiler_overhead.py [--seconds 1]
+        [--interval-ms 10] [--depth 30]
+"""
+
+import argparse
+import threading
+import time
+
+from answer_app.profiler import sample_stacks
+
+
+def work(depth: int) -> int:
+    """Do a little work at the bottom of a stack of the given depth."""
+    if depth > 0:
+        return work(depth - 1)
+
+    return sum(range(200))
+
+
+def calls_per_second(seconds: float, depth: int) -> float:
+    """Call the work as often as possible for a fixed time."""
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        work(depth)
+        count += 1
+
+    return count / seconds
+
+
+def with_sampler(seconds: float, interval: float, depth: int) -> tuple[float, float]:
+    """Measure the work throughput while the sampler runs in a thread, and the CPU
+    time of the sampler thread per sample.
+    """
+    result = {}
+
+    def sample() -> None:
+        start = time.thread_time()
+        profile = sample_stacks(seconds, interval)
+        samples = sum(profile.samples.values())
+        result["per_sample"] = (time.thread_time() - start) / max(samples, 1)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    rate = calls_per_second(seconds, depth)
+    sampler.join()
+
+    return rate, result["per_sample"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    parser.add_argument("--depth", type=int, default=30)
+    args = parser.parse_args()
+
+    interval = args.interval_ms / 1e3
+    without, with_sampling, per_sample = [], [], []
+    for _ in range(5):
+        without.append(calls_per_second(args.seconds, args.depth))
+        rate, seconds_per_sample = with_sampler(args.seconds, interval, args.depth)
+        with_sampling.append(rate)
+        per_sample.append(seconds_per_sample)
+
+    best_without, best_with = max(without), max(with_sampling)
+    print(f"Calls per second without the sampler: {best_without:12,.0f}")
+    print(f"Calls per second with the sampler:    {best_with:12,.0f}")
+    overhead = 1 - best_with / best_without
+    print(f"Overhead:                             {overhead:12.2%}")
+    print(f"Sampler CPU time per sample:          {min(per_sample) * 1e6:12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Benchmark the markdown citation renderer against the original splicing renderer.
+
+Checks that both renderers produce identical output, then times them on synthetic
+answers with 10, 100 and 1000 citations. Also measures the peak traced memory of a
+whole render and of collecting the citation records alone.
+
+Usage:
+    poetry run python benchmarks/render_markdown.py [--citations 10 100 1000]
+"""
+
+import argparse
+import base64
+import logging
+import timeit
+import tracemalloc
+from typing import Callable
+from urllib.parse import quote
+
+from google.cloud.discoveryengine_v1.types import Answer
+from pydantic import BaseModel
+
+from answer_app.render import RenderedAnswer
+from answer_app.render import _citation_records
+from answer_app.render import link_cache
+
+from sample_data import make_answer
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClientCitation(BaseModel):
+    """The original citation model, with a pydantic model per citation source."""
+
+    start_index: int
+    end_index: int
+    ref_index: int
+    content: str
+    score: float
+    title: str
+    citation_index: int | None = None
+    uri: str
+
+    def update_citation_index(self, citation_index: int):
+        self.citation_index = citation_index
+
+    def get_inline_link(self):
+        # Ensure citation_index is an integer before performing the addition
+        if self.citation_index is None:
+            raise ValueError(
+                "citation_index must be set to an integer before calling get_inline_link"
+            )
+
+        # Ref: https://www.markdownguide.org/basic-syntax/#adding-titles
+        content = self.content.replace('"', "'")
+        return f' _[[{self.citation_index}]({self.get_footer_link()} "{content}")]_'
+
+    def get_footer_link(self):
+        url = self.uri.replace("gs://", "https://storage.cloud.google.com/")
+        url_encoded = quote(url, safe=":/")
+        return url_encoded
+
+    def count_chars(self):
+        return len(self.get_inline_link())
+
+
+def legacy_client_citations(answer: Answer) -> list[ClientCitation]:
+    """The original citation collection, with a pydantic model per citation source."""
+    return [
+        ClientCitation(
+            # fmt: off
+            start_index=citation.start_index,
+            end_index=citation.end_index,
+            ref_index=int(source.reference_id),
+            content=answer.references[int(source.reference_id)].chunk_info.content,
+            score=answer.references[int(source.reference_id)].chunk_info.relevance_score,
+            title=answer.references[int(source.reference_id)].chunk_info.document_metadata.title,
+            uri=answer.references[int(source.reference_id)].chunk_info.document_metadata.uri,
+            # fmt: on
+        )
+        for citation in answer.citations
+        for source in citation.sources
+    ]
+
+
+def legacy_answer_to_markdown(answer: Answer) -> str:
+    """The original renderer, which splices each link into the whole markdown string."""
+    client_citations = legacy_client_citations(answer)
+    client_citations.sort(key=lambda citation: citation.start_index)
+
+    markdown: str = answer.answer_text
+    offset = 0
+    footer: str = "\n\n**Citations:**\n\n"
+    collected_uris: dict[str, int] = {}
+    citation_index = 0
+
+    for citation in client_citations:
+        logger.debug(f"Citation: {citation}")
+        if citation.uri not in collected_uris.keys():
+            citation_index += 1
+            collected_uris[citation.uri] = citation_index
+            footer += f"[{citation_index}] [{citation.title}]({citation.get_footer_link()})\n\n"
+        citation.update_citation_index(collected_uris[citation.uri])
+        logger.debug(f"Citation index: {citation.citation_index}")
+        logger.debug(f"Footer: {footer}")
+        markdown = (
+            markdown[: citation.end_index + offset]
+            + citation.get_inline_link()
+            + markdown[citation.end_index + offset :]
+        )
+        offset += citation.count_chars()
+
+    markdown += footer
+    logger.debug(f"Markdown: {markdown}")
+
+    return base64.b64encode(markdown.encode("utf-8")).decode("utf-8")
+
+
+def answer_to_markdown(answer: Answer) -> str:
+    """The current renderer, as the /answer route uses it."""
+    return RenderedAnswer.from_answer(answer).base64
+
+
+def peak_memory(render: Callable[[Answer], object], answer: Answer) -> int:
+    """Return the peak bytes allocated by a render step for an answer."""
+    render(answer)
+    tracemalloc.start()
+    render(answer)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--citations", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(
+        f"{'citations':>9}{'legacy ms':>12}{'current ms':>12}{'speedup':>9}"
+        f"{'legacy KiB':>12}{'current KiB':>13}"
+        f"{'legacy cit. KiB':>17}{'current cit. KiB':>18}"
+    )
+    for citations in args.citations:
+        answer = make_answer(citations=citations)
+        if answer_to_markdown(answer) != legacy_answer_to_markdown(answer):
+            raise SystemExit(f"Output differs from the legacy renderer at {citations} citations.")
+
+        timings = []
+        for render in (legacy_answer_to_markdown, answer_to_markdown):
+            timer = timeit.Timer(lambda: render(answer))
+            number, _ = timer.autorange()
+            timings.append(min(timer.repeat(repeat=5, number=number)) / number)
+
+        legacy, current = timings
+        legacy_peak = peak_memory(legacy_answer_to_markdown, answer)
+        current_peak = peak_memory(answer_to_markdown, answer)
+        legacy_citations_peak = peak_memory(legacy_client_citations, answer)
+        current_citations_peak = peak_memory(_citation_records, answer)
+        print(
+            f"{citations:>9}{legacy * 1e3:>12.3f}{current * 1e3:>12.3f}"
+            f"{legacy / current:>8.1f}x{legacy_peak / 1024:>12.1f}{current_peak / 1024:>13.1f}"
+            f"{legacy_citations_peak / 1024:>17.1f}{current_citations_peak / 1024:>18.1f}"
+        )
+
+    stats = link_cache.stats()
+    print(
+        f"Link cache hit rates: links {stats['link_hit_rate']:.4f}, "
+        f"footer lines {stats['line_hit_rate']:.4f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark the /answer response work with and without a fields projection.
+
+Times the request-path work of building and serializing an AnswerResponse for the full
+response and for the minimal profile, on synthetic answers with 10, 100 and 1000
+citations, and reports the JSON body size of each. The full BigQuery row is built by the
+background writer in both cases and is not part of the request path.
+
+Usage:
+    poetry run python benchmarks/response_fields.py [--citations 10 100 1000]
+"""
+
+import argparse
+import base64
+import json
+import timeit
+from typing import Any
+
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+from answer_app.model import AnswerResponse
+from answer_app.projection import ResponseFields
+from answer_app.projection import parse_fields
+from answer_app.projection import project_response
+
+from sample_data import make_response
+
+
+def full_body(response: AnswerQueryResponse) -> bytes:
+    """Build the full response and serialize it as FastAPI does for a response_model."""
+    answer_response = AnswerResponse(
+        question="question",
+        markdown=base64.b64encode(b"markdown").decode("utf-8"),
+        latency=1.0,
+        **AnswerQueryResponse.to_dict(instance=response, use_integers_for_enums=False),
+    )
+    validated = AnswerResponse.model_validate(answer_response.model_dump())
+
+    return json.dumps(validated.model_dump()).encode("utf-8")
+
+
+def projected_body(response: AnswerQueryResponse, include: ResponseFields) -> bytes:
+    """Build the projected response and serialize only the included fields."""
+    response_dict: dict[str, Any] = project_response(response=response, include=include)
+    answer_response = AnswerResponse(
+        question="question",
+        markdown=base64.b64encode(b"markdown").decode("utf-8"),
+        latency=1.0,
+        **{"answer": {}, "answer_query_token": response.answer_query_token, **response_dict},
+    )
+
+    return json.dumps(answer_response.model_dump(include=include)).encode("utf-8")
+
+
+def best_time(function: Any) -> float:
+    """Return the best time of one call in seconds."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--citations", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+    include = parse_fields("minimal")
+
+    print(
+        f"{'citations':>9}{'full ms':>10}{'minimal ms':>12}{'speedup':>9}"
+        f"{'full KiB':>10}{'minimal KiB':>13}"
+    )
+    for citations in args.citations:
+        response = make_response(citations=citations)
+
+        full = best_time(lambda: full_body(response))
+        minimal = best_time(lambda: projected_body(response, include))
+        full_size = len(full_body(response))
+        minimal_size = len(projected_body(response, include))
+        print(
+            f"{citations:>9}{full * 1e3:>10.3f}{minimal * 1e3:>12.3f}"
+            f"{full / minimal:>8.1f}x{full_size / 1024:>10.1f}{minimal_size / 1024:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Synthetic Discovery Engine answers for the benchmarks."""
+
+from google.cloud.discoveryengine_v1.types import Answer
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+from google.cloud.discoveryengine_v1.types import Session
+
+
+def make_answer(citations: int = 10, sentence_length: int = 80) -> Answer:
+    """Build an answer with one cited sentence per citation.
+
+    Args:
+        citations (int, optional): The number of citations. Defaults to 10.
+        sentence_length (int, optional): The length of each sentence. Defaults to 80.
+
+    Returns:
+        Answer: The answer with citations and chunk references.
+    """
+    sentence = ("Lorem ipsum dolor sit amet. " * (sentence_length // 28 + 1))[
+        :sentence_length
+    ]
+    answer_text = sentence * citations
+    # Cite a few documents many times, like real answers do.
+    documents = max(1, citations // 3)
+
+    return Answer(
+        name="projects/p/locations/global/collections/c/engines/e/sessions/s/answers/a",
+        state=Answer.State.SUCCEEDED,
+        answer_text=answer_text,
+        citations=[
+            Answer.Citation(
+                start_index=index * sentence_length,
+                end_index=(index + 1) * sentence_length,
+                sources=[Answer.CitationSource(reference_id=str(index))],
+            )
+            for index in range(citations)
+        ],
+        references=[
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content=f'Chunk {index} content with "quotes". ' * 10,
+                    relevance_score=0.5,
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        uri=f"gs://bucket/folder name/document {index % documents}.pdf",
+                        title=f"Document {index % documents}",
+                    ),
+                )
+            )
+            for index in range(citations)
+        ],
+        related_questions=["What else?", "Why?"],
+        create_time={"seconds": 1700000000, "nanos": 123456000},
+        complete_time={"seconds": 1700000003, "nanos": 0},
+    )
+
+
+def make_response(citations: int = 10) -> AnswerQueryResponse:
+    """Build an AnswerQueryResponse with a session.
+
+    Args:
+        citations (int, optional): The number of citations. Defaults to 10.
+
+    Returns:
+        AnswerQueryResponse: The response.
+    """
+    return AnswerQueryResponse(
+        answer=make_answer(citations=citations),
+        session=Session(
+            name="projects/p/locations/global/collections/c/engines/e/sessions/s",
+            state=Session.State.IN_PROGRESS,
+            user_pseudo_id="user",
+        ),
+        answer_query_token="token",
+    )
@@ -0,0 +1,185 @@
+"""Load test the answer_app.server entry point.
+
+Serves a stand-in for the /answer route through answer_app.server in a separate process.
+It waits a fixed delay for the upstream answer, then converts a synthetic answer to a
+dict and serializes the AnswerResponse, which is the CPU-bound part of a real request.
+Keep-alive HTTP/1.1 connections send requests at a fixed concurrency for a fixed time
+under each worker count, event loop and HTTP parser. The report gives throughput and
+latency percentiles.
+
+Usage:
+    cd benchmarks && PYTHONPATH=../src python server_load.py [--workers 1 2]
+        [--loops asyncio uvloop] [--http h11 httptools] [--concurrency 64]
+        [--seconds 10] [--delay-ms 20] [--citations 10]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+
+from fastapi import FastAPI
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+from answer_app.model import AnswerResponse
+from answer_app.responses import ModelJSONResponse
+from answer_app.server import serve
+from answer_app.server import server_config
+
+from sample_data import make_response
+
+
+# The stand-in app, imported by the server workers.
+DELAY_SECONDS = float(os.getenv("SERVER_LOAD_DELAY_MS", "20")) / 1e3
+RESPONSE = make_response(citations=int(os.getenv("SERVER_LOAD_CITATIONS", "10")))
+
+app = FastAPI()
+
+
+@app.post("/answer")
+async def answer() -> ModelJSONResponse:
+    await asyncio.sleep(DELAY_SECONDS)
+    response_dict = AnswerQueryResponse.to_dict(RESPONSE)
+    answer_response = AnswerResponse.model_construct(
+        question="question",
+        markdown="bWFya2Rvd24=",
+        latency=DELAY_SECONDS,
+        answer=response_dict["answer"],
+        session=response_dict.get("session"),
+        answer_query_token=response_dict["answer_query_token"],
+    )
+
+    return ModelJSONResponse(answer_response)
+
+
+REQUEST = (
+    b"POST /answer HTTP/1.1\r\nHost: localhost\r\n"
+    b"Content-Type: application/json\r\nContent-Length: 2\r\n\r\n{}"
+)
+
+
+def free_port() -> int:
+    """Return a free local port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_serving(port: int, timeout: float = 60.0) -> None:
+    """Wait until the server accepts connections and answers a request."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+            continue
+        await request(reader, writer)
+        writer.close()
+        return
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> int:
+    """Send a request on a keep-alive connection and read the response body."""
+    writer.write(REQUEST)
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+
+    return int(head.split(b" ", 2)[1])
+
+
+async def load(port: int, concurrency: int, seconds: float) -> list[float]:
+    """Send requests on concurrent connections and return their latencies."""
+    latencies: list[float] = []
+    deadline = time.perf_counter() + seconds
+
+    async def connection() -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await request(reader, writer)
+            if status != 200:
+                raise RuntimeError(f"Unexpected status {status}")
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    await asyncio.gather(*[connection() for _ in range(concurrency)])
+
+    return latencies
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return the value at the given fraction of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--loops", nargs="+", default=["asyncio", "uvloop"])
+    parser.add_argument("--http", nargs="+", default=["h11", "httptools"])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--delay-ms", type=float, default=20.0)
+    parser.add_argument("--citations", type=int, default=10)
+    args = parser.parse_args()
+
+    # The server workers read the stand-in settings from the environment.
+    os.environ["SERVER_LOAD_DELAY_MS"] = str(args.delay_ms)
+    os.environ["SERVER_LOAD_CITATIONS"] = str(args.citations)
+
+    # Skip the event loops and HTTP parsers that are not installed.
+    loops = [loop for loop in args.loops if importlib.util.find_spec(loop)]
+    http = [name for name in args.http if importlib.util.find_spec(name)]
+
+    print(
+        f"{os.cpu_count()} CPUs, concurrency {args.concurrency}, "
+        f"{args.seconds:g} seconds, {args.delay_ms:g} ms upstream delay, "
+        f"{args.citations} citations"
+    )
+    print(
+        f"{'workers':>7}{'loop':>9}{'http':>11}{'req/s':>9}"
+        f"{'p50 ms':>9}{'p99 ms':>9}"
+    )
+    for workers, loop, parser_name in itertools.product(args.workers, loops, http):
+        port = free_port()
+        config = server_config(
+            app="server_load:app",
+            host="127.0.0.1",
+            port=port,
+            workers=workers,
+            loop=loop,
+            http=parser_name,
+            log_level="warning",
+        )
+        server = multiprocessing.Process(target=serve, args=(config,))
+        server.start()
+        try:
+            asyncio.run(wait_until_serving(port))
+            latencies = asyncio.run(load(port, args.concurrency, args.seconds))
+        finally:
+            server.terminate()
+            server.join()
+
+        print(
+            f"{workers:>7}{loop:>9}{parser_name:>11}"
+            f"{len(latencies) / args.seconds:>9.0f}"
+            f"{statistics.median(latencies) * 1e3:>9.1f}"
+            f"{percentile(latencies, 0.99) * 1e3:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
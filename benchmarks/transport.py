@@ -0,0 +1,259 @@
+"""Compare the Discovery Engine client transports on latency and client CPU.
+
+Runs local stand-ins for the ConversationalSearchService in a separate process: a gRPC
+server over local TCP credentials and an HTTP/1.1 JSON server for the REST transport.
+Both answer after a fixed delay with a synthetic answer. Calls are made at a fixed
+concurrency through the gRPC transport with the ClientTransport channel settings, with
+and without gzip message compression, and through the REST client in worker threads.
+Reports the latency percentiles and the client CPU per call.
+
+Usage:
+    poetry run python benchmarks/transport.py [--concurrency 100] [--calls 2000]
+        [--delay-ms 50] [--citations 10]
+"""
+
+import argparse
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import multiprocessing
+import queue
+import statistics
+import threading
+import time
+from typing import Any
+
+from google.api_core.client_options import ClientOptions
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import discoveryengine_v1 as discoveryengine
+from google.cloud.discoveryengine_v1.services.conversational_search_service.transports import (
+    ConversationalSearchServiceGrpcAsyncIOTransport,
+)
+import grpc
+from grpc import aio
+
+from answer_app.transport import ClientTransport
+from answer_app.transport import RestAsyncClient
+
+from sample_data import make_response
+
+
+SERVICE = "google.cloud.discoveryengine.v1.ConversationalSearchService"
+SERVING_CONFIG = (
+    "projects/p/locations/global/collections/default_collection/engines/e/"
+    "servingConfigs/default_serving_config"
+)
+
+
+async def serve_grpc(
+    response: discoveryengine.AnswerQueryResponse,
+    delay: float,
+    compression: grpc.Compression,
+    name: str,
+    started: queue.Queue[tuple[str, int]],
+) -> None:
+    """Serve gRPC answers on a free local port until the process is terminated."""
+
+    async def answer_query(
+        request: discoveryengine.AnswerQueryRequest,
+        context: aio.ServicerContext,
+    ) -> discoveryengine.AnswerQueryResponse:
+        await asyncio.sleep(delay)
+        return response
+
+    handler = grpc.method_handlers_generic_handler(
+        SERVICE,
+        {
+            "AnswerQuery": grpc.unary_unary_rpc_method_handler(
+                answer_query,
+                request_deserializer=discoveryengine.AnswerQueryRequest.deserialize,
+                response_serializer=discoveryengine.AnswerQueryResponse.serialize,
+            )
+        },
+    )
+    server = aio.server(compression=compression)
+    server.add_generic_rpc_handlers((handler,))
+    port = server.add_secure_port(
+        "127.0.0.1:0", grpc.local_server_credentials(grpc.LocalConnectionType.LOCAL_TCP)
+    )
+    await server.start()
+    started.put((name, port))
+    await server.wait_for_termination()
+
+
+def serve_rest(
+    response: discoveryengine.AnswerQueryResponse,
+    delay: float,
+    started: queue.Queue[tuple[str, int]],
+) -> None:
+    """Serve JSON answers on a free local port until the process is terminated."""
+    body = discoveryengine.AnswerQueryResponse.to_json(response).encode()
+
+    class AnswerHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), AnswerHandler)
+    server.daemon_threads = True
+    started.put(("rest", server.server_address[1]))
+    server.serve_forever()
+
+
+def run_servers(
+    citations: int,
+    delay: float,
+    ports: multiprocessing.Queue,
+) -> None:
+    """Run the stand-ins in this process and put their ports on the queue."""
+    response = make_response(citations=citations)
+    started: queue.Queue[tuple[str, int]] = queue.Queue()
+    threading.Thread(
+        target=serve_rest, args=(response, delay, started), daemon=True
+    ).start()
+
+    async def serve() -> None:
+        servers = [
+            asyncio.create_task(serve_grpc(response, delay, compression, name, started))
+            for name, compression in (
+                ("grpc", grpc.Compression.NoCompression),
+                ("grpc_gzip", grpc.Compression.Gzip),
+            )
+        ]
+        loop = asyncio.get_running_loop()
+        names_and_ports = [
+            await loop.run_in_executor(None, started.get) for _ in range(3)
+        ]
+        ports.put(dict(names_and_ports))
+        await asyncio.gather(*servers)
+
+    asyncio.run(serve())
+
+
+def grpc_client(
+    port: int,
+    compression: str | None,
+) -> discoveryengine.ConversationalSearchServiceAsyncClient:
+    """Create a gRPC client with the ClientTransport channel settings."""
+    transport = ClientTransport(compression=compression)
+    grpc_transport = ConversationalSearchServiceGrpcAsyncIOTransport(
+        host=f"127.0.0.1:{port}",
+        credentials=AnonymousCredentials(),
+        ssl_channel_credentials=grpc.local_channel_credentials(
+            grpc.LocalConnectionType.LOCAL_TCP
+        ),
+        channel=transport._create_channel,
+    )
+
+    return discoveryengine.ConversationalSearchServiceAsyncClient(
+        transport=grpc_transport
+    )
+
+
+def rest_client(port: int) -> RestAsyncClient:
+    """Create a REST client for the local HTTP stand-in."""
+    return RestAsyncClient(
+        discoveryengine.ConversationalSearchServiceClient(
+            client_options=ClientOptions(api_endpoint=f"http://127.0.0.1:{port}"),
+            credentials=AnonymousCredentials(),
+            transport="rest",
+        )
+    )
+
+
+async def run(client: Any, concurrency: int, calls: int) -> tuple[list[float], float]:
+    """Make the calls at the given concurrency.
+
+    Returns:
+        tuple[list[float], float]: The latencies and the client CPU time in seconds.
+    """
+    request = discoveryengine.AnswerQueryRequest(
+        serving_config=SERVING_CONFIG,
+        query=discoveryengine.Query(text="What is the answer?"),
+    )
+    latencies: list[float] = []
+    remaining = calls
+
+    # Connect before measuring.
+    await client.answer_query(request)
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            await client.answer_query(request)
+            latencies.append(time.perf_counter() - start)
+
+    cpu_start = time.process_time()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    return latencies, time.process_time() - cpu_start
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return the value at the given fraction of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--delay-ms", type=float, default=50.0)
+    parser.add_argument("--citations", type=int, default=10)
+    args = parser.parse_args()
+
+    ports: multiprocessing.Queue = multiprocessing.Queue()
+    servers = multiprocessing.Process(
+        target=run_servers, args=(args.citations, args.delay_ms / 1e3, ports)
+    )
+    servers.start()
+    port: dict[str, int] = ports.get(timeout=30)
+    response_size = len(
+        discoveryengine.AnswerQueryResponse.serialize(
+            make_response(citations=args.citations)
+        )
+    )
+
+    print(
+        f"concurrency {args.concurrency}, {args.calls} calls, "
+        f"{args.delay_ms:g} ms answers, {args.citations} citations "
+        f"({response_size} protobuf bytes)"
+    )
+    print(
+        f"{'transport':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'CPU ms/call':>13}"
+    )
+    clients = {
+        "grpc": lambda: grpc_client(port["grpc"], compression=None),
+        "grpc_gzip": lambda: grpc_client(port["grpc_gzip"], compression="gzip"),
+        "rest": lambda: rest_client(port["rest"]),
+    }
+    try:
+        for name, create_client in clients.items():
+            client = create_client()
+            latencies, cpu = await run(client, args.concurrency, args.calls)
+            print(
+                f"{name:>10}{statistics.median(latencies) * 1e3:>9.1f}"
+                f"{percentile(latencies, 0.95) * 1e3:>9.1f}"
+                f"{percentile(latencies, 0.99) * 1e3:>9.1f}"
+                f"{cpu / args.calls * 1e3:>13.3f}"
+            )
+    finally:
+        servers.terminate()
+        servers.join()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,5 @@
+import time
+
+
+# When the package was first imported, for the startup timings logged by answer_app.main.
+IMPORT_START: float = time.perf_counter()
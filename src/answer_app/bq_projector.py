@@ -0,0 +1,249 @@
+import base64
+import json
+import logging
+from typing import Any, Callable
+
+from google.protobuf import json_format
+from google.protobuf.descriptor import Descriptor, FieldDescriptor
+from google.protobuf.message import Message
+import proto
+
+
+logger = logging.getLogger(__name__)
+
+_RECORD_TYPES = ("RECORD", "STRUCT")
+
+# Well-known message types stored in scalar columns.
+_TIMESTAMP = "google.protobuf.Timestamp"
+_JSON_MESSAGES = (
+    "google.protobuf.Struct",
+    "google.protobuf.Value",
+    "google.protobuf.ListValue",
+)
+
+_INTEGER_FIELDS = (
+    FieldDescriptor.CPPTYPE_INT32,
+    FieldDescriptor.CPPTYPE_INT64,
+    FieldDescriptor.CPPTYPE_UINT32,
+    FieldDescriptor.CPPTYPE_UINT64,
+)
+_FLOAT_FIELDS = (FieldDescriptor.CPPTYPE_FLOAT, FieldDescriptor.CPPTYPE_DOUBLE)
+
+
+def _is_repeated(field: FieldDescriptor) -> bool:
+    """Return whether a protobuf field is repeated, across protobuf versions."""
+    is_repeated = getattr(field, "is_repeated", None)
+    if is_repeated is not None:
+        return is_repeated
+
+    return field.label == FieldDescriptor.LABEL_REPEATED
+
+
+def _has_presence(field: FieldDescriptor) -> bool:
+    """Return whether a singular protobuf field tracks whether it is set."""
+    has_presence = getattr(field, "has_presence", None)
+    if has_presence is not None:
+        return has_presence
+
+    return field.message_type is not None or field.containing_oneof is not None
+
+
+def _struct_to_python(value: Message) -> Any:
+    """Convert a Struct, Value or ListValue message to Python values."""
+    return json_format.MessageToDict(value, preserving_proto_field_name=True)
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _scalar_converter(
+    column_type: str,
+    field: FieldDescriptor,
+    path: str,
+) -> Callable[[Any], Any]:
+    """Return the function that converts a protobuf value to a scalar column value.
+
+    Raises:
+        ValueError: If the protobuf field cannot be stored in the column type.
+    """
+    message_name = field.message_type.full_name if field.message_type else None
+
+    if message_name == _TIMESTAMP and column_type in ("TIMESTAMP", "STRING"):
+        return lambda value: value.ToJsonString()
+
+    if message_name in _JSON_MESSAGES:
+        if column_type == "JSON":
+            return _struct_to_python
+        if column_type == "STRING":
+            return lambda value: json.dumps(_struct_to_python(value))
+
+    if field.enum_type is not None and column_type == "STRING":
+        names = {value.number: value.name for value in field.enum_type.values}
+        return lambda value: names.get(value, str(value))
+
+    if message_name is None and field.enum_type is None:
+        cpp_type = field.cpp_type
+        if cpp_type == FieldDescriptor.CPPTYPE_STRING:
+            if field.type == FieldDescriptor.TYPE_BYTES and column_type == "BYTES":
+                return lambda value: base64.b64encode(value).decode("ascii")
+            if field.type == FieldDescriptor.TYPE_STRING and column_type in (
+                "STRING",
+                "JSON",
+            ):
+                return _identity
+        if cpp_type in _INTEGER_FIELDS and column_type in ("INTEGER", "INT64"):
+            return _identity
+        if cpp_type in _INTEGER_FIELDS and column_type == "STRING":
+            return str
+        if cpp_type in _FLOAT_FIELDS and column_type in ("FLOAT", "FLOAT64"):
+            return _identity
+        if cpp_type == FieldDescriptor.CPPTYPE_BOOL and column_type in (
+            "BOOLEAN",
+            "BOOL",
+        ):
+            return _identity
+
+    raise ValueError(
+        f"BigQuery column {path!r} of type {column_type} cannot hold the protobuf "
+        f"field {field.full_name}."
+    )
+
+
+class RowProjector:
+    """Project protobuf messages straight to BigQuery rows, compiled from the schema.
+
+    Only the fields that are columns of the table are read from the message, and each
+    value is converted to its column type, so the rest of the message is never
+    materialized. Columns that are not message fields, such as the question, are
+    passed to project(). The schema is checked against the message type when the
+    projector is compiled, and REQUIRED columns are checked on every row, so rows that
+    BigQuery would reject fail locally.
+    """
+
+    def __init__(
+        self,
+        schema: list[dict[str, Any]],
+        message_type: type[proto.Message],
+        extra_columns: tuple[str, ...] = (),
+    ) -> None:
+        """Initialize the RowProjector class.
+
+        Args:
+            schema (list[dict[str, Any]]): The BigQuery table schema fields.
+            message_type (type[proto.Message]): The proto-plus message type of the rows.
+            extra_columns (tuple[str, ...], optional): The top-level columns passed to
+                project() rather than read from the message. Defaults to ().
+
+        Raises:
+            ValueError: If a column has no matching message field or type.
+        """
+        self._message_type = message_type
+        self._extra_columns: list[tuple[str, bool]] = [
+            (field["name"], field.get("mode", "NULLABLE").upper() == "REQUIRED")
+            for field in schema
+            if field["name"] in extra_columns
+        ]
+        self._project = self._compile(
+            fields=[field for field in schema if field["name"] not in extra_columns],
+            descriptor=message_type.pb().DESCRIPTOR,
+            path="",
+        )
+        logger.debug(f"Compiled BigQuery row projector for {message_type.__name__}.")
+
+        return
+
+    def project(self, message: proto.Message, **values: Any) -> dict[str, Any]:
+        """Project a message and the extra column values to a row.
+
+        Args:
+            message (proto.Message): The message.
+            **values (Any): The values of the extra columns.
+
+        Returns:
+            dict[str, Any]: The row, in the insert_rows_json format.
+
+        Raises:
+            ValueError: If a REQUIRED column is missing.
+        """
+        row: dict[str, Any] = {}
+        for name, required in self._extra_columns:
+            value = values.get(name)
+            if value is not None:
+                row[name] = value
+            elif required:
+                raise ValueError(f"Missing value for REQUIRED column {name!r}.")
+
+        row.update(self._project(self._message_type.pb(message)))
+
+        return row
+
+    def _compile(
+        self,
+        fields: list[dict[str, Any]],
+        descriptor: Descriptor,
+        path: str,
+    ) -> Callable[[Message], dict[str, Any]]:
+        """Compile a function that projects a message to the columns of a record."""
+        # (column name, convert, repeated, check presence, required)
+        plan: list[tuple[str, Callable[[Any], Any], bool, bool, bool]] = []
+
+        for column in fields:
+            name: str = column["name"]
+            column_path = f"{path}{name}"
+            column_type: str = column["type"].upper()
+            mode: str = column.get("mode", "NULLABLE").upper()
+
+            field = descriptor.fields_by_name.get(name)
+            if field is None:
+                raise ValueError(
+                    f"BigQuery column {column_path!r} is not a field of "
+                    f"{descriptor.full_name}."
+                )
+
+            repeated = _is_repeated(field)
+            if repeated != (mode == "REPEATED"):
+                raise ValueError(
+                    f"BigQuery column {column_path!r} is {mode} but the protobuf field "
+                    f"{field.full_name} is {'' if repeated else 'not '}repeated."
+                )
+
+            if column_type in _RECORD_TYPES:
+                if field.message_type is None:
+                    raise ValueError(
+                        f"BigQuery column {column_path!r} is a RECORD but the protobuf "
+                        f"field {field.full_name} is not a message."
+                    )
+                convert = self._compile(
+                    fields=column["fields"],
+                    descriptor=field.message_type,
+                    path=f"{column_path}.",
+                )
+            else:
+                convert = _scalar_converter(column_type, field, column_path)
+
+            check_presence = not repeated and _has_presence(field)
+            plan.append((name, convert, repeated, check_presence, mode == "REQUIRED"))
+
+        def project_record(message: Message) -> dict[str, Any]:
+            record: dict[str, Any] = {}
+            for name, convert, repeated, check_presence, required in plan:
+                if check_presence and not message.HasField(name):
+                    if required:
+                        column_path = f"{path}{name}"
+                        raise ValueError(
+                            f"Missing value for REQUIRED column {column_path!r}."
+                        )
+                    continue
+
+                value = getattr(message, name)
+                if repeated:
+                    record[name] = [convert(item) for item in value]
+                elif convert is _identity:
+                    record[name] = value
+                else:
+                    record[name] = convert(value)
+
+            return record
+
+        return project_record
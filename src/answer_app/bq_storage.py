@@ -0,0 +1,417 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable
+
+from google.auth.credentials import Credentials
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import message_factory
+from google.protobuf.message import Message
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from answer_app.lazy import lazy_import
+
+if TYPE_CHECKING:
+    from google.cloud.bigquery_storage_v1.services.big_query_write import (
+        BigQueryWriteAsyncClient,
+    )
+
+
+logger = logging.getLogger(__name__)
+
+# The Storage Write client library is only needed by the storage_write sink, and
+# load_schema is used without it.
+types = lazy_import("google.cloud.bigquery_storage_v1.types")
+big_query_write = lazy_import(
+    "google.cloud.bigquery_storage_v1.services.big_query_write"
+)
+
+# The schema files are copied next to this module in the container image and are read
+# from the Terraform module when running from the source tree.
+SCHEMA_DIRS = (
+    os.path.dirname(os.path.abspath(__file__)),
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "..",
+        "terraform",
+        "modules",
+        "answer-app",
+    ),
+)
+
+_FieldType = descriptor_pb2.FieldDescriptorProto
+
+# BigQuery column types and their protobuf wire types for the Storage Write API.
+# Ref: https://cloud.google.com/bigquery/docs/write-api#data_type_conversions
+_PROTO_TYPES: dict[str, int] = {
+    "STRING": _FieldType.TYPE_STRING,
+    "JSON": _FieldType.TYPE_STRING,
+    "INTEGER": _FieldType.TYPE_INT64,
+    "INT64": _FieldType.TYPE_INT64,
+    "FLOAT": _FieldType.TYPE_DOUBLE,
+    "FLOAT64": _FieldType.TYPE_DOUBLE,
+    "BOOLEAN": _FieldType.TYPE_BOOL,
+    "BOOL": _FieldType.TYPE_BOOL,
+    "TIMESTAMP": _FieldType.TYPE_INT64,
+}
+
+_PROTO_LABELS: dict[str, int] = {
+    "REQUIRED": _FieldType.LABEL_REQUIRED,
+    "NULLABLE": _FieldType.LABEL_OPTIONAL,
+    "REPEATED": _FieldType.LABEL_REPEATED,
+}
+
+_RECORD_TYPES = ("RECORD", "STRUCT")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def load_schema(filename: str) -> list[dict[str, Any]]:
+    """Load a BigQuery table schema file.
+
+    Args:
+        filename (str): The schema file name, e.g. "schema.json".
+
+    Returns:
+        list[dict[str, Any]]: The schema fields.
+    """
+    for directory in SCHEMA_DIRS:
+        filepath = os.path.join(directory, filename)
+        if os.path.exists(filepath):
+            with open(filepath, "r") as file:
+                schema: list[dict[str, Any]] = json.load(file)
+            logger.debug(f"Loaded BigQuery schema: {os.path.normpath(filepath)}")
+
+            return schema
+
+    raise FileNotFoundError(f"BigQuery schema {filename} not found in {SCHEMA_DIRS}")
+
+
+def _to_string(value: Any) -> str:
+    """Convert a STRING or JSON column value, encoding structured values as JSON."""
+    if isinstance(value, str):
+        return value
+
+    return json.dumps(value)
+
+
+def _to_timestamp(value: Any) -> int:
+    """Convert a TIMESTAMP column value to microseconds since the epoch."""
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    if not isinstance(value, datetime):
+        try:
+            # Fast path for RFC 3339 timestamps with up to microsecond precision.
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            timestamp = Timestamp()
+            timestamp.FromJsonString(value)
+            return timestamp.ToMicroseconds()
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return (value - _EPOCH) // _MICROSECOND
+
+
+_CONVERTERS: dict[str, Callable[[Any], Any]] = {
+    "STRING": _to_string,
+    "JSON": _to_string,
+    "INTEGER": int,
+    "INT64": int,
+    "FLOAT": float,
+    "FLOAT64": float,
+    "BOOLEAN": bool,
+    "BOOL": bool,
+    "TIMESTAMP": _to_timestamp,
+}
+
+
+def _message_name(field_name: str) -> str:
+    """Return the nested message name for a RECORD column."""
+    return "".join(part.capitalize() for part in field_name.split("_")) + "Record"
+
+
+def _descriptor_proto(
+    name: str,
+    fields: list[dict[str, Any]],
+) -> descriptor_pb2.DescriptorProto:
+    """Build a proto2 message descriptor for a list of schema fields.
+
+    RECORD columns become nested message types so the descriptor is self-contained,
+    as the Storage Write API requires.
+    """
+    message = descriptor_pb2.DescriptorProto(name=name)
+
+    for number, field in enumerate(fields, start=1):
+        field_type: str = field["type"].upper()
+        proto_field = message.field.add(
+            name=field["name"],
+            number=number,
+            label=_PROTO_LABELS[field.get("mode", "NULLABLE").upper()],
+        )
+
+        if field_type in _RECORD_TYPES:
+            nested_name = _message_name(field["name"])
+            message.nested_type.append(_descriptor_proto(nested_name, field["fields"]))
+            proto_field.type = _FieldType.TYPE_MESSAGE
+            proto_field.type_name = nested_name
+        else:
+            proto_field.type = _PROTO_TYPES[field_type]
+
+    return message
+
+
+class RowEncoder:
+    """Encode row dictionaries as protobuf messages compiled from a BigQuery schema.
+
+    The message class and a conversion plan are built once per table schema, so
+    encoding a row only walks the columns of the row. Keys that are not columns of the
+    table are ignored.
+    """
+
+    def __init__(
+        self,
+        schema: list[dict[str, Any]],
+        name: str = "Row",
+    ) -> None:
+        """Initialize the RowEncoder class.
+
+        Args:
+            schema (list[dict[str, Any]]): The BigQuery table schema fields.
+            name (str, optional): The root message name. Defaults to "Row".
+        """
+        file_proto = descriptor_pb2.FileDescriptorProto(
+            name=f"answer_app/{name.lower()}.proto",
+            package="answer_app.bigquery",
+            syntax="proto2",
+        )
+        file_proto.message_type.append(_descriptor_proto(name, schema))
+
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(file_proto)
+        descriptor = pool.FindMessageTypeByName(f"answer_app.bigquery.{name}")
+
+        self._message_class: type[Message] = message_factory.GetMessageClass(
+            descriptor
+        )
+        self._descriptor = descriptor_pb2.DescriptorProto()
+        descriptor.CopyToProto(self._descriptor)
+        self._convert = self._compile(schema)
+
+        return
+
+    @property
+    def descriptor(self) -> descriptor_pb2.DescriptorProto:
+        """The self-contained row message descriptor for the writer schema."""
+        return self._descriptor
+
+    @property
+    def message_class(self) -> type[Message]:
+        """The generated row message class."""
+        return self._message_class
+
+    def encode(self, row: dict[str, Any]) -> bytes:
+        """Encode a row as a serialized protobuf message.
+
+        Args:
+            row (dict[str, Any]): The row data.
+
+        Returns:
+            bytes: The serialized row.
+
+        Raises:
+            google.protobuf.message.EncodeError: If a REQUIRED column is missing.
+            ValueError | TypeError: If a value does not fit its column type.
+        """
+        # The message constructor builds nested messages from dictionaries in C,
+        # which is much faster than setting each field from Python.
+        message = self._message_class(**self._convert(row))
+
+        return message.SerializeToString()
+
+    def _compile(
+        self,
+        fields: list[dict[str, Any]],
+    ) -> Callable[[dict[str, Any]], dict[str, Any]]:
+        """Compile a function that converts row values to the message field values."""
+        plan: list[tuple[str, bool, Callable[[Any], Any]]] = []
+
+        for field in fields:
+            field_type: str = field["type"].upper()
+            repeated = field.get("mode", "NULLABLE").upper() == "REPEATED"
+            if field_type in _RECORD_TYPES:
+                plan.append((field["name"], repeated, self._compile(field["fields"])))
+            else:
+                plan.append((field["name"], repeated, _CONVERTERS[field_type]))
+
+        def convert_fields(row: dict[str, Any]) -> dict[str, Any]:
+            values: dict[str, Any] = {}
+            for name, repeated, convert in plan:
+                value = row.get(name)
+                if value is None:
+                    continue
+                if repeated:
+                    values[name] = [convert(item) for item in value if item is not None]
+                elif value.__class__ is str and convert is _to_string:
+                    # Most columns are strings that need no conversion.
+                    values[name] = value
+                else:
+                    values[name] = convert(value)
+
+            return values
+
+        return convert_fields
+
+
+class BigQueryStorageWriter:
+    """Write rows to BigQuery tables through the Storage Write API default stream.
+
+    Rows are serialized once as protobuf messages and appended in a single
+    AppendRows request per batch. The default stream is at-least-once: insert IDs are
+    not used for deduplication, so a replayed batch may write duplicate rows.
+    """
+
+    def __init__(
+        self,
+        schemas: dict[str, list[dict[str, Any]]],
+        credentials: Credentials | None = None,
+        client: "BigQueryWriteAsyncClient | None" = None,
+    ) -> None:
+        """Initialize the BigQueryStorageWriter class.
+
+        Args:
+            schemas (dict[str, list[dict[str, Any]]]): The schema fields of each table,
+                keyed by the full table name "project.dataset.table".
+            credentials (Credentials, optional): The credentials for the client.
+            client (BigQueryWriteAsyncClient, optional): The BigQuery Write client.
+                Defaults to a new client with the credentials.
+        """
+        # Compile the row encoders up front so a schema problem fails at startup.
+        self._encoders: dict[str, RowEncoder] = {
+            table: RowEncoder(schema=schema) for table, schema in schemas.items()
+        }
+        self._streams: dict[str, str] = {
+            table: self._default_stream(table) for table in schemas
+        }
+        self._client = client or big_query_write.BigQueryWriteAsyncClient(
+            credentials=credentials
+        )
+        logger.debug(f"BigQuery Storage Write streams: {self._streams}")
+
+        return
+
+    @staticmethod
+    def _default_stream(table: str) -> str:
+        """Return the default write stream name of a table.
+
+        Args:
+            table (str): The full table name "project.dataset.table".
+
+        Returns:
+            str: The default write stream resource name.
+        """
+        project, dataset, table_id = table.split(".")
+
+        return f"projects/{project}/datasets/{dataset}/tables/{table_id}/streams/_default"
+
+    async def insert_rows(
+        self,
+        table: str,
+        rows: list[dict[str, Any]],
+        row_ids: list[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Append rows to the default stream of a table.
+
+        Errors are reported in the shape of insert_rows_json errors. A row that cannot
+        be encoded or that BigQuery rejects is reported as "invalid". Because BigQuery
+        rejects the whole request when any row is invalid, the other rows of that
+        request are reported as "stopped" so they can be retried.
+
+        Args:
+            table (str): The full table name "project.dataset.table".
+            rows (list[dict[str, Any]]): The rows to append.
+            row_ids (list[str], optional): Unused. The default stream does not
+                deduplicate rows by insert ID.
+
+        Returns:
+            list[dict[str, Any]]: A list of row errors, empty on success.
+
+        Raises:
+            RuntimeError: If BigQuery rejects the request without row errors.
+        """
+        encoder = self._encoders[table]
+        stream = self._streams[table]
+
+        # Start the timer.
+        start_time = time.time()
+
+        errors: list[dict[str, Any]] = []
+        serialized_rows: list[bytes] = []
+        row_indexes: list[int] = []
+        for index, row in enumerate(rows):
+            try:
+                serialized_rows.append(encoder.encode(row))
+                row_indexes.append(index)
+            except Exception as e:
+                errors.append(self._row_error(index, "invalid", str(e)))
+
+        if errors:
+            logger.warning(f"{len(errors)} rows could not be encoded for {table}.")
+
+        if not serialized_rows:
+            return errors
+
+        # Build the raw protobuf request and wrap it, so proto-plus does not copy the
+        # writer schema and rows into a new message.
+        request_pb = types.AppendRowsRequest.pb()(write_stream=stream)
+        request_pb.proto_rows.writer_schema.proto_descriptor.CopyFrom(encoder.descriptor)
+        request_pb.proto_rows.rows.serialized_rows.extend(serialized_rows)
+        request = types.AppendRowsRequest.wrap(request_pb)
+
+        async def requests() -> AsyncIterator[types.AppendRowsRequest]:
+            yield request
+
+        responses = await self._client.append_rows(
+            requests(),
+            metadata=(("x-goog-request-params", f"write_stream={stream}"),),
+        )
+        response: types.AppendRowsResponse | None = None
+        async for response in responses:
+            pass
+
+        if response is None:
+            raise RuntimeError(f"AppendRows to {table} returned no response.")
+
+        if response.row_errors:
+            invalid: dict[int, str] = {
+                row_indexes[row_error.index]: row_error.message
+                for row_error in response.row_errors
+            }
+            for index in row_indexes:
+                if index in invalid:
+                    errors.append(self._row_error(index, "invalid", invalid[index]))
+                else:
+                    errors.append(self._row_error(index, "stopped", ""))
+        elif response.error.code:
+            raise RuntimeError(
+                f"AppendRows to {table} failed: {response.error.message}"
+            )
+
+        # Log the append time.
+        logger.info(
+            f"Append {len(serialized_rows)} rows latency: {time.time() - start_time:.4f} seconds."
+        )
+
+        return sorted(errors, key=lambda error: error["index"])
+
+    @staticmethod
+    def _row_error(index: int, reason: str, message: str) -> dict[str, Any]:
+        """Return a row error in the shape of an insert_rows_json error."""
+        return {"index": index, "errors": [{"reason": reason, "message": message}]}
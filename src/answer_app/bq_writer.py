@@ -0,0 +1,561 @@
+import asyncio
+from collections import defaultdict
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Sequence
+import uuid
+
+from answer_app.metrics import bigquery_insert_seconds
+from answer_app.metrics import bigquery_queue_depth
+from answer_app.metrics import bigquery_rows_dropped
+from answer_app.metrics import bigquery_rows_failed
+from answer_app.metrics import bigquery_rows_spilled
+from answer_app.spill import SpillLog
+from answer_app.spill import SpillRecord
+from answer_app.timing import stage
+from answer_app.tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+# Insert rows into a table with the given insert IDs and return a list of per-row
+# errors, if any occurred.
+InsertRows = Callable[
+    [str, list[dict[str, Any]], list[str]],
+    Awaitable[Sequence[dict[str, Any]] | None],
+]
+
+# A row, or a function that builds it. Built rows are resolved by the background task,
+# off the request path.
+Row = dict[str, Any] | Callable[[], dict[str, Any]]
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "spill")
+
+
+def new_insert_id() -> str:
+    """Return a unique BigQuery insert ID for a row.
+
+    The ID is random rather than derived from the row, so BigQuery never merges two
+    identical rows of different events, such as the same feedback from two users.
+
+    Returns:
+        str: A random UUID in hex.
+    """
+    return uuid.uuid4().hex
+
+
+class _TableBatch:
+    """The rows buffered for one table."""
+
+    __slots__ = ("rows", "row_ids", "bytes", "started_at")
+
+    def __init__(self) -> None:
+        self.rows: list[dict[str, Any]] = []
+        self.row_ids: list[str] = []
+        self.bytes = 0
+        self.started_at = 0.0
+
+
+class BigQueryBatchWriter:
+    """A background writer that batches rows for BigQuery streaming inserts.
+
+    Rows are enqueued without waiting on BigQuery and flushed per table when a batch
+    reaches the row count or byte size limit, or when its oldest row reaches the
+    maximum age. The queue is bounded; when it is full the overflow policy either
+    rejects the new row ("drop_newest"), discards the oldest queued row
+    ("drop_oldest"), or appends the new row to the spill log ("spill").
+
+    With a spill log, rows that fail to insert for a retryable reason are appended to
+    it and replayed on start and every replay interval. Every row gets a unique insert
+    ID when it is enqueued, and the spill log keeps it, so BigQuery can deduplicate
+    replayed rows.
+
+    The queue depth and the dropped, spilled and failed rows are exported as bigquery
+    metrics, and the flush latency is the bigquery_insert_seconds histogram.
+    """
+
+    def __init__(
+        self,
+        insert_rows: InsertRows,
+        max_batch_rows: int = 500,
+        max_batch_bytes: int = 5_000_000,
+        max_batch_age_seconds: float = 1.0,
+        max_queue_rows: int = 10_000,
+        overflow_policy: str = "drop_newest",
+        spill_log: SpillLog | None = None,
+        replay_interval_seconds: float = 60.0,
+        max_replay_attempts: int = 10,
+    ) -> None:
+        """Initialize the BigQueryBatchWriter class.
+
+        Args:
+            insert_rows (InsertRows): The coroutine function that inserts rows into a table.
+            max_batch_rows (int, optional): The row count that triggers a flush. Defaults to 500.
+            max_batch_bytes (int, optional): The JSON size in bytes that triggers a flush.
+                Defaults to 5,000,000.
+            max_batch_age_seconds (float, optional): The age of the oldest buffered row
+                that triggers a flush. Defaults to 1.0.
+            max_queue_rows (int, optional): The maximum number of queued rows. Defaults to 10,000.
+            overflow_policy (str, optional): "drop_newest", "drop_oldest" or "spill".
+                Defaults to "drop_newest".
+            spill_log (SpillLog, optional): The spill log for rows that fail or overflow.
+                Defaults to None.
+            replay_interval_seconds (float, optional): The time between spill log replays.
+                Defaults to 60.0.
+            max_replay_attempts (int, optional): The number of replays of a row before it
+                is dropped. Defaults to 10.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow_policy must be one of {OVERFLOW_POLICIES}, got {overflow_policy!r}"
+            )
+        if overflow_policy == "spill" and spill_log is None:
+            raise ValueError('overflow_policy "spill" requires a spill log.')
+
+        self._insert_rows = insert_rows
+        self._max_batch_rows = max_batch_rows
+        self._max_batch_bytes = max_batch_bytes
+        self._max_batch_age_seconds = max_batch_age_seconds
+        self._max_queue_rows = max_queue_rows
+        self._overflow_policy = overflow_policy
+        self._spill_log = spill_log
+        self._replay_interval_seconds = replay_interval_seconds
+        self._max_replay_attempts = max_replay_attempts
+
+        # The queue is unbounded so the stop sentinel always fits; the row limit is
+        # enforced in enqueue().
+        self._queue: asyncio.Queue[tuple[str, Row, str] | None] = asyncio.Queue()
+        self._queued_rows = 0
+        self._batches: dict[str, _TableBatch] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._replay_task: asyncio.Task[None] | None = None
+        self._closing = False
+
+        self.rows_enqueued = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rows_dropped = 0
+        self.rows_spilled = 0
+        self.rows_replayed = 0
+        self.flushes = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+        return
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of rows waiting in the queue."""
+        return self._queued_rows
+
+    @property
+    def buffered_rows(self) -> int:
+        """The number of rows taken from the queue and waiting to be flushed."""
+        return sum(len(batch.rows) for batch in self._batches.values())
+
+    def enqueue(self, table: str, row: Row) -> bool:
+        """Add a row to the queue without waiting for it to be written.
+
+        Args:
+            table (str): The full BigQuery table name.
+            row (Row): The row data to insert, or a function that builds it.
+
+        Returns:
+            bool: True if the row was queued or spilled, False if it was dropped.
+        """
+        if self._closing:
+            logger.warning(f"BigQuery writer is stopped. Dropped row for {table}.")
+            self._count_dropped()
+            return False
+
+        row_id = new_insert_id()
+        if self._queued_rows >= self._max_queue_rows:
+            if self._overflow_policy == "spill":
+                # A synchronous local append; overflow is the exceptional path.
+                logger.warning(f"BigQuery writer queue full. Spilled row for {table}.")
+                row = self._build_row(table, row)
+                if row is None:
+                    return False
+                self._spill_records([self._spill_record(table, row, row_id, 0)])
+                return True
+
+            self._count_dropped()
+            if self._overflow_policy == "drop_newest":
+                logger.warning(f"BigQuery writer queue full. Dropped row for {table}.")
+                return False
+
+            dropped_table, _, _ = self._get_row_nowait()
+            logger.warning(
+                f"BigQuery writer queue full. Dropped oldest row for {dropped_table}."
+            )
+
+        self._queue.put_nowait((table, row, row_id))
+        self._queued_rows += 1
+        bigquery_queue_depth.set(self._queued_rows)
+        self.rows_enqueued += 1
+
+        return True
+
+    async def start(self) -> None:
+        """Start the background flush task and the spill log replay task."""
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+            logger.info("BigQuery writer started.")
+
+        if self._spill_log is not None and (
+            self._replay_task is None or self._replay_task.done()
+        ):
+            self._replay_task = asyncio.create_task(self._replay_periodically())
+
+        return
+
+    async def stop(self) -> None:
+        """Stop the background flush task after writing every queued row."""
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            try:
+                await self._replay_task
+            except asyncio.CancelledError:
+                pass
+            self._replay_task = None
+
+        if self._task is None or self._task.done():
+            # Never started: write anything enqueued before shutdown.
+            self._closing = True
+            self._drain_queue()
+            await self.flush()
+            return
+
+        self._closing = True
+        self._queue.put_nowait(None)
+        await self._task
+        logger.info(f"BigQuery writer stopped. Stats: {self.stats()}")
+
+        return
+
+    async def flush(self) -> None:
+        """Write every buffered row."""
+        for table in list(self._batches):
+            await self._flush_table(table)
+
+        return
+
+    def stats(self) -> dict[str, int | float]:
+        """Return the writer counters.
+
+        Returns:
+            dict[str, int | float]: The queue depth, row counters and flush latencies.
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "buffered_rows": self.buffered_rows,
+            "rows_enqueued": self.rows_enqueued,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "rows_dropped": self.rows_dropped,
+            "rows_spilled": self.rows_spilled,
+            "rows_replayed": self.rows_replayed,
+            "spill_bytes": self._spill_log.size() if self._spill_log else 0,
+            "flushes": self.flushes,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "total_flush_latency": self.total_flush_latency,
+        }
+
+    async def replay_spill(self) -> None:
+        """Insert the rows in the spill log, spilling them again if they still fail."""
+        if self._spill_log is None:
+            return
+
+        records: list[SpillRecord] = await asyncio.to_thread(self._spill_log.take)
+        if not records:
+            return
+
+        logger.info(f"Replaying {len(records)} spilled rows.")
+
+        # Group the records by table, keeping their insert IDs.
+        by_table: dict[str, list[SpillRecord]] = defaultdict(list)
+        for record in records:
+            by_table[record["table"]].append(record)
+
+        retry: list[SpillRecord] = []
+        for table, table_records in by_table.items():
+            for i in range(0, len(table_records), self._max_batch_rows):
+                chunk = table_records[i : i + self._max_batch_rows]
+                failed = await self._insert(
+                    table=table,
+                    rows=[record["row"] for record in chunk],
+                    row_ids=[record["insert_id"] for record in chunk],
+                )
+                self.rows_replayed += len(chunk) - len(failed)
+                for index in failed:
+                    record = chunk[index]
+                    record["attempts"] = record.get("attempts", 0) + 1
+                    if record["attempts"] >= self._max_replay_attempts:
+                        logger.error(
+                            f"Dropping row for {table} after {record['attempts']} attempts."
+                        )
+                        self._count_failed()
+                    else:
+                        retry.append(record)
+
+        # Spill the rows that still failed before discarding the replayed records.
+        if retry:
+            await asyncio.to_thread(self._spill_log.append, retry)
+        await asyncio.to_thread(self._spill_log.ack)
+        logger.info(
+            f"Replayed {len(records) - len(retry)} spilled rows. "
+            f"{len(retry)} rows spilled again."
+        )
+
+        return
+
+    async def _replay_periodically(self) -> None:
+        """Replay the spill log now and then every replay interval."""
+        while True:
+            try:
+                await self.replay_spill()
+            except Exception as e:
+                logger.error(f"Error replaying the spill log: {e}")
+            await asyncio.sleep(self._replay_interval_seconds)
+
+    async def _run(self) -> None:
+        """Move rows from the queue into per-table batches and flush them when due."""
+        while True:
+            try:
+                item = await asyncio.wait_for(
+                    self._queue.get(), timeout=self._next_flush_timeout()
+                )
+            except asyncio.TimeoutError:
+                await self._flush_due()
+                continue
+
+            if item is None:
+                # Stop sentinel: write everything left and exit.
+                self._drain_queue()
+                await self.flush()
+                return
+
+            self._queued_rows -= 1
+            bigquery_queue_depth.set(self._queued_rows)
+            self._add_to_batch(*item)
+            await self._flush_due()
+
+    def _get_row_nowait(self) -> tuple[str, Row, str]:
+        """Remove and return the oldest queued row."""
+        item = self._queue.get_nowait()
+        assert item is not None
+        self._queued_rows -= 1
+        bigquery_queue_depth.set(self._queued_rows)
+
+        return item
+
+    def _drain_queue(self) -> None:
+        """Move every queued row into the per-table batches."""
+        while self._queued_rows:
+            self._add_to_batch(*self._get_row_nowait())
+
+        return
+
+    def _build_row(self, table: str, row: Row) -> dict[str, Any] | None:
+        """Return the row data, calling the row function of a deferred row."""
+        if not callable(row):
+            return row
+
+        try:
+            return row()
+        except Exception as e:
+            logger.error(f"Error building a row for {table}: {e}")
+            self._count_failed()
+            return None
+
+    def _add_to_batch(self, table: str, row: Row, row_id: str) -> None:
+        """Add a row and its insert ID to its table batch."""
+        row = self._build_row(table, row)
+        if row is None:
+            return
+
+        batch = self._batches.get(table)
+        if batch is None:
+            batch = self._batches[table] = _TableBatch()
+            batch.started_at = time.monotonic()
+
+        encoded = json.dumps(row, default=str)
+        batch.rows.append(row)
+        batch.row_ids.append(row_id)
+        batch.bytes += len(encoded)
+
+        return
+
+    def _next_flush_timeout(self) -> float | None:
+        """Return the seconds until the oldest batch is due, or None if nothing is buffered."""
+        if not self._batches:
+            return None
+
+        oldest = min(batch.started_at for batch in self._batches.values())
+
+        return max(0.0, oldest + self._max_batch_age_seconds - time.monotonic())
+
+    async def _flush_due(self) -> None:
+        """Flush every batch that is full or old enough."""
+        now = time.monotonic()
+        for table, batch in list(self._batches.items()):
+            if (
+                len(batch.rows) >= self._max_batch_rows
+                or batch.bytes >= self._max_batch_bytes
+                or now - batch.started_at >= self._max_batch_age_seconds
+            ):
+                await self._flush_table(table)
+
+        return
+
+    async def _flush_table(self, table: str) -> None:
+        """Write the batch for one table."""
+        batch = self._batches.pop(table, None)
+        if batch is None or not batch.rows:
+            return
+
+        # Start the timer.
+        start_time = time.time()
+
+        failed = await self._insert(table=table, rows=batch.rows, row_ids=batch.row_ids)
+
+        # Record the flush latency.
+        latency = time.time() - start_time
+        self.flushes += 1
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.total_flush_latency += latency
+        logger.info(
+            f"Flushed {len(batch.rows)} rows to {table} in {latency:.4f} seconds. "
+            f"Queue depth: {self.queue_depth}"
+        )
+
+        # Spill the rows that failed for a retryable reason.
+        if failed:
+            await self._spill_or_fail(
+                [
+                    self._spill_record(table, batch.rows[i], batch.row_ids[i], 0)
+                    for i in failed
+                ]
+            )
+
+        return
+
+    async def _insert(
+        self,
+        table: str,
+        rows: list[dict[str, Any]],
+        row_ids: list[str],
+    ) -> list[int]:
+        """Insert rows and return the indexes of the rows to retry.
+
+        Rows rejected as invalid are counted as failed and not retried. Rows that were
+        only stopped because another row was invalid, or that failed for a transient
+        reason, are returned for retry.
+
+        Args:
+            table (str): The full BigQuery table name.
+            rows (list[dict[str, Any]]): The rows to insert.
+            row_ids (list[str]): The insert IDs of the rows.
+
+        Returns:
+            list[int]: The indexes of the rows to retry.
+        """
+        try:
+            with (
+                stage("bigquery_insert", bigquery_insert_seconds),
+                span(
+                    "bigquery.insert_rows",
+                    attributes={"table": table, "rows": len(rows)},
+                ),
+            ):
+                errors = await self._insert_rows(table, rows, row_ids)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} rows to {table}: {e}")
+            return list(range(len(rows)))
+
+        if not errors:
+            self.rows_written += len(rows)
+            return []
+
+        logger.error(f"Errors loading to Big Query: {errors}")
+        retry: list[int] = []
+        failed: set[int] = set()
+        for error in errors:
+            index = error.get("index")
+            if not isinstance(index, int):
+                continue
+            failed.add(index)
+            reasons = {
+                e.get("reason") for e in error.get("errors", []) if isinstance(e, dict)
+            }
+            if "invalid" in reasons:
+                self._count_failed()
+            else:
+                retry.append(index)
+
+        self.rows_written += len(rows) - len(failed)
+
+        return retry
+
+    def _count_dropped(self, rows: int = 1) -> None:
+        """Count rows dropped by the overflow policy or after stopping."""
+        self.rows_dropped += rows
+        bigquery_rows_dropped.inc(amount=rows)
+
+        return
+
+    def _count_spilled(self, rows: int) -> None:
+        """Count rows appended to the spill log."""
+        self.rows_spilled += rows
+        bigquery_rows_spilled.inc(amount=rows)
+
+        return
+
+    def _count_failed(self, rows: int = 1) -> None:
+        """Count rows that were not written and will not be retried."""
+        self.rows_failed += rows
+        bigquery_rows_failed.inc(amount=rows)
+
+        return
+
+    @staticmethod
+    def _spill_record(
+        table: str,
+        row: dict[str, Any],
+        row_id: str,
+        attempts: int,
+    ) -> SpillRecord:
+        """Create a spill log record."""
+        return {"table": table, "insert_id": row_id, "row": row, "attempts": attempts}
+
+    def _spill_records(self, records: list[SpillRecord]) -> None:
+        """Append records to the spill log on the calling thread."""
+        assert self._spill_log is not None
+        try:
+            self._count_spilled(self._spill_log.append(records))
+        except Exception as e:
+            logger.error(f"Error writing {len(records)} rows to the spill log: {e}")
+            self._count_failed(len(records))
+
+        return
+
+    async def _spill_or_fail(self, records: list[SpillRecord]) -> None:
+        """Spill records if there is a spill log, otherwise count them as failed."""
+        if self._spill_log is None:
+            self._count_failed(len(records))
+            return
+
+        try:
+            self._count_spilled(
+                await asyncio.to_thread(self._spill_log.append, records)
+            )
+        except Exception as e:
+            logger.error(f"Error writing {len(records)} rows to the spill log: {e}")
+            self._count_failed(len(records))
+
+        return
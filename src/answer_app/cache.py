@@ -0,0 +1,172 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any
+
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+from answer_app.render import RenderedAnswer
+
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCacheEntry:
+    """A cached answer for a stateless question.
+
+    Entries are shared between requests and must be treated as read-only.
+    """
+
+    __slots__ = ("rendered", "response", "expires_at", "_response_dict")
+
+    def __init__(
+        self,
+        rendered: RenderedAnswer,
+        response: AnswerQueryResponse,
+        expires_at: float,
+    ) -> None:
+        self.rendered = rendered
+        self.response = response
+        self.expires_at = expires_at
+        self._response_dict: dict[str, Any] | None = None
+
+    def response_dict(self) -> dict[str, Any]:
+        """Return the dictionary representation of the response, converted once."""
+        if self._response_dict is None:
+            self._response_dict = AnswerQueryResponse.to_dict(
+                instance=self.response,
+                use_integers_for_enums=False,
+            )
+        return self._response_dict
+
+
+class AnswerCache:
+    """A bounded in-process answer cache with TTL and LRU eviction.
+
+    Only answers to stateless questions (no session ID) are cacheable, because
+    answers within a session depend on the previous conversation turns.
+
+    A cache hit returns the answer_query_token of the request that filled the entry,
+    so the BigQuery conversation rows and feedback rows of every user served from one
+    entry refer to the same Discovery Engine answer. The response and its conversation
+    row are marked cached, so they can be told apart from the answer that filled the
+    entry.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 512,
+        ttl_seconds: float = 300.0,
+    ) -> None:
+        """Initialize the AnswerCache class.
+
+        Args:
+            max_size (int, optional): The maximum number of cached answers. Defaults to 512.
+            ttl_seconds (float, optional): The time to live of a cached answer. Defaults to 300.
+        """
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[str, ...], AnswerCacheEntry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        return
+
+    @staticmethod
+    def make_key(
+        query_text: str,
+        preamble: str,
+        model_version: str,
+        engine: str,
+    ) -> tuple[str, ...]:
+        """Compose a cache key from the normalized question and the answer generation settings.
+
+        Args:
+            query_text (str): The text of the query.
+            preamble (str): The preamble used for answer generation.
+            model_version (str): The answer generation model version.
+            engine (str): The full resource name of the Search engine.
+
+        Returns:
+            tuple[str, ...]: The cache key.
+        """
+        normalized_text = re.sub(r"\s+", " ", query_text).strip().casefold()
+
+        return (normalized_text, preamble, model_version, engine)
+
+    def get(self, key: tuple[str, ...]) -> AnswerCacheEntry | None:
+        """Get a cached answer and mark it as recently used.
+
+        Args:
+            key (tuple[str, ...]): The cache key.
+
+        Returns:
+            AnswerCacheEntry | None: The cached answer, or None if missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return entry
+
+    def put(
+        self,
+        key: tuple[str, ...],
+        rendered: RenderedAnswer,
+        response: AnswerQueryResponse,
+    ) -> None:
+        """Add an answer to the cache, evicting the least recently used entry when full.
+
+        Args:
+            key (tuple[str, ...]): The cache key.
+            rendered (RenderedAnswer): The rendered answer, shared by later requests.
+            response (AnswerQueryResponse): The Conversational Search Service response.
+        """
+        if self._max_size <= 0:
+            return
+
+        self._entries[key] = AnswerCacheEntry(
+            rendered=rendered,
+            response=response,
+            expires_at=time.monotonic() + self._ttl_seconds,
+        )
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        return
+
+    def clear(self) -> None:
+        """Remove all cached answers."""
+        self._entries.clear()
+
+        return
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache counters.
+
+        Returns:
+            dict[str, int]: The cache size, hits, misses, evictions and expirations.
+        """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+import inspect
+import logging
+import time
+from typing import Any, Callable, Generic, Iterator, TypeVar
+
+from google.api_core import exceptions
+
+from answer_app.metrics import client_pool_calls
+from answer_app.metrics import client_pool_channel_errors
+from answer_app.metrics import client_pool_ejections
+from answer_app.metrics import client_pool_healthy
+from answer_app.metrics import client_pool_in_flight
+
+
+logger = logging.getLogger(__name__)
+
+ClientT = TypeVar("ClientT")
+
+SELECTION_POLICIES = ("round_robin", "least_in_flight")
+
+# Errors that point at the connection rather than the request.
+CHANNEL_ERRORS: tuple[type[Exception], ...] = (
+    exceptions.ServiceUnavailable,
+    exceptions.DeadlineExceeded,
+)
+
+
+class _PooledClient(Generic[ClientT]):
+    """A pooled client and the health and load counters of its channel."""
+
+    __slots__ = (
+        "index",
+        "label",
+        "client",
+        "in_flight",
+        "calls",
+        "failures",
+        "consecutive_failures",
+        "unhealthy_until",
+    )
+
+    def __init__(self, index: int, client: ClientT) -> None:
+        self.index = index
+        # The channel label value of the pool metrics.
+        self.label = str(index)
+        self.client = client
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+
+class ClientPool(Generic[ClientT]):
+    """A pool of API clients, each with its own gRPC channel.
+
+    A single channel multiplexes every in-flight call over one HTTP/2 connection, so at
+    high request concurrency calls queue behind the server's concurrent stream limit.
+    The pool spreads calls over several channels, choosing the next channel in turn
+    ("round_robin") or the one with the fewest in-flight calls ("least_in_flight").
+
+    A channel whose calls fail with a connection error failure_threshold times in a
+    row is skipped for recovery_seconds, unless every channel is unhealthy, and counts
+    as healthy again after its next successful call.
+
+    The in-flight calls, calls, connection errors, ejections and health of each
+    channel are exported as client_pool metrics, labeled by channel index.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[int], ClientT],
+        size: int = 1,
+        selection: str = "least_in_flight",
+        failure_threshold: int = 3,
+        recovery_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the ClientPool class.
+
+        Args:
+            client_factory (Callable[[int], ClientT]): The function that creates the
+                client with the given index, each with its own channel.
+            size (int, optional): The number of clients. Defaults to 1.
+            selection (str, optional): "round_robin" or "least_in_flight".
+                Defaults to "least_in_flight".
+            failure_threshold (int, optional): The consecutive connection errors that
+                mark a channel unhealthy. Defaults to 3.
+            recovery_seconds (float, optional): The time an unhealthy channel is
+                skipped. Defaults to 30.0.
+            clock (Callable[[], float], optional): The monotonic clock.
+                Defaults to time.monotonic.
+        """
+        if size < 1:
+            raise ValueError(f"size must be at least 1, got {size}")
+        if selection not in SELECTION_POLICIES:
+            raise ValueError(
+                f"selection must be one of {SELECTION_POLICIES}, got {selection!r}"
+            )
+
+        self._selection = selection
+        self._failure_threshold = failure_threshold
+        self._recovery_seconds = recovery_seconds
+        self._clock = clock
+        self._pooled: list[_PooledClient[ClientT]] = [
+            _PooledClient(index=index, client=client_factory(index))
+            for index in range(size)
+        ]
+        self._next = 0
+        for pooled in self._pooled:
+            client_pool_in_flight.set(0, pooled.label)
+            client_pool_healthy.set(1, pooled.label)
+        logger.debug(f"Client pool size: {size}, selection: {selection}")
+
+        return
+
+    @property
+    def clients(self) -> list[ClientT]:
+        """The pooled clients."""
+        return [pooled.client for pooled in self._pooled]
+
+    @property
+    def size(self) -> int:
+        """The number of pooled clients."""
+        return len(self._pooled)
+
+    @contextmanager
+    def acquire(self) -> Iterator[ClientT]:
+        """Choose a client for a call and count the call against its channel.
+
+        The call, including a stream read to its end, must be made inside the context.
+
+        Yields:
+            ClientT: The client.
+        """
+        pooled = self._select()
+        pooled.in_flight += 1
+        pooled.calls += 1
+        client_pool_in_flight.inc(pooled.label)
+        client_pool_calls.inc(pooled.label)
+        try:
+            yield pooled.client
+
+        except CHANNEL_ERRORS:
+            self._record_failure(pooled)
+            raise
+
+        else:
+            pooled.consecutive_failures = 0
+            if pooled.unhealthy_until:
+                pooled.unhealthy_until = 0.0
+                client_pool_healthy.set(1, pooled.label)
+                logger.info(f"Client pool channel {pooled.index} healthy again.")
+
+        finally:
+            pooled.in_flight -= 1
+            client_pool_in_flight.dec(pooled.label)
+
+    def _select(self) -> _PooledClient[ClientT]:
+        """Choose the next healthy client by the selection policy."""
+        if len(self._pooled) == 1:
+            return self._pooled[0]
+
+        # Rotate the starting point so ties are spread over the channels.
+        start = self._next
+        self._next = (start + 1) % len(self._pooled)
+        rotated = self._pooled[start:] + self._pooled[:start]
+
+        now = self._clock()
+        candidates = [pooled for pooled in rotated if pooled.unhealthy_until <= now]
+        if not candidates:
+            candidates = rotated
+
+        if self._selection == "round_robin":
+            return candidates[0]
+
+        return min(candidates, key=lambda pooled: pooled.in_flight)
+
+    def _record_failure(self, pooled: _PooledClient[ClientT]) -> None:
+        """Count a connection error and mark the channel unhealthy at the threshold."""
+        pooled.failures += 1
+        pooled.consecutive_failures += 1
+        client_pool_channel_errors.inc(pooled.label)
+        if pooled.consecutive_failures >= self._failure_threshold:
+            pooled.unhealthy_until = self._clock() + self._recovery_seconds
+            pooled.consecutive_failures = 0
+            client_pool_ejections.inc(pooled.label)
+            client_pool_healthy.set(0, pooled.label)
+            logger.warning(
+                f"Client pool channel {pooled.index} unhealthy for "
+                f"{self._recovery_seconds} seconds."
+            )
+
+        return
+
+    def stats(self) -> dict[str, Any]:
+        """Return the pool counters.
+
+        Returns:
+            dict[str, Any]: The pool size and the in-flight calls, calls, connection
+            errors and health of each channel.
+        """
+        now = self._clock()
+
+        return {
+            "size": self.size,
+            "selection": self._selection,
+            "in_flight": sum(pooled.in_flight for pooled in self._pooled),
+            "channels": [
+                {
+                    "index": pooled.index,
+                    "in_flight": pooled.in_flight,
+                    "calls": pooled.calls,
+                    "failures": pooled.failures,
+                    "healthy": pooled.unhealthy_until <= now,
+                }
+                for pooled in self._pooled
+            ],
+        }
+
+    async def close(self) -> None:
+        """Close the channel of every pooled client."""
+        for pooled in self._pooled:
+            transport = getattr(pooled.client, "transport", None)
+            close = getattr(transport, "close", None)
+            if close is None:
+                continue
+            # The gRPC transports close asynchronously and the REST transport does not.
+            closed = close()
+            if inspect.isawaitable(closed):
+                await closed
+        logger.info(f"Client pool closed. Stats: {self.stats()}")
+
+        return
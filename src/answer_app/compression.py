@@ -0,0 +1,236 @@
+import logging
+import zlib
+from typing import Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is a dependency, but optional here.
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+# Streamed responses are sent unchanged so each event reaches the client immediately.
+DEFAULT_EXCLUDED_MEDIA_TYPES = ("text/event-stream",)
+
+
+class _Encoder(Protocol):
+    def compress(self, data: bytes, final: bool) -> bytes: ...
+
+
+class _GzipEncoder:
+    """Incremental gzip compression."""
+
+    def __init__(self, level: int) -> None:
+        # wbits=31 writes a gzip header and trailer.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush_mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+class _BrotliEncoder:
+    """Incremental Brotli compression."""
+
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        compressed = self._compressor.process(data)
+        if final:
+            return compressed + self._compressor.finish()
+        return compressed + self._compressor.flush()
+
+
+def negotiate_encoding(accept_encoding: str, brotli_available: bool = True) -> str | None:
+    """Choose the response content coding from an Accept-Encoding header.
+
+    Brotli is preferred over gzip at equal quality when the brotli package is installed.
+
+    Args:
+        accept_encoding (str): The Accept-Encoding header.
+        brotli_available (bool, optional): Whether Brotli may be chosen. Defaults to True.
+
+    Returns:
+        str | None: "br", "gzip", or None to send the response uncompressed.
+    """
+    qualities: dict[str, float] = {}
+    for coding_range in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in coding_range.split(";")]
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    candidates = ("br", "gzip") if brotli_available and brotli is not None else ("gzip",)
+    best_coding: str | None = None
+    best_quality = 0.0
+    for coding in candidates:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best_coding, best_quality = coding, quality
+
+    return best_coding
+
+
+class CompressionMiddleware:
+    """Compress responses with Brotli or gzip, as negotiated with Accept-Encoding.
+
+    Responses smaller than the minimum size, responses that already have a content
+    coding and excluded media types are sent unchanged. Streamed response bodies are
+    compressed chunk by chunk.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        brotli_enabled: bool = True,
+        excluded_media_types: tuple[str, ...] = DEFAULT_EXCLUDED_MEDIA_TYPES,
+    ) -> None:
+        """Initialize the CompressionMiddleware class.
+
+        Args:
+            app (ASGIApp): The application to wrap.
+            minimum_size (int, optional): The smallest body in bytes to compress.
+                Defaults to 1024.
+            gzip_level (int, optional): The gzip compression level, 1 to 9. Defaults to 6.
+            brotli_quality (int, optional): The Brotli quality, 0 to 11. Defaults to 4.
+            brotli_enabled (bool, optional): Whether to offer Brotli when the brotli
+                package is installed. Defaults to True.
+            excluded_media_types (tuple[str, ...], optional): Media types sent
+                uncompressed. Defaults to ("text/event-stream",).
+        """
+        self.app = app
+        self._minimum_size = minimum_size
+        self._gzip_level = gzip_level
+        self._brotli_quality = brotli_quality
+        self._brotli_enabled = brotli_enabled and brotli is not None
+        self._excluded_media_types = excluded_media_types
+
+        if brotli_enabled and brotli is None:
+            logger.warning("The brotli package is not installed. Using gzip only.")
+
+        return
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""),
+            brotli_available=self._brotli_enabled,
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(
+            app=self.app,
+            encoding=encoding,
+            encoder=self._encoder(encoding),
+            minimum_size=self._minimum_size,
+            excluded_media_types=self._excluded_media_types,
+        )
+        await responder(scope, receive, send)
+
+    def _encoder(self, encoding: str) -> _Encoder:
+        if encoding == "br":
+            return _BrotliEncoder(quality=self._brotli_quality)
+        return _GzipEncoder(level=self._gzip_level)
+
+
+class _CompressionResponder:
+    """Compress the body of one response."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        encoding: str,
+        encoder: _Encoder,
+        minimum_size: int,
+        excluded_media_types: tuple[str, ...],
+    ) -> None:
+        self.app = app
+        self._encoding = encoding
+        self._encoder = encoder
+        self._minimum_size = minimum_size
+        self._excluded_media_types = excluded_media_types
+        self._send: Send
+        self._start_message: Message | None = None
+        self._passthrough = False
+        self._started = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self._send = send
+        await self.app(scope, receive, self._send_compressed)
+
+    async def _send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").split(";")[0].strip()
+            self._passthrough = (
+                "content-encoding" in headers
+                or media_type in self._excluded_media_types
+            )
+            # Hold the start message until the first body shows the response size.
+            self._start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if self._started:
+            compressed = self._encoder.compress(body, final=not more_body)
+        else:
+            if not more_body and len(body) < self._minimum_size:
+                # A small, complete body is not worth compressing.
+                self._passthrough = True
+                await self._flush_start()
+                await self._send(message)
+                return
+
+            headers = MutableHeaders(raw=self._start_message["headers"])
+            headers["Content-Encoding"] = self._encoding
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+
+            compressed = self._encoder.compress(body, final=not more_body)
+            if not more_body:
+                headers["Content-Length"] = str(len(compressed))
+            await self._flush_start()
+
+        await self._send(
+            {"type": "http.response.body", "body": compressed, "more_body": more_body}
+        )
+
+        return
+
+    async def _flush_start(self) -> None:
+        """Send the held start message once."""
+        if not self._started and self._start_message is not None:
+            self._started = True
+            await self._send(self._start_message)
+
+        return
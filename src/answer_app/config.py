@@ -0,0 +1,26 @@
+import logging
+import os
+from typing import Any
+
+import yaml
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_config(filepath: str) -> dict[str, Any]:
+    """Load a configuration file from the package directory.
+
+    Args:
+        filepath (str): The relative path to the configuration file.
+
+    Returns:
+        dict[str, Any]: The configuration settings.
+    """
+    this_directory: str = os.path.dirname(os.path.abspath(__file__))
+    abs_filepath: str = os.path.join(this_directory, filepath)
+    with open(abs_filepath, "r") as file:
+        config: dict[str, Any] = yaml.safe_load(file)
+    logger.debug(f"Loaded configuration: {config}")
+
+    return config
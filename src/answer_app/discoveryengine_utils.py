@@ -1,16 +1,53 @@
+import asyncio
+from contextvars import ContextVar
+import functools
+import hashlib
 import logging
+from typing import Any, AsyncIterator
 
 from google.api_core.client_options import ClientOptions
 import google.auth
+from google.auth.credentials import Credentials
 from google.cloud import discoveryengine_v1 as discoveryengine
 from google.cloud.discoveryengine_v1.types import AnswerQueryResponse, Session
 from google.cloud.discoveryengine_v1.services.conversational_search_service.pagers import (
     ListSessionsAsyncPager,
 )
 
+from answer_app.client_pool import ClientPool
+from answer_app.metrics import coalesced_answer_requests
+from answer_app.transport import ClientTransport
+from answer_app.transport import RestAsyncClient
+from answer_app.tracing import span
+
 
 logger = logging.getLogger(__name__)
 
+# Whether the last answer call of the current task joined another caller's call.
+_coalesced: ContextVar[bool] = ContextVar("coalesced", default=False)
+
+
+def answer_was_coalesced() -> bool:
+    """Return whether the last answer_query call of the current task was coalesced.
+
+    A coalesced call returned the response of an identical in-flight call of another
+    caller, including its answer_query_token.
+
+    Returns:
+        bool: True if the call joined another caller's call.
+    """
+    return _coalesced.get()
+
+
+class _InflightCall:
+    """A shared in-flight answer call and the number of callers awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future[AnswerQueryResponse]) -> None:
+        self.task = task
+        self.waiters = 0
+
 
 class DiscoveryEngineHandler:
     """A class to interact with the Conversational Search Service."""
@@ -21,6 +58,11 @@ class DiscoveryEngineHandler:
         engine_id: str,
         preamble: str,
         project_id: str | None = None,
+        model_version: str = "gemini-2.0-flash-001/answer_gen/v1",
+        coalesce_requests: bool = False,
+        client_pool: dict[str, Any] | None = None,
+        transport: dict[str, Any] | None = None,
+        credentials: Credentials | None = None,
     ) -> None:
         """Initialize the DiscoveryEngineHandler class.
 
@@ -29,24 +71,61 @@ class DiscoveryEngineHandler:
             engine_id (str): The ID of the search engine.
             preamble (str): The preamble for the answer generation.
             project_id (str, optional): The ID of the Google Cloud project. Defaults to None.
+            model_version (str, optional): The answer generation model version.
+                Defaults to "gemini-2.0-flash-001/answer_gen/v1".
+            coalesce_requests (bool, optional): Whether concurrent identical stateless
+                answer requests share a single call. Defaults to False.
+            client_pool (dict[str, Any], optional): The ClientPool settings, such as
+                the number of clients and the selection policy. Defaults to None for
+                a single client.
+            transport (dict[str, Any], optional): The ClientTransport settings, such
+                as gRPC or REST and the gRPC keepalive. Defaults to None for gRPC.
+            credentials (Credentials, optional): The credentials of the clients.
+                Defaults to None for the application default credentials.
         """
         self._location = location
         self._engine_id = engine_id
         self._preamble = preamble
+        self._model_version = model_version
+        self._coalesce_requests = coalesce_requests
+        self._inflight: dict[str, _InflightCall] = {}
         self._project_id = project_id if project_id else google.auth.default()[1]
-        self._client = self._initialize_client()
+        self._credentials = credentials
+        self._transport = ClientTransport(**(transport or {}))
+        self._pool: ClientPool[
+            discoveryengine.ConversationalSearchServiceAsyncClient | RestAsyncClient
+        ] = ClientPool(client_factory=self._initialize_client, **(client_pool or {}))
         self._engine = self._engine_path()
         self._log_attributes()
 
         return
 
+    @property
+    def engine(self) -> str:
+        """The full resource name of the Search engine."""
+        return self._engine
+
+    @property
+    def preamble(self) -> str:
+        """The preamble for the answer generation."""
+        return self._preamble
+
+    @property
+    def model_version(self) -> str:
+        """The answer generation model version."""
+        return self._model_version
+
     def _initialize_client(
         self,
-    ) -> discoveryengine.ConversationalSearchServiceAsyncClient:
-        """Initialize the Conversational Search Service async client.
+        index: int = 0,
+    ) -> discoveryengine.ConversationalSearchServiceAsyncClient | RestAsyncClient:
+        """Initialize a Conversational Search Service async client with its own channel.
+
+        Args:
+            index (int, optional): The index of the client in the pool. Defaults to 0.
 
         Returns:
-            discoveryengine.ConversationalSearchServiceAsyncClient:
+            discoveryengine.ConversationalSearchServiceAsyncClient | RestAsyncClient:
             The async client for the Conversational Search Service.
 
         Ref: https://cloud.google.com/generative-ai-app-builder/docs/locations#specify_a_multi-region_for_your_data_store
@@ -59,9 +138,10 @@ class DiscoveryEngineHandler:
             else None
         )
 
-        # Create an async client.
-        return discoveryengine.ConversationalSearchServiceAsyncClient(
-            client_options=client_options
+        # Create an async client with the configured transport.
+        logger.debug(f"Creating Conversational Search Service client {index}.")
+        return self._transport.create_client(
+            client_options=client_options, credentials=self._credentials
         )
 
     def _engine_path(self) -> str:
@@ -73,20 +153,22 @@ class DiscoveryEngineHandler:
         logger.debug(f"VAIS Handler project: {self._project_id}")
         logger.debug(f"VAIS Handler location: {self._location}")
         logger.debug(f"VAIS Handler engine ID: {self._engine_id}")
-        logger.debug(f"VAIS Handler client: {self._client.transport.host}")
+        logger.debug(f"VAIS Handler client: {self._pool.clients[0].transport.host}")
+        logger.debug(f"VAIS Handler client pool size: {self._pool.size}")
+        logger.debug(f"VAIS Handler transport: {self._transport.settings()}")
         logger.debug(f"VAIS Handler engine: {self._engine}")
         logger.debug(f"VAIS Handler preamble: {self._preamble}")
+        logger.debug(f"VAIS Handler model version: {self._model_version}")
 
         return
 
-    async def answer_query(
+    def _answer_request(
         self,
         query_text: str,
         session_id: str | None,
         user_pseudo_id: str,
-    ) -> AnswerQueryResponse:
-        """Call the answer method and return a generated answer and a list of search results,
-        with links to the sources.
+    ) -> discoveryengine.AnswerQueryRequest:
+        """Build the request for the answer and streaming answer methods.
 
         Args:
             query_text (str): The text of the query to be answered.
@@ -94,10 +176,9 @@ class DiscoveryEngineHandler:
             user_pseudo_id (str): The unique ID of the active user.
 
         Returns:
-            AnswerQueryResponse: The response from the Conversational Search Service,
-            containing the generated answer and selected references.
+            discoveryengine.AnswerQueryRequest: The answer request.
 
-        Ref: https://cloud.google.com/generative-ai-app-builder/docs/answer
+        Ref: https://cloud.google.com/python/docs/reference/discoveryengine/latest/google.cloud.discoveryengine_v1.types.AnswerQueryRequest
         """
         # The full resource name of the Search serving config.
         serving_config = f"{self._engine}/servingConfigs/default_serving_config"
@@ -123,7 +204,7 @@ class DiscoveryEngineHandler:
             ignore_non_answer_seeking_query=False,  # Optional: Ignore non-answer seeking query
             ignore_low_relevant_content=False,  # Optional: Return fallback answer when content is not relevant
             model_spec=discoveryengine.AnswerQueryRequest.AnswerGenerationSpec.ModelSpec(
-                model_version="gemini-2.0-flash-001/answer_gen/v1",  # Optional: Model to use for answer generation
+                model_version=self._model_version,  # Optional: Model to use for answer generation
             ),
             prompt_spec=discoveryengine.AnswerQueryRequest.AnswerGenerationSpec.PromptSpec(
                 preamble=self._preamble,  # Optional: Natural language instructions for customizing the answer
@@ -146,8 +227,45 @@ class DiscoveryEngineHandler:
             user_pseudo_id=user_pseudo_id,
         )
 
-        # Make the request.
-        response = await self._client.answer_query(request)
+        return request
+
+    async def answer_query(
+        self,
+        query_text: str,
+        session_id: str | None,
+        user_pseudo_id: str,
+    ) -> AnswerQueryResponse:
+        """Call the answer method and return a generated answer and a list of search results,
+        with links to the sources.
+
+        Args:
+            query_text (str): The text of the query to be answered.
+            session_id (str, optional): The session ID to continue a conversation.
+            user_pseudo_id (str): The unique ID of the active user.
+
+        Returns:
+            AnswerQueryResponse: The response from the Conversational Search Service,
+            containing the generated answer and selected references.
+
+        Ref: https://cloud.google.com/generative-ai-app-builder/docs/answer
+        """
+        request = self._answer_request(
+            query_text=query_text,
+            session_id=session_id,
+            user_pseudo_id=user_pseudo_id,
+        )
+
+        # Make the request. Concurrent identical stateless requests share one call.
+        _coalesced.set(False)
+        coalesce = self._coalesce_requests and not request.session
+        with span(
+            "discoveryengine.answer_query",
+            attributes={"session": bool(request.session), "coalesced": coalesce},
+        ):
+            if coalesce:
+                response = await self._coalesced_answer_query(request)
+            else:
+                response = await self._pooled_answer_query(request)
 
         # Handle the response.
         logger.debug(response)
@@ -155,6 +273,161 @@ class DiscoveryEngineHandler:
 
         return response
 
+    async def stream_answer_query(
+        self,
+        query_text: str,
+        session_id: str | None,
+        user_pseudo_id: str,
+    ) -> AsyncIterator[AnswerQueryResponse]:
+        """Call the streaming answer method and yield partial responses as they arrive.
+
+        Args:
+            query_text (str): The text of the query to be answered.
+            session_id (str, optional): The session ID to continue a conversation.
+            user_pseudo_id (str): The unique ID of the active user.
+
+        Yields:
+            AnswerQueryResponse: The partial responses from the Conversational Search Service.
+            Each carries the next chunk of the answer text; the final response carries
+            the citations, references, session and answer query token.
+
+        Ref: https://cloud.google.com/generative-ai-app-builder/docs/stream-answer
+        """
+        request = self._answer_request(
+            query_text=query_text,
+            session_id=session_id,
+            user_pseudo_id=user_pseudo_id,
+        )
+
+        # Make the request and yield the responses as they arrive. The stream counts
+        # against its channel until it ends.
+        with (
+            span(
+                "discoveryengine.stream_answer_query",
+                attributes={"session": bool(request.session)},
+                current=False,
+            ),
+            self._pool.acquire() as client,
+        ):
+            stream = await client.stream_answer_query(request)
+            async for response in stream:
+                logger.debug(response)
+                yield response
+
+        return
+
+    async def _pooled_answer_query(
+        self,
+        request: discoveryengine.AnswerQueryRequest,
+    ) -> AnswerQueryResponse:
+        """Call the answer method on a client from the pool.
+
+        Args:
+            request (discoveryengine.AnswerQueryRequest): The answer request.
+
+        Returns:
+            AnswerQueryResponse: The response from the Conversational Search Service.
+        """
+        with self._pool.acquire() as client:
+            return await client.answer_query(request)
+
+    @staticmethod
+    def _request_fingerprint(request: discoveryengine.AnswerQueryRequest) -> str:
+        """Return a fingerprint of an answer request for coalescing.
+
+        The user pseudo ID is excluded so identical questions from different users
+        share a call, matching the answer cache key in answer_app.utils.
+
+        Args:
+            request (discoveryengine.AnswerQueryRequest): The answer request.
+
+        Returns:
+            str: The hex digest of the serialized request.
+        """
+        fingerprint_request = discoveryengine.AnswerQueryRequest(request)
+        fingerprint_request.user_pseudo_id = ""
+        serialized = discoveryengine.AnswerQueryRequest.serialize(fingerprint_request)
+
+        return hashlib.sha256(serialized).hexdigest()
+
+    async def _coalesced_answer_query(
+        self,
+        request: discoveryengine.AnswerQueryRequest,
+    ) -> AnswerQueryResponse:
+        """Call the answer method, joining an identical in-flight call if there is one.
+
+        The shared call is shielded so a cancelled caller does not cancel it for the
+        others. It is cancelled only when every caller awaiting it has been cancelled.
+        Every caller gets the same response, including its answer_query_token, even
+        when the callers are different users.
+
+        Args:
+            request (discoveryengine.AnswerQueryRequest): The answer request.
+
+        Returns:
+            AnswerQueryResponse: The response from the Conversational Search Service.
+        """
+        fingerprint = self._request_fingerprint(request)
+        call = self._inflight.get(fingerprint)
+
+        if call is None:
+            call = _InflightCall(
+                task=asyncio.ensure_future(self._pooled_answer_query(request))
+            )
+            call.task.add_done_callback(
+                functools.partial(self._release_inflight, fingerprint, call)
+            )
+            self._inflight[fingerprint] = call
+        else:
+            _coalesced.set(True)
+            coalesced_answer_requests.inc()
+            logger.info(f"Coalesced answer request {fingerprint}.")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                logger.debug(f"Cancelling abandoned answer request {fingerprint}.")
+                self._inflight.pop(fingerprint, None)
+                call.task.cancel()
+            raise
+
+        finally:
+            call.waiters -= 1
+
+    def _release_inflight(
+        self,
+        fingerprint: str,
+        call: _InflightCall,
+        task: asyncio.Future[AnswerQueryResponse],
+    ) -> None:
+        """Remove a finished call from the in-flight calls."""
+        if self._inflight.get(fingerprint) is call:
+            del self._inflight[fingerprint]
+
+        # Retrieve the exception so an error with no remaining waiters is not reported
+        # as never retrieved. Waiters still receive it from the shielded task.
+        if not task.cancelled():
+            task.exception()
+
+        return
+
+    async def warm_up(self) -> None:
+        """Connect the channels of the pooled clients."""
+        await asyncio.gather(
+            *[self._transport.connect(client) for client in self._pool.clients]
+        )
+
+        return
+
+    async def close(self) -> None:
+        """Close the channels of the pooled clients."""
+        await self._pool.close()
+
+        return
+
     async def get_user_sessions(
         self,
         user_pseudo_id: str,
@@ -174,19 +447,20 @@ class DiscoveryEngineHandler:
         sessions: list[Session] = []
         page_result: ListSessionsAsyncPager
 
-        page_result = await self._client.list_sessions(
-            request=discoveryengine.ListSessionsRequest(
-                parent=self._engine,
-                filter=f'user_pseudo_id = {user_pseudo_id} AND state = "IN_PROGRESS"',  # Optional: Filter requests by userPseudoId or state
-                order_by="update_time",  # Optional: Sort results
+        with span("discoveryengine.list_sessions"), self._pool.acquire() as client:
+            page_result = await client.list_sessions(
+                request=discoveryengine.ListSessionsRequest(
+                    parent=self._engine,
+                    filter=f'user_pseudo_id = {user_pseudo_id} AND state = "IN_PROGRESS"',  # Optional: Filter requests by userPseudoId or state
+                    order_by="update_time",  # Optional: Sort results
+                )
             )
-        )
 
-        async for session in page_result:
-            sessions.append(session)
-            logger.debug(f"Session ID: {session.name.split('/')[-1]}")
-            logger.debug(f"Session State: {session.state}")
-            logger.debug(f"Session user_pseudo_id: {session.user_pseudo_id}")
+            async for session in page_result:
+                sessions.append(session)
+                logger.debug(f"Session ID: {session.name.split('/')[-1]}")
+                logger.debug(f"Session State: {session.state}")
+                logger.debug(f"Session user_pseudo_id: {session.user_pseudo_id}")
 
         logger.info(f"Number of sessions: {len(sessions)}")
 
@@ -198,11 +472,12 @@ class DiscoveryEngineHandler:
     ) -> None:
         """Delete a user session."""
         try:
-            await self._client.delete_session(
-                request=discoveryengine.DeleteSessionRequest(
-                    name=f"{self._engine}/sessions/{session_id}"
+            with span("discoveryengine.delete_session"), self._pool.acquire() as client:
+                await client.delete_session(
+                    request=discoveryengine.DeleteSessionRequest(
+                        name=f"{self._engine}/sessions/{session_id}"
+                    )
                 )
-            )
             logger.info(f"Session {session_id} deleted.")
 
         except Exception as e:
@@ -0,0 +1,60 @@
+import importlib
+import logging
+import sys
+from types import ModuleType
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule(ModuleType):
+    """A stand-in for a module that imports it on first attribute access.
+
+    Client libraries such as google.cloud.bigquery take hundreds of milliseconds to
+    import, mostly for code paths the app does not use at startup. A LazyModule defers
+    that cost from the import of answer_app.main to the first use of the module.
+    Attributes set on the stand-in, such as test patches, take precedence over the
+    module's own.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize the LazyModule class.
+
+        Args:
+            name (str): The absolute name of the module to import.
+        """
+        super().__init__(name)
+        self._module: ModuleType | None = None
+
+        return
+
+    def __getattr__(self, attr: str) -> Any:
+        """Import the module if needed and return its attribute."""
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if self._module is None:
+            logger.debug(f"Importing lazy module {self.__name__}.")
+            self._module = importlib.import_module(self.__name__)
+
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        state = "imported" if self._module is not None else "not imported"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return a module, importing it on first attribute access if not already imported.
+
+    Args:
+        name (str): The absolute name of the module.
+
+    Returns:
+        ModuleType: The module, or a LazyModule stand-in for it.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    return LazyModule(name)
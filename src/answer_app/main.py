@@ -1,64 +1,356 @@
+import asyncio
+from contextlib import asynccontextmanager
+import hmac
+import json
 import logging
 import os
 import time
+from typing import Any, AsyncIterator
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
+from answer_app import IMPORT_START
+from answer_app.compression import CompressionMiddleware
+from answer_app.config import load_config
+from answer_app.metrics import OPENMETRICS_CONTENT_TYPE
+from answer_app.metrics import PROMETHEUS_CONTENT_TYPE
+from answer_app.metrics import answer_seconds
+from answer_app.metrics import answers_in_flight
+from answer_app.metrics import errors
+from answer_app.metrics import registry
 from answer_app.model import QuestionRequest
+from answer_app.model import AnswerFormat
 from answer_app.model import AnswerResponse
+from answer_app.model import StageTiming
 from answer_app.model import HealthCheckResponse
+from answer_app.model import ReadinessResponse
 from answer_app.model import EnvVarResponse
 from answer_app.model import FeedbackRequest
 from answer_app.model import FeedbackResponse
 from answer_app.model import GetSessionResponse
-from answer_app.utils import sanitize, utils
+from answer_app.model import ProfileFormat
+from answer_app.profiler import MAX_PROFILE_SECONDS
+from answer_app.profiler import sample_stacks
+from answer_app.projection import parse_fields
+from answer_app.responses import ModelJSONResponse
+from answer_app.timing import RequestTimings
+from answer_app.timing import request_timings
+from answer_app.tracing import TracingMiddleware
+from answer_app.tracing import configure_tracing
+from answer_app.tracing import shutdown_tracing
+from answer_app.utils import UtilHandler
+from answer_app.utils import response_compression_settings
+from answer_app.utils import sanitize
 
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create the UtilHandler and start the background tasks and the warm-up on startup,
+    and flush queued BigQuery rows on shutdown.
+    """
+    start_time = time.perf_counter()
+    app.state.utils = UtilHandler(log_level=os.getenv("LOG_LEVEL", "INFO").upper())
+    init_time = time.perf_counter()
+    await app.state.utils.startup()
+    startup_time = time.perf_counter()
+    logger.info(
+        f"Startup timings: import {IMPORT_SECONDS:.4f} seconds, "
+        f"app state {init_time - start_time:.4f} seconds, "
+        f"background tasks {startup_time - init_time:.4f} seconds."
+    )
+
+    yield
+
+    await app.state.utils.shutdown()
+    shutdown_tracing()
+
+
+def get_utils(request: Request) -> UtilHandler:
+    """Return the UtilHandler created in the lifespan, for injection into the routes.
+
+    Args:
+        request (Request): The request.
+
+    Returns:
+        UtilHandler: The utility handler of the app.
+    """
+    return request.app.state.utils
+
+
 # Create a FastAPI app.
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# The middleware is added before the lifespan creates the UtilHandler, so its
+# settings are read from the configuration directly.
+config = load_config("config.yaml")
+
+# Compress large responses for clients that accept Brotli or gzip.
+compression_settings = response_compression_settings(config)
+if compression_settings is not None:
+    app.add_middleware(CompressionMiddleware, **compression_settings)
+
+# Continue the caller's trace in a server span around every request, including the
+# compression.
+if configure_tracing(**(config.get("tracing") or {})):
+    app.add_middleware(TracingMiddleware)
+
+# The time between the stack samples of /debug/profile.
+profile_interval_seconds = (config.get("profiler") or {}).get(
+    "sample_interval_seconds", 0.01
+)
+
+# One profile at a time, since concurrent profiles would sample each other.
+profile_lock = asyncio.Lock()
+
+
+# Media types in the Accept header that select an answer format.
+ACCEPT_ANSWER_FORMATS: dict[str, AnswerFormat] = {
+    "text/markdown": AnswerFormat.MARKDOWN,
+    "text/html": AnswerFormat.HTML,
+}
+
+
+def _negotiate_answer_format(
+    answer_format: AnswerFormat | None,
+    accept: str | None,
+) -> AnswerFormat:
+    """Choose the format of the answer markdown field.
+
+    The format query parameter takes precedence. Otherwise the Accept header media type
+    with the highest quality among text/markdown and text/html is used. The default is
+    base64-encoded markdown.
+
+    Args:
+        answer_format (AnswerFormat, optional): The format query parameter.
+        accept (str, optional): The Accept header.
+
+    Returns:
+        AnswerFormat: The answer format.
+    """
+    if answer_format is not None:
+        return answer_format
+
+    best_format = AnswerFormat.BASE64
+    best_quality = 0.0
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        candidate = ACCEPT_ANSWER_FORMATS.get(media_type.lower())
+        if candidate is None:
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if quality > best_quality:
+            best_format, best_quality = candidate, quality
+
+    return best_format
 
 
 @app.post("/answer", response_model=AnswerResponse)
-async def answer(request: QuestionRequest) -> AnswerResponse:
-    """Answer a question using the Discovery Engine Answer method."""
+async def answer(
+    request: QuestionRequest,
+    answer_format: AnswerFormat | None = Query(default=None, alias="format"),
+    accept: str | None = Header(default=None),
+    fields: str | None = Query(default=None),
+    utils: UtilHandler = Depends(get_utils),
+) -> ModelJSONResponse:
+    """Answer a question using the Discovery Engine Answer method.
+
+    The markdown field holds base64-encoded markdown by default. Request raw UTF-8
+    markdown or sanitized HTML with the format query parameter ("markdown" or "html")
+    or an Accept header of text/markdown or text/html. The response body is JSON in
+    every format.
+
+    The fields query parameter limits the response to a comma-separated list of
+    profiles ("minimal" or "full") and dotted field paths, such as
+    "markdown,answer.answer_text,session.name". BigQuery always logs the full record.
+
+    The time spent in each stage is returned in the timings field, logged to BigQuery
+    and sent in a Server-Timing header, which also includes the serialization and the
+    total time. The timings field is part of the minimal profile and can be requested
+    with fields=timings.
+    """
     # Start the timer.
     start_time = time.time()
 
+    # Parse the response fields before doing any work.
+    try:
+        include = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     # Log the request.
     logger.info(f"Received question: {sanitize(request.question)}")
     request_session_id = request.session_id or "None"
     logger.info(f"Received session_id: {sanitize(request_session_id)}")
 
-    try:
-        # Get an answer to the question.
-        response = await utils.answer_query(
-            query_text=request.question,
-            session_id=request.session_id,
-            user_pseudo_id=request.user_pseudo_id,
-        )
+    answers_in_flight.inc()
+    with request_timings() as timings:
+        try:
+            # Get an answer to the question.
+            response = await utils.answer_query(
+                query_text=request.question,
+                session_id=request.session_id,
+                user_pseudo_id=request.user_pseudo_id,
+                fields=include,
+            )
+
+            # Convert the markdown to the negotiated format. BigQuery keeps base64
+            # markdown.
+            with timings.stage("format"):
+                formatted = response.in_format(
+                    _negotiate_answer_format(answer_format, accept)
+                )
+
+            # Return and log the stage timings so far.
+            response.timings = formatted.timings = _stage_timings(timings)
+
+            # Queue the details for a background insert to BigQuery. The writer builds
+            # the full row off the request path.
+            with timings.stage("bigquery_enqueue"):
+                if not utils.bq_enqueue_answer(response):
+                    logger.warning("Answer details were not queued for BigQuery.")
+
+            # Serialize the requested fields of the server-built response directly,
+            # without validating it again against the response model.
+            with timings.stage("serialize"):
+                json_response = ModelJSONResponse(
+                    content=formatted,
+                    include=include,
+                    headers={"Vary": "Accept"},
+                )
+            json_response.headers["Server-Timing"] = timings.server_timing()
+
+            # Log the full time taken to answer the question.
+            elapsed_time = time.time() - start_time
+            logger.info(f"Returned an answer in {elapsed_time:.2f} seconds.")
+
+            return json_response
+
+        except Exception as e:
+            logger.error(f"An error occurred: {e}")
+            errors.inc(type(e).__name__)
+            raise HTTPException(status_code=500, detail=str(e))
+
+        finally:
+            answer_seconds.observe(timings.elapsed())
+            answers_in_flight.dec()
+
+
+def _stage_timings(timings: RequestTimings) -> list[StageTiming]:
+    """Convert the recorded stages to the timings of the response.
+
+    Args:
+        timings (RequestTimings): The timings of the request.
+
+    Returns:
+        list[StageTiming]: The time spent in each stage, in the order recorded.
+    """
+    return [
+        StageTiming.model_construct(name=name, seconds=seconds)
+        for name, seconds in timings.stages.items()
+    ]
+
+
+def _sse_event(event: str, data: dict[str, Any]) -> str:
+    """Format a server-sent event.
+
+    Args:
+        event (str): The event name.
+        data (dict[str, Any]): The event data to encode as JSON.
+
+    Returns:
+        str: The server-sent event message.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/answer/stream")
+async def answer_stream(
+    request: QuestionRequest,
+    utils: UtilHandler = Depends(get_utils),
+) -> StreamingResponse:
+    """Stream an answer to a question as server-sent events.
+
+    Events are emitted in order: "accepted", one "answer" event per chunk of answer text,
+    "citations" with the base64-encoded markdown answer including inline citations and
+    the footer, then "done" with the answer query token and session. An "error" event
+    replaces the remaining events if answer generation fails. The answer is logged to
+    BigQuery after the stream closes.
+    """
+    # Start the timer.
+    start_time = time.time()
 
-        # Dump the response model to a dictionary for loading to BigQuery.
-        data = response.model_dump()
+    # Log the request.
+    logger.info(f"Received streaming question: {sanitize(request.question)}")
+    request_session_id = request.session_id or "None"
+    logger.info(f"Received session_id: {sanitize(request_session_id)}")
+
+    # The complete answer, set once the stream finishes, to log to BigQuery.
+    completed: list[AnswerResponse] = []
+
+    async def events() -> AsyncIterator[str]:
+        yield _sse_event("accepted", {"question": request.question})
+
+        try:
+            async for item in utils.stream_answer_query(
+                query_text=request.question,
+                session_id=request.session_id,
+                user_pseudo_id=request.user_pseudo_id,
+            ):
+                if isinstance(item, AnswerResponse):
+                    completed.append(item)
+                else:
+                    yield _sse_event("answer", {"text": item})
 
-        # Log details to BigQuery.
-        errors = await utils.bq_insert_row_data(
-            data=data,
+        except Exception as e:
+            logger.error(f"An error occurred: {e}")
+            errors.inc(type(e).__name__)
+            yield _sse_event("error", {"detail": str(e)})
+            return
+
+        response = completed[-1]
+        yield _sse_event("citations", {"markdown": response.markdown})
+        yield _sse_event(
+            "done",
+            {
+                "answer_query_token": response.answer_query_token,
+                "session": response.session,
+                "latency": response.latency,
+            },
         )
-        if errors:
-            logger.error(f"Errors loading to Big Query: {errors}")
-            raise HTTPException(status_code=500, detail=str(errors))
 
-        # Log the full time taken to answer the question.
+        # Log the full time taken to stream the answer.
         elapsed_time = time.time() - start_time
-        logger.info(f"Returned an answer in {elapsed_time:.2f} seconds.")
+        logger.info(f"Streamed an answer in {elapsed_time:.2f} seconds.")
+
+    def log_answer() -> None:
+        if not completed:
+            return
 
-        return response
+        # Queue the details for a background insert to BigQuery.
+        if not utils.bq_enqueue_answer(completed[-1]):
+            logger.warning("Answer details were not queued for BigQuery.")
 
-    except Exception as e:
-        logger.error(f"An error occurred: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(log_answer),
+    )
 
 
 @app.get("/healthz", response_model=HealthCheckResponse)
@@ -67,6 +359,94 @@ def health_check() -> HealthCheckResponse:
     return HealthCheckResponse()
 
 
+@app.get("/readyz", response_model=ReadinessResponse)
+def readiness_check(
+    response: Response,
+    utils: UtilHandler = Depends(get_utils),
+) -> ReadinessResponse:
+    """Report ready once the startup warm-up has finished, for the Cloud Run startup
+    probe. Responds 503 while the warm-up is running.
+    """
+    readiness = utils.readiness()
+    if not readiness.ready:
+        response.status_code = 503
+
+    return readiness
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(accept: str | None = Header(default=None)) -> Response:
+    """Expose the metrics of this worker process for Prometheus to scrape.
+
+    The response uses the OpenMetrics text format when the Accept header includes
+    application/openmetrics-text, and the Prometheus text format otherwise.
+    """
+    if "application/openmetrics-text" in (accept or ""):
+        return Response(
+            content=registry.render(openmetrics=True),
+            media_type=OPENMETRICS_CONTENT_TYPE,
+        )
+
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def require_profiling(
+    x_profile_token: str | None = Header(default=None),
+) -> None:
+    """Allow /debug/profile only when enabled and with the right token.
+
+    The route is hidden with a 404 unless the ENABLE_PROFILING environment variable is
+    true and PROFILE_TOKEN is set, and refused with a 403 unless the X-Profile-Token
+    header matches PROFILE_TOKEN.
+
+    Args:
+        x_profile_token (str | None, optional): The X-Profile-Token header.
+            Defaults to None.
+
+    Raises:
+        HTTPException: 404 when profiling is disabled, 403 for a wrong token.
+    """
+    token = os.getenv("PROFILE_TOKEN", "")
+    if os.getenv("ENABLE_PROFILING", "").lower() != "true" or not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_profile_token is None or not hmac.compare_digest(
+        x_profile_token.encode(), token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid profile token.")
+
+    return
+
+
+@app.get(
+    "/debug/profile",
+    include_in_schema=False,
+    dependencies=[Depends(require_profiling)],
+)
+async def get_profile(
+    seconds: float = Query(default=5.0, gt=0, le=MAX_PROFILE_SECONDS),
+    format: ProfileFormat = Query(default=ProfileFormat.COLLAPSED),
+) -> Response:
+    """Sample the stacks of this worker process for a number of seconds.
+
+    The sampler runs in a thread, so the event loop keeps serving requests, which
+    appear in the profile. The collapsed format is the input of flamegraph.pl and
+    inferno, and the speedscope format opens in https://www.speedscope.app.
+    """
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running.")
+
+    async with profile_lock:
+        logger.info(f"Profiling for {seconds:g} seconds.")
+        profile = await asyncio.to_thread(
+            sample_stacks, seconds, profile_interval_seconds
+        )
+
+    if format == ProfileFormat.SPEEDSCOPE:
+        return JSONResponse(content=profile.speedscope())
+
+    return Response(content=profile.collapsed(), media_type="text/plain")
+
+
 @app.get("/get-env-variable", response_model=EnvVarResponse)
 def get_env_variable(name: str = Query(...)) -> EnvVarResponse:
     """Return the value of an environment variable.
@@ -76,7 +456,10 @@ def get_env_variable(name: str = Query(...)) -> EnvVarResponse:
 
 
 @app.post("/feedback", response_model=FeedbackResponse)
-async def log_feedback(request: FeedbackRequest) -> FeedbackResponse:
+async def log_feedback(
+    request: FeedbackRequest,
+    utils: UtilHandler = Depends(get_utils),
+) -> FeedbackResponse:
     """Log feedback from the user."""
     # Log the request.
     logger.info(f"Received answer_query_token: {sanitize(request.answer_query_token)}")
@@ -90,17 +473,21 @@ async def log_feedback(request: FeedbackRequest) -> FeedbackResponse:
     # Add the feedback name to the data dictionary.
     data["feedback_name"] = request.feedback_value.name
 
-    # Log the feedback to BigQuery.
-    errors = await utils.bq_insert_row_data(data=data, feedback=True)
-
-    if errors:
-        logger.error(f"Errors loading to Big Query: {errors}")
-        raise HTTPException(status_code=500, detail=str(errors))
+    # Queue the feedback for a background insert to BigQuery.
+    if not utils.bq_enqueue_row_data(data=data, feedback=True):
+        logger.warning("Feedback was not queued for BigQuery.")
 
     return FeedbackResponse(answer_query_token=request.answer_query_token)
 
 
 @app.get("/sessions/", response_model=GetSessionResponse)
-async def get_sessions(user_id: str = Query(...)) -> GetSessionResponse:
+async def get_sessions(
+    user_id: str = Query(...),
+    utils: UtilHandler = Depends(get_utils),
+) -> GetSessionResponse:
     """Get all sessions for a user ID."""
     return await utils.get_user_sessions(user_pseudo_id=user_id)
+
+
+# The time to import the app modules, from the first import of the package.
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
@@ -0,0 +1,523 @@
+import asyncio
+from bisect import bisect_left
+import logging
+import math
+from typing import Callable
+
+
+logger = logging.getLogger(__name__)
+
+# The content types of the two exposition formats.
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def log_linear_bounds(
+    lowest: float,
+    highest: float,
+    sub_buckets: int = 4,
+) -> tuple[float, ...]:
+    """Return HDR-style histogram bucket bounds.
+
+    Each doubling from the lowest bound is split into sub_buckets equal steps, so a
+    value is bucketed with a relative error of at most 1 / sub_buckets across the whole
+    range, at a fixed number of buckets per doubling.
+
+    Args:
+        lowest (float): The upper bound of the first bucket.
+        highest (float): The value the last bound must reach.
+        sub_buckets (int, optional): The buckets per doubling. Defaults to 4.
+
+    Returns:
+        tuple[float, ...]: The increasing upper bounds of the buckets.
+    """
+    if lowest <= 0:
+        raise ValueError(f"lowest must be positive, got {lowest}")
+    if highest <= lowest:
+        raise ValueError(f"highest must be greater than lowest, got {highest}")
+    if sub_buckets < 1:
+        raise ValueError(f"sub_buckets must be at least 1, got {sub_buckets}")
+
+    bounds = [lowest]
+    octave = lowest
+    while bounds[-1] < highest:
+        bounds += [
+            # Round off the float noise so the bounds print as short labels.
+            float(f"{octave * (1 + step / sub_buckets):.12g}")
+            for step in range(1, sub_buckets + 1)
+        ]
+        octave *= 2
+
+    return tuple(bounds)
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value or bucket bound for the exposition formats."""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the exposition formats."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """A histogram of observed values with fixed bucket bounds.
+
+    observe(value) appends the value to a buffer, which is a single C call on the
+    request path. collect() sorts the buffered values into the buckets, off the request
+    path, and runs before the counts are read.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, bounds: tuple[float, ...]) -> None:
+        """Initialize the Histogram class.
+
+        Args:
+            name (str): The metric name.
+            help (str): The description of the metric.
+            bounds (tuple[float, ...]): The increasing upper bounds of the buckets. An
+                unbounded last bucket is added.
+        """
+        if list(bounds) != sorted(set(bounds)):
+            raise ValueError("bounds must be strictly increasing")
+
+        self.name = name
+        self.help = help
+        self._bounds = tuple(bounds)
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._pending: list[float] = []
+        # Record a value, such as a duration in seconds.
+        self.observe: Callable[[float], None] = self._pending.append
+
+        return
+
+    def collect(self) -> None:
+        """Sort the values observed since the last collection into the buckets."""
+        pending = self._pending
+        # Values appended meanwhile, from another thread, stay for the next collection.
+        values = pending[:]
+        del pending[: len(values)]
+
+        counts = self._counts
+        bounds = self._bounds
+        for value in values:
+            counts[bisect_left(bounds, value)] += 1
+        self._sum += sum(values)
+
+        return
+
+    @property
+    def count(self) -> int:
+        """The number of observed values."""
+        self.collect()
+        return sum(self._counts)
+
+    @property
+    def sum(self) -> float:
+        """The sum of the observed values."""
+        self.collect()
+        return self._sum
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        """Return the cumulative bucket counts, the sum and the count.
+
+        Returns:
+            list[tuple[str, str, float]]: The name suffix, labels and value of each
+            sample.
+        """
+        self.collect()
+        samples: list[tuple[str, str, float]] = []
+        cumulative = 0
+        for bound, count in zip(self._bounds + (math.inf,), self._counts):
+            cumulative += count
+            samples.append(("_bucket", f'le="{_format_value(bound)}"', cumulative))
+        samples.append(("_sum", "", self._sum))
+        samples.append(("_count", "", cumulative))
+
+        return samples
+
+
+class Gauge:
+    """A value that goes up and down, such as the number of requests in flight,
+    optionally by the value of one label.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, label: str | None = None) -> None:
+        """Initialize the Gauge class.
+
+        Args:
+            name (str): The metric name.
+            help (str): The description of the metric.
+            label (str, optional): The name of the label. Defaults to None for a single
+                unlabeled value.
+        """
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: dict[str, float] = {}
+
+        return
+
+    def inc(self, label_value: str = "", amount: float = 1.0) -> None:
+        """Increase the value."""
+        self._values[label_value] = self._values.get(label_value, 0.0) + amount
+
+        return
+
+    def dec(self, label_value: str = "", amount: float = 1.0) -> None:
+        """Decrease the value."""
+        self._values[label_value] = self._values.get(label_value, 0.0) - amount
+
+        return
+
+    def set(self, value: float, label_value: str = "") -> None:
+        """Set the value."""
+        self._values[label_value] = value
+
+        return
+
+    def get(self, label_value: str = "") -> float:
+        """Return the value of a label value."""
+        return self._values.get(label_value, 0.0)
+
+    @property
+    def value(self) -> float:
+        """The value of an unlabeled gauge."""
+        return self.get()
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        """Return the value, or the value of each label value, as samples."""
+        if self.label is None:
+            return [("", "", self.get())]
+
+        return [
+            ("", f'{self.label}="{_escape(value)}"', gauge_value)
+            for value, gauge_value in sorted(self._values.items())
+        ]
+
+
+class Counter:
+    """Counts of events, optionally by the value of one label, such as errors by type."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: str | None = None) -> None:
+        """Initialize the Counter class.
+
+        Args:
+            name (str): The metric name, without the "_total" suffix of the samples.
+            help (str): The description of the metric.
+            label (str, optional): The name of the label. Defaults to None for a single
+                unlabeled count.
+        """
+        self.name = name
+        self.help = help
+        self.label = label
+        self._counts: dict[str, float] = {}
+
+        return
+
+    def inc(self, label_value: str = "", amount: float = 1.0) -> None:
+        """Count events.
+
+        Args:
+            label_value (str, optional): The value of the label. Defaults to "" for an
+                unlabeled counter.
+            amount (float, optional): The number of events. Defaults to 1.0.
+        """
+        self._counts[label_value] = self._counts.get(label_value, 0.0) + amount
+
+        return
+
+    def get(self, label_value: str = "") -> float:
+        """Return the count of a label value."""
+        return self._counts.get(label_value, 0.0)
+
+    def samples(self) -> list[tuple[str, str, float]]:
+        """Return the count of each label value."""
+        if self.label is None:
+            return [("_total", "", self._counts.get("", 0.0))]
+
+        return [
+            ("_total", f'{self.label}="{_escape(value)}"', count)
+            for value, count in sorted(self._counts.items())
+        ]
+
+
+Metric = Histogram | Gauge | Counter
+
+
+class Registry:
+    """The metrics of the process, rendered in the Prometheus text format or in the
+    OpenMetrics text format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+        return
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The metric.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        lowest: float,
+        highest: float,
+        sub_buckets: int = 4,
+    ) -> Histogram:
+        """Create and register a histogram with log_linear_bounds buckets."""
+        histogram = Histogram(
+            name, help, log_linear_bounds(lowest, highest, sub_buckets)
+        )
+        self.register(histogram)
+
+        return histogram
+
+    def gauge(self, name: str, help: str, label: str | None = None) -> Gauge:
+        """Create and register a gauge."""
+        gauge = Gauge(name, help, label)
+        self.register(gauge)
+
+        return gauge
+
+    def counter(self, name: str, help: str, label: str | None = None) -> Counter:
+        """Create and register a counter."""
+        counter = Counter(name, help, label)
+        self.register(counter)
+
+        return counter
+
+    def collect(self) -> None:
+        """Sort the values observed by every histogram into its buckets."""
+        for metric in self._metrics.values():
+            if isinstance(metric, Histogram):
+                metric.collect()
+
+        return
+
+    def render(self, openmetrics: bool = False) -> str:
+        """Render every metric.
+
+        Args:
+            openmetrics (bool, optional): Whether to use the OpenMetrics text format
+                rather than the Prometheus text format. Defaults to False.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            # The Prometheus format names a counter family by its samples.
+            family = metric.name
+            if metric.kind == "counter" and not openmetrics:
+                family += "_total"
+            lines.append(f"# HELP {family} {metric.help}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                labels = f"{{{labels}}}" if labels else ""
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsCollector:
+    """Collect the histograms and measure the event loop lag in the background.
+
+    A task sleeps for a fixed interval and records how much later than asked it woke
+    up. The delay is the time the loop spent running other callbacks, so it grows when
+    synchronous code holds the loop. After each interval the task sorts the values
+    observed by the histograms into their buckets, which bounds the buffered values.
+    """
+
+    def __init__(
+        self,
+        registry: Registry,
+        lag_gauge: Gauge,
+        interval_seconds: float = 0.5,
+    ) -> None:
+        """Initialize the MetricsCollector class.
+
+        Args:
+            registry (Registry): The metrics to collect.
+            lag_gauge (Gauge): The gauge set to the lag of each interval, in seconds.
+            interval_seconds (float, optional): The time between collections.
+                Defaults to 0.5.
+        """
+        if interval_seconds <= 0:
+            raise ValueError(
+                f"interval_seconds must be positive, got {interval_seconds}"
+            )
+
+        self._registry = registry
+        self._lag_gauge = lag_gauge
+        self._interval_seconds = interval_seconds
+        self._task: asyncio.Task[None] | None = None
+
+        return
+
+    def start(self) -> None:
+        """Start collecting in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        return
+
+    async def stop(self) -> None:
+        """Stop collecting."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        return
+
+    async def _run(self) -> None:
+        """Set the lag gauge and collect the histograms after each interval."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self._interval_seconds)
+            self._lag_gauge.set(
+                max(0.0, loop.time() - start - self._interval_seconds)
+            )
+            self._registry.collect()
+
+
+# The metrics of the app, shared by every request of the worker process.
+registry = Registry()
+
+answer_seconds = registry.histogram(
+    "answer_app_answer_seconds",
+    "The time to handle an /answer request, in seconds.",
+    lowest=0.001,
+    highest=120.0,
+)
+discoveryengine_seconds = registry.histogram(
+    "answer_app_discoveryengine_seconds",
+    "The latency of Discovery Engine answer calls, in seconds.",
+    lowest=0.01,
+    highest=120.0,
+)
+render_seconds = registry.histogram(
+    "answer_app_render_seconds",
+    "The time to render an answer and its citations to markdown, in seconds.",
+    lowest=0.00001,
+    highest=1.0,
+)
+bigquery_insert_seconds = registry.histogram(
+    "answer_app_bigquery_insert_seconds",
+    "The latency of BigQuery batch inserts, in seconds.",
+    lowest=0.001,
+    highest=60.0,
+)
+bigquery_queue_depth = registry.gauge(
+    "answer_app_bigquery_queue_depth",
+    "The rows waiting in the BigQuery writer queue.",
+)
+bigquery_rows_dropped = registry.counter(
+    "answer_app_bigquery_rows_dropped",
+    "The rows the BigQuery writer dropped because its queue was full or stopped.",
+)
+bigquery_rows_spilled = registry.counter(
+    "answer_app_bigquery_rows_spilled",
+    "The rows the BigQuery writer appended to the spill log.",
+)
+bigquery_rows_failed = registry.counter(
+    "answer_app_bigquery_rows_failed",
+    "The rows the BigQuery writer gave up on, such as rows rejected as invalid.",
+)
+answers_in_flight = registry.gauge(
+    "answer_app_answers_in_flight",
+    "The number of /answer requests being handled.",
+)
+event_loop_lag_seconds = registry.gauge(
+    "answer_app_event_loop_lag_seconds",
+    "The event loop lag of the last measurement interval, in seconds.",
+)
+event_loop_blocked_seconds = registry.histogram(
+    "answer_app_event_loop_blocked_seconds",
+    "The durations of the event loop stalls found by the watchdog, in seconds.",
+    lowest=0.01,
+    highest=60.0,
+)
+event_loop_blocked = registry.counter(
+    "answer_app_event_loop_blocked",
+    "The event loop stalls found by the watchdog, by the code holding the loop.",
+    label="site",
+)
+client_pool_in_flight = registry.gauge(
+    "answer_app_client_pool_in_flight",
+    "The Discovery Engine calls in flight, by client pool channel.",
+    label="channel",
+)
+client_pool_healthy = registry.gauge(
+    "answer_app_client_pool_healthy",
+    "Whether a client pool channel is healthy, 1 or 0, by channel.",
+    label="channel",
+)
+client_pool_calls = registry.counter(
+    "answer_app_client_pool_calls",
+    "The Discovery Engine calls, by client pool channel.",
+    label="channel",
+)
+client_pool_channel_errors = registry.counter(
+    "answer_app_client_pool_channel_errors",
+    "The connection errors of Discovery Engine calls, by client pool channel.",
+    label="channel",
+)
+client_pool_ejections = registry.counter(
+    "answer_app_client_pool_ejections",
+    "The times a client pool channel was marked unhealthy, by channel.",
+    label="channel",
+)
+citation_link_cache_hits = registry.counter(
+    "answer_app_citation_link_cache_hits",
+    "The citation link cache hits, by kind of entry, link or line.",
+    label="kind",
+)
+citation_link_cache_misses = registry.counter(
+    "answer_app_citation_link_cache_misses",
+    "The citation link cache misses, by kind of entry, link or line.",
+    label="kind",
+)
+citation_link_cache_size = registry.gauge(
+    "answer_app_citation_link_cache_size",
+    "The entries in the citation link cache, by kind of entry, link or line.",
+    label="kind",
+)
+coalesced_answer_requests = registry.counter(
+    "answer_app_coalesced_answer_requests",
+    "The answer requests that joined an identical in-flight Discovery Engine call.",
+)
+errors = registry.counter(
+    "answer_app_errors",
+    "The errors of the answer routes, by exception type.",
+    label="type",
+)
@@ -1,8 +1,18 @@
+import base64
 from enum import Enum
-from typing import Any
-from urllib.parse import quote
+from typing import TYPE_CHECKING, Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+
+from answer_app.render import RenderedAnswer
+
+if TYPE_CHECKING:
+    from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+
+# The conversations table columns of an AnswerResponse that are not fields of the
+# Conversational Search Service response.
+ANSWER_ROW_COLUMNS = ("question", "markdown", "latency", "cached", "coalesced", "timings")
 
 
 class QuestionRequest(BaseModel):
@@ -11,6 +21,22 @@ class QuestionRequest(BaseModel):
     user_pseudo_id: str = ""
 
 
+class AnswerFormat(str, Enum):
+    BASE64 = "base64"
+    MARKDOWN = "markdown"
+    HTML = "html"
+
+
+class ProfileFormat(str, Enum):
+    COLLAPSED = "collapsed"
+    SPEEDSCOPE = "speedscope"
+
+
+class StageTiming(BaseModel):
+    name: str
+    seconds: float
+
+
 class AnswerResponse(BaseModel):
     question: str
     markdown: str
@@ -18,48 +44,64 @@ class AnswerResponse(BaseModel):
     answer: dict[str, Any]
     session: dict[str, Any] | None = None
     answer_query_token: str
+    # Whether the answer came from the answer cache, or from the identical in-flight
+    # request of another caller. Either way it shares that answer's answer_query_token.
+    cached: bool = False
+    coalesced: bool = False
+    # The time spent in each stage of the request, set by the /answer route.
+    timings: list[StageTiming] = []
+
+    # The rendered answer behind the base64 markdown, reused for the other formats.
+    _rendered: RenderedAnswer | None = PrivateAttr(default=None)
+    # The service response behind the answer and session fields, for BigQuery.
+    _source: "AnswerQueryResponse | None" = PrivateAttr(default=None)
+
+    @property
+    def rendered(self) -> RenderedAnswer:
+        if self._rendered is None:
+            self._rendered = RenderedAnswer(
+                base64.b64decode(self.markdown).decode("utf-8")
+            )
+        return self._rendered
+
+    def set_rendered(self, rendered: RenderedAnswer) -> None:
+        self._rendered = rendered
+
+    @property
+    def source(self) -> "AnswerQueryResponse | None":
+        return self._source
+
+    def set_source(self, source: "AnswerQueryResponse") -> None:
+        self._source = source
+
+    def in_format(self, answer_format: AnswerFormat) -> "AnswerResponse":
+        # The base64 markdown is the canonical format.
+        if answer_format == AnswerFormat.BASE64:
+            return self
+
+        return self.model_copy(
+            update={"markdown": self.rendered.to_format(answer_format.value)}
+        )
 
 
 class HealthCheckResponse(BaseModel):
     status: str = "ok"
 
 
-class EnvVarResponse(BaseModel):
+class WarmUpStepResult(BaseModel):
     name: str
-    value: str | None
-
+    seconds: float
+    error: str | None = None
 
-class ClientCitation(BaseModel):
-    start_index: int
-    end_index: int
-    ref_index: int
-    content: str
-    score: float
-    title: str
-    citation_index: int | None = None
-    uri: str
-
-    def update_citation_index(self, citation_index: int):
-        self.citation_index = citation_index
-
-    def get_inline_link(self):
-        # Ensure citation_index is an integer before performing the addition
-        if self.citation_index is None:
-            raise ValueError(
-                "citation_index must be set to an integer before calling get_inline_link"
-            )
 
-        # Ref: https://www.markdownguide.org/basic-syntax/#adding-titles
-        content = self.content.replace('"', "'")
-        return f' _[[{self.citation_index}]({self.get_footer_link()} "{content}")]_'
+class ReadinessResponse(BaseModel):
+    ready: bool
+    steps: list[WarmUpStepResult] = []
 
-    def get_footer_link(self):
-        url = self.uri.replace("gs://", "https://storage.cloud.google.com/")
-        url_encoded = quote(url, safe=":/")
-        return url_encoded
 
-    def count_chars(self):
-        return len(self.get_inline_link())
+class EnvVarResponse(BaseModel):
+    name: str
+    value: str | None
 
 
 class UserFeedback(int, Enum):
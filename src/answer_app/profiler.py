@@ -0,0 +1,161 @@
+from collections import Counter
+import logging
+import sys
+import threading
+import time
+from types import CodeType
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+# The longest profile, well within the Cloud Run request timeout.
+MAX_PROFILE_SECONDS = 60.0
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+class Profile:
+    """The stacks sampled from the threads of the process, with their counts."""
+
+    def __init__(
+        self,
+        samples: Counter[tuple[str, tuple[CodeType, ...]]],
+        interval_seconds: float,
+        seconds: float,
+    ) -> None:
+        """Initialize the Profile class.
+
+        Args:
+            samples (Counter[tuple[str, tuple[CodeType, ...]]]): The number of times
+                each stack was sampled, by thread name and code objects from the
+                outermost frame.
+            interval_seconds (float): The time between samples.
+            seconds (float): The duration of the profile.
+        """
+        self.samples = samples
+        self.interval_seconds = interval_seconds
+        self.seconds = seconds
+
+        return
+
+    @staticmethod
+    def _frame_name(code: CodeType) -> str:
+        """Name a frame by its function and source location."""
+        return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+    def collapsed(self) -> str:
+        """Return the profile in the collapsed stack format of flamegraph.pl.
+
+        Returns:
+            str: A line per stack, "thread;outer frame;...;inner frame count".
+        """
+        lines = [
+            ";".join([thread_name] + [self._frame_name(code) for code in stack])
+            + f" {count}"
+            for (thread_name, stack), count in self.samples.most_common()
+        ]
+
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict[str, Any]:
+        """Return the profile in the speedscope file format, a profile per thread.
+
+        Returns:
+            dict[str, Any]: The speedscope document, weighted in seconds.
+        """
+        frames: list[dict[str, Any]] = []
+        frame_indexes: dict[CodeType, int] = {}
+        profiles: dict[str, dict[str, Any]] = {}
+        for (thread_name, stack), count in self.samples.items():
+            indexes = []
+            for code in stack:
+                if code not in frame_indexes:
+                    frame_indexes[code] = len(frames)
+                    frames.append(
+                        {
+                            "name": code.co_qualname,
+                            "file": code.co_filename,
+                            "line": code.co_firstlineno,
+                        }
+                    )
+                indexes.append(frame_indexes[code])
+
+            profile = profiles.setdefault(
+                thread_name,
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": 0,
+                    "samples": [],
+                    "weights": [],
+                },
+            )
+            profile["samples"].append(indexes)
+            profile["weights"].append(count * self.interval_seconds)
+            profile["endValue"] += count * self.interval_seconds
+
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": f"answer-app {self.seconds:g} second profile",
+            "exporter": __name__,
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+
+
+def sample_stacks(seconds: float, interval_seconds: float = 0.01) -> Profile:
+    """Sample the stacks of every other thread of the process at a fixed interval.
+
+    Runs in its own thread. Each sample takes the GIL for a walk of the frames, so the
+    overhead grows with the sample rate and the stack depths, not with the work the
+    threads do. The event loop thread keeps serving requests meanwhile.
+
+    Args:
+        seconds (float): The duration of the profile.
+        interval_seconds (float, optional): The time between samples.
+            Defaults to 0.01.
+
+    Returns:
+        Profile: The sampled stacks.
+    """
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(
+            f"seconds must be in (0, {MAX_PROFILE_SECONDS:g}], got {seconds}"
+        )
+    if interval_seconds <= 0:
+        raise ValueError(f"interval_seconds must be positive, got {interval_seconds}")
+
+    own_ident = threading.get_ident()
+    samples: Counter[tuple[str, tuple[CodeType, ...]]] = Counter()
+    start = time.monotonic()
+    deadline = start + seconds
+    next_sample = start
+    while next_sample < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            codes: list[CodeType] = []
+            current = frame
+            while current is not None:
+                codes.append(current.f_code)
+                current = current.f_back
+            codes.reverse()
+            samples[(names.get(ident, str(ident)), tuple(codes))] += 1
+        del frame, current
+
+        # Keep to the schedule rather than drifting by the sampling time.
+        next_sample += interval_seconds
+        time.sleep(max(0.0, next_sample - time.monotonic()))
+
+    elapsed = time.monotonic() - start
+    logger.info(
+        f"Sampled {sum(samples.values())} stacks of {len(samples)} kinds in "
+        f"{elapsed:.2f} seconds."
+    )
+
+    return Profile(samples, interval_seconds=interval_seconds, seconds=seconds)
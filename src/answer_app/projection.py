@@ -0,0 +1,186 @@
+from typing import Any
+
+from google.cloud.discoveryengine_v1.types import Answer
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+from google.cloud.discoveryengine_v1.types import Session
+from google.protobuf import json_format
+from google.protobuf.descriptor import Descriptor
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.message import Message
+
+# A nested include tree in the pydantic model_dump(include=...) format: each key maps
+# to True for the whole value or to the tree of its subfields. The subfields of the
+# items of a repeated message field are under its "__all__" key.
+ResponseFields = dict[str, Any]
+
+# The top-level AnswerResponse fields and the message types behind the dict fields.
+RESPONSE_FIELDS: dict[str, Descriptor | None] = {
+    "question": None,
+    "markdown": None,
+    "latency": None,
+    "answer": Answer.pb().DESCRIPTOR,
+    "session": Session.pb().DESCRIPTOR,
+    "answer_query_token": None,
+    "cached": None,
+    "coalesced": None,
+    "timings": None,
+}
+
+# Named field sets. The minimal profile holds the fields the Streamlit client reads and
+# the stage timings of the request.
+RESPONSE_PROFILES: dict[str, str | None] = {
+    "minimal": (
+        "markdown,latency,answer.answer_text,session.name,answer_query_token,timings"
+    ),
+    "full": None,
+}
+
+# The options AnswerQueryResponse.to_dict() uses, so projected values match it.
+_JSON_OPTIONS: dict[str, Any] = {
+    "preserving_proto_field_name": True,
+    "use_integers_for_enums": False,
+    "always_print_fields_with_no_presence": True,
+}
+
+
+def parse_fields(fields: str | None) -> ResponseFields | None:
+    """Parse a fields= value into an include tree.
+
+    The value is a comma-separated list of profile names and dotted field paths, such
+    as "minimal" or "markdown,answer.answer_text,session.name". Paths into answer and
+    session name fields of the Answer and Session messages.
+
+    Args:
+        fields (str, optional): The fields query parameter.
+
+    Returns:
+        ResponseFields | None: The include tree, or None for the full response.
+
+    Raises:
+        ValueError: If a profile or field name is unknown.
+    """
+    if not fields:
+        return None
+
+    include: ResponseFields = {}
+    for item in fields.split(","):
+        item = item.strip()
+        if not item:
+            continue
+
+        if item in RESPONSE_PROFILES:
+            profile = RESPONSE_PROFILES[item]
+            if profile is None:
+                return None
+            paths = profile.split(",")
+        else:
+            paths = [item]
+
+        for path in paths:
+            _add_path(include, path.split("."))
+
+    return include or None
+
+
+def _add_path(include: ResponseFields, names: list[str]) -> None:
+    """Validate a field path and merge it into the include tree."""
+    if names[0] not in RESPONSE_FIELDS:
+        raise ValueError(f"Unknown response field: {names[0]!r}")
+    descriptor = RESPONSE_FIELDS[names[0]]
+
+    node = include
+    for depth, name in enumerate(names):
+        field: FieldDescriptor | None = None
+        if depth > 0:
+            field = descriptor.fields_by_name.get(name) if descriptor else None
+            if field is None:
+                path = ".".join(names[: depth + 1])
+                raise ValueError(f"Unknown response field: {path!r}")
+            descriptor = field.message_type
+
+        if node.get(name) is True:
+            # An enclosing field is already included whole.
+            return
+
+        if depth == len(names) - 1:
+            node[name] = True
+        else:
+            node = node.setdefault(name, {})
+            if field is not None and _is_message_list(field):
+                # Pydantic applies the "__all__" subtree to every item of a list.
+                node = node.setdefault("__all__", {})
+
+    return
+
+
+def _is_message_list(field: FieldDescriptor) -> bool:
+    """Return whether a field is a repeated message field, but not a map field."""
+    return (
+        field.label == FieldDescriptor.LABEL_REPEATED
+        and field.message_type is not None
+        and not field.message_type.GetOptions().map_entry
+    )
+
+
+def project_response(
+    response: AnswerQueryResponse,
+    include: ResponseFields,
+) -> dict[str, Any]:
+    """Convert only the included fields of an AnswerQueryResponse to a dictionary.
+
+    This skips the dictionary conversion of everything the client did not ask for, such
+    as the full chunk content of every reference.
+
+    Args:
+        response (AnswerQueryResponse): The Conversational Search Service response.
+        include (ResponseFields): The include tree. Keys that are not fields of the
+            response are ignored.
+
+    Returns:
+        dict[str, Any]: The projected fields, in the AnswerQueryResponse.to_dict() format.
+    """
+    pb = AnswerQueryResponse.pb(response)
+    fields = pb.DESCRIPTOR.fields_by_name
+
+    return _project(pb, {name: sub for name, sub in include.items() if name in fields})
+
+
+def _project(pb: Message, include: ResponseFields) -> dict[str, Any]:
+    """Project a protobuf message, converting the included leaves like MessageToDict."""
+    projected: dict[str, Any] = {}
+    # The leaves are copied into an empty message and converted together.
+    leaves = type(pb)()
+    leaf_names: list[str] = []
+
+    for name, sub in include.items():
+        value = getattr(pb, name)
+
+        if isinstance(value, Message):
+            # Unset message fields are left out, as in MessageToDict.
+            if not pb.HasField(name):
+                continue
+            if sub is True:
+                getattr(leaves, name).CopyFrom(value)
+                leaf_names.append(name)
+            else:
+                projected[name] = _project(value, sub)
+
+        elif isinstance(value, (str, bytes, int, float)):
+            setattr(leaves, name, value)
+            leaf_names.append(name)
+
+        elif sub is True:
+            # Repeated and map fields.
+            getattr(leaves, name).MergeFrom(value)
+            leaf_names.append(name)
+
+        else:
+            projected[name] = [_project(item, sub["__all__"]) for item in value]
+
+    if leaf_names:
+        converted = json_format.MessageToDict(leaves, **_JSON_OPTIONS)
+        for name in leaf_names:
+            if name in converted:
+                projected[name] = converted[name]
+
+    return projected
@@ -0,0 +1,473 @@
+import base64
+import logging
+import time
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, NamedTuple
+from urllib.parse import quote
+
+from google.cloud.discoveryengine_v1.types import Answer
+from markdown_it import MarkdownIt
+
+from answer_app.metrics import Counter
+from answer_app.metrics import Gauge
+from answer_app.metrics import citation_link_cache_hits
+from answer_app.metrics import citation_link_cache_misses
+from answer_app.metrics import citation_link_cache_size
+
+
+logger = logging.getLogger(__name__)
+
+# CommonMark with raw HTML disabled, so HTML in the answer text is escaped. The link
+# validator rejects javascript:, vbscript:, file: and data: URLs.
+_html_renderer = MarkdownIt("commonmark", {"html": False}).enable("table")
+
+
+def _splice_links(text: str, links: list[tuple[int, str]]) -> str:
+    """Insert links into the text one at a time, each at its end index shifted by the
+    length of the links inserted before it.
+
+    This is quadratic in the number of links. It is only used for out-of-order end
+    indexes, where the shifted positions no longer map to a single pass over the text.
+
+    Args:
+        text (str): The answer text.
+        links (list[tuple[int, str]]): The end index and inline link of each citation.
+
+    Returns:
+        str: The text with the inline links inserted.
+    """
+    offset = 0
+    for end_index, link in links:
+        text = text[: end_index + offset] + link + text[end_index + offset :]
+        offset += len(link)
+
+    return text
+
+
+def _insert_links(text: str, links: list[tuple[int, str]]) -> str:
+    """Insert links into the text after their end indexes in a single pass.
+
+    The output is identical to _splice_links. When the end indexes are in order, each
+    shifted insertion position falls after the links already inserted, so the text can
+    be cut into segments and joined once.
+
+    Args:
+        text (str): The answer text.
+        links (list[tuple[int, str]]): The end index and inline link of each citation,
+            in citation order.
+
+    Returns:
+        str: The text with the inline links inserted.
+    """
+    length = len(text)
+    segments: list[str] = []
+    position = 0
+
+    for end_index, link in links:
+        # Slicing past the end of the text appends the link.
+        end_index = min(end_index, length)
+        if end_index < position:
+            return _splice_links(text, links)
+
+        segments.append(text[position:end_index])
+        segments.append(link)
+        position = end_index
+
+    segments.append(text[position:])
+
+    return "".join(segments)
+
+
+def footer_link(uri: str) -> str:
+    """Return the browser link for a cited document URI.
+
+    Args:
+        uri (str): The document URI.
+
+    Returns:
+        str: The URL-encoded link, with gs:// URIs pointing to the Cloud Storage browser.
+    """
+    url = uri.replace("gs://", "https://storage.cloud.google.com/")
+    url_encoded = quote(url, safe=":/")
+
+    return url_encoded
+
+
+def inline_link(citation_index: int, link: str, content: str) -> str:
+    """Return the inline markdown link for a citation, titled with the cited content.
+
+    Args:
+        citation_index (int): The citation number.
+        link (str): The footer link of the cited document.
+        content (str): The cited chunk content.
+
+    Returns:
+        str: The inline link.
+    """
+    # Ref: https://www.markdownguide.org/basic-syntax/#adding-titles
+    content = content.replace('"', "'")
+
+    return f' _[[{citation_index}]({link} "{content}")]_'
+
+
+class LinkCache:
+    """A bounded process-wide LRU memo of the footer links and lines of cited documents.
+
+    The same documents are cited across many answers, so the renderer reuses their
+    encoded links instead of encoding them for every citation of every request.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 4096,
+        hits: Counter | None = None,
+        misses: Counter | None = None,
+        size: Gauge | None = None,
+    ) -> None:
+        """Initialize the LinkCache class.
+
+        Args:
+            max_size (int, optional): The maximum number of links and of footer lines
+                to keep. Defaults to 4096.
+            hits (Counter, optional): The counter of hits, labeled "link" or "line".
+                Defaults to None.
+            misses (Counter, optional): The counter of misses, labeled "link" or
+                "line". Defaults to None.
+            size (Gauge, optional): The gauge of the number of entries, labeled "link"
+                or "line". Defaults to None.
+        """
+        self._max_size = max_size
+        self._links: OrderedDict[str, str] = OrderedDict()
+        self._lines: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._hits = hits
+        self._misses = misses
+        self._size = size
+        self.link_hits = 0
+        self.link_misses = 0
+        self.line_hits = 0
+        self.line_misses = 0
+
+        return
+
+    @property
+    def max_size(self) -> int:
+        """The maximum number of links and of footer lines to keep."""
+        return self._max_size
+
+    def resize(self, max_size: int) -> None:
+        """Change the maximum size, evicting the least recently used entries.
+
+        Args:
+            max_size (int): The maximum number of links and of footer lines to keep.
+        """
+        self._max_size = max_size
+        for entries in (self._links, self._lines):
+            while len(entries) > max(max_size, 0):
+                entries.popitem(last=False)
+        self._set_size()
+
+        return
+
+    def footer_link(self, uri: str) -> str:
+        """Return the footer link for a document URI.
+
+        Args:
+            uri (str): The document URI.
+
+        Returns:
+            str: The URL-encoded link.
+        """
+        link = self._links.get(uri)
+        if link is not None:
+            self._links.move_to_end(uri)
+            self.link_hits += 1
+            if self._hits is not None:
+                self._hits.inc("link")
+            return link
+
+        self.link_misses += 1
+        if self._misses is not None:
+            self._misses.inc("link")
+        link = footer_link(uri)
+        self._put(self._links, uri, link)
+
+        return link
+
+    def footer_line(self, uri: str, title: str) -> str:
+        """Return the footer line for a cited document, without its citation number.
+
+        Args:
+            uri (str): The document URI.
+            title (str): The document title.
+
+        Returns:
+            str: The footer line after the "[n]" citation number.
+        """
+        key = (uri, title)
+        line = self._lines.get(key)
+        if line is not None:
+            self._lines.move_to_end(key)
+            self.line_hits += 1
+            if self._hits is not None:
+                self._hits.inc("line")
+            return line
+
+        self.line_misses += 1
+        if self._misses is not None:
+            self._misses.inc("line")
+        line = f" [{title}]({self.footer_link(uri)})\n\n"
+        self._put(self._lines, key, line)
+
+        return line
+
+    def clear(self) -> None:
+        """Remove all memoized links and lines."""
+        self._links.clear()
+        self._lines.clear()
+        self._set_size()
+
+        return
+
+    def stats(self) -> dict[str, int | float]:
+        """Return the memo counters.
+
+        Returns:
+            dict[str, int | float]: The sizes, hits, misses and hit rates of the links
+            and footer lines.
+        """
+        link_lookups = self.link_hits + self.link_misses
+        line_lookups = self.line_hits + self.line_misses
+
+        return {
+            "max_size": self._max_size,
+            "links": len(self._links),
+            "link_hits": self.link_hits,
+            "link_misses": self.link_misses,
+            "link_hit_rate": self.link_hits / link_lookups if link_lookups else 0.0,
+            "lines": len(self._lines),
+            "line_hits": self.line_hits,
+            "line_misses": self.line_misses,
+            "line_hit_rate": self.line_hits / line_lookups if line_lookups else 0.0,
+        }
+
+    def _put(self, entries: OrderedDict, key: Any, value: str) -> None:
+        """Add an entry, evicting the least recently used entry when full."""
+        if self._max_size <= 0:
+            return
+
+        entries[key] = value
+        if len(entries) > self._max_size:
+            entries.popitem(last=False)
+        self._set_size()
+
+        return
+
+    def _set_size(self) -> None:
+        """Set the size gauge to the number of links and of footer lines."""
+        if self._size is not None:
+            self._size.set(len(self._links), "link")
+            self._size.set(len(self._lines), "line")
+
+        return
+
+
+# The process-wide memo used by the markdown renderer, exported at /metrics.
+link_cache = LinkCache(
+    hits=citation_link_cache_hits,
+    misses=citation_link_cache_misses,
+    size=citation_link_cache_size,
+)
+
+
+class CitedReference:
+    """A reference cited by an answer, read from the protobuf once per answer."""
+
+    __slots__ = ("uri", "title", "content", "link")
+
+    def __init__(self, uri: str, title: str, content: str) -> None:
+        self.uri = uri
+        self.title = title
+        self.content = content
+        self.link = link_cache.footer_link(uri)
+
+    def __repr__(self) -> str:
+        return f"CitedReference(uri={self.uri!r}, title={self.title!r})"
+
+
+class CitationRecord(NamedTuple):
+    """A citation source in the render path."""
+
+    start_index: int
+    end_index: int
+    reference: CitedReference
+
+
+def _citation_records(answer: Answer) -> list[CitationRecord]:
+    """Collect the citation sources of an answer, sorted by start index.
+
+    Reads the raw protobuf message to skip the proto-plus wrappers, and reads each
+    cited reference once however many times it is cited.
+
+    Args:
+        answer (google.cloud.discoveryengine_v1.types.Answer): The Answer object.
+
+    Returns:
+        list[CitationRecord]: The citation records.
+    """
+    answer_pb = Answer.pb(answer)
+    references_pb = answer_pb.references
+    cited: dict[str, CitedReference] = {}
+    records: list[CitationRecord] = []
+
+    for citation in answer_pb.citations:
+        for source in citation.sources:
+            reference = cited.get(source.reference_id)
+            if reference is None:
+                chunk_info = references_pb[int(source.reference_id)].chunk_info
+                reference = CitedReference(
+                    uri=chunk_info.document_metadata.uri,
+                    title=chunk_info.document_metadata.title,
+                    content=chunk_info.content,
+                )
+                cited[source.reference_id] = reference
+
+            records.append(
+                CitationRecord(citation.start_index, citation.end_index, reference)
+            )
+
+    # Sort the records by start index.
+    records.sort(key=itemgetter(0))
+
+    return records
+
+
+def render_markdown(answer: Answer) -> str:
+    """Convert the Answer object to a markdown-formatted string of the answer text and
+    citations.
+
+    Args:
+        answer (google.cloud.discoveryengine_v1.types.Answer): The Answer object.
+
+    Returns:
+        str: The markdown-formatted answer text with inline citations and a footer.
+
+    Ref: https://github.com/aurelio-labs/cookbook/blob/main/gen-ai/google-ai/gemini-2/web-search.ipynb
+    """
+    # Start the timer.
+    start_time: float = time.time()
+
+    records = _citation_records(answer)
+
+    # Collect the inline links and the footer lines, numbering each uri once.
+    footer: list[str] = ["\n\n**Citations:**\n\n"]
+    collected_uris: dict[str, int] = {}
+    links: list[tuple[int, str]] = []
+
+    for _, end_index, reference in records:
+        citation_index = collected_uris.get(reference.uri)
+        if citation_index is None:
+            citation_index = len(collected_uris) + 1
+            collected_uris[reference.uri] = citation_index
+            footer.append(f"[{citation_index}]")
+            footer.append(link_cache.footer_line(reference.uri, reference.title))
+
+        links.append(
+            (end_index, inline_link(citation_index, reference.link, reference.content))
+        )
+
+    # Insert citation numbers and links into the answer text and append the footer.
+    markdown: str = _insert_links(answer.answer_text, links) + "".join(footer)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Citations: {records}")
+        logger.debug(f"Markdown: {markdown}")
+        logger.debug(f"Link cache stats: {link_cache.stats()}")
+
+    # Log the markdown conversion time.
+    logger.debug(f"Markdown conversion time: {time.time() - start_time:.4f} seconds.")
+
+    return markdown
+
+
+def encode_markdown(markdown: str) -> str:
+    """Base64 encode a markdown string to ensure fidelity when sending over HTTP.
+
+    Args:
+        markdown (str): The markdown string.
+
+    Returns:
+        str: The base64-encoded markdown.
+    """
+    return base64.b64encode(markdown.encode("utf-8")).decode("utf-8")
+
+
+def markdown_to_html(markdown: str) -> str:
+    """Render a markdown string as sanitized HTML.
+
+    Args:
+        markdown (str): The markdown string.
+
+    Returns:
+        str: The HTML, with any raw HTML in the markdown escaped.
+    """
+    return _html_renderer.render(markdown)
+
+
+class RenderedAnswer:
+    """The markdown answer with citations, rendered into each response format at most once.
+
+    Formats are rendered lazily on first use and kept with the answer, so cached answers
+    are not rendered again for later requests.
+    """
+
+    __slots__ = ("markdown", "_base64", "_html")
+
+    def __init__(self, markdown: str) -> None:
+        self.markdown = markdown
+        self._base64: str | None = None
+        self._html: str | None = None
+
+    @classmethod
+    def from_answer(cls, answer: Answer) -> "RenderedAnswer":
+        """Render an Answer object.
+
+        Args:
+            answer (google.cloud.discoveryengine_v1.types.Answer): The Answer object.
+
+        Returns:
+            RenderedAnswer: The rendered answer.
+        """
+        return cls(render_markdown(answer))
+
+    @property
+    def base64(self) -> str:
+        """The base64-encoded markdown."""
+        if self._base64 is None:
+            self._base64 = encode_markdown(self.markdown)
+        return self._base64
+
+    @property
+    def html(self) -> str:
+        """The sanitized HTML."""
+        if self._html is None:
+            self._html = markdown_to_html(self.markdown)
+        return self._html
+
+    def to_format(self, answer_format: str) -> str:
+        """Return the answer in a response format.
+
+        Args:
+            answer_format (str): One of "base64", "markdown" or "html".
+
+        Returns:
+            str: The answer in the format.
+        """
+        match answer_format:
+            case "base64":
+                return self.base64
+            case "markdown":
+                return self.markdown
+            case "html":
+                return self.html
+            case _:
+                raise ValueError(f"Unsupported answer format: {answer_format}")
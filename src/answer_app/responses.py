@@ -0,0 +1,44 @@
+from typing import Any, Mapping
+
+from pydantic import BaseModel
+import pydantic_core
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse
+
+
+class ModelJSONResponse(JSONResponse):
+    """A JSON response that serializes a pydantic model with pydantic-core.
+
+    Returning it from an endpoint skips the response_model validation and
+    serialization of FastAPI, so use it only for models built by the server.
+    """
+
+    def __init__(
+        self,
+        content: BaseModel,
+        include: Mapping[str, Any] | None = None,
+        status_code: int = 200,
+        headers: Mapping[str, str] | None = None,
+        background: BackgroundTask | None = None,
+    ) -> None:
+        """Initialize the ModelJSONResponse class.
+
+        Args:
+            content (BaseModel): The model to serialize.
+            include (Mapping[str, Any], optional): The fields to serialize, in the
+                model_dump(include=...) format. Defaults to None for all fields.
+            status_code (int, optional): The HTTP status code. Defaults to 200.
+            headers (Mapping[str, str], optional): The response headers. Defaults to None.
+            background (BackgroundTask, optional): A task to run after the response is
+                sent. Defaults to None.
+        """
+        self._include = include
+        super().__init__(
+            content=content,
+            status_code=status_code,
+            headers=headers,
+            background=background,
+        )
+
+    def render(self, content: BaseModel) -> bytes:
+        return pydantic_core.to_json(content, include=self._include)
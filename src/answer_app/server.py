@@ -0,0 +1,223 @@
+import importlib.util
+import logging
+import math
+import os
+from typing import Any, Mapping
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from answer_app.config import load_config
+
+
+logger = logging.getLogger(__name__)
+
+APP = "answer_app.main:app"
+LOOPS = ("auto", "asyncio", "uvloop")
+HTTP_PROTOCOLS = ("auto", "h11", "httptools")
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def cgroup_cpu_limit(root: str = CGROUP_ROOT) -> float | None:
+    """Return the CPU limit of the container from its cgroup CPU quota.
+
+    Args:
+        root (str, optional): The cgroup filesystem mount point.
+            Defaults to "/sys/fs/cgroup".
+
+    Returns:
+        float | None: The number of CPUs the quota allows, or None without a quota.
+    """
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" without a quota.
+        with open(os.path.join(root, "cpu.max")) as file:
+            quota, period = file.read().split()
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+
+    except (FileNotFoundError, ValueError):
+        pass
+
+    try:
+        # cgroup v1: a quota of -1 means no quota.
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as file:
+            quota_us = int(file.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as file:
+            period_us = int(file.read())
+        if quota_us <= 0 or period_us <= 0:
+            return None
+        return quota_us / period_us
+
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def available_cpus(root: str = CGROUP_ROOT) -> int:
+    """Return the number of CPUs this process can use.
+
+    os.cpu_count() reports the CPUs of the host, so the count is limited by the CPU
+    affinity of the process and the cgroup CPU quota of the container.
+
+    Args:
+        root (str, optional): The cgroup filesystem mount point.
+            Defaults to "/sys/fs/cgroup".
+
+    Returns:
+        int: The number of CPUs, at least 1.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    limit = cgroup_cpu_limit(root)
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+
+    return max(1, cpus)
+
+
+def _installed(module: str) -> bool:
+    """Return whether a module is installed, without importing it."""
+    return importlib.util.find_spec(module) is not None
+
+
+def server_config(
+    app: str = APP,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    workers: int | str = "auto",
+    loop: str = "auto",
+    http: str = "auto",
+    backlog: int = 2048,
+    timeout_keep_alive: int = 620,
+    timeout_graceful_shutdown: int = 8,
+    log_level: str = "info",
+) -> uvicorn.Config:
+    """Create the uvicorn configuration of the server.
+
+    Args:
+        app (str, optional): The import string of the ASGI app.
+            Defaults to "answer_app.main:app".
+        host (str, optional): The interface to listen on. Defaults to "0.0.0.0".
+        port (int, optional): The port to listen on. Defaults to 8080.
+        workers (int | str, optional): The number of worker processes, or "auto" for
+            one per available CPU. Defaults to "auto".
+        loop (str, optional): "asyncio", "uvloop", or "auto" for uvloop when it is
+            installed. Defaults to "auto".
+        http (str, optional): "h11", "httptools", or "auto" for httptools when it is
+            installed. Defaults to "auto".
+        backlog (int, optional): The maximum number of connections waiting to be
+            accepted. Defaults to 2048.
+        timeout_keep_alive (int, optional): The seconds to keep an idle connection
+            open. Defaults to 620.
+        timeout_graceful_shutdown (int, optional): The seconds a stopping worker waits
+            for in-flight requests. Defaults to 8.
+        log_level (str, optional): The uvicorn log level. Defaults to "info".
+
+    Returns:
+        uvicorn.Config: The uvicorn configuration.
+    """
+    if loop not in LOOPS:
+        raise ValueError(f"loop must be one of {LOOPS}, got {loop!r}")
+    if http not in HTTP_PROTOCOLS:
+        raise ValueError(f"http must be one of {HTTP_PROTOCOLS}, got {http!r}")
+
+    if workers == "auto":
+        workers = available_cpus()
+    workers = int(workers)
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+
+    # Resolve "auto" here rather than in uvicorn so the choice is logged.
+    if loop == "auto":
+        loop = "uvloop" if _installed("uvloop") else "asyncio"
+    if http == "auto":
+        http = "httptools" if _installed("httptools") else "h11"
+
+    return uvicorn.Config(
+        app,
+        host=host,
+        port=int(port),
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=backlog,
+        timeout_keep_alive=timeout_keep_alive,
+        timeout_graceful_shutdown=timeout_graceful_shutdown,
+        log_level=log_level.lower(),
+    )
+
+
+def load_server_settings(
+    environ: Mapping[str, str] | None = None,
+) -> dict[str, Any]:
+    """Load the server settings from the configuration file and the environment.
+
+    The PORT (set by Cloud Run), WEB_CONCURRENCY and LOG_LEVEL environment variables
+    override the port, workers and log level of the configuration file.
+
+    Args:
+        environ (Mapping[str, str], optional): The environment variables.
+            Defaults to None for os.environ.
+
+    Returns:
+        dict[str, Any]: The server_config keyword arguments.
+    """
+    environ = os.environ if environ is None else environ
+    settings: dict[str, Any] = dict(load_config("config.yaml").get("server") or {})
+
+    for variable, setting in (
+        ("PORT", "port"),
+        ("WEB_CONCURRENCY", "workers"),
+        ("LOG_LEVEL", "log_level"),
+    ):
+        if environ.get(variable):
+            settings[setting] = environ[variable]
+
+    return settings
+
+
+def serve(config: uvicorn.Config) -> None:
+    """Serve the app from worker processes sharing one listening socket.
+
+    The supervisor restarts workers that exit, and replaces the workers one at a time
+    on SIGHUP. The socket stays open meanwhile, so new connections wait in the backlog
+    rather than being refused. Stopping workers finish their in-flight requests and
+    run the app shutdown, which flushes the queued BigQuery rows.
+
+    Args:
+        config (uvicorn.Config): The uvicorn configuration.
+    """
+    logger.info(
+        f"Serving {config.app} on {config.host}:{config.port} with "
+        f"{config.workers} workers, {config.loop} event loop, {config.http} HTTP, "
+        f"backlog {config.backlog}, keep-alive {config.timeout_keep_alive} seconds."
+    )
+    sock = config.bind_socket()
+    try:
+        Multiprocess(config, target=uvicorn.Server(config).run, sockets=[sock]).run()
+    finally:
+        sock.close()
+
+    return
+
+
+def main() -> None:
+    """Run the production server with the settings of the configuration file."""
+    log_format: str = "{levelname:<9} [{name}.{funcName}:{lineno:>5}] {message}"
+    logging.basicConfig(
+        format=log_format,
+        style="{",
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        encoding="utf-8",
+    )
+    serve(server_config(**load_server_settings()))
+
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Any, Iterable
+
+
+logger = logging.getLogger(__name__)
+
+# A spilled row: {"table": str, "insert_id": str, "row": dict, "attempts": int}.
+SpillRecord = dict[str, Any]
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Each record is a 4-byte big-endian length prefix followed by the UTF-8 JSON record.
+_HEADER = struct.Struct(">I")
+
+
+class SpillLog:
+    """An append-only local file of BigQuery rows waiting to be replayed.
+
+    Records are appended by the BigQuery writer when an insert fails or the queue
+    overflows, and taken back for replay. A replay first moves the log aside to a
+    ".replay" file, which is only removed once the replay is acknowledged, so rows
+    survive a crash mid-replay. Replays may therefore repeat rows; the deterministic
+    insert IDs let BigQuery deduplicate them.
+
+    Each process claims its own spill file, so the workers of a multi-worker server do
+    not replay each other's rows. The first process uses path and the others path.1,
+    path.2 and so on.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync_policy: str = "interval",
+        fsync_interval_seconds: float = 1.0,
+    ) -> None:
+        """Initialize the SpillLog class.
+
+        Args:
+            path (str): The path of the spill file.
+            fsync_policy (str, optional): "always" to fsync every append, "interval" to
+                fsync at most every fsync_interval_seconds, or "never" to leave it to the
+                operating system. Defaults to "interval".
+            fsync_interval_seconds (float, optional): The minimum time between fsyncs for
+                the "interval" policy. Defaults to 1.0.
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(
+                f"fsync_policy must be one of {FSYNC_POLICIES}, got {fsync_policy!r}"
+            )
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._path = self._claim(path)
+        self._replay_path = f"{self._path}.replay"
+        self._fsync_policy = fsync_policy
+        self._fsync_interval_seconds = fsync_interval_seconds
+        self._last_fsync = 0.0
+        self._lock = threading.Lock()
+        logger.debug(f"Spill log path: {self._path}")
+
+        return
+
+    @property
+    def path(self) -> str:
+        """The path of the spill file claimed by this process."""
+        return self._path
+
+    def _claim(self, path: str) -> str:
+        """Claim the first spill file that no other live process is using.
+
+        The claim is an exclusive lock on a ".lock" file next to the spill file, which
+        the operating system releases when the process exits. A replacement worker
+        therefore takes over the spill file, and the rows, of the worker it replaces.
+        """
+        slot = 0
+        while True:
+            slot_path = path if slot == 0 else f"{path}.{slot}"
+            lock_file = open(f"{slot_path}.lock", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                slot += 1
+                continue
+
+            # Hold the lock for the lifetime of the spill log.
+            self._slot_lock = lock_file
+
+            return slot_path
+
+    def size(self) -> int:
+        """Return the number of bytes waiting in the spill and replay files."""
+        total = 0
+        for path in (self._path, self._replay_path):
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+
+        return total
+
+    def append(self, records: Iterable[SpillRecord]) -> int:
+        """Append records to the spill file.
+
+        Args:
+            records (Iterable[SpillRecord]): The records to append.
+
+        Returns:
+            int: The number of records appended.
+        """
+        payloads = [json.dumps(record).encode("utf-8") for record in records]
+        if not payloads:
+            return 0
+
+        data = b"".join(_HEADER.pack(len(payload)) + payload for payload in payloads)
+
+        with self._lock:
+            with open(self._path, "ab") as file:
+                file.write(data)
+                file.flush()
+                self._maybe_fsync(file.fileno())
+
+        return len(payloads)
+
+    def take(self) -> list[SpillRecord]:
+        """Move the spilled records aside for replay and return them.
+
+        Records from an unacknowledged earlier replay are returned as well. Call ack()
+        once the records are replayed or re-appended.
+
+        Returns:
+            list[SpillRecord]: The records to replay.
+        """
+        with self._lock:
+            if os.path.exists(self._path):
+                if os.path.exists(self._replay_path):
+                    # Merge with the records of an unacknowledged replay.
+                    with open(self._path, "rb") as source:
+                        data = source.read()
+                    with open(self._replay_path, "ab") as target:
+                        target.write(data)
+                        target.flush()
+                        os.fsync(target.fileno())
+                    os.remove(self._path)
+                else:
+                    os.replace(self._path, self._replay_path)
+
+            if not os.path.exists(self._replay_path):
+                return []
+
+            with open(self._replay_path, "rb") as file:
+                data = file.read()
+
+        return self._decode(data)
+
+    def ack(self) -> None:
+        """Remove the records returned by the last take()."""
+        with self._lock:
+            try:
+                os.remove(self._replay_path)
+            except FileNotFoundError:
+                pass
+
+        return
+
+    def _maybe_fsync(self, fileno: int) -> None:
+        """Flush the file to disk according to the fsync policy."""
+        if self._fsync_policy == "never":
+            return
+
+        now = time.monotonic()
+        if (
+            self._fsync_policy == "always"
+            or now - self._last_fsync >= self._fsync_interval_seconds
+        ):
+            os.fsync(fileno)
+            self._last_fsync = now
+
+        return
+
+    def _decode(self, data: bytes) -> list[SpillRecord]:
+        """Decode length-prefixed JSON records, skipping corrupt or truncated ones."""
+        records: list[SpillRecord] = []
+        offset = 0
+
+        while offset + _HEADER.size <= len(data):
+            (length,) = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            end = start + length
+            if end > len(data):
+                logger.warning(f"Spill log truncated at byte {offset}.")
+                break
+
+            try:
+                records.append(json.loads(data[start:end]))
+            except ValueError as e:
+                logger.warning(f"Skipping corrupt spill record at byte {offset}: {e}")
+
+            offset = end
+
+        if 0 < len(data) - offset < _HEADER.size:
+            logger.warning(f"Spill log truncated at byte {offset}.")
+
+        return records
@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+from typing import Iterator
+
+from answer_app.metrics import Histogram
+
+
+# The timings of the request being handled, set by request_timings().
+_current: ContextVar["RequestTimings | None"] = ContextVar("timings", default=None)
+
+
+class RequestTimings:
+    """The durations of the named stages of a request.
+
+    A stage recorded more than once, such as a retried call, accumulates its time.
+    Stages are kept in the order they were first recorded.
+    """
+
+    __slots__ = ("_start", "_stages")
+
+    def __init__(self) -> None:
+        self._start = time.perf_counter()
+        self._stages: dict[str, float] = {}
+
+        return
+
+    @property
+    def stages(self) -> dict[str, float]:
+        """The seconds spent in each stage."""
+        return dict(self._stages)
+
+    def elapsed(self) -> float:
+        """Return the seconds since the timings started."""
+        return time.perf_counter() - self._start
+
+    def add(self, name: str, seconds: float) -> None:
+        """Record time spent in a stage.
+
+        Args:
+            name (str): The stage name.
+            seconds (float): The duration in seconds.
+        """
+        self._stages[name] = self._stages.get(name, 0.0) + seconds
+
+        return
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the code inside the context as a stage.
+
+        Args:
+            name (str): The stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def server_timing(self) -> str:
+        """Return the stages and the total time as a Server-Timing header value.
+
+        Returns:
+            str: The header value, with durations in milliseconds.
+        """
+        metrics = [
+            f"{name};dur={seconds * 1e3:.2f}" for name, seconds in self._stages.items()
+        ]
+        metrics.append(f"total;dur={self.elapsed() * 1e3:.2f}")
+
+        return ", ".join(metrics)
+
+
+@contextmanager
+def request_timings() -> Iterator[RequestTimings]:
+    """Collect the stages timed with stage() during a request.
+
+    Yields:
+        RequestTimings: The timings of the request.
+    """
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str, histogram: Histogram | None = None) -> Iterator[None]:
+    """Time the code inside the context as a stage of the current request, if any.
+
+    Args:
+        name (str): The stage name.
+        histogram (Histogram, optional): A histogram that also records the duration,
+            inside a request or not. Defaults to None.
+    """
+    timings = _current.get()
+    if timings is None and histogram is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if timings is not None:
+            timings.add(name, seconds)
+        if histogram is not None:
+            histogram.observe(seconds)
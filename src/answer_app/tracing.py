@@ -0,0 +1,232 @@
+from contextlib import contextmanager
+from contextlib import nullcontext
+import logging
+import os
+from typing import Any, ContextManager, Iterator, TextIO
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+logger = logging.getLogger(__name__)
+
+EXPORTERS = ("otlp", "console", "file")
+
+# The tracer and provider set by configure_tracing(). None while tracing is off, so
+# span() costs one comparison per call.
+_tracer: Any = None
+_provider: Any = None
+# The span file of the "file" exporter, closed by shutdown_tracing().
+_trace_file: TextIO | None = None
+
+# A reusable context manager that does nothing.
+_NO_SPAN: ContextManager[None] = nullcontext()
+
+
+def configure_tracing(
+    enabled: bool = False,
+    exporter: str = "otlp",
+    sample_ratio: float = 0.01,
+    otlp_endpoint: str | None = None,
+    file_path: str = "/tmp/answer-app/traces.jsonl",
+    service_name: str = "answer-app",
+) -> bool:
+    """Set up OpenTelemetry tracing of the app.
+
+    Traces continue the sampling decision of the caller. New traces are sampled at
+    sample_ratio. Spans are exported in batches by a background thread.
+
+    Args:
+        enabled (bool, optional): Whether to trace. Defaults to False.
+        exporter (str, optional): "otlp" to send spans to an OpenTelemetry collector,
+            "console" to print them, or "file" to append them to a JSON lines file.
+            Defaults to "otlp".
+        sample_ratio (float, optional): The fraction of new traces to sample, from 0
+            to 1. Defaults to 0.01.
+        otlp_endpoint (str, optional): The gRPC endpoint of the collector. Defaults to
+            None for the OTEL_EXPORTER_OTLP_ENDPOINT environment variable or the
+            exporter's default, localhost:4317.
+        file_path (str, optional): The file of the "file" exporter.
+            Defaults to "/tmp/answer-app/traces.jsonl".
+        service_name (str, optional): The service name of the spans.
+            Defaults to "answer-app".
+
+    Returns:
+        bool: True if tracing is on, False if it is disabled or the OpenTelemetry SDK
+        is not installed.
+    """
+    global _tracer, _provider
+
+    if exporter not in EXPORTERS:
+        raise ValueError(f"exporter must be one of {EXPORTERS}, got {exporter!r}")
+    if not 0.0 <= sample_ratio <= 1.0:
+        raise ValueError(f"sample_ratio must be between 0 and 1, got {sample_ratio}")
+
+    if not enabled:
+        logger.debug("Tracing disabled.")
+        return False
+
+    # The OpenTelemetry packages are only imported when tracing is on.
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased
+        from opentelemetry.sdk.trace.sampling import TraceIdRatioBased
+
+        span_exporter = _load_exporter(exporter, otlp_endpoint, file_path)
+
+    except ImportError as e:
+        logger.warning(f"Tracing disabled, OpenTelemetry is not installed: {e}")
+        return False
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    _provider = provider
+    _tracer = provider.get_tracer("answer_app")
+    logger.info(
+        f"Tracing enabled with the {exporter} exporter, sampling {sample_ratio:.2%} "
+        f"of new traces."
+    )
+
+    return True
+
+
+def _load_exporter(exporter: str, otlp_endpoint: str | None, file_path: str) -> Any:
+    """Create the span exporter.
+
+    Raises:
+        ImportError: If the exporter package is not installed.
+    """
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        if otlp_endpoint:
+            return OTLPSpanExporter(endpoint=otlp_endpoint)
+        return OTLPSpanExporter()
+
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if exporter == "console":
+        return ConsoleSpanExporter()
+
+    # One span per line, appended by every worker process. The file is line buffered,
+    # so each span is appended in one write and lines of workers do not interleave.
+    global _trace_file
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    _trace_file = open(file_path, "a", buffering=1, encoding="utf-8")
+    return ConsoleSpanExporter(
+        out=_trace_file,
+        formatter=lambda span: span.to_json(indent=None) + "\n",
+    )
+
+
+def shutdown_tracing() -> None:
+    """Export the remaining spans, stop tracing and close the span file."""
+    global _tracer, _provider, _trace_file
+
+    if _provider is not None:
+        _provider.shutdown()
+    if _trace_file is not None:
+        _trace_file.close()
+    _tracer = None
+    _provider = None
+    _trace_file = None
+
+    return
+
+
+def span(
+    name: str,
+    attributes: dict[str, Any] | None = None,
+    current: bool = True,
+) -> ContextManager[Any]:
+    """Trace the code inside the context as a span, if tracing is on.
+
+    An exception raised inside the context is recorded on the span.
+
+    Args:
+        name (str): The span name.
+        attributes (dict[str, Any], optional): The span attributes. Defaults to None.
+        current (bool, optional): Whether the span is the parent of the spans started
+            inside the context. Use False in async generators, which may be closed in
+            another context. Defaults to True.
+
+    Returns:
+        ContextManager[Any]: The span context manager.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    if current:
+        return _tracer.start_as_current_span(name, attributes=attributes)
+
+    return _detached_span(name, attributes)
+
+
+@contextmanager
+def _detached_span(name: str, attributes: dict[str, Any] | None) -> Iterator[Any]:
+    """Trace the code inside the context as a span that is not the current span."""
+    from opentelemetry.trace import Status
+    from opentelemetry.trace import StatusCode
+
+    detached = _tracer.start_span(name, attributes=attributes)
+    try:
+        yield detached
+    except Exception as e:
+        detached.record_exception(e)
+        detached.set_status(Status(StatusCode.ERROR, str(e)))
+        raise
+    finally:
+        detached.end()
+
+
+class TracingMiddleware:
+    """Continue the trace of each HTTP request in a server span.
+
+    The trace context of the traceparent header, sent by the client, is the parent of
+    the server span, which is the parent of the spans of the request handler. The span
+    ends when the response has been sent, including a streamed response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        from opentelemetry import propagate
+        from opentelemetry.trace import SpanKind
+
+        carrier = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+        }
+        with _tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+            },
+        ) as server_span:
+
+            async def send_traced(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute(
+                        "http.response.status_code", message["status"]
+                    )
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
+
+        return
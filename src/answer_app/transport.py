@@ -0,0 +1,270 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Iterable, TypeVar
+
+from google.api_core.client_options import ClientOptions
+from google.auth.credentials import Credentials
+from google.cloud import discoveryengine_v1 as discoveryengine
+from google.cloud.discoveryengine_v1.services.conversational_search_service.transports import (
+    ConversationalSearchServiceGrpcAsyncIOTransport,
+)
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse, Session
+import grpc
+from grpc import aio
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRANSPORTS = ("grpc", "rest")
+COMPRESSION_ALGORITHMS: dict[str | None, grpc.Compression] = {
+    None: grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+
+# Marks the end of a synchronous iterator read in a worker thread.
+_DONE = object()
+
+
+async def _iterate_in_thread(iterable: Iterable[T]) -> AsyncIterator[T]:
+    """Iterate a blocking iterable in worker threads, one item at a time."""
+    iterator = iter(iterable)
+    while True:
+        item = await asyncio.to_thread(next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+class RestAsyncClient:
+    """An async facade over the synchronous REST Conversational Search Service client.
+
+    The client library has no async REST transport without optional dependencies, so
+    each blocking call runs in a worker thread, as the BigQuery inserts do. Only the
+    methods used by DiscoveryEngineHandler are provided.
+    """
+
+    def __init__(
+        self,
+        client: discoveryengine.ConversationalSearchServiceClient,
+    ) -> None:
+        """Initialize the RestAsyncClient class.
+
+        Args:
+            client (discoveryengine.ConversationalSearchServiceClient): The synchronous
+                client with the REST transport.
+        """
+        self._client = client
+
+        return
+
+    @property
+    def transport(self) -> Any:
+        """The REST transport of the client."""
+        return self._client.transport
+
+    async def answer_query(
+        self,
+        request: discoveryengine.AnswerQueryRequest,
+    ) -> AnswerQueryResponse:
+        """Call the answer method in a worker thread."""
+        return await asyncio.to_thread(self._client.answer_query, request)
+
+    async def stream_answer_query(
+        self,
+        request: discoveryengine.AnswerQueryRequest,
+    ) -> AsyncIterator[AnswerQueryResponse]:
+        """Call the streaming answer method and read the stream in worker threads."""
+        stream = await asyncio.to_thread(self._client.stream_answer_query, request)
+
+        return _iterate_in_thread(stream)
+
+    async def list_sessions(
+        self,
+        request: discoveryengine.ListSessionsRequest,
+    ) -> AsyncIterator[Session]:
+        """List the sessions, fetching each page in a worker thread."""
+        pager = await asyncio.to_thread(self._client.list_sessions, request=request)
+
+        return _iterate_in_thread(pager)
+
+    async def delete_session(
+        self,
+        request: discoveryengine.DeleteSessionRequest,
+    ) -> None:
+        """Call the delete session method in a worker thread."""
+        return await asyncio.to_thread(self._client.delete_session, request=request)
+
+
+class ClientTransport:
+    """The transport settings of the Conversational Search Service clients.
+
+    With "grpc", each client gets its own channel with the keepalive, idle timeout,
+    message size and compression settings. Keepalive pings detect connections that were
+    closed while Cloud Run throttled the instance CPU between requests, and the idle
+    timeout lets an unused channel reconnect on its next call instead. With "rest", the
+    synchronous REST client runs in worker threads and the gRPC settings do not apply.
+    """
+
+    def __init__(
+        self,
+        kind: str = "grpc",
+        compression: str | None = None,
+        keepalive_time_ms: int = 60_000,
+        keepalive_timeout_ms: int = 20_000,
+        keepalive_permit_without_calls: bool = False,
+        idle_timeout_ms: int = 300_000,
+        max_send_message_bytes: int = -1,
+        max_receive_message_bytes: int = -1,
+    ) -> None:
+        """Initialize the ClientTransport class.
+
+        Args:
+            kind (str, optional): "grpc" or "rest". Defaults to "grpc".
+            compression (str, optional): The gRPC request message compression, "gzip"
+                or "deflate". Defaults to None for no compression.
+            keepalive_time_ms (int, optional): The time between keepalive pings.
+                Defaults to 60,000.
+            keepalive_timeout_ms (int, optional): The time to wait for a ping
+                acknowledgement before closing the connection. Defaults to 20,000.
+            keepalive_permit_without_calls (bool, optional): Whether to ping without
+                in-flight calls. Defaults to False.
+            idle_timeout_ms (int, optional): The time without calls before the channel
+                goes idle and closes its connection. Defaults to 300,000.
+            max_send_message_bytes (int, optional): The largest request message.
+                Defaults to -1 for no limit.
+            max_receive_message_bytes (int, optional): The largest response message.
+                Defaults to -1 for no limit.
+        """
+        if kind not in TRANSPORTS:
+            raise ValueError(f"kind must be one of {TRANSPORTS}, got {kind!r}")
+        if compression not in COMPRESSION_ALGORITHMS:
+            raise ValueError(
+                f"compression must be one of {tuple(COMPRESSION_ALGORITHMS)}, "
+                f"got {compression!r}"
+            )
+
+        self._kind = kind
+        self._compression = COMPRESSION_ALGORITHMS[compression]
+        self._channel_options: list[tuple[str, Any]] = [
+            ("grpc.keepalive_time_ms", keepalive_time_ms),
+            ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+            (
+                "grpc.keepalive_permit_without_calls",
+                int(keepalive_permit_without_calls),
+            ),
+            ("grpc.client_idle_timeout_ms", idle_timeout_ms),
+            ("grpc.max_send_message_length", max_send_message_bytes),
+            ("grpc.max_receive_message_length", max_receive_message_bytes),
+            # gRPC shares the connections of channels with the same target and options
+            # through a global subchannel pool, so each channel uses a local one.
+            ("grpc.use_local_subchannel_pool", 1),
+        ]
+
+        return
+
+    @property
+    def kind(self) -> str:
+        """The transport, "grpc" or "rest"."""
+        return self._kind
+
+    def create_client(
+        self,
+        client_options: ClientOptions | None = None,
+        credentials: Credentials | None = None,
+    ) -> discoveryengine.ConversationalSearchServiceAsyncClient | RestAsyncClient:
+        """Create a client with its own connection.
+
+        Args:
+            client_options (ClientOptions, optional): The client options, such as the
+                regional API endpoint. Defaults to None.
+            credentials (Credentials, optional): The credentials. Defaults to None for
+                the application default credentials.
+
+        Returns:
+            discoveryengine.ConversationalSearchServiceAsyncClient | RestAsyncClient:
+            The async client.
+        """
+        if self._kind == "rest":
+            return RestAsyncClient(
+                discoveryengine.ConversationalSearchServiceClient(
+                    client_options=client_options,
+                    credentials=credentials,
+                    transport="rest",
+                )
+            )
+
+        return discoveryengine.ConversationalSearchServiceAsyncClient(
+            client_options=client_options,
+            credentials=credentials,
+            transport=self._grpc_transport,
+        )
+
+    async def connect(
+        self,
+        client: (
+            discoveryengine.ConversationalSearchServiceAsyncClient | RestAsyncClient
+        ),
+    ) -> None:
+        """Open the connection of a client's gRPC channel and wait until it is ready.
+
+        The REST transport connects on its first call, so there is nothing to open.
+
+        Args:
+            client (discoveryengine.ConversationalSearchServiceAsyncClient |
+                RestAsyncClient): The client.
+        """
+        if self._kind == "grpc":
+            await client.transport.grpc_channel.channel_ready()
+
+        return
+
+    def _grpc_transport(
+        self,
+        **kwargs: Any,
+    ) -> ConversationalSearchServiceGrpcAsyncIOTransport:
+        """Create the gRPC transport with a channel from these settings."""
+        return ConversationalSearchServiceGrpcAsyncIOTransport(
+            channel=self._create_channel, **kwargs
+        )
+
+    def _create_channel(
+        self,
+        host: str,
+        options: list[tuple[str, Any]] | None = None,
+        **kwargs: Any,
+    ) -> aio.Channel:
+        """Create a gRPC channel, overriding the transport's options with these.
+
+        Args:
+            host (str): The host for the channel.
+            options (list[tuple[str, Any]], optional): The transport's channel options.
+                Defaults to None.
+            **kwargs (Any): The other channel arguments from the transport.
+
+        Returns:
+            aio.Channel: The channel.
+        """
+        names = {name for name, _ in self._channel_options}
+        channel_options = [
+            (name, value) for name, value in options or [] if name not in names
+        ] + self._channel_options
+
+        return ConversationalSearchServiceGrpcAsyncIOTransport.create_channel(
+            host, options=channel_options, compression=self._compression, **kwargs
+        )
+
+    def settings(self) -> dict[str, Any]:
+        """Return the transport settings for logging.
+
+        Returns:
+            dict[str, Any]: The transport, compression and gRPC channel options.
+        """
+        return {
+            "kind": self._kind,
+            "compression": self._compression.name,
+            "channel_options": dict(self._channel_options),
+        }
+
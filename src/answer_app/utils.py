@@ -1,23 +1,52 @@
 import asyncio
-import base64
+from functools import partial
 import logging
 import os
 import time
-from typing import Any
+from typing import Any, AsyncIterator
 
 import google.auth
-from google.cloud import bigquery
+import google.auth.transport.requests
 from google.cloud.discoveryengine_v1.types import Answer
 from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
 from google.cloud.discoveryengine_v1.types import Session
-import yaml
 
+from answer_app.bq_projector import RowProjector
+from answer_app.bq_storage import BigQueryStorageWriter
+from answer_app.bq_storage import load_schema
+from answer_app.bq_writer import BigQueryBatchWriter
+from answer_app.bq_writer import InsertRows
+from answer_app.bq_writer import Row
+from answer_app.cache import AnswerCache
+from answer_app.config import load_config
+from answer_app.lazy import lazy_import
 from answer_app.discoveryengine_utils import DiscoveryEngineHandler
+from answer_app.discoveryengine_utils import answer_was_coalesced
+from answer_app.metrics import MetricsCollector
+from answer_app.metrics import discoveryengine_seconds
+from answer_app.metrics import event_loop_blocked
+from answer_app.metrics import event_loop_blocked_seconds
+from answer_app.metrics import event_loop_lag_seconds
+from answer_app.metrics import registry
+from answer_app.metrics import render_seconds
+from answer_app.model import ANSWER_ROW_COLUMNS
 from answer_app.model import AnswerResponse
-from answer_app.model import ClientCitation
 from answer_app.model import GetSessionResponse
+from answer_app.model import ReadinessResponse
+from answer_app.model import WarmUpStepResult
+from answer_app.projection import ResponseFields
+from answer_app.projection import project_response
+from answer_app.render import RenderedAnswer
+from answer_app.render import link_cache
+from answer_app.spill import SpillLog
+from answer_app.timing import stage
+from answer_app.warmup import WarmUp
+from answer_app.watchdog import LoopWatchdog
 
 
+# The BigQuery client library is only needed once the UtilHandler is created.
+bigquery = lazy_import("google.cloud.bigquery")
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,86 +63,35 @@ def sanitize(text: str) -> str:
     return text.replace("\r\n", "").replace("\n", "")
 
 
-def _answer_to_markdown(answer: Answer) -> str:
-    """Convert the Answer object to a base64-encoded markdown-formatted string of
-    the answer text and citations.
+def response_compression_settings(config: dict[str, Any]) -> dict[str, Any] | None:
+    """Return the response compression middleware settings from the configuration.
+
+    The middleware is added when the app is created, before the lifespan creates the
+    UtilHandler, so the settings are read from the configuration directly.
 
     Args:
-        answer (google.cloud.discoveryengine_v1.types.Answer): The Answer object.
+        config (dict[str, Any]): The configuration settings.
 
     Returns:
-        str: The markdown-formatted answer text with citations encoded using base64.
-
-    Ref: https://github.com/aurelio-labs/cookbook/blob/main/gen-ai/google-ai/gemini-2/web-search.ipynb
+        dict[str, Any] | None: The CompressionMiddleware keyword arguments, or None
+        if response compression is not enabled.
     """
-    # Start the timer.
-    start_time: float = time.time()
-
-    # Create a list of ClientCitation objects from the response citations and references.
-    client_citations: list[ClientCitation] = [
-        ClientCitation(
-            # fmt: off
-            start_index=citation.start_index,
-            end_index=citation.end_index,
-            ref_index=int(source.reference_id),
-            content=answer.references[int(source.reference_id)].chunk_info.content,
-            score=answer.references[int(source.reference_id)].chunk_info.relevance_score,
-            title=answer.references[int(source.reference_id)].chunk_info.document_metadata.title,
-            uri=answer.references[int(source.reference_id)].chunk_info.document_metadata.uri,
-            # fmt: on
-        )
-        for citation in answer.citations
-        for source in citation.sources
-    ]
-
-    # Sort the client_citations by start index.
-    client_citations.sort(key=lambda citation: citation.start_index)
-
-    # Initialize the output.
-    markdown: str = answer.answer_text
-    offset = 0
-    footer: str = "\n\n**Citations:**\n\n"
-    collected_uris: dict[str, int] = {}
-    citation_index = 0
-
-    for citation in client_citations:
-        logger.debug(f"Citation: {citation}")
-
-        # Increment the index and append to the footer if the uri is not in the set.
-        if citation.uri not in collected_uris.keys():
-            citation_index += 1
-            collected_uris[citation.uri] = citation_index
-            footer += f"[{citation_index}] [{citation.title}]({citation.get_footer_link()})\n\n"
-
-        citation.update_citation_index(collected_uris[citation.uri])
-        logger.debug(f"Citation index: {citation.citation_index}")
-        logger.debug(f"Footer: {footer}")
-
-        # Insert citation numbers and links into the answer text.
-        markdown = (
-            markdown[: citation.end_index + offset]
-            + citation.get_inline_link()
-            + markdown[citation.end_index + offset :]
-        )
+    compression_config: dict[str, Any] = dict(config.get("response_compression") or {})
+    if not compression_config.pop("enabled", False):
+        logger.debug("Response compression disabled.")
+        return None
 
-        # Increase the offset by the number of characters added to the answer text.
-        offset += citation.count_chars()
+    logger.debug(f"Response compression config: {compression_config}")
 
-    # Append the footer and log the full annotated markdown answer text.
-    markdown += footer
-    logger.debug(f"Markdown: {markdown}")
-
-    # Base64 encode the markdown string to ensure fidelity when sending over HTTP.
-    encoded_markdown: str = base64.b64encode(markdown.encode("utf-8")).decode("utf-8")
-
-    # Log the markdown conversion time.
-    logger.debug(f"Markdown conversion time: {time.time() - start_time:.4f} seconds.")
-
-    return encoded_markdown
+    return compression_config
 
 
 class UtilHandler:
-    """A utility handler class."""
+    """A utility handler class.
+
+    Holds the configuration, credentials and clients of the app. The FastAPI lifespan
+    creates one per worker process and stores it in the app state.
+    """
 
     def __init__(self, log_level: str = "INFO") -> None:
         """Initialize the UtilHandler class.
@@ -136,7 +114,22 @@ class UtilHandler:
             engine_id=self._config["search_engine_id"],
             preamble=self._config.get("preamble", "Give a detailed answer."),
             project_id=self._project,
+            coalesce_requests=self._config.get("coalesce_answer_requests", False),
+            client_pool=self._config.get("discoveryengine_client_pool"),
+            transport=self._config.get("discoveryengine_transport"),
+            credentials=self._credentials,
+        )
+        self._answer_cache = self._load_answer_cache()
+        self._configure_link_cache()
+        self._row_projector = RowProjector(
+            schema=load_schema("schema.json"),
+            message_type=AnswerQueryResponse,
+            extra_columns=ANSWER_ROW_COLUMNS,
         )
+        self._bq_writer = self._load_bq_writer()
+        self._warm_up = self._load_warm_up()
+        self._metrics_collector = self._load_metrics_collector()
+        self._loop_watchdog = self._load_loop_watchdog()
 
         return
 
@@ -166,15 +159,9 @@ class UtilHandler:
         Returns:
             dict[str, Any]: The configuration settings.
         """
-        this_directory: str = os.path.dirname(os.path.abspath(__file__))
-        abs_filepath: str = os.path.join(this_directory, filepath)
-        with open(abs_filepath, "r") as file:
-            config: dict[str, Any] = yaml.safe_load(file)
-        logger.debug(f"Loaded configuration: {config}")
-
-        return config
+        return load_config(filepath)
 
-    def _load_bigquery_client(self) -> bigquery.Client:
+    def _load_bigquery_client(self) -> "bigquery.Client":
         """Load the BigQuery client.
 
         Returns:
@@ -188,6 +175,172 @@ class UtilHandler:
 
         return client
 
+    def _load_answer_cache(self) -> AnswerCache | None:
+        """Load the answer cache for stateless questions from the configuration.
+
+        Returns:
+            AnswerCache | None: The answer cache, or None if it is not enabled.
+        """
+        cache_config: dict[str, Any] = self._config.get("answer_cache") or {}
+        if not cache_config.get("enabled", False):
+            logger.debug("Answer cache disabled.")
+            return None
+
+        cache = AnswerCache(
+            max_size=cache_config.get("max_size", 512),
+            ttl_seconds=cache_config.get("ttl_seconds", 300),
+        )
+        logger.debug(f"Answer cache config: {cache_config}")
+
+        return cache
+
+    def _configure_link_cache(self) -> None:
+        """Size the process-wide memo of citation links from the configuration."""
+        cache_config: dict[str, Any] = self._config.get("citation_link_cache") or {}
+        link_cache.resize(cache_config.get("max_size", link_cache.max_size))
+        logger.debug(f"Citation link cache max size: {link_cache.max_size}")
+
+        return
+
+    def _load_bq_writer(self) -> BigQueryBatchWriter:
+        """Load the batched BigQuery writer from the configuration.
+
+        Returns:
+            BigQueryBatchWriter: The writer for the conversations and feedback tables.
+        """
+        writer_config: dict[str, Any] = self._config.get("bigquery_writer") or {}
+        spill_config: dict[str, Any] = dict(self._config.get("bigquery_spill") or {})
+
+        spill_log: SpillLog | None = None
+        if spill_config.pop("enabled", False):
+            spill_log = SpillLog(**spill_config)
+
+        writer = BigQueryBatchWriter(
+            insert_rows=self._load_bq_sink(),
+            spill_log=spill_log,
+            **writer_config,
+        )
+        logger.debug(f"BigQuery writer config: {writer_config}")
+        logger.debug(f"BigQuery spill log config: {spill_config}")
+
+        return writer
+
+    def _load_bq_sink(self) -> InsertRows:
+        """Load the BigQuery sink used by the batched writer from the configuration.
+
+        Returns:
+            InsertRows: The coroutine function that inserts a batch of rows.
+        """
+        sink: str = self._config.get("bigquery_sink", "insert_rows_json")
+        logger.debug(f"BigQuery sink: {sink}")
+
+        if sink == "insert_rows_json":
+            return self._bq_insert_rows
+
+        if sink == "storage_write":
+            storage_writer = BigQueryStorageWriter(
+                schemas={
+                    self._table: load_schema("schema.json"),
+                    self._feedback_table: load_schema("schema_feedback.json"),
+                },
+                credentials=self._credentials,
+            )
+            return storage_writer.insert_rows
+
+        raise ValueError(
+            f"bigquery_sink must be 'insert_rows_json' or 'storage_write', got {sink!r}"
+        )
+
+    def _load_warm_up(self) -> WarmUp | None:
+        """Load the startup warm-up from the configuration.
+
+        Returns:
+            WarmUp | None: The warm-up, or None if it is not enabled.
+        """
+        warm_up_config: dict[str, Any] = dict(self._config.get("warm_up") or {})
+        if not warm_up_config.pop("enabled", False):
+            logger.debug("Warm-up disabled.")
+            return None
+
+        logger.debug(f"Warm-up config: {warm_up_config}")
+
+        # The credentials are shared by the clients, so they are refreshed first.
+        return WarmUp(
+            steps={
+                "credentials": self._refresh_credentials,
+                "discoveryengine_channels": self._vais_handler.warm_up,
+                "bigquery_session": self._prime_bigquery_client,
+            },
+            **warm_up_config,
+        )
+
+    async def _refresh_credentials(self) -> None:
+        """Mint an access token for the shared credentials."""
+        await asyncio.to_thread(
+            self._credentials.refresh, google.auth.transport.requests.Request()
+        )
+
+        return
+
+    async def _prime_bigquery_client(self) -> None:
+        """Open the BigQuery client's HTTP session with a metadata read of the table."""
+        await asyncio.to_thread(self._bq_client.get_table, self._table)
+
+        return
+
+    def _load_metrics_collector(self) -> MetricsCollector:
+        """Load the background collector of the metrics from the configuration.
+
+        Returns:
+            MetricsCollector: The collector of the histograms and the event loop lag.
+        """
+        metrics_config: dict[str, Any] = self._config.get("metrics") or {}
+        logger.debug(f"Metrics config: {metrics_config}")
+
+        return MetricsCollector(
+            registry=registry,
+            lag_gauge=event_loop_lag_seconds,
+            **metrics_config,
+        )
+
+    def _load_loop_watchdog(self) -> LoopWatchdog | None:
+        """Load the event loop watchdog from the configuration.
+
+        Returns:
+            LoopWatchdog | None: The watchdog, or None if it is not enabled.
+        """
+        watchdog_config: dict[str, Any] = dict(self._config.get("loop_watchdog") or {})
+        if not watchdog_config.pop("enabled", False):
+            logger.debug("Event loop watchdog disabled.")
+            return None
+
+        logger.debug(f"Event loop watchdog config: {watchdog_config}")
+
+        return LoopWatchdog(
+            blocked_seconds=event_loop_blocked_seconds,
+            blocked_sites=event_loop_blocked,
+            **watchdog_config,
+        )
+
+    def readiness(self) -> ReadinessResponse:
+        """Return whether the startup warm-up has finished, with the step timings.
+
+        Returns:
+            ReadinessResponse: The readiness and the result of each warm-up step.
+        """
+        if self._warm_up is None:
+            return ReadinessResponse(ready=True)
+
+        return ReadinessResponse(
+            ready=self._warm_up.ready,
+            steps=[
+                WarmUpStepResult(
+                    name=result.name, seconds=result.seconds, error=result.error
+                )
+                for result in self._warm_up.results
+            ],
+        )
+
     def _compose_table(
         self,
         dataset_key: str,
@@ -214,6 +367,7 @@ class UtilHandler:
         query_text: str,
         session_id: str | None,
         user_pseudo_id: str,
+        fields: ResponseFields | None = None,
     ) -> AnswerResponse:
         """Call the answer method to return a generated answer and a list of search results,
         with links to the sources.
@@ -222,6 +376,9 @@ class UtilHandler:
             query_text (str): The text of the query to be answered.
             session_id (str, optional): The session ID to continue a conversation.
             user_pseudo_id (str): The unique ID of the active user.
+            fields (ResponseFields, optional): The include tree of the response fields.
+                Only the included parts of the answer and session are converted to
+                dictionaries. Defaults to None for the full response.
 
         Returns:
             AnswerResponse: The response from the Conversational Search Service,
@@ -234,30 +391,195 @@ class UtilHandler:
         # Start the timer.
         start_time: float = time.time()
 
+        # Return a cached answer for a stateless question if one is available.
+        cache_key: tuple[str, ...] | None = None
+        if self._answer_cache is not None and not session_id:
+            with stage("answer_cache"):
+                cache_key = AnswerCache.make_key(
+                    query_text=query_text,
+                    preamble=self._vais_handler.preamble,
+                    model_version=self._vais_handler.model_version,
+                    engine=self._vais_handler.engine,
+                )
+                cached = self._answer_cache.get(cache_key)
+            if cached is not None:
+                latency = time.time() - start_time
+                logger.info(f"Answer cache hit latency: {latency:.4f} seconds.")
+                logger.debug(f"Answer cache stats: {self._answer_cache.stats()}")
+
+                return self._answer_response(
+                    query_text=query_text,
+                    response=cached.response,
+                    latency=latency,
+                    rendered=cached.rendered,
+                    fields=fields,
+                    response_dict=cached.response_dict() if fields is None else None,
+                    cached=True,
+                )
+
         # Get the answer to the query.
-        response: AnswerQueryResponse = await self._vais_handler.answer_query(
+        with stage("discoveryengine", discoveryengine_seconds):
+            response: AnswerQueryResponse = await self._vais_handler.answer_query(
+                query_text=query_text,
+                session_id=session_id,
+                user_pseudo_id=user_pseudo_id,
+            )
+
+        # Log the latency in the model response.
+        latency: float = time.time() - start_time
+        logger.info(f"Answer latency: {latency:.4f} seconds.")
+
+        answer_response = self._answer_response(
+            query_text=query_text,
+            response=response,
+            latency=latency,
+            fields=fields,
+            coalesced=answer_was_coalesced(),
+        )
+
+        # Cache the answer to a stateless question.
+        if cache_key is not None:
+            self._answer_cache.put(
+                key=cache_key,
+                rendered=answer_response.rendered,
+                response=response,
+            )
+
+        return answer_response
+
+    async def stream_answer_query(
+        self,
+        query_text: str,
+        session_id: str | None,
+        user_pseudo_id: str,
+    ) -> AsyncIterator[str | AnswerResponse]:
+        """Stream a generated answer as it is produced.
+
+        Args:
+            query_text (str): The text of the query to be answered.
+            session_id (str, optional): The session ID to continue a conversation.
+            user_pseudo_id (str): The unique ID of the active user.
+
+        Yields:
+            str | AnswerResponse: The answer text in chunks as they arrive, followed by
+            the complete AnswerResponse with the markdown-formatted answer and citations.
+        """
+        logger.debug(f"Query: {query_text}")
+        logger.debug(f"Session ID: {session_id}")
+
+        # Start the timer.
+        start_time: float = time.time()
+
+        answer_text: str = ""
+        last_chunk: AnswerQueryResponse | None = None
+        session: Session | None = None
+        answer_query_token: str = ""
+
+        async for chunk in self._vais_handler.stream_answer_query(
             query_text=query_text,
             session_id=session_id,
             user_pseudo_id=user_pseudo_id,
-        )
+        ):
+            if last_chunk is None:
+                ttfb: float = time.time() - start_time
+                logger.info(f"Answer time to first chunk: {ttfb:.4f} seconds.")
+            last_chunk = chunk
+
+            # Keep the most recent session and token, whichever chunk carries them.
+            if chunk.session.name:
+                session = chunk.session
+            if chunk.answer_query_token:
+                answer_query_token = chunk.answer_query_token
+
+            # Each chunk carries the next piece of the answer text, not the text so far.
+            delta: str = chunk.answer.answer_text
+            answer_text += delta
+            if delta:
+                yield delta
+
+        if last_chunk is None:
+            raise RuntimeError("The answer stream returned no responses.")
 
         # Log the latency in the model response.
         latency: float = time.time() - start_time
         logger.info(f"Answer latency: {latency:.4f} seconds.")
 
-        # Create a markdown string of the answer text and citations and a dictionary of the full response.
-        markdown: str = _answer_to_markdown(response.answer)
-        response_dict: dict[str, Any] = AnswerQueryResponse.to_dict(
-            instance=response,
-            use_integers_for_enums=False,
+        # Assemble the complete response from the final chunk and the streamed text.
+        response = AnswerQueryResponse(
+            answer=last_chunk.answer,
+            session=session,
+            answer_query_token=answer_query_token,
+        )
+        response.answer.answer_text = answer_text
+        logger.info(f"Answer: {answer_text}")
+
+        yield self._answer_response(
+            query_text=query_text,
+            response=response,
+            latency=latency,
         )
 
-        return AnswerResponse(
+    def _answer_response(
+        self,
+        query_text: str,
+        response: AnswerQueryResponse,
+        latency: float,
+        rendered: RenderedAnswer | None = None,
+        fields: ResponseFields | None = None,
+        response_dict: dict[str, Any] | None = None,
+        cached: bool = False,
+        coalesced: bool = False,
+    ) -> AnswerResponse:
+        """Create an AnswerResponse from the Conversational Search Service response.
+
+        Args:
+            query_text (str): The text of the query.
+            response (AnswerQueryResponse): The Conversational Search Service response.
+            latency (float): The latency of the model response in seconds.
+            rendered (RenderedAnswer, optional): The rendered answer. Defaults to None
+                to render the answer.
+            fields (ResponseFields, optional): The include tree of the response fields.
+                Defaults to None for the full response.
+            response_dict (dict[str, Any], optional): The dictionary representation of
+                the full response, if already converted. Defaults to None.
+            cached (bool, optional): Whether the response came from the answer cache.
+                Defaults to False.
+            coalesced (bool, optional): Whether the response came from another
+                caller's identical in-flight request. Defaults to False.
+
+        Returns:
+            AnswerResponse: The response with the markdown-formatted answer.
+        """
+        # Render the answer text and citations.
+        if rendered is None:
+            with stage("render", render_seconds):
+                rendered = RenderedAnswer.from_answer(response.answer)
+
+        # Convert the full response, or only the requested fields, to a dictionary.
+        with stage("to_dict"):
+            if fields is not None:
+                response_dict = project_response(response=response, include=fields)
+            elif response_dict is None:
+                response_dict = AnswerQueryResponse.to_dict(
+                    instance=response,
+                    use_integers_for_enums=False,
+                )
+
+        # The fields come from the service response, so skip validating them.
+        answer_response = AnswerResponse.model_construct(
             question=query_text,
-            markdown=markdown,
+            markdown=rendered.base64,
             latency=latency,
-            **response_dict,
+            answer=response_dict.get("answer", {}),
+            session=response_dict.get("session"),
+            answer_query_token=response.answer_query_token,
+            cached=cached,
+            coalesced=coalesced,
         )
+        answer_response.set_rendered(rendered)
+        answer_response.set_source(response)
+
+        return answer_response
 
     async def get_user_sessions(
         self,
@@ -296,38 +618,122 @@ class UtilHandler:
         """
         return await self._vais_handler.delete_session(session_id=session_id)
 
-    async def bq_insert_row_data(
+    def bq_enqueue_row_data(
         self,
-        data: dict[str, Any],
+        data: Row,
         feedback: bool = False,
-    ) -> list[dict[str, Any]] | None:
-        """Insert rows into a BigQuery table.
+    ) -> bool:
+        """Queue a row for a batched background insert into a BigQuery table.
 
         Args:
-            data (dict[str, Any]): The row data to insert.
+            data (Row): The row data to insert, or a function that builds it in the
+                background.
             feedback (bool, optional): Whether to insert into the feedback table.
 
         Returns:
-            list[dict] | None: A list of errors, if any occurred.
+            bool: True if the row was queued, False if the writer dropped it.
+        """
+        # Choose the table to insert the data.
+        table = self._feedback_table if feedback else self._table
+
+        return self._bq_writer.enqueue(table=table, row=data)
+
+    def bq_enqueue_answer(self, answer_response: AnswerResponse) -> bool:
+        """Queue the full record of an answer for a batched background insert.
+
+        The row is built by the background writer, off the request path.
+
+        Args:
+            answer_response (AnswerResponse): The answer, with base64 markdown.
+
+        Returns:
+            bool: True if the row was queued, False if the writer dropped it.
+        """
+        return self._bq_writer.enqueue(
+            table=self._table, row=partial(self._answer_row, answer_response)
+        )
+
+    def _answer_row(self, answer_response: AnswerResponse) -> dict[str, Any]:
+        """Build the conversations table row of an answer.
+
+        Args:
+            answer_response (AnswerResponse): The answer.
+
+        Returns:
+            dict[str, Any]: The row, projected from the service response when available.
+        """
+        if answer_response.source is None:
+            return answer_response.model_dump()
+
+        return self._row_projector.project(
+            answer_response.source,
+            question=answer_response.question,
+            markdown=answer_response.markdown,
+            latency=answer_response.latency,
+            cached=answer_response.cached,
+            coalesced=answer_response.coalesced,
+            timings=[timing.model_dump() for timing in answer_response.timings],
+        )
+
+    async def _bq_insert_rows(
+        self,
+        table: str,
+        rows: list[dict[str, Any]],
+        row_ids: list[str] | None = None,
+    ) -> list[dict[str, Any]] | None:
+        """Insert rows into a BigQuery table with a streaming insert.
+
+        Args:
+            table (str): The full BigQuery table name.
+            rows (list[dict[str, Any]]): The rows to insert.
+            row_ids (list[str], optional): The insert IDs used by BigQuery to deduplicate
+                rows. Defaults to None for random IDs.
 
+        Returns:
+            list[dict] | None: A list of errors, if any occurred.
         """
         # Start the timer.
         start_time = time.time()
 
-        # Choose the table to insert the data.
-        table = self._feedback_table if feedback else self._table
-
         # Insert the rows into the BigQuery table.
         errors = await asyncio.to_thread(
             self._bq_client.insert_rows_json,
             table=table,
-            json_rows=[data],
+            json_rows=rows,
+            row_ids=row_ids,
         )
 
         # Log the insert time.
-        logger.info(f"Insert row latency: {time.time() - start_time:.4f} seconds.")
+        logger.info(
+            f"Insert {len(rows)} rows latency: {time.time() - start_time:.4f} seconds."
+        )
 
         return errors
 
+    async def startup(self) -> None:
+        """Start the background tasks and the startup warm-up.
+        Called from the FastAPI lifespan.
+        """
+        await self._bq_writer.start()
+        if self._warm_up is not None:
+            self._warm_up.start()
+        self._metrics_collector.start()
+        if self._loop_watchdog is not None:
+            self._loop_watchdog.start()
+
+        return
+
+    async def shutdown(self) -> None:
+        """Stop the background tasks, writing any queued BigQuery rows, and close the
+        Discovery Engine channels. Called from the FastAPI lifespan.
+        """
+        await self._metrics_collector.stop()
+        if self._loop_watchdog is not None:
+            await self._loop_watchdog.stop()
+        if self._warm_up is not None:
+            await self._warm_up.stop()
+        await self._bq_writer.stop()
+        await self._vais_handler.close()
+
+        return
 
-utils = UtilHandler(log_level=os.getenv("LOG_LEVEL", "INFO").upper())
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+
+logger = logging.getLogger(__name__)
+
+WarmUpStep = Callable[[], Awaitable[None]]
+
+
+class WarmUpResult:
+    """The outcome of a warm-up step."""
+
+    __slots__ = ("name", "seconds", "error")
+
+    def __init__(self, name: str, seconds: float, error: str | None = None) -> None:
+        self.name = name
+        self.seconds = seconds
+        self.error = error
+
+
+class WarmUp:
+    """Run the startup warm-up steps in the background and track readiness.
+
+    Each step sets up a connection or token that the first request would otherwise pay
+    for. The steps run in order, each with a timeout, and are timed and logged. A step
+    that fails or times out is logged and skipped, since the request path sets it up
+    again on demand. The warm-up is ready once every step has finished.
+    """
+
+    def __init__(
+        self,
+        steps: dict[str, WarmUpStep],
+        timeout_seconds: float = 30.0,
+    ) -> None:
+        """Initialize the WarmUp class.
+
+        Args:
+            steps (dict[str, WarmUpStep]): The coroutine functions of the steps, by
+                name, in the order they run.
+            timeout_seconds (float, optional): The time limit of each step.
+                Defaults to 30.0.
+        """
+        self._steps = steps
+        self._timeout_seconds = timeout_seconds
+        self._results: list[WarmUpResult] = []
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+        return
+
+    @property
+    def ready(self) -> bool:
+        """Whether every warm-up step has finished."""
+        return self._ready.is_set()
+
+    @property
+    def results(self) -> list[WarmUpResult]:
+        """The results of the finished steps."""
+        return list(self._results)
+
+    def start(self) -> None:
+        """Start the warm-up in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+        return
+
+    async def stop(self) -> None:
+        """Cancel the warm-up if it is still running."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        return
+
+    async def wait(self) -> None:
+        """Wait until every warm-up step has finished."""
+        await self._ready.wait()
+
+        return
+
+    async def run(self) -> None:
+        """Run the warm-up steps in order and mark the warm-up ready."""
+        start_time = time.perf_counter()
+        for name, step in self._steps.items():
+            self._results.append(await self._run_step(name, step))
+
+        self._ready.set()
+        logger.info(
+            f"Warm-up complete: {time.perf_counter() - start_time:.4f} seconds."
+        )
+
+        return
+
+    async def _run_step(self, name: str, step: WarmUpStep) -> WarmUpResult:
+        """Run and time a warm-up step."""
+        start_time = time.perf_counter()
+        error: str | None = None
+        try:
+            await asyncio.wait_for(step(), timeout=self._timeout_seconds)
+
+        except asyncio.TimeoutError:
+            error = f"Timed out after {self._timeout_seconds} seconds."
+
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        seconds = time.perf_counter() - start_time
+        if error is None:
+            logger.info(f"Warm-up {name}: {seconds:.4f} seconds.")
+        else:
+            logger.warning(
+                f"Warm-up {name} failed after {seconds:.4f} seconds: {error}"
+            )
+
+        return WarmUpResult(name=name, seconds=seconds, error=error)
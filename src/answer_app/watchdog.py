@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+
+from answer_app.metrics import Counter
+from answer_app.metrics import Histogram
+
+
+logger = logging.getLogger(__name__)
+
+# The package whose frames name the blocking site, in preference to library frames.
+APP_PACKAGE = "answer_app"
+
+
+def blocking_site(frame: FrameType) -> str:
+    """Name the code that holds the event loop, from the stack of the loop thread.
+
+    Args:
+        frame (FrameType): The innermost frame of the loop thread.
+
+    Returns:
+        str: "module:function" of the innermost app frame, or of the innermost frame
+        if no app code is on the stack.
+    """
+    innermost = frame
+    current: FrameType | None = frame
+    while current is not None:
+        module = current.f_globals.get("__name__", "")
+        if module == APP_PACKAGE or module.startswith(f"{APP_PACKAGE}."):
+            return f"{module}:{current.f_code.co_name}"
+        current = current.f_back
+
+    return f"{innermost.f_globals.get('__name__', '?')}:{innermost.f_code.co_name}"
+
+
+class LoopWatchdog:
+    """Detect code that blocks the event loop and capture its stack.
+
+    A heartbeat callback runs on the event loop every interval. A watchdog thread
+    checks the time of the last heartbeat. When the loop has not run the heartbeat for
+    longer than the threshold, the thread logs the stack of the loop thread, which is
+    the code holding the loop. When the loop runs the heartbeat again, the length of the
+    stall is recorded in the histogram and counted by blocking site in the counter.
+    """
+
+    def __init__(
+        self,
+        blocked_seconds: Histogram,
+        blocked_sites: Counter,
+        threshold_seconds: float = 0.1,
+        interval_seconds: float = 0.02,
+    ) -> None:
+        """Initialize the LoopWatchdog class.
+
+        Args:
+            blocked_seconds (Histogram): The histogram of the stall durations.
+            blocked_sites (Counter): The counter of stalls by blocking site.
+            threshold_seconds (float, optional): The shortest stall to report.
+                Defaults to 0.1.
+            interval_seconds (float, optional): The time between heartbeats and
+                between checks of the watchdog thread. Defaults to 0.02.
+        """
+        if threshold_seconds <= 0:
+            raise ValueError(
+                f"threshold_seconds must be positive, got {threshold_seconds}"
+            )
+        if interval_seconds <= 0:
+            raise ValueError(
+                f"interval_seconds must be positive, got {interval_seconds}"
+            )
+
+        self._blocked_seconds = blocked_seconds
+        self._blocked_sites = blocked_sites
+        self._threshold_seconds = threshold_seconds
+        self._interval_seconds = interval_seconds
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._handle: asyncio.TimerHandle | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._last_beat = 0.0
+        # The heartbeat time and blocking site of the stall the thread reported.
+        self._reported: tuple[float, str] | None = None
+
+        return
+
+    def start(self) -> None:
+        """Start the heartbeat on the running event loop and the watchdog thread."""
+        if self._thread is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._handle = self._loop.call_later(self._interval_seconds, self._beat)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            f"Event loop watchdog started with a {self._threshold_seconds * 1e3:.0f} ms "
+            f"threshold."
+        )
+
+        return
+
+    async def stop(self) -> None:
+        """Stop the heartbeat and the watchdog thread."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._thread is not None:
+            self._stopped.set()
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+        return
+
+    def _beat(self) -> None:
+        """Record a late heartbeat as a stall, and schedule the next heartbeat."""
+        now = time.monotonic()
+        blocked = now - self._last_beat - self._interval_seconds
+        if blocked >= self._threshold_seconds:
+            reported = self._reported
+            if reported is not None and reported[0] == self._last_beat:
+                site = reported[1]
+            else:
+                site = "unknown"
+            self._blocked_seconds.observe(blocked)
+            self._blocked_sites.inc(site)
+            logger.warning(
+                f"Event loop was blocked for {blocked * 1e3:.0f} ms in {site}."
+            )
+
+        self._last_beat = now
+        if self._loop is not None:
+            self._handle = self._loop.call_later(self._interval_seconds, self._beat)
+
+        return
+
+    def _watch(self) -> None:
+        """Log the stack of the loop thread once for each stall over the threshold."""
+        reported_beat: float | None = None
+        while not self._stopped.wait(self._interval_seconds):
+            last_beat = self._last_beat
+            blocked = time.monotonic() - last_beat - self._interval_seconds
+            if blocked < self._threshold_seconds or last_beat == reported_beat:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported_beat = last_beat
+            site = blocking_site(frame)
+            self._reported = (last_beat, site)
+            stack = "".join(traceback.format_stack(frame))
+            del frame
+            logger.warning(
+                f"Event loop blocked for {blocked * 1e3:.0f} ms so far in {site}:\n"
+                f"{stack}"
+            )
+
+        return
@@ -1,5 +1,4 @@
 import asyncio
-import base64
 import json
 import logging
 import os
@@ -156,37 +155,37 @@ async def form_submission() -> None:
             }
             logger.debug(f"Data:\n{json.dumps(data, indent=2)}")
 
+            # Ask for raw markdown and only the fields used here.
             response: dict[str, Any] = await utils.send_request(
                 route=route,
                 data=data,
                 method="POST",
+                params={"format": "markdown", "fields": "minimal"},
             )
             logger.debug(f"Response:\n{json.dumps(response, indent=2)}")
 
-            # Get the encoded markdown-formatted answer from the backend.
+            # Get the markdown-formatted answer from the backend.
             try:
-                encoded_markdown = response["markdown"]
+                markdown = response["markdown"]
             except KeyError:
                 logger.error("No markdown returned.")
                 st.error("No markdown returned.")
-                encoded_markdown = ""
+                markdown = ""
 
-            # Decode it and escape dollar signs to prevent rendering as MathJax or LaTeX.
-            decoded_markdown = (
-                base64.b64decode(encoded_markdown).decode("utf-8").replace("$", "\\$")
-            )
+            # Escape dollar signs to prevent rendering as MathJax or LaTeX.
+            escaped_markdown = markdown.replace("$", "\\$")
 
             # Display the formatted answer and update the chat history.
-            message_placeholder.markdown(decoded_markdown)
+            message_placeholder.markdown(escaped_markdown)
             st.session_state["chat_history"].append(
-                {"type": "assistant", "content": decoded_markdown}
+                {"type": "assistant", "content": escaped_markdown}
             )
 
             # Write it to a local file for offline debugging.
             if os.getenv("LOCAL_DEBUG"):
                 with open(".log/answer.md", "w") as f:
                     logger.debug(f"Writing markdown to .log/answer.md...")
-                    f.write(decoded_markdown)
+                    f.write(escaped_markdown)
 
             # Get the answer text and update the session state.
             try:
@@ -306,10 +305,13 @@ async def main() -> None:
         st.stop()
 
     logger.debug("User logged in.")
-    await initialize()
-    display_chat_history()
-    await form_submission()
-    await user_feedback()
+
+    # Trace the rerun, so its requests to the backend share a trace.
+    with utils.trace_span("streamlit.rerun"):
+        await initialize()
+        display_chat_history()
+        await form_submission()
+        await user_feedback()
 
     # Log the final session state.
     logger.info(
@@ -1,6 +1,7 @@
+from contextlib import nullcontext
 import logging
 import os
-from typing import Any
+from typing import Any, ContextManager
 
 from dotenv import load_dotenv
 import google.auth
@@ -12,6 +13,26 @@ import httpx
 
 logger = logging.getLogger(__name__)
 
+# The content codings httpx can decode. Brotli needs the brotli package.
+try:
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    ACCEPT_ENCODING = "gzip"
+
+# Trace context propagation to the backend. Needs the opentelemetry-api package. Spans
+# are recorded when an OpenTelemetry SDK is configured from the OTEL_* environment
+# variables, such as by running the app with opentelemetry-instrument.
+try:
+    from opentelemetry import propagate
+    from opentelemetry import trace
+
+    tracer = trace.get_tracer(__name__)
+except ImportError:
+    propagate = None
+    tracer = None
+
 
 class UtilHandler:
     """A utility handler class.
@@ -182,11 +203,31 @@ class UtilHandler:
 
         return
 
+    def trace_span(
+        self,
+        name: str,
+        attributes: dict[str, Any] | None = None,
+    ) -> ContextManager[Any]:
+        """Trace the code inside the context as a span, if OpenTelemetry is installed.
+
+        Args:
+            name (str): The span name.
+            attributes (dict, optional): The span attributes. Defaults to None.
+
+        Returns:
+            ContextManager[Any]: The span context manager.
+        """
+        if tracer is None:
+            return nullcontext()
+
+        return tracer.start_as_current_span(name, attributes=attributes)
+
     async def send_request(
         self,
         route: str,
         data: dict[str, Any] | None = None,
         method: str = "POST",
+        params: dict[str, Any] | None = None,
     ) -> dict[str, Any]:
         """Send a request to the answer-app Cloud Run backend service.
 
@@ -195,6 +236,8 @@ class UtilHandler:
             data (dict, optional): The data to send in the request. Passed as the body
                 for POST and as query parameters for GET requests. Defaults to None.
             method (str, optional): The HTTP method to use. Defaults to "POST".
+            params (dict, optional): Query parameters for POST requests, e.g.
+                {"format": "markdown"} for /answer. Defaults to None.
 
         Returns:
             dict: The response from the Discovery Engine API.
@@ -205,20 +248,31 @@ class UtilHandler:
         headers = {
             "Authorization": f"Bearer {self.id_token}",
             "Content-Type": "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING,
         }
         logger.debug(f"Headers: {headers}")
         logger.info(f"Request data: {data}")
 
-        async with httpx.AsyncClient() as client:
-            match method:
-                case "POST":
-                    response = await client.post(url, headers=headers, json=data)
-                case "GET":
-                    response = await client.get(url, headers=headers, params=data)
-                case _:
-                    message = f"Unsupported method: {method}"
-                    logger.error(message)
-                    return {"error": message}
+        with self.trace_span(
+            f"send_request {method} {route}",
+            attributes={"http.request.method": method, "url.full": url},
+        ):
+            # Send the trace context, so the backend continues the trace.
+            if propagate is not None:
+                propagate.inject(headers)
+
+            async with httpx.AsyncClient() as client:
+                match method:
+                    case "POST":
+                        response = await client.post(
+                            url, headers=headers, json=data, params=params
+                        )
+                    case "GET":
+                        response = await client.get(url, headers=headers, params=data)
+                    case _:
+                        message = f"Unsupported method: {method}"
+                        logger.error(message)
+                        return {"error": message}
 
         logger.info(f"Response status code: {response.status_code}")
 
@@ -0,0 +1,172 @@
+import subprocess
+import sys
+from typing import NamedTuple
+
+import click
+
+DEFAULT_MODULE: str = "answer_app.main"
+DEFAULT_TOP: int = 25
+# The cold-start import budget of answer_app.main, checked by the test suite. The
+# import takes about 0.7-1.0 seconds, so the budget leaves headroom for slower runners
+# but fails when a change adds an eager import of a large client library.
+IMPORT_BUDGET_SECONDS: float = 1.3
+
+
+class ImportTime(NamedTuple):
+    """The import time of a module reported by python -X importtime."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> list[ImportTime]:
+    """Parse the python -X importtime report.
+
+    Each report line looks like
+    "import time:       517 |      63107 |     google.auth.transport.grpc",
+    with the nesting depth shown by the indentation of the module name.
+
+    Args:
+        output: The standard error of the python -X importtime process.
+
+    Returns:
+        The import time of each module, in import completion order.
+    """
+    times: list[ImportTime] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # Skip the header line.
+            continue
+        name = fields[2].rstrip()
+        module = name.lstrip()
+        times.append(
+            ImportTime(
+                module=module,
+                self_us=int(fields[0]),
+                cumulative_us=int(fields[1]),
+                depth=(len(name) - len(module) - 1) // 2,
+            )
+        )
+
+    return times
+
+
+def profile_imports(module: str = DEFAULT_MODULE) -> list[ImportTime]:
+    """Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module: The module to import.
+
+    Returns:
+        The import time of each module imported.
+
+    Raises:
+        RuntimeError: If the import fails.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    return parse_importtime(result.stderr)
+
+
+def import_seconds(times: list[ImportTime], module: str = DEFAULT_MODULE) -> float:
+    """Return the cumulative import time of a module.
+
+    Args:
+        times: The import times from profile_imports.
+        module: The module.
+
+    Returns:
+        The cumulative import time of the module in seconds.
+
+    Raises:
+        ValueError: If the module is not in the import times.
+    """
+    for time in times:
+        if time.module == module:
+            return time.cumulative_us / 1e6
+
+    raise ValueError(f"{module} not found in the import times")
+
+
+def format_table(
+    times: list[ImportTime],
+    top: int = DEFAULT_TOP,
+    sort: str = "cumulative",
+) -> str:
+    """Format the slowest imports as a table.
+
+    Args:
+        times: The import times from profile_imports.
+        top: The number of rows.
+        sort: "cumulative" or "self".
+
+    Returns:
+        The table.
+    """
+    key = "cumulative_us" if sort == "cumulative" else "self_us"
+    rows = sorted(times, key=lambda time: getattr(time, key), reverse=True)[:top]
+    width = max([len("module")] + [len(time.module) for time in rows])
+    lines = [f"{'module':<{width}}  {'self ms':>9}  {'cumulative ms':>13}"]
+    lines += [
+        f"{time.module:<{width}}  {time.self_us / 1e3:>9.1f}  "
+        f"{time.cumulative_us / 1e3:>13.1f}"
+        for time in rows
+    ]
+
+    return "\n".join(lines)
+
+
+@click.command(help="Print the slowest imports of a module, from python -X importtime.")
+@click.option(
+    "--module",
+    "-m",
+    default=DEFAULT_MODULE,
+    help=f"Module to import (default: {DEFAULT_MODULE}).",
+)
+@click.option(
+    "--top",
+    "-n",
+    default=DEFAULT_TOP,
+    type=int,
+    help=f"Number of modules to show (default: {DEFAULT_TOP}).",
+)
+@click.option(
+    "--sort",
+    "-s",
+    default="cumulative",
+    type=click.Choice(["cumulative", "self"]),
+    help="Sort by cumulative or self import time (default: cumulative).",
+)
+@click.option(
+    "--budget",
+    "-b",
+    default=None,
+    type=float,
+    help="Exit with an error if the import takes longer than this many seconds.",
+)
+def run(module: str, top: int, sort: str, budget: float | None) -> None:
+    """Print the slowest imports of a module, from python -X importtime."""
+    try:
+        times = profile_imports(module=module)
+    except RuntimeError as e:
+        raise click.ClickException(str(e)) from e
+
+    seconds = import_seconds(times, module=module)
+    click.echo(format_table(times, top=top, sort=sort))
+    click.echo(f"\nImported {module} in {seconds:.3f} seconds ({len(times)} modules).")
+
+    if budget is not None and seconds > budget:
+        raise click.ClickException(
+            f"Import time {seconds:.3f} seconds is over the {budget} second budget."
+        )
@@ -27,11 +27,13 @@ resource "google_cloud_run_v2_service" "run_app" {
         cpu_idle = true
       }
 
+      # Route traffic to the instance only after the startup warm-up.
       startup_probe {
-        timeout_seconds   = 30
-        period_seconds    = 180
-        failure_threshold = 1
-        tcp_socket {
+        timeout_seconds   = 2
+        period_seconds    = 2
+        failure_threshold = 60
+        http_get {
+          path = "/readyz"
           port = 8080
         }
       }
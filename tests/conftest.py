@@ -44,10 +44,7 @@ def pytest_configure(config: Any) -> None:
     config._load_dotenv_patch = patch("client.utils.load_dotenv")
     config._load_dotenv_patch.start()
 
-    # Mock the module-level singleton instances that get created during import
-    config._answer_app_utils_patch = patch("answer_app.utils.utils")
-    config._answer_app_utils_patch.start()
-
+    # Mock the module-level singleton instance that gets created during import
     config._client_utils_patch = patch("client.utils.utils")
     config._client_utils_patch.start()
 
@@ -70,16 +67,92 @@ def pytest_unconfigure(config: Any) -> None:
 # google.auth.default() during import. The imports are done inside individual fixtures.
 
 
+# Fixtures shared by the response, projection and BigQuery tests
+@pytest.fixture
+def sample_answer_query_response() -> Any:
+    """Return an AnswerQueryResponse with a cited answer, a reference and a session."""
+    from google.cloud.discoveryengine_v1.types import Answer
+    from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+    from google.cloud.discoveryengine_v1.types import Session
+
+    return AnswerQueryResponse(
+        answer=Answer(
+            name="test-answer",
+            state=Answer.State.SUCCEEDED,
+            answer_text="Test answer.",
+            citations=[
+                Answer.Citation(
+                    start_index=0,
+                    end_index=12,
+                    sources=[Answer.CitationSource(reference_id="0")],
+                )
+            ],
+            references=[
+                Answer.Reference(
+                    chunk_info=Answer.Reference.ChunkInfo(
+                        content="Test content",
+                        relevance_score=0.5,
+                        document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                            uri="gs://test-bucket/test.pdf",
+                            title="Test title",
+                            struct_data={"key": "value"},
+                        ),
+                    )
+                )
+            ],
+            related_questions=["Related?"],
+            create_time={"seconds": 1700000000, "nanos": 123456000},
+            answer_skipped_reasons=[
+                Answer.AnswerSkippedReason.OUT_OF_DOMAIN_QUERY_IGNORED
+            ],
+        ),
+        session=Session(name="test-session", user_pseudo_id="test-user"),
+        answer_query_token="test-token",
+    )
+
+
 # Fixtures for test_main.py
 @pytest.fixture
 def mock_util_handler_methods() -> Generator[MagicMock, None, None]:
-    """Mock the methods of UtilHandler class instance answer_app.main.utils."""
-    with patch("answer_app.main.utils") as mock_utils:
+    """Mock the UtilHandler class instance injected into the answer_app.main routes."""
+    from answer_app.main import app, get_utils
+
+    with patch("answer_app.main.UtilHandler") as mock_util_handler:
+        mock_utils = mock_util_handler.return_value
         mock_utils.answer_query = AsyncMock()
+        mock_utils.stream_answer_query = MagicMock()
         mock_utils.get_user_sessions = AsyncMock()
         mock_utils.delete_session = AsyncMock()
-        mock_utils.bq_insert_row_data = AsyncMock()
+        mock_utils.bq_enqueue_row_data = MagicMock(return_value=True)
+        mock_utils.bq_enqueue_answer = MagicMock(return_value=True)
+        app.dependency_overrides[get_utils] = lambda: mock_utils
         yield mock_utils
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def rendered_answer_response(sample_answer_query_response: Any) -> Any:
+    """Return an AnswerResponse of the sample response, rendered from raw markdown."""
+    from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+    from answer_app.model import AnswerResponse
+    from answer_app.render import RenderedAnswer
+
+    rendered = RenderedAnswer("**Paris** <script>")
+    response_dict = AnswerQueryResponse.to_dict(
+        sample_answer_query_response, use_integers_for_enums=False
+    )
+    answer_response = AnswerResponse(
+        question="What is the capital of France?",
+        markdown=rendered.base64,
+        latency=0.1,
+        answer=response_dict["answer"],
+        session=response_dict["session"],
+        answer_query_token=response_dict["answer_query_token"],
+    )
+    answer_response.set_rendered(rendered)
+
+    return answer_response
 
 
 @pytest.fixture
@@ -89,6 +162,14 @@ def patch_my_env_var() -> Generator[None, None, None]:
         yield
 
 
+@pytest.fixture
+def patch_profiling_enabled() -> Generator[str, None, None]:
+    """Enable the /debug/profile route and return its token."""
+    token = "test-profile-token"
+    with patch.dict(os.environ, {"ENABLE_PROFILING": "true", "PROFILE_TOKEN": token}):
+        yield token
+
+
 # Fixtures for test_utils.py
 @pytest.fixture
 def mock_answer_app_util_handler() -> Any:
@@ -108,7 +189,10 @@ def mock_answer_app_util_handler() -> Any:
             "table_id": "test-table",
             "feedback_table_id": "test-feedback-table",
         }
-        return AnswerAppUtilHandler(log_level="DEBUG")
+        handler = AnswerAppUtilHandler(log_level="DEBUG")
+        handler._vais_handler.close = AsyncMock()
+        handler._vais_handler.warm_up = AsyncMock()
+        return handler
 
 
 # Fixtures for test_discoveryengine_utils.py
@@ -0,0 +1,166 @@
+from typing import Any
+
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+import pytest
+
+from answer_app.bq_projector import RowProjector
+from answer_app.bq_storage import RowEncoder
+from answer_app.bq_storage import load_schema
+from answer_app.model import ANSWER_ROW_COLUMNS
+
+
+def _projector() -> RowProjector:
+    return RowProjector(
+        schema=load_schema("schema.json"),
+        message_type=AnswerQueryResponse,
+        extra_columns=ANSWER_ROW_COLUMNS,
+    )
+
+
+def test_project(sample_answer_query_response: AnswerQueryResponse) -> None:
+    row = _projector().project(
+        sample_answer_query_response,
+        question="Test question?",
+        markdown="VGVzdA==",
+        latency=1.5,
+        cached=False,
+        coalesced=True,
+        timings=[{"name": "discoveryengine", "seconds": 1.5}],
+    )
+
+    assert list(row)[:6] == list(ANSWER_ROW_COLUMNS)
+    assert row["question"] == "Test question?"
+    assert row["latency"] == 1.5
+    assert row["cached"] is False
+    assert row["coalesced"] is True
+    assert row["timings"] == [{"name": "discoveryengine", "seconds": 1.5}]
+    answer = row["answer"]
+    assert answer["state"] == "SUCCEEDED"
+    assert answer["citations"] == [
+        {"start_index": 0, "end_index": 12, "sources": [{"reference_id": "0"}]}
+    ]
+    chunk_info = answer["references"][0]["chunk_info"]
+    assert chunk_info["relevance_score"] == 0.5
+    assert chunk_info["document_metadata"]["struct_data"] == {"key": "value"}
+    # Unset NULLABLE records are left out.
+    assert "unstructured_document_info" not in answer["references"][0]
+    assert "query_understanding_info" not in answer
+    assert "complete_time" not in answer
+    assert answer["create_time"] == "2023-11-14T22:13:20.123456Z"
+    assert answer["related_questions"] == ["Related?"]
+    assert answer["answer_skipped_reasons"] == ["OUT_OF_DOMAIN_QUERY_IGNORED"]
+    assert row["session"]["name"] == "test-session"
+    assert row["session"]["turns"] == []
+    assert row["answer_query_token"] == "test-token"
+
+
+def test_project_matches_to_dict(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    response = sample_answer_query_response
+    full: dict[str, Any] = AnswerQueryResponse.to_dict(
+        response, use_integers_for_enums=False
+    )
+
+    row = _projector().project(response, question="q", markdown="m", latency=1.0)
+
+    # Apart from integers, which to_dict encodes as strings, the row holds the
+    # schema columns of the full dictionary.
+    citation = full["answer"]["citations"][0]
+    citation.update(start_index=0, end_index=12)
+    assert row["answer"]["citations"] == full["answer"]["citations"]
+    assert row["answer"]["references"][0]["chunk_info"] == {
+        key: value
+        for key, value in full["answer"]["references"][0]["chunk_info"].items()
+        if key in row["answer"]["references"][0]["chunk_info"]
+    }
+    assert row["session"] == {
+        key: value for key, value in full["session"].items() if key in row["session"]
+    }
+
+
+def test_project_rows_encode_for_storage_write(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    encoder = RowEncoder(schema=load_schema("schema.json"))
+    row = _projector().project(
+        sample_answer_query_response,
+        question="q",
+        markdown="m",
+        latency=1.0,
+        cached=True,
+        timings=[{"name": "render", "seconds": 0.002}],
+    )
+
+    message = encoder.message_class()
+    message.ParseFromString(encoder.encode(row))
+
+    assert message.cached
+    assert not message.HasField("coalesced")
+    assert message.answer.citations[0].end_index == 12
+    assert message.timings[0].name == "render"
+    assert message.timings[0].seconds == 0.002
+    assert message.answer.create_time == 1700000000123456
+
+
+def test_project_missing_required_values(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    projector = _projector()
+
+    with pytest.raises(ValueError, match="'question'"):
+        projector.project(sample_answer_query_response, markdown="m", latency=1.0)
+
+    with pytest.raises(ValueError, match="'answer'"):
+        projector.project(
+            AnswerQueryResponse(answer_query_token="token"),
+            question="q",
+            markdown="m",
+            latency=1.0,
+        )
+
+
+@pytest.mark.parametrize(
+    "schema,message",
+    [
+        (
+            [{"name": "not_a_field", "type": "STRING", "mode": "NULLABLE"}],
+            "'not_a_field' is not a field",
+        ),
+        (
+            [{"name": "answer_query_token", "type": "INTEGER", "mode": "NULLABLE"}],
+            "cannot hold",
+        ),
+        (
+            [{"name": "answer_query_token", "type": "STRING", "mode": "REPEATED"}],
+            "not repeated",
+        ),
+        (
+            [
+                {
+                    "name": "answer_query_token",
+                    "type": "RECORD",
+                    "mode": "NULLABLE",
+                    "fields": [],
+                }
+            ],
+            "not a message",
+        ),
+        (
+            [
+                {
+                    "name": "answer",
+                    "type": "RECORD",
+                    "mode": "NULLABLE",
+                    "fields": [{"name": "state", "type": "BOOLEAN"}],
+                }
+            ],
+            "'answer.state'",
+        ),
+    ],
+)
+def test_schema_mismatch_fails_at_compile_time(
+    schema: list[dict[str, Any]], message: str
+) -> None:
+    with pytest.raises(ValueError, match=message):
+        RowProjector(schema=schema, message_type=AnswerQueryResponse)
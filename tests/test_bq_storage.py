@@ -0,0 +1,242 @@
+from typing import Any, AsyncIterator
+from unittest.mock import patch
+
+from google.cloud.bigquery_storage_v1 import types
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import json_format
+from google.protobuf import message_factory
+import pytest
+
+from answer_app.bq_storage import BigQueryStorageWriter
+from answer_app.bq_storage import RowEncoder
+from answer_app.bq_storage import load_schema
+
+
+TABLE = "test-project-id.test-dataset.test-table"
+FEEDBACK_TABLE = "test-project-id.test-dataset.test-feedback-table"
+
+
+class FakeBigQueryWrite:
+    """A local stand-in for the BigQuery Write service.
+
+    Decodes appended rows with the writer schema sent in the request, as BigQuery does,
+    and rejects rows listed in invalid_rows.
+    """
+
+    def __init__(self, invalid_rows: set[int] | None = None) -> None:
+        self.invalid_rows = invalid_rows or set()
+        self.error: str | None = None
+        self.rows: dict[str, list[dict[str, Any]]] = {}
+        self.metadata: list[tuple[tuple[str, str], ...]] = []
+
+    async def append_rows(
+        self,
+        requests: AsyncIterator[types.AppendRowsRequest],
+        metadata: tuple[tuple[str, str], ...] = (),
+    ) -> AsyncIterator[types.AppendRowsResponse]:
+        self.metadata.append(metadata)
+        responses = [self._append(request) async for request in requests]
+
+        async def response_stream() -> AsyncIterator[types.AppendRowsResponse]:
+            for response in responses:
+                yield response
+
+        return response_stream()
+
+    def _append(self, request: types.AppendRowsRequest) -> types.AppendRowsResponse:
+        if self.error:
+            return types.AppendRowsResponse(error={"code": 14, "message": self.error})
+
+        serialized_rows = list(request.proto_rows.rows.serialized_rows)
+        row_errors = [
+            types.RowError(index=index, code=1, message="Invalid row")
+            for index in range(len(serialized_rows))
+            if index in self.invalid_rows
+        ]
+        if row_errors:
+            return types.AppendRowsResponse(
+                error={"code": 3, "message": "Invalid rows"},
+                row_errors=row_errors,
+            )
+
+        message_class = self._message_class(request.proto_rows.writer_schema)
+        rows = self.rows.setdefault(request.write_stream, [])
+        for serialized_row in serialized_rows:
+            message = message_class()
+            message.ParseFromString(serialized_row)
+            rows.append(
+                json_format.MessageToDict(message, preserving_proto_field_name=True)
+            )
+
+        return types.AppendRowsResponse(append_result={})
+
+    @staticmethod
+    def _message_class(writer_schema: types.ProtoSchema) -> Any:
+        file_proto = descriptor_pb2.FileDescriptorProto(
+            name="fake.proto", package="answer_app.bigquery", syntax="proto2"
+        )
+        file_proto.message_type.append(writer_schema.proto_descriptor)
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(file_proto)
+        descriptor = pool.FindMessageTypeByName(
+            f"answer_app.bigquery.{writer_schema.proto_descriptor.name}"
+        )
+
+        return message_factory.GetMessageClass(descriptor)
+
+
+def _answer_row(response: AnswerQueryResponse) -> dict[str, Any]:
+    return {
+        "question": "Test question?",
+        "markdown": "VGVzdA==",
+        "latency": 1.5,
+        **AnswerQueryResponse.to_dict(response, use_integers_for_enums=False),
+    }
+
+
+def test_load_schema() -> None:
+    schema = load_schema("schema.json")
+    assert [field["name"] for field in schema][:3] == ["question", "markdown", "latency"]
+
+    with pytest.raises(FileNotFoundError):
+        load_schema("missing.json")
+
+
+def test_row_encoder_roundtrip(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    encoder = RowEncoder(schema=load_schema("schema.json"))
+
+    message = encoder.message_class()
+    message.ParseFromString(encoder.encode(_answer_row(sample_answer_query_response)))
+
+    assert message.question == "Test question?"
+    assert message.latency == 1.5
+    assert message.answer.state == "SUCCEEDED"
+    assert message.answer.citations[0].end_index == 12
+    assert message.answer.citations[0].sources[0].reference_id == "0"
+    metadata = message.answer.references[0].chunk_info.document_metadata
+    assert metadata.struct_data == '{"key": "value"}'
+    assert list(message.answer.related_questions) == ["Related?"]
+    assert message.answer.create_time == 1700000000123456
+    assert message.session.name == "test-session"
+    assert message.answer_query_token == "test-token"
+
+
+def test_row_encoder_descriptor_is_self_contained() -> None:
+    encoder = RowEncoder(schema=load_schema("schema.json"))
+
+    nested = {message.name for message in encoder.descriptor.nested_type}
+    assert {"AnswerRecord", "SessionRecord"} <= nested
+
+
+def test_row_encoder_missing_required_field() -> None:
+    encoder = RowEncoder(schema=load_schema("schema_feedback.json"))
+
+    with pytest.raises(Exception):
+        encoder.encode({"question": "Test question?"})
+
+
+@pytest.mark.asyncio
+async def test_insert_rows(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    fake = FakeBigQueryWrite()
+    writer = BigQueryStorageWriter(
+        schemas={
+            TABLE: load_schema("schema.json"),
+            FEEDBACK_TABLE: load_schema("schema_feedback.json"),
+        },
+        client=fake,
+    )
+    feedback = {
+        "answer_query_token": "test-token",
+        "question": "Test question?",
+        "answer_text": "Test answer.",
+        "feedback_value": 1,
+        "feedback_name": "THUMBS_UP",
+        "feedback_text": None,
+    }
+
+    row = _answer_row(sample_answer_query_response)
+    assert await writer.insert_rows(TABLE, [row, row]) == []
+    assert await writer.insert_rows(FEEDBACK_TABLE, [feedback], row_ids=["a"]) == []
+
+    stream = "projects/test-project-id/datasets/test-dataset/tables/test-table/streams/_default"
+    assert len(fake.rows[stream]) == 2
+    assert fake.rows[stream][0]["answer"]["answer_text"] == "Test answer."
+    assert fake.metadata[0] == (("x-goog-request-params", f"write_stream={stream}"),)
+
+    feedback_stream = stream.replace("test-table", "test-feedback-table")
+    assert fake.rows[feedback_stream] == [
+        {
+            "answer_query_token": "test-token",
+            "question": "Test question?",
+            "answer_text": "Test answer.",
+            "feedback_value": "1",
+            "feedback_name": "THUMBS_UP",
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_insert_rows_encoding_errors_are_invalid(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    fake = FakeBigQueryWrite()
+    writer = BigQueryStorageWriter(
+        schemas={TABLE: load_schema("schema.json")}, client=fake
+    )
+
+    row = _answer_row(sample_answer_query_response)
+    errors = await writer.insert_rows(TABLE, [{"question": "No answer"}, row])
+
+    assert [error["index"] for error in errors] == [0]
+    assert errors[0]["errors"][0]["reason"] == "invalid"
+    assert len(next(iter(fake.rows.values()))) == 1
+
+
+@pytest.mark.asyncio
+async def test_insert_rows_row_errors(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    fake = FakeBigQueryWrite(invalid_rows={1})
+    writer = BigQueryStorageWriter(
+        schemas={TABLE: load_schema("schema.json")}, client=fake
+    )
+
+    row = _answer_row(sample_answer_query_response)
+    errors = await writer.insert_rows(TABLE, [{"question": "No answer"}, row, row])
+
+    # Row 0 fails to encode, so BigQuery's row 1 is the input row 2.
+    reasons = {error["index"]: error["errors"][0]["reason"] for error in errors}
+    assert reasons == {0: "invalid", 1: "stopped", 2: "invalid"}
+    assert fake.rows == {}
+
+
+@pytest.mark.asyncio
+async def test_insert_rows_request_error(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    fake = FakeBigQueryWrite()
+    fake.error = "Unavailable"
+    writer = BigQueryStorageWriter(
+        schemas={TABLE: load_schema("schema.json")}, client=fake
+    )
+
+    with pytest.raises(RuntimeError, match="Unavailable"):
+        await writer.insert_rows(TABLE, [_answer_row(sample_answer_query_response)])
+
+
+def test_default_client() -> None:
+    with patch(
+        "answer_app.bq_storage.big_query_write.BigQueryWriteAsyncClient"
+    ) as mock_client:
+        writer = BigQueryStorageWriter(
+            schemas={TABLE: load_schema("schema.json")}, credentials="credentials"
+        )
+
+    mock_client.assert_called_once_with(credentials="credentials")
+    assert writer._client == mock_client.return_value
@@ -0,0 +1,360 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock
+
+import pytest
+
+from answer_app.bq_writer import BigQueryBatchWriter
+from answer_app.metrics import bigquery_insert_seconds
+from answer_app.metrics import bigquery_queue_depth
+from answer_app.metrics import bigquery_rows_dropped
+from answer_app.metrics import bigquery_rows_failed
+from answer_app.metrics import bigquery_rows_spilled
+from answer_app.spill import SpillLog
+
+
+def _inserted(insert_rows: AsyncMock) -> list[tuple[str, list[dict[str, Any]]]]:
+    """Return the (table, rows) of every insert call."""
+    return [(call.args[0], call.args[1]) for call in insert_rows.await_args_list]
+
+
+def test_invalid_overflow_policy() -> None:
+    with pytest.raises(ValueError):
+        BigQueryBatchWriter(insert_rows=AsyncMock(), overflow_policy="block")
+
+
+def test_spill_overflow_policy_requires_spill_log() -> None:
+    with pytest.raises(ValueError):
+        BigQueryBatchWriter(insert_rows=AsyncMock(), overflow_policy="spill")
+
+
+@pytest.mark.asyncio
+async def test_identical_rows_get_different_insert_ids() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(insert_rows=insert_rows)
+
+    # Two users sending the same feedback for a shared answer token.
+    writer.enqueue("feedback", {"answer_query_token": "token", "score": 1})
+    writer.enqueue("feedback", {"answer_query_token": "token", "score": 1})
+    await writer.stop()
+
+    rows, row_ids = insert_rows.await_args.args[1:]
+    assert rows[0] == rows[1]
+    assert len(set(row_ids)) == 2
+
+
+def test_enqueue_drop_newest() -> None:
+    writer = BigQueryBatchWriter(insert_rows=AsyncMock(), max_queue_rows=2)
+
+    assert writer.enqueue("table", {"n": 1})
+    assert writer.enqueue("table", {"n": 2})
+    assert not writer.enqueue("table", {"n": 3})
+
+    assert writer.queue_depth == 2
+    assert writer.stats()["rows_dropped"] == 1
+    assert writer.stats()["rows_enqueued"] == 2
+
+
+@pytest.mark.asyncio
+async def test_metrics(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    errors = [{"index": 0, "errors": [{"reason": "invalid", "message": "Invalid"}]}]
+    writer = BigQueryBatchWriter(
+        insert_rows=AsyncMock(return_value=errors),
+        max_queue_rows=2,
+        overflow_policy="spill",
+        spill_log=spill_log,
+    )
+    dropped = bigquery_rows_dropped.get()
+    spilled = bigquery_rows_spilled.get()
+    failed = bigquery_rows_failed.get()
+
+    for n in range(3):
+        writer.enqueue("table", {"n": n})
+    assert bigquery_queue_depth.value == 2
+    assert bigquery_rows_spilled.get() == spilled + 1
+
+    await writer.stop()
+    assert not writer.enqueue("table", {"n": 3})
+
+    assert bigquery_queue_depth.value == 0
+    assert bigquery_rows_failed.get() == failed + 1
+    assert bigquery_rows_dropped.get() == dropped + 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_drop_oldest() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(
+        insert_rows=insert_rows, max_queue_rows=2, overflow_policy="drop_oldest"
+    )
+
+    for n in range(3):
+        assert writer.enqueue("table", {"n": n})
+    await writer.stop()
+
+    assert writer.stats()["rows_dropped"] == 1
+    assert _inserted(insert_rows) == [("table", [{"n": 1}, {"n": 2}])]
+
+
+def test_enqueue_spill_on_overflow(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    writer = BigQueryBatchWriter(
+        insert_rows=AsyncMock(),
+        max_queue_rows=1,
+        overflow_policy="spill",
+        spill_log=spill_log,
+    )
+
+    assert writer.enqueue("table", {"n": 1})
+    assert writer.enqueue("table", {"n": 2})
+
+    records = spill_log.take()
+    assert [record["row"] for record in records] == [{"n": 2}]
+    assert records[0]["table"] == "table"
+    assert records[0]["insert_id"]
+    assert writer.stats()["rows_spilled"] == 1
+    assert writer.stats()["rows_dropped"] == 0
+
+
+@pytest.mark.asyncio
+async def test_deferred_rows_are_built_in_the_background() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(insert_rows=insert_rows)
+    calls: list[int] = []
+
+    def build_row() -> dict[str, Any]:
+        calls.append(1)
+        return {"n": 1}
+
+    def broken_row() -> dict[str, Any]:
+        raise ValueError("Bad row")
+
+    assert writer.enqueue("table", build_row)
+    assert writer.enqueue("table", broken_row)
+    assert calls == []
+    await writer.stop()
+
+    assert calls == [1]
+    assert _inserted(insert_rows) == [("table", [{"n": 1}])]
+    assert len(insert_rows.await_args.args[2]) == 1
+    assert writer.stats()["rows_failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_on_row_count() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(
+        insert_rows=insert_rows, max_batch_rows=2, max_batch_age_seconds=60
+    )
+    await writer.start()
+
+    writer.enqueue("table", {"n": 1})
+    writer.enqueue("table", {"n": 2})
+    await asyncio.sleep(0.01)
+
+    assert _inserted(insert_rows) == [("table", [{"n": 1}, {"n": 2}])]
+    assert len(set(insert_rows.await_args.args[2])) == 2
+    await writer.stop()
+    assert writer.stats()["rows_written"] == 2
+    assert writer.stats()["flushes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_on_byte_size() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(
+        insert_rows=insert_rows, max_batch_bytes=10, max_batch_age_seconds=60
+    )
+    await writer.start()
+
+    writer.enqueue("table", {"text": "more than ten bytes"})
+    await asyncio.sleep(0.01)
+
+    insert_rows.assert_awaited_once()
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_flush_on_age() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(insert_rows=insert_rows, max_batch_age_seconds=0.01)
+    await writer.start()
+
+    writer.enqueue("table", {"n": 1})
+    await asyncio.sleep(0)
+    insert_rows.assert_not_awaited()
+    await asyncio.sleep(0.05)
+
+    assert _inserted(insert_rows) == [("table", [{"n": 1}])]
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_batches_per_table() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(insert_rows=insert_rows, max_batch_age_seconds=60)
+    await writer.start()
+
+    writer.enqueue("conversations", {"n": 1})
+    writer.enqueue("feedback", {"n": 2})
+    writer.enqueue("conversations", {"n": 3})
+    await writer.stop()
+
+    assert dict(_inserted(insert_rows)) == {
+        "conversations": [{"n": 1}, {"n": 3}],
+        "feedback": [{"n": 2}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_and_rejects_new_rows() -> None:
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(insert_rows=insert_rows, max_batch_age_seconds=60)
+    await writer.start()
+
+    writer.enqueue("table", {"n": 1})
+    await writer.stop()
+
+    assert _inserted(insert_rows) == [("table", [{"n": 1}])]
+    assert not writer.enqueue("table", {"n": 2})
+    assert writer.stats()["queue_depth"] == 0
+    assert writer.stats()["buffered_rows"] == 0
+
+
+@pytest.mark.asyncio
+async def test_insert_errors_are_counted() -> None:
+    errors = [{"index": 0, "errors": [{"reason": "invalid", "message": "Invalid"}]}]
+    insert_rows = AsyncMock(return_value=errors)
+    writer = BigQueryBatchWriter(insert_rows=insert_rows)
+
+    writer.enqueue("table", {"n": 1})
+    writer.enqueue("table", {"n": 2})
+    await writer.stop()
+
+    assert writer.stats()["rows_failed"] == 1
+    assert writer.stats()["rows_written"] == 1
+
+
+@pytest.mark.asyncio
+async def test_insert_exception_is_contained() -> None:
+    insert_rows = AsyncMock(side_effect=Exception("Test exception"))
+    writer = BigQueryBatchWriter(insert_rows=insert_rows, max_batch_rows=1)
+    inserts = bigquery_insert_seconds.count
+    await writer.start()
+
+    writer.enqueue("table", {"n": 1})
+    await asyncio.sleep(0.01)
+    writer.enqueue("table", {"n": 2})
+    await writer.stop()
+
+    assert insert_rows.await_count == 2
+    assert writer.stats()["rows_failed"] == 2
+    # Failed inserts are part of the latency histogram.
+    assert bigquery_insert_seconds.count == inserts + 2
+    assert writer.stats()["flushes"] == 2
+    assert writer.stats()["last_flush_latency"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_failed_rows_are_spilled(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    errors = [
+        {"index": 0, "errors": [{"reason": "invalid", "message": "Invalid"}]},
+        {"index": 1, "errors": [{"reason": "stopped", "message": ""}]},
+    ]
+    insert_rows = AsyncMock(return_value=errors)
+    writer = BigQueryBatchWriter(insert_rows=insert_rows, spill_log=spill_log)
+
+    writer.enqueue("table", {"n": 1})
+    writer.enqueue("table", {"n": 2})
+    await writer.stop()
+
+    # The invalid row is dropped; the stopped row is spilled for replay, with the insert
+    # ID it was first inserted with.
+    records = spill_log.take()
+    assert [record["row"] for record in records] == [{"n": 2}]
+    assert records[0]["insert_id"] == insert_rows.await_args.args[2][1]
+    assert writer.stats()["rows_failed"] == 1
+    assert writer.stats()["rows_spilled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_insert_exception_spills_batch(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    insert_rows = AsyncMock(side_effect=Exception("Test exception"))
+    writer = BigQueryBatchWriter(insert_rows=insert_rows, spill_log=spill_log)
+
+    writer.enqueue("table", {"n": 1})
+    writer.enqueue("table", {"n": 2})
+    await writer.stop()
+
+    assert [record["row"] for record in spill_log.take()] == [{"n": 1}, {"n": 2}]
+    assert writer.stats()["rows_failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_replay_spill(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    spill_log.append(
+        [
+            {"table": "conversations", "insert_id": "a", "row": {"n": 1}, "attempts": 0},
+            {"table": "feedback", "insert_id": "b", "row": {"n": 2}, "attempts": 0},
+        ]
+    )
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(insert_rows=insert_rows, spill_log=spill_log)
+
+    await writer.replay_spill()
+
+    calls = {call.args[0]: call.args[1:] for call in insert_rows.await_args_list}
+    assert calls == {
+        "conversations": ([{"n": 1}], ["a"]),
+        "feedback": ([{"n": 2}], ["b"]),
+    }
+    assert writer.stats()["rows_replayed"] == 2
+    assert spill_log.take() == []
+
+
+@pytest.mark.asyncio
+async def test_replay_spill_failure_is_spilled_again(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    spill_log.append(
+        [
+            {"table": "table", "insert_id": "a", "row": {"n": 1}, "attempts": 0},
+            {"table": "table", "insert_id": "b", "row": {"n": 2}, "attempts": 1},
+        ]
+    )
+    insert_rows = AsyncMock(side_effect=Exception("Test exception"))
+    writer = BigQueryBatchWriter(
+        insert_rows=insert_rows, spill_log=spill_log, max_replay_attempts=2
+    )
+
+    await writer.replay_spill()
+
+    # The row at its last attempt is dropped, the other is spilled again.
+    records = spill_log.take()
+    assert [(record["insert_id"], record["attempts"]) for record in records] == [
+        ("a", 1)
+    ]
+    assert writer.stats()["rows_failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_start_replays_spill(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    spill_log.append(
+        [{"table": "table", "insert_id": "a", "row": {"n": 1}, "attempts": 0}]
+    )
+    insert_rows = AsyncMock(return_value=[])
+    writer = BigQueryBatchWriter(
+        insert_rows=insert_rows, spill_log=spill_log, replay_interval_seconds=60
+    )
+
+    await writer.start()
+    await asyncio.sleep(0.01)
+    await writer.stop()
+
+    assert _inserted(insert_rows) == [("table", [{"n": 1}])]
+    assert spill_log.size() == 0
@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+from google.cloud.discoveryengine_v1.types import Answer
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+
+from answer_app.cache import AnswerCache
+from answer_app.render import RenderedAnswer
+
+
+def test_make_key_normalizes_question() -> None:
+    key1 = AnswerCache.make_key(
+        query_text="  What is   the capital\nof France? ",
+        preamble="preamble",
+        model_version="model",
+        engine="engine",
+    )
+    key2 = AnswerCache.make_key(
+        query_text="what is the capital of france?",
+        preamble="preamble",
+        model_version="model",
+        engine="engine",
+    )
+    assert key1 == key2
+
+
+def test_make_key_includes_generation_settings() -> None:
+    key = AnswerCache.make_key(
+        query_text="question",
+        preamble="preamble",
+        model_version="model",
+        engine="engine",
+    )
+    assert key != AnswerCache.make_key(
+        query_text="question",
+        preamble="other-preamble",
+        model_version="model",
+        engine="engine",
+    )
+    assert key != AnswerCache.make_key(
+        query_text="question",
+        preamble="preamble",
+        model_version="other-model",
+        engine="engine",
+    )
+    assert key != AnswerCache.make_key(
+        query_text="question",
+        preamble="preamble",
+        model_version="model",
+        engine="other-engine",
+    )
+
+
+def test_get_miss_and_hit() -> None:
+    cache = AnswerCache(max_size=2, ttl_seconds=60)
+    rendered = RenderedAnswer("md")
+    assert cache.get(("a",)) is None
+
+    response = AnswerQueryResponse(
+        answer=Answer(answer_text="A"), answer_query_token="token-a"
+    )
+    cache.put(key=("a",), rendered=rendered, response=response)
+    entry = cache.get(("a",))
+
+    assert entry is not None
+    assert entry.rendered is rendered
+    assert entry.response is response
+    response_dict = entry.response_dict()
+    assert response_dict["answer"]["answer_text"] == "A"
+    assert response_dict["answer_query_token"] == "token-a"
+    # The dictionary is converted once and shared.
+    assert entry.response_dict() is response_dict
+    assert cache.stats() == {
+        "size": 1,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "expirations": 0,
+    }
+
+
+def test_lru_eviction() -> None:
+    cache = AnswerCache(max_size=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        cache.put(
+            key=(key,), rendered=RenderedAnswer(key), response=AnswerQueryResponse()
+        )
+
+    # Touch "a" so "b" becomes the least recently used entry.
+    assert cache.get(("a",)) is not None
+    cache.put(key=("c",), rendered=RenderedAnswer("c"), response=AnswerQueryResponse())
+
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None
+    assert cache.get(("c",)) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_ttl_expiration() -> None:
+    cache = AnswerCache(max_size=2, ttl_seconds=10)
+    with patch("answer_app.cache.time.monotonic", return_value=100.0):
+        cache.put(key=("a",), rendered=RenderedAnswer("a"), response=AnswerQueryResponse())
+    with patch("answer_app.cache.time.monotonic", return_value=109.0):
+        assert cache.get(("a",)) is not None
+    with patch("answer_app.cache.time.monotonic", return_value=110.0):
+        assert cache.get(("a",)) is None
+
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_zero_size_disables_storage() -> None:
+    cache = AnswerCache(max_size=0, ttl_seconds=60)
+    cache.put(key=("a",), rendered=RenderedAnswer("a"), response=AnswerQueryResponse())
+    assert cache.get(("a",)) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_clear() -> None:
+    cache = AnswerCache(max_size=2, ttl_seconds=60)
+    cache.put(key=("a",), rendered=RenderedAnswer("a"), response=AnswerQueryResponse())
+    cache.clear()
+    assert cache.get(("a",)) is None
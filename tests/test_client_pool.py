@@ -0,0 +1,183 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from google.api_core import exceptions
+import pytest
+
+from answer_app.client_pool import ClientPool
+from answer_app.metrics import client_pool_calls
+from answer_app.metrics import client_pool_channel_errors
+from answer_app.metrics import client_pool_ejections
+from answer_app.metrics import client_pool_healthy
+from answer_app.metrics import client_pool_in_flight
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _pool(size: int = 3, **kwargs) -> ClientPool[str]:
+    return ClientPool(client_factory=lambda index: f"client-{index}", size=size, **kwargs)
+
+
+def test_invalid_settings() -> None:
+    with pytest.raises(ValueError, match="size"):
+        _pool(size=0)
+
+    with pytest.raises(ValueError, match="selection"):
+        _pool(selection="random")
+
+
+def test_round_robin() -> None:
+    pool = _pool(selection="round_robin")
+
+    chosen = []
+    for _ in range(6):
+        with pool.acquire() as client:
+            chosen.append(client)
+
+    assert pool.clients == ["client-0", "client-1", "client-2"]
+    assert chosen == pool.clients * 2
+    assert [channel["calls"] for channel in pool.stats()["channels"]] == [2, 2, 2]
+
+
+def test_least_in_flight() -> None:
+    pool = _pool()
+
+    with pool.acquire() as first, pool.acquire() as second:
+        with pool.acquire() as third:
+            assert len({first, second, third}) == 3
+            assert pool.stats()["in_flight"] == 3
+        # The released channel is the only one without an in-flight call.
+        with pool.acquire() as fourth:
+            assert fourth == third
+
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_unhealthy_channel_is_skipped_until_recovered() -> None:
+    clock = FakeClock()
+    pool = _pool(
+        size=2,
+        selection="round_robin",
+        failure_threshold=2,
+        recovery_seconds=10.0,
+        clock=clock,
+    )
+
+    for _ in range(2):
+        with pytest.raises(exceptions.ServiceUnavailable):
+            with pool.acquire() as client:
+                assert client == "client-0"
+                raise exceptions.ServiceUnavailable("Connection reset")
+        # Skip client-1 on the round.
+        with pool.acquire():
+            pass
+
+    assert [channel["healthy"] for channel in pool.stats()["channels"]] == [False, True]
+    for _ in range(3):
+        with pool.acquire() as client:
+            assert client == "client-1"
+
+    clock.now = 10.0
+    chosen = set()
+    for _ in range(2):
+        with pool.acquire() as client:
+            chosen.add(client)
+    assert chosen == {"client-0", "client-1"}
+    assert pool.stats()["channels"][0]["failures"] == 2
+
+
+def test_request_errors_do_not_count_against_the_channel() -> None:
+    pool = _pool(size=1, failure_threshold=1)
+
+    with pytest.raises(exceptions.InvalidArgument):
+        with pool.acquire():
+            raise exceptions.InvalidArgument("Bad request")
+
+    assert pool.stats()["channels"][0]["failures"] == 0
+    assert pool.stats()["channels"][0]["healthy"]
+
+
+def test_success_resets_consecutive_failures() -> None:
+    pool = _pool(size=1, failure_threshold=2)
+
+    for _ in range(3):
+        with pytest.raises(exceptions.DeadlineExceeded):
+            with pool.acquire():
+                raise exceptions.DeadlineExceeded("Timeout")
+        with pool.acquire():
+            pass
+
+    assert pool.stats()["channels"][0]["failures"] == 3
+    assert pool.stats()["channels"][0]["healthy"]
+
+
+def test_metrics() -> None:
+    pool = _pool(size=2, selection="round_robin", failure_threshold=1)
+    calls = client_pool_calls.get("0")
+    errors = client_pool_channel_errors.get("0")
+    ejections = client_pool_ejections.get("0")
+
+    with pool.acquire(), pool.acquire():
+        assert client_pool_in_flight.get("0") == 1.0
+        assert client_pool_in_flight.get("1") == 1.0
+    assert client_pool_in_flight.get("0") == 0.0
+
+    with pytest.raises(exceptions.ServiceUnavailable):
+        with pool.acquire():
+            raise exceptions.ServiceUnavailable("Unavailable")
+    assert client_pool_healthy.get("0") == 0.0
+    assert client_pool_healthy.get("1") == 1.0
+    assert client_pool_calls.get("0") == calls + 2
+    assert client_pool_channel_errors.get("0") == errors + 1
+    assert client_pool_ejections.get("0") == ejections + 1
+
+    # Every channel is unhealthy, so the next call uses channel 0 and restores it.
+    with pytest.raises(exceptions.ServiceUnavailable):
+        with pool.acquire() as client:
+            assert client == "client-1"
+            raise exceptions.ServiceUnavailable("Unavailable")
+    with pool.acquire() as client:
+        assert client == "client-0"
+    assert client_pool_healthy.get("0") == 1.0
+    assert client_pool_healthy.get("1") == 0.0
+    assert pool.stats()["channels"][0]["healthy"]
+
+
+def test_all_unhealthy_channels_are_still_used() -> None:
+    pool = _pool(size=2, failure_threshold=1)
+
+    for _ in range(2):
+        with pytest.raises(exceptions.ServiceUnavailable):
+            with pool.acquire():
+                raise exceptions.ServiceUnavailable("Unavailable")
+
+    with pool.acquire() as client:
+        assert client in pool.clients
+
+
+@pytest.mark.asyncio
+async def test_close() -> None:
+    clients = [MagicMock() for _ in range(2)]
+    for client in clients:
+        client.transport.close = AsyncMock()
+    pool = ClientPool(client_factory=lambda index: clients[index], size=2)
+
+    await pool.close()
+
+    for client in clients:
+        client.transport.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_close_synchronous_transport() -> None:
+    client = MagicMock()
+    pool = ClientPool(client_factory=lambda index: client)
+
+    await pool.close()
+
+    client.transport.close.assert_called_once_with()
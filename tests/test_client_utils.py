@@ -1,4 +1,4 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from google.auth.exceptions import DefaultCredentialsError
 import pytest
@@ -105,6 +105,81 @@ async def test_send_request_success_post(
     assert httpx_mock.get_request().method == "POST"
 
 
+@pytest.mark.asyncio
+async def test_send_request_post_with_params(
+    mock_client_util_handler: UtilHandler,
+    httpx_mock: HTTPXMock,
+) -> None:
+    httpx_mock.add_response(
+        json={"markdown": "**Paris**"},
+        url="http://localhost:8888/answer?format=markdown",
+    )
+
+    response = await mock_client_util_handler.send_request(
+        route="/answer",
+        data={"question": "What is the capital of France?"},
+        method="POST",
+        params={"format": "markdown"},
+    )
+
+    assert response == {"markdown": "**Paris**"}
+    assert httpx_mock.get_request().url.params["format"] == "markdown"
+
+
+@pytest.mark.asyncio
+async def test_send_request_accepts_compressed_responses(
+    mock_client_util_handler: UtilHandler,
+    httpx_mock: HTTPXMock,
+) -> None:
+    httpx_mock.add_response(json={"markdown": "**Paris**"})
+
+    await mock_client_util_handler.send_request(
+        route="/answer", data={"question": "What is the capital of France?"}
+    )
+
+    # httpx decodes the Brotli and gzip responses.
+    assert httpx_mock.get_request().headers["Accept-Encoding"] == "br, gzip"
+
+
+@pytest.mark.asyncio
+async def test_send_request_propagates_trace_context(
+    mock_client_util_handler: UtilHandler,
+    httpx_mock: HTTPXMock,
+) -> None:
+    context = pytest.importorskip("opentelemetry.context")
+    trace = pytest.importorskip("opentelemetry.trace")
+    httpx_mock.add_response(json={"markdown": "**Paris**"})
+    span_context = trace.SpanContext(
+        trace_id=0x0AF7651916CD43DD8448EB211C80319C,
+        span_id=0xB7AD6B7169203331,
+        is_remote=False,
+        trace_flags=trace.TraceFlags(trace.TraceFlags.SAMPLED),
+    )
+
+    # The current span of a Streamlit rerun.
+    token = context.attach(
+        trace.set_span_in_context(trace.NonRecordingSpan(span_context))
+    )
+    try:
+        await mock_client_util_handler.send_request(
+            route="/answer", data={"question": "What is the capital of France?"}
+        )
+    finally:
+        context.detach(token)
+
+    assert httpx_mock.get_request().headers["traceparent"] == (
+        "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    )
+
+
+def test_trace_span_without_opentelemetry(
+    mock_client_util_handler: UtilHandler,
+) -> None:
+    with patch("client.utils.tracer", None):
+        with mock_client_util_handler.trace_span("streamlit.rerun") as span:
+            assert span is None
+
+
 @pytest.mark.asyncio
 async def test_send_request_success_get(
     mock_client_util_handler: UtilHandler,
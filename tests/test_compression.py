@@ -0,0 +1,141 @@
+from typing import AsyncIterator
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+import pytest
+
+from answer_app.compression import CompressionMiddleware
+from answer_app.compression import negotiate_encoding
+
+
+LARGE_BODY = "Paris is the capital of France. " * 100
+
+
+def _client(**settings: int | bool) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **settings)
+
+    @app.get("/large")
+    def large() -> PlainTextResponse:
+        return PlainTextResponse(LARGE_BODY)
+
+    @app.get("/small")
+    def small() -> PlainTextResponse:
+        return PlainTextResponse("Paris")
+
+    @app.get("/encoded")
+    def encoded() -> PlainTextResponse:
+        return PlainTextResponse(LARGE_BODY, headers={"Content-Encoding": "identity"})
+
+    @app.get("/stream")
+    def stream() -> StreamingResponse:
+        async def chunks() -> AsyncIterator[str]:
+            for _ in range(3):
+                yield LARGE_BODY
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/events")
+    def events() -> StreamingResponse:
+        async def chunks() -> AsyncIterator[str]:
+            yield f"data: {LARGE_BODY}\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+        ("GZIP;q=bad, gzip", "gzip"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding: str, expected: str | None) -> None:
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_negotiate_encoding_without_brotli() -> None:
+    assert negotiate_encoding("br, gzip", brotli_available=False) == "gzip"
+    assert negotiate_encoding("br", brotli_available=False) is None
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_compresses_large_response(encoding: str) -> None:
+    client = _client()
+
+    response = client.get("/large", headers={"Accept-Encoding": encoding})
+
+    assert response.headers["Content-Encoding"] == encoding
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert int(response.headers["Content-Length"]) < len(LARGE_BODY) // 10
+    assert response.text == LARGE_BODY
+
+
+def test_small_response_is_not_compressed() -> None:
+    client = _client(minimum_size=1024)
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.text == "Paris"
+
+
+def test_no_accept_encoding() -> None:
+    client = _client()
+
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.text == LARGE_BODY
+
+
+def test_already_encoded_response_is_not_compressed() -> None:
+    client = _client()
+
+    response = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "identity"
+    assert response.text == LARGE_BODY
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_streaming_response_is_compressed_per_chunk(encoding: str) -> None:
+    client = _client()
+
+    response = client.get("/stream", headers={"Accept-Encoding": encoding})
+
+    assert response.headers["Content-Encoding"] == encoding
+    assert "Content-Length" not in response.headers
+    assert response.text == LARGE_BODY * 3
+
+
+def test_event_stream_is_not_compressed() -> None:
+    client = _client()
+
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.text == f"data: {LARGE_BODY}\n\n"
+
+
+def test_gzip_level_and_brotli_disabled() -> None:
+    fast = _client(gzip_level=1, brotli_enabled=False)
+    best = _client(gzip_level=9, brotli_enabled=False)
+
+    fast_response = fast.get("/large", headers={"Accept-Encoding": "br, gzip"})
+    best_response = best.get("/large", headers={"Accept-Encoding": "br, gzip"})
+
+    assert fast_response.headers["Content-Encoding"] == "gzip"
+    assert int(best_response.headers["Content-Length"]) <= int(
+        fast_response.headers["Content-Length"]
+    )
@@ -0,0 +1,8 @@
+from answer_app.config import load_config
+
+
+def test_load_config() -> None:
+    config = load_config("config.yaml")
+
+    assert "search_engine_id" in config
+    assert "response_compression" in config
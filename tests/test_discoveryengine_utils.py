@@ -1,4 +1,6 @@
-from unittest.mock import MagicMock, AsyncMock
+import asyncio
+from typing import AsyncIterator
+from unittest.mock import MagicMock, AsyncMock, patch
 
 from google.cloud.discoveryengine_v1 import Answer
 from google.cloud.discoveryengine_v1 import AnswerQueryRequest
@@ -8,6 +10,9 @@ from google.cloud.discoveryengine_v1 import Session
 import pytest
 
 from answer_app.discoveryengine_utils import DiscoveryEngineHandler
+from answer_app.discoveryengine_utils import answer_was_coalesced
+from answer_app.metrics import coalesced_answer_requests
+from answer_app.transport import RestAsyncClient
 
 
 def test_initialization_with_project_id() -> None:
@@ -46,6 +51,14 @@ def test_engine_path(mock_discoveryengine_handler: DiscoveryEngineHandler) -> No
     assert handler._engine == expected_path
 
 
+def test_properties(mock_discoveryengine_handler: DiscoveryEngineHandler) -> None:
+    handler = mock_discoveryengine_handler
+
+    assert handler.engine == handler._engine
+    assert handler.preamble == "test-preamble"
+    assert handler.model_version == "gemini-2.0-flash-001/answer_gen/v1"
+
+
 def test_log_attributes(
     mock_discoveryengine_handler: DiscoveryEngineHandler,
     caplog: pytest.LogCaptureFixture,
@@ -72,7 +85,7 @@ async def test_answer_query(
     mock_discoveryengine_handler: DiscoveryEngineHandler,
 ) -> None:
     handler = mock_discoveryengine_handler
-    handler._client.answer_query = AsyncMock(return_value=AnswerQueryResponse())
+    handler._pool.clients[0].answer_query = AsyncMock(return_value=AnswerQueryResponse())
 
     response = await handler.answer_query(
         query_text="What is the capital of France?",
@@ -83,20 +96,224 @@ async def test_answer_query(
     assert isinstance(response.answer, Answer)
     assert isinstance(response.session, Session)
     assert isinstance(response.answer_query_token, str)
-    handler._client.answer_query.assert_called_once()
-    args, kwargs = handler._client.answer_query.call_args
+    handler._pool.clients[0].answer_query.assert_called_once()
+    args, kwargs = handler._pool.clients[0].answer_query.call_args
     assert isinstance(args[0], AnswerQueryRequest)
     assert isinstance(args[0].query, Query)
     assert args[0].query.text == "What is the capital of France?"
     assert args[0].user_pseudo_id == "test-user"
 
 
+@pytest.mark.asyncio
+async def test_stream_answer_query(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    chunks = [
+        AnswerQueryResponse(answer=Answer(answer_text="Paris ")),
+        AnswerQueryResponse(answer=Answer(answer_text="is the capital.")),
+    ]
+    stream = MagicMock()
+    stream.__aiter__.return_value = chunks
+    handler._pool.clients[0].stream_answer_query = AsyncMock(return_value=stream)
+
+    responses = [
+        response
+        async for response in handler.stream_answer_query(
+            query_text="What is the capital of France?",
+            session_id="test-session",
+            user_pseudo_id="test-user",
+        )
+    ]
+
+    assert responses == chunks
+    handler._pool.clients[0].stream_answer_query.assert_called_once()
+    args, kwargs = handler._pool.clients[0].stream_answer_query.call_args
+    assert isinstance(args[0], AnswerQueryRequest)
+    assert args[0].query.text == "What is the capital of France?"
+    assert args[0].session.endswith("/sessions/test-session")
+    assert args[0].user_pseudo_id == "test-user"
+
+
+def _slow_answer_query(
+    event: asyncio.Event,
+    response: AnswerQueryResponse | None = None,
+    error: Exception | None = None,
+) -> AsyncMock:
+    """Create an answer_query mock that blocks until the event is set."""
+
+    async def answer_query(request: AnswerQueryRequest) -> AnswerQueryResponse:
+        await event.wait()
+        if error:
+            raise error
+        return response or AnswerQueryResponse()
+
+    return AsyncMock(side_effect=answer_query)
+
+
+@pytest.mark.asyncio
+async def test_answer_query_coalesces_identical_requests(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    handler._coalesce_requests = True
+    event = asyncio.Event()
+    handler._pool.clients[0].answer_query = _slow_answer_query(
+        event, response=AnswerQueryResponse(answer_query_token="token1")
+    )
+    coalesced = coalesced_answer_requests.get()
+
+    tasks = [
+        asyncio.create_task(
+            handler.answer_query(
+                query_text="What is the capital of France?",
+                session_id=None,
+                user_pseudo_id=f"user-{i}",
+            )
+        )
+        for i in range(3)
+    ]
+    await asyncio.sleep(0)
+    assert len(handler._inflight) == 1
+    assert coalesced_answer_requests.get() == coalesced + 2
+
+    event.set()
+    responses = await asyncio.gather(*tasks)
+
+    handler._pool.clients[0].answer_query.assert_called_once()
+    assert all(r.answer_query_token == "token1" for r in responses)
+    assert not handler._inflight
+
+
+@pytest.mark.asyncio
+async def test_answer_was_coalesced(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    handler._coalesce_requests = True
+    event = asyncio.Event()
+    handler._pool.clients[0].answer_query = _slow_answer_query(event)
+
+    async def ask() -> bool:
+        await handler.answer_query(query_text="q", session_id=None, user_pseudo_id="")
+        return answer_was_coalesced()
+
+    tasks = [asyncio.create_task(ask()) for _ in range(2)]
+    await asyncio.sleep(0)
+    event.set()
+
+    # Only the caller that joined the other's call is marked coalesced.
+    assert await asyncio.gather(*tasks) == [False, True]
+    # A later call of the same task is not.
+    await handler.answer_query(query_text="q", session_id=None, user_pseudo_id="")
+    assert not answer_was_coalesced()
+
+
+@pytest.mark.asyncio
+async def test_answer_query_does_not_coalesce_sessions(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    handler._coalesce_requests = True
+    handler._pool.clients[0].answer_query = AsyncMock(return_value=AnswerQueryResponse())
+    coalesced = coalesced_answer_requests.get()
+
+    await asyncio.gather(
+        *[
+            handler.answer_query(
+                query_text="What is the capital of France?",
+                session_id="test-session",
+                user_pseudo_id="test-user",
+            )
+            for _ in range(2)
+        ]
+    )
+
+    assert handler._pool.clients[0].answer_query.call_count == 2
+    assert coalesced_answer_requests.get() == coalesced
+
+
+@pytest.mark.asyncio
+async def test_answer_query_coalesced_waiter_cancellation(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    handler._coalesce_requests = True
+    event = asyncio.Event()
+    handler._pool.clients[0].answer_query = _slow_answer_query(event)
+
+    first = asyncio.create_task(
+        handler.answer_query(query_text="q", session_id=None, user_pseudo_id="")
+    )
+    second = asyncio.create_task(
+        handler.answer_query(query_text="q", session_id=None, user_pseudo_id="")
+    )
+    await asyncio.sleep(0)
+
+    # Cancelling one waiter must not cancel the shared call for the other.
+    first.cancel()
+    await asyncio.sleep(0)
+    event.set()
+
+    assert isinstance(await second, AnswerQueryResponse)
+    assert first.cancelled()
+    handler._pool.clients[0].answer_query.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_answer_query_coalesced_all_waiters_cancelled(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    handler._coalesce_requests = True
+    handler._pool.clients[0].answer_query = _slow_answer_query(asyncio.Event())
+
+    tasks = [
+        asyncio.create_task(
+            handler.answer_query(query_text="q", session_id=None, user_pseudo_id="")
+        )
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert not handler._inflight
+
+
+@pytest.mark.asyncio
+async def test_answer_query_coalesced_error_propagates(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    handler._coalesce_requests = True
+    event = asyncio.Event()
+    handler._pool.clients[0].answer_query = _slow_answer_query(
+        event, error=RuntimeError("Test error")
+    )
+
+    tasks = [
+        asyncio.create_task(
+            handler.answer_query(query_text="q", session_id=None, user_pseudo_id="")
+        )
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    event.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    handler._pool.clients[0].answer_query.assert_called_once()
+
+
 @pytest.mark.asyncio
 async def test_get_user_sessions(
     mock_discoveryengine_handler: DiscoveryEngineHandler,
 ) -> None:
     handler = mock_discoveryengine_handler
-    handler._client.list_sessions = AsyncMock(
+    handler._pool.clients[0].list_sessions = AsyncMock(
         return_value=AsyncMock(
             __aiter__=lambda self: self,
             __anext__=AsyncMock(
@@ -116,7 +333,7 @@ async def test_get_user_sessions(
     assert isinstance(response[1], Session)
     assert response[0].name == "session1"
     assert response[1].name == "session2"
-    handler._client.list_sessions.assert_called_once()
+    handler._pool.clients[0].list_sessions.assert_called_once()
 
 
 @pytest.mark.asyncio
@@ -124,11 +341,11 @@ async def test_delete_session(
     mock_discoveryengine_handler: DiscoveryEngineHandler,
 ) -> None:
     handler = mock_discoveryengine_handler
-    handler._client.delete_session = AsyncMock()
+    handler._pool.clients[0].delete_session = AsyncMock()
 
     await handler.delete_session(session_id="test-session-id")
 
-    handler._client.delete_session.assert_called_once()
+    handler._pool.clients[0].delete_session.assert_called_once()
 
 
 @pytest.mark.asyncio
@@ -137,9 +354,94 @@ async def test_delete_session_error(
     caplog: pytest.LogCaptureFixture,
 ) -> None:
     handler = mock_discoveryengine_handler
-    handler._client.delete_session = AsyncMock(side_effect=Exception("Test error"))
+    handler._pool.clients[0].delete_session = AsyncMock(side_effect=Exception("Test error"))
 
     await handler.delete_session(session_id="test-session-id")
-    handler._client.delete_session.assert_called_once()
+    handler._pool.clients[0].delete_session.assert_called_once()
     assert "Error deleting session test-session-id: Test error" in caplog.text
     assert "Session test-session-id deleted." not in caplog.text
+
+
+def test_initialize_client_pool() -> None:
+    with patch(
+        "answer_app.discoveryengine_utils.discoveryengine.ConversationalSearchServiceAsyncClient"
+    ) as mock_client:
+        mock_client.side_effect = lambda **kwargs: MagicMock()
+        handler = DiscoveryEngineHandler(
+            location="us",
+            engine_id="test-engine-id",
+            preamble="test-preamble",
+            project_id="test-project-id",
+            client_pool={"size": 3, "selection": "round_robin"},
+        )
+
+    assert mock_client.call_count == 3
+    assert len(set(map(id, handler._pool.clients))) == 3
+    kwargs = mock_client.call_args.kwargs
+    assert kwargs["client_options"].api_endpoint == "us-discoveryengine.googleapis.com"
+    assert kwargs["transport"] == handler._transport._grpc_transport
+    assert handler._pool.stats()["size"] == 3
+
+
+def test_initialize_rest_client() -> None:
+    with patch(
+        "answer_app.transport.discoveryengine.ConversationalSearchServiceClient"
+    ) as mock_client:
+        handler = DiscoveryEngineHandler(
+            location="eu",
+            engine_id="test-engine-id",
+            preamble="test-preamble",
+            project_id="test-project-id",
+            transport={"kind": "rest"},
+            credentials="credentials",
+        )
+
+    assert isinstance(handler._pool.clients[0], RestAsyncClient)
+    kwargs = mock_client.call_args.kwargs
+    assert kwargs["client_options"].api_endpoint == "eu-discoveryengine.googleapis.com"
+    assert kwargs["transport"] == "rest"
+    assert kwargs["credentials"] == "credentials"
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_query_counts_against_its_channel(
+    mock_discoveryengine_handler: DiscoveryEngineHandler,
+) -> None:
+    handler = mock_discoveryengine_handler
+    in_flight = []
+
+    async def stream() -> AsyncIterator[AnswerQueryResponse]:
+        for text in ("Paris ", "is the capital."):
+            in_flight.append(handler._pool.stats()["in_flight"])
+            yield AnswerQueryResponse(answer=Answer(answer_text=text))
+
+    handler._pool.clients[0].stream_answer_query = AsyncMock(return_value=stream())
+
+    async for _ in handler.stream_answer_query(
+        query_text="q", session_id=None, user_pseudo_id=""
+    ):
+        pass
+
+    assert in_flight == [1, 1]
+    assert handler._pool.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_warm_up(mock_discoveryengine_handler: DiscoveryEngineHandler) -> None:
+    handler = mock_discoveryengine_handler
+    channel_ready = AsyncMock()
+    handler._pool.clients[0].transport.grpc_channel.channel_ready = channel_ready
+
+    await handler.warm_up()
+
+    channel_ready.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_close(mock_discoveryengine_handler: DiscoveryEngineHandler) -> None:
+    handler = mock_discoveryengine_handler
+    handler._pool.clients[0].transport.close = AsyncMock()
+
+    await handler.close()
+
+    handler._pool.clients[0].transport.close.assert_awaited_once()
@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+from click.testing import CliRunner
+import pytest
+
+from package_scripts.import_profile import IMPORT_BUDGET_SECONDS
+from package_scripts.import_profile import ImportTime
+from package_scripts.import_profile import format_table
+from package_scripts.import_profile import import_seconds
+from package_scripts.import_profile import parse_importtime
+from package_scripts.import_profile import profile_imports
+from package_scripts.import_profile import run
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       517 |      63107 |     google.auth.transport.grpc
+import time:      1330 |     103594 |   google.api_core.grpc_helpers
+import time:     26923 |    1161759 | answer_app.main
+some other stderr line
+"""
+
+
+def test_parse_importtime() -> None:
+    times = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert times == [
+        ImportTime(module="_io", self_us=120, cumulative_us=120, depth=2),
+        ImportTime(
+            module="google.auth.transport.grpc",
+            self_us=517,
+            cumulative_us=63107,
+            depth=2,
+        ),
+        ImportTime(
+            module="google.api_core.grpc_helpers",
+            self_us=1330,
+            cumulative_us=103594,
+            depth=1,
+        ),
+        ImportTime(
+            module="answer_app.main", self_us=26923, cumulative_us=1161759, depth=0
+        ),
+    ]
+
+
+def test_import_seconds() -> None:
+    times = parse_importtime(IMPORTTIME_OUTPUT)
+
+    assert import_seconds(times) == pytest.approx(1.161759)
+    with pytest.raises(ValueError):
+        import_seconds(times, module="answer_app.utils")
+
+
+def test_format_table() -> None:
+    table = format_table(parse_importtime(IMPORTTIME_OUTPUT), top=2)
+    lines = table.splitlines()
+
+    assert lines[0].split() == ["module", "self", "ms", "cumulative", "ms"]
+    assert [line.split()[0] for line in lines[1:]] == [
+        "answer_app.main",
+        "google.api_core.grpc_helpers",
+    ]
+    assert lines[1].split()[1:] == ["26.9", "1161.8"]
+
+
+def test_format_table_sort_by_self() -> None:
+    table = format_table(parse_importtime(IMPORTTIME_OUTPUT), top=4, sort="self")
+
+    assert [line.split()[0] for line in table.splitlines()[1:]] == [
+        "answer_app.main",
+        "google.api_core.grpc_helpers",
+        "google.auth.transport.grpc",
+        "_io",
+    ]
+
+
+def test_profile_imports_failure() -> None:
+    with pytest.raises(RuntimeError, match="Importing answer_app.no_such_module"):
+        profile_imports(module="answer_app.no_such_module")
+
+
+@pytest.mark.parametrize(
+    "args, exit_code",
+    [
+        ([], 0),
+        (["--budget", "2.0"], 0),
+        (["--budget", "1.0"], 1),
+    ],
+)
+def test_run(args: list[str], exit_code: int) -> None:
+    with patch(
+        "package_scripts.import_profile.profile_imports",
+        return_value=parse_importtime(IMPORTTIME_OUTPUT),
+    ):
+        result = CliRunner().invoke(run, ["--top", "2"] + args)
+
+    assert result.exit_code == exit_code
+    assert "answer_app.main" in result.output
+    assert "Imported answer_app.main in 1.162 seconds (4 modules)." in result.output
+
+
+def test_run_import_failure() -> None:
+    with patch(
+        "package_scripts.import_profile.profile_imports",
+        side_effect=RuntimeError("Importing answer_app.main failed"),
+    ):
+        result = CliRunner().invoke(run, [])
+
+    assert result.exit_code == 1
+    assert "Importing answer_app.main failed" in result.output
+
+
+def test_answer_app_import_budget() -> None:
+    """Fail when a change pushes the import of answer_app.main over budget."""
+    times = profile_imports()
+    seconds = import_seconds(times)
+    modules = {time.module for time in times}
+
+    # The client libraries that are only needed after startup are imported lazily.
+    assert "google.cloud.bigquery" not in modules
+    assert "google.cloud.bigquery_storage_v1" not in modules
+    assert seconds < IMPORT_BUDGET_SECONDS, format_table(times, top=15)
@@ -0,0 +1,63 @@
+from pathlib import Path
+import sys
+from typing import Generator
+from unittest.mock import patch
+
+import pytest
+
+from answer_app.lazy import LazyModule
+from answer_app.lazy import lazy_import
+
+
+@pytest.fixture
+def slow_module(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[str, None, None]:
+    """Write an importable test module and return its name."""
+    (tmp_path / "lazy_test_module.py").write_text(
+        "IMPORTED = True\n\ndef answer() -> int:\n    return 42\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "lazy_test_module"
+    sys.modules.pop("lazy_test_module", None)
+
+
+def test_lazy_import_defers_import(slow_module: str) -> None:
+    module = lazy_import(slow_module)
+
+    assert isinstance(module, LazyModule)
+    assert slow_module not in sys.modules
+    assert "not imported" in repr(module)
+
+    assert module.answer() == 42
+    assert slow_module in sys.modules
+    assert "(imported)" in repr(module)
+
+
+def test_lazy_import_returns_imported_module(slow_module: str) -> None:
+    imported = __import__(slow_module)
+
+    assert lazy_import(slow_module) is imported
+
+
+def test_lazy_module_does_not_import_for_dunders(slow_module: str) -> None:
+    module = lazy_import(slow_module)
+
+    assert not hasattr(module, "__wrapped__")
+    assert slow_module not in sys.modules
+
+
+def test_lazy_module_attributes_can_be_patched(slow_module: str) -> None:
+    module = lazy_import(slow_module)
+
+    with patch.object(module, "answer", return_value=0):
+        assert module.answer() == 0
+
+    assert module.answer() == 42
+
+
+def test_lazy_module_missing_module() -> None:
+    module = lazy_import("answer_app.no_such_module")
+
+    with pytest.raises(ModuleNotFoundError):
+        module.anything
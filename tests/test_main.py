@@ -1,11 +1,20 @@
-from unittest.mock import MagicMock
+import base64
+import json
+from typing import Any, AsyncIterator
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from fastapi.testclient import TestClient
 import pytest
 
 from answer_app.main import app
+from answer_app.metrics import answer_seconds
+from answer_app.metrics import answers_in_flight
+from answer_app.metrics import errors
 from answer_app.model import AnswerResponse
 from answer_app.model import GetSessionResponse
+from answer_app.model import ReadinessResponse
+from answer_app.model import WarmUpStepResult
+from answer_app.timing import stage
 
 
 client = TestClient(app)
@@ -21,7 +30,6 @@ async def test_answer_no_session_id(mock_util_handler_methods: MagicMock) -> Non
         session=None,
         answer_query_token="token1",
     )
-    mock_util_handler_methods.bq_insert_row_data.return_value = []
 
     request_body = {"question": "What is the capital of France?"}
     response = client.post("/answer", json=request_body)
@@ -35,7 +43,227 @@ async def test_answer_no_session_id(mock_util_handler_methods: MagicMock) -> Non
     assert data["session"] is None
     assert data["answer_query_token"] == "token1"
     mock_util_handler_methods.answer_query.assert_called_once()
-    mock_util_handler_methods.bq_insert_row_data.assert_called_once()
+    mock_util_handler_methods.bq_enqueue_answer.assert_called_once()
+
+
+def test_answer_timings(
+    mock_util_handler_methods: MagicMock, rendered_answer_response: AnswerResponse
+) -> None:
+    async def answer_query(**kwargs: Any) -> AnswerResponse:
+        # Stages recorded by the handler are part of the request timings.
+        with stage("discoveryengine"):
+            pass
+        return rendered_answer_response
+
+    mock_util_handler_methods.answer_query.side_effect = answer_query
+
+    response = client.post(
+        "/answer", params={"format": "html"}, json={"question": "Capital?"}
+    )
+
+    assert response.status_code == 200
+    names = [timing["name"] for timing in response.json()["timings"]]
+    assert names == ["discoveryengine", "format"]
+    assert all(timing["seconds"] >= 0 for timing in response.json()["timings"])
+
+    server_timing = response.headers["Server-Timing"]
+    metrics = [metric.split(";")[0] for metric in server_timing.split(", ")]
+    assert metrics == [
+        "discoveryengine",
+        "format",
+        "bigquery_enqueue",
+        "serialize",
+        "total",
+    ]
+
+    # BigQuery logs the same timings with the base64 markdown.
+    queued = mock_util_handler_methods.bq_enqueue_answer.call_args.args[0]
+    assert [timing.name for timing in queued.timings] == names
+    assert queued.markdown == base64.b64encode(b"**Paris** <script>").decode("utf-8")
+
+
+@pytest.mark.parametrize(
+    "params,headers,expected_markdown",
+    [
+        ({}, {}, base64.b64encode(b"**Paris** <script>").decode("utf-8")),
+        ({"format": "markdown"}, {}, "**Paris** <script>"),
+        ({"format": "html"}, {}, "<p><strong>Paris</strong> &lt;script&gt;</p>\n"),
+        ({}, {"Accept": "text/markdown"}, "**Paris** <script>"),
+        ({}, {"Accept": "text/html, application/json"}, "<p><strong>Paris</strong> &lt;script&gt;</p>\n"),
+        ({}, {"Accept": "text/html;q=0.5, text/markdown;q=0.9"}, "**Paris** <script>"),
+        ({"format": "base64"}, {"Accept": "text/markdown"}, base64.b64encode(b"**Paris** <script>").decode("utf-8")),
+    ],
+)
+def test_answer_format_negotiation(
+    mock_util_handler_methods: MagicMock,
+    rendered_answer_response: AnswerResponse,
+    params: dict[str, str],
+    headers: dict[str, str],
+    expected_markdown: str,
+) -> None:
+    mock_util_handler_methods.answer_query.return_value = rendered_answer_response
+
+    response = client.post(
+        "/answer",
+        json={"question": "What is the capital of France?"},
+        params=params,
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json()["markdown"] == expected_markdown
+    assert response.headers["Vary"] == "Accept"
+
+    # BigQuery always gets the base64 markdown.
+    logged = mock_util_handler_methods.bq_enqueue_answer.call_args.args[0]
+    assert logged.markdown == base64.b64encode(b"**Paris** <script>").decode("utf-8")
+
+
+def test_answer_invalid_format(mock_util_handler_methods: MagicMock) -> None:
+    response = client.post(
+        "/answer",
+        json={"question": "What is the capital of France?"},
+        params={"format": "pdf"},
+    )
+
+    assert response.status_code == 422
+    mock_util_handler_methods.answer_query.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "fields,expected",
+    [
+        (
+            "minimal",
+            {
+                "markdown": "KipQYXJpcyoqIDxzY3JpcHQ+",
+                "latency": 0.1,
+                "answer": {"answer_text": "Paris"},
+                "session": {"name": "test-session"},
+                "answer_query_token": "token1",
+            },
+        ),
+        ("answer.answer_text", {"answer": {"answer_text": "Paris"}}),
+        (
+            "question, session.name",
+            {
+                "question": "What is the capital of France?",
+                "session": {"name": "test-session"},
+            },
+        ),
+    ],
+)
+def test_answer_fields(
+    mock_util_handler_methods: MagicMock,
+    fields: str,
+    expected: dict[str, Any],
+) -> None:
+    mock_util_handler_methods.answer_query.return_value = AnswerResponse(
+        question="What is the capital of France?",
+        markdown="KipQYXJpcyoqIDxzY3JpcHQ+",
+        latency=0.1,
+        answer={"answer_text": "Paris", "references": [{"chunk_info": {}}]},
+        session={"name": "test-session", "turns": []},
+        answer_query_token="token1",
+    )
+
+    response = client.post(
+        "/answer",
+        json={"question": "What is the capital of France?"},
+        params={"fields": fields},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    # The minimal profile includes the stage timings of the request.
+    timings = data.pop("timings", None)
+    assert (timings is not None) == (fields == "minimal")
+    assert data == expected
+    assert response.headers["Vary"] == "Accept"
+    assert mock_util_handler_methods.answer_query.call_args.kwargs["fields"] is not None
+
+    # BigQuery still gets the full record.
+    logged = mock_util_handler_methods.bq_enqueue_answer.call_args.args[0]
+    assert logged.answer["references"] == [{"chunk_info": {}}]
+
+
+def test_answer_fields_timings(
+    mock_util_handler_methods: MagicMock, rendered_answer_response: AnswerResponse
+) -> None:
+    mock_util_handler_methods.answer_query.return_value = rendered_answer_response
+
+    response = client.post(
+        "/answer",
+        json={"question": "What is the capital of France?"},
+        params={"format": "markdown", "fields": "markdown,timings"},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data) == {"markdown", "timings"}
+    assert [timing["name"] for timing in data["timings"]] == ["format"]
+
+
+def test_answer_fields_in_repeated_field(mock_util_handler_methods: MagicMock) -> None:
+    mock_util_handler_methods.answer_query.return_value = AnswerResponse(
+        question="What is the capital of France?",
+        markdown="KipQYXJpcyoqIDxzY3JpcHQ+",
+        latency=0.1,
+        answer={
+            "answer_text": "Paris",
+            "references": [
+                {"chunk_info": {"content": "one", "relevance_score": 0.5}},
+                {"chunk_info": {"content": "two", "relevance_score": 0.4}},
+            ],
+        },
+        session={"name": "test-session", "turns": []},
+        answer_query_token="token1",
+    )
+
+    response = client.post(
+        "/answer",
+        json={"question": "What is the capital of France?"},
+        params={"fields": "answer.references.chunk_info.content,markdown"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "markdown": "KipQYXJpcyoqIDxzY3JpcHQ+",
+        "answer": {
+            "references": [
+                {"chunk_info": {"content": "one"}},
+                {"chunk_info": {"content": "two"}},
+            ]
+        },
+    }
+
+
+def test_answer_full_fields(
+    mock_util_handler_methods: MagicMock, rendered_answer_response: AnswerResponse
+) -> None:
+    mock_util_handler_methods.answer_query.return_value = rendered_answer_response
+
+    response = client.post(
+        "/answer",
+        json={"question": "What is the capital of France?"},
+        params={"fields": "full"},
+    )
+
+    assert response.status_code == 200
+    assert set(response.json()) == set(AnswerResponse.model_fields)
+    assert mock_util_handler_methods.answer_query.call_args.kwargs["fields"] is None
+
+
+def test_answer_unknown_fields(mock_util_handler_methods: MagicMock) -> None:
+    response = client.post(
+        "/answer",
+        json={"question": "What is the capital of France?"},
+        params={"fields": "answer.not_a_field"},
+    )
+
+    assert response.status_code == 422
+    assert "answer.not_a_field" in response.json()["detail"]
+    mock_util_handler_methods.answer_query.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -48,7 +276,6 @@ async def test_answer_with_session_id(mock_util_handler_methods: MagicMock) -> N
         session={"name": "test-session"},
         answer_query_token="token1",
     )
-    mock_util_handler_methods.bq_insert_row_data.return_value = []
 
     request_body = {
         "question": "What is the capital of France?",
@@ -65,7 +292,7 @@ async def test_answer_with_session_id(mock_util_handler_methods: MagicMock) -> N
     assert data["session"]["name"] == "test-session"
     assert data["answer_query_token"] == "token1"
     mock_util_handler_methods.answer_query.assert_called_once()
-    mock_util_handler_methods.bq_insert_row_data.assert_called_once()
+    mock_util_handler_methods.bq_enqueue_answer.assert_called_once()
 
 
 @pytest.mark.asyncio
@@ -80,7 +307,6 @@ async def test_answer_with_wildcard_session_id(
         session={"name": "new-session"},
         answer_query_token="token1",
     )
-    mock_util_handler_methods.bq_insert_row_data.return_value = []
 
     request_body = {
         "question": "What is the capital of France?",
@@ -97,7 +323,208 @@ async def test_answer_with_wildcard_session_id(
     assert data["session"]["name"] == "new-session"
     assert data["answer_query_token"] == "token1"
     mock_util_handler_methods.answer_query.assert_called_once()
-    mock_util_handler_methods.bq_insert_row_data.assert_called_once()
+    mock_util_handler_methods.bq_enqueue_answer.assert_called_once()
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict[str, Any]]]:
+    """Parse a server-sent events body into (event, data) tuples."""
+    events = []
+    for message in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in message.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_answer_stream(mock_util_handler_methods: MagicMock) -> None:
+    final = AnswerResponse(
+        question="What is the capital of France?",
+        markdown="UGFyaXM=",
+        latency=0.1,
+        answer={"answer_text": "Paris is the capital."},
+        session={"name": "test-session"},
+        answer_query_token="token1",
+    )
+
+    async def stream(**kwargs: Any) -> AsyncIterator[str | AnswerResponse]:
+        yield "Paris "
+        yield "is the capital."
+        yield final
+
+    mock_util_handler_methods.stream_answer_query.side_effect = stream
+
+    response = client.post(
+        "/answer/stream", json={"question": "What is the capital of France?"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert _parse_sse(response.text) == [
+        ("accepted", {"question": "What is the capital of France?"}),
+        ("answer", {"text": "Paris "}),
+        ("answer", {"text": "is the capital."}),
+        ("citations", {"markdown": "UGFyaXM="}),
+        (
+            "done",
+            {
+                "answer_query_token": "token1",
+                "session": {"name": "test-session"},
+                "latency": 0.1,
+            },
+        ),
+    ]
+    mock_util_handler_methods.bq_enqueue_answer.assert_called_once_with(final)
+
+
+def test_answer_stream_error(mock_util_handler_methods: MagicMock) -> None:
+    async def stream(**kwargs: Any) -> AsyncIterator[str | AnswerResponse]:
+        yield "Paris "
+        raise Exception("Test exception")
+
+    mock_util_handler_methods.stream_answer_query.side_effect = stream
+
+    response = client.post(
+        "/answer/stream", json={"question": "What is the capital of France?"}
+    )
+
+    assert response.status_code == 200
+    assert _parse_sse(response.text)[-1] == ("error", {"detail": "Test exception"})
+    mock_util_handler_methods.bq_enqueue_answer.assert_not_called()
+
+
+def test_answer_metrics(mock_util_handler_methods: MagicMock) -> None:
+    in_flight: list[float] = []
+
+    async def answer_query(**kwargs: Any) -> AnswerResponse:
+        in_flight.append(answers_in_flight.value)
+        raise ValueError("failed")
+
+    mock_util_handler_methods.answer_query.side_effect = answer_query
+    count = answer_seconds.count
+    value_errors = errors.get("ValueError")
+
+    response = client.post("/answer", json={"question": "Capital?"})
+
+    assert response.status_code == 500
+    assert in_flight == [1.0]
+    assert answers_in_flight.value == 0.0
+    assert answer_seconds.count == count + 1
+    assert errors.get("ValueError") == value_errors + 1
+
+
+def test_metrics(mock_util_handler_methods: MagicMock) -> None:
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE answer_app_answer_seconds histogram" in response.text
+    assert "# TYPE answer_app_errors_total counter" in response.text
+    assert "answer_app_answers_in_flight 0.0" in response.text
+    assert not response.text.endswith("# EOF\n")
+
+
+def test_metrics_openmetrics(mock_util_handler_methods: MagicMock) -> None:
+    response = client.get(
+        "/metrics", headers={"Accept": "application/openmetrics-text; version=1.0.0"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/openmetrics-text")
+    assert "# TYPE answer_app_errors counter" in response.text
+    assert response.text.endswith("# EOF\n")
+
+
+@pytest.mark.parametrize(
+    "env",
+    [{}, {"ENABLE_PROFILING": "true"}, {"PROFILE_TOKEN": "token"}],
+)
+def test_profile_disabled(
+    mock_util_handler_methods: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+    env: dict[str, str],
+) -> None:
+    monkeypatch.delenv("ENABLE_PROFILING", raising=False)
+    monkeypatch.delenv("PROFILE_TOKEN", raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    response = client.get(
+        "/debug/profile",
+        params={"seconds": 0.05},
+        headers={"X-Profile-Token": "token"},
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Profile-Token": "wrong"}])
+def test_profile_invalid_token(
+    mock_util_handler_methods: MagicMock,
+    patch_profiling_enabled: str,
+    headers: dict[str, str],
+) -> None:
+    response = client.get("/debug/profile", params={"seconds": 0.05}, headers=headers)
+
+    assert response.status_code == 403
+
+
+def test_profile_collapsed(
+    mock_util_handler_methods: MagicMock, patch_profiling_enabled: str
+) -> None:
+    response = client.get(
+        "/debug/profile",
+        params={"seconds": 0.05},
+        headers={"X-Profile-Token": patch_profiling_enabled},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # The event loop thread is sampled waiting for the profile.
+    stack, count = response.text.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert ";" in stack
+
+
+def test_profile_speedscope(
+    mock_util_handler_methods: MagicMock, patch_profiling_enabled: str
+) -> None:
+    response = client.get(
+        "/debug/profile",
+        params={"seconds": 0.05, "format": "speedscope"},
+        headers={"X-Profile-Token": patch_profiling_enabled},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    assert data["shared"]["frames"]
+    assert data["profiles"][0]["type"] == "sampled"
+
+
+def test_profile_already_running(
+    mock_util_handler_methods: MagicMock, patch_profiling_enabled: str
+) -> None:
+    with patch("answer_app.main.profile_lock") as mock_lock:
+        mock_lock.locked.return_value = True
+        response = client.get(
+            "/debug/profile",
+            params={"seconds": 0.05},
+            headers={"X-Profile-Token": patch_profiling_enabled},
+        )
+
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("seconds", [0, -1, 61])
+def test_profile_invalid_seconds(
+    mock_util_handler_methods: MagicMock, patch_profiling_enabled: str, seconds: float
+) -> None:
+    response = client.get(
+        "/debug/profile",
+        params={"seconds": seconds},
+        headers={"X-Profile-Token": patch_profiling_enabled},
+    )
+
+    assert response.status_code == 422
 
 
 def test_health_check(mock_util_handler_methods: MagicMock) -> None:
@@ -107,6 +534,27 @@ def test_health_check(mock_util_handler_methods: MagicMock) -> None:
     assert data == {"status": "ok"}
 
 
+def test_readiness_check(mock_util_handler_methods: MagicMock) -> None:
+    mock_util_handler_methods.readiness = MagicMock(
+        return_value=ReadinessResponse(
+            ready=False,
+            steps=[WarmUpStepResult(name="credentials", seconds=0.25)],
+        )
+    )
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json() == {
+        "ready": False,
+        "steps": [{"name": "credentials", "seconds": 0.25, "error": None}],
+    }
+
+    mock_util_handler_methods.readiness.return_value = ReadinessResponse(ready=True)
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json() == {"ready": True, "steps": []}
+
+
 def test_get_env_variable(
     mock_util_handler_methods: MagicMock,
     patch_my_env_var: MagicMock,
@@ -145,8 +593,7 @@ async def test_get_sessions(mock_util_handler_methods: MagicMock) -> None:
     )
 
 
-@pytest.mark.asyncio
-async def test_answer_with_bq_insert_error(
+def test_answer_with_bq_enqueue_rejected(
     mock_util_handler_methods: MagicMock,
 ) -> None:
     mock_util_handler_methods.answer_query.return_value = AnswerResponse(
@@ -157,9 +604,7 @@ async def test_answer_with_bq_insert_error(
         session={"name": "test-session"},
         answer_query_token="token1",
     )
-    mock_util_handler_methods.bq_insert_row_data.return_value = [
-        {"index": 0, "errors": ["error"]}
-    ]
+    mock_util_handler_methods.bq_enqueue_answer.return_value = False
 
     response = client.post(
         "/answer",
@@ -169,13 +614,13 @@ async def test_answer_with_bq_insert_error(
         },
     )
 
-    assert response.status_code == 500
-    data = response.json()
-    assert data["detail"] == "500: [{'index': 0, 'errors': ['error']}]"
+    # A dropped BigQuery row does not fail the answer.
+    assert response.status_code == 200
+    assert response.json()["answer_query_token"] == "token1"
 
 
 @pytest.mark.asyncio
-async def test_answer_with_bq_insert_exception(
+async def test_answer_with_bq_enqueue_exception(
     mock_util_handler_methods: MagicMock,
 ) -> None:
     mock_util_handler_methods.answer_query.return_value = AnswerResponse(
@@ -186,7 +631,7 @@ async def test_answer_with_bq_insert_exception(
         session={"name": "test-session"},
         answer_query_token="token1",
     )
-    mock_util_handler_methods.bq_insert_row_data.side_effect = Exception(
+    mock_util_handler_methods.bq_enqueue_answer.side_effect = Exception(
         "Test exception"
     )
 
@@ -204,7 +649,6 @@ async def test_answer_with_bq_insert_exception(
 
 @pytest.mark.asyncio
 async def test_feedback(mock_util_handler_methods: MagicMock) -> None:
-    mock_util_handler_methods.bq_insert_row_data.return_value = []
 
     response = client.post(
         "/feedback",
@@ -253,11 +697,8 @@ async def test_feedback_invalid_value(mock_util_handler_methods: MagicMock) -> N
     assert response.status_code == 422
 
 
-@pytest.mark.asyncio
-async def test_feedback_insert_errors(mock_util_handler_methods: MagicMock) -> None:
-    mock_util_handler_methods.bq_insert_row_data.return_value = [
-        {"index": 0, "errors": ["error"]}
-    ]
+def test_feedback_enqueue_rejected(mock_util_handler_methods: MagicMock) -> None:
+    mock_util_handler_methods.bq_enqueue_row_data.return_value = False
 
     response = client.post(
         "/feedback",
@@ -270,6 +711,24 @@ async def test_feedback_insert_errors(mock_util_handler_methods: MagicMock) -> N
         },
     )
 
-    assert response.status_code == 500
-    data = response.json()
-    assert data["detail"] == "[{'index': 0, 'errors': ['error']}]"
+    assert response.status_code == 200
+    mock_util_handler_methods.bq_enqueue_row_data.assert_called_once()
+    args, kwargs = mock_util_handler_methods.bq_enqueue_row_data.call_args
+    assert kwargs["feedback"] is True
+    assert kwargs["data"]["feedback_name"] == "THUMBS_UP"
+
+
+def test_lifespan_starts_and_stops_utils(
+    mock_util_handler_methods: MagicMock,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    mock_util_handler_methods.startup = AsyncMock()
+    mock_util_handler_methods.shutdown = AsyncMock()
+
+    with caplog.at_level("INFO", logger="answer_app.main"), TestClient(app):
+        assert app.state.utils is mock_util_handler_methods
+        mock_util_handler_methods.startup.assert_awaited_once()
+        mock_util_handler_methods.shutdown.assert_not_awaited()
+        assert "Startup timings: import" in caplog.text
+
+    mock_util_handler_methods.shutdown.assert_awaited_once()
@@ -0,0 +1,212 @@
+import asyncio
+import time
+
+import pytest
+
+from answer_app.metrics import Counter
+from answer_app.metrics import Gauge
+from answer_app.metrics import Histogram
+from answer_app.metrics import MetricsCollector
+from answer_app.metrics import Registry
+from answer_app.metrics import log_linear_bounds
+
+
+def test_log_linear_bounds() -> None:
+    assert log_linear_bounds(0.001, 0.004, sub_buckets=2) == (
+        0.001,
+        0.0015,
+        0.002,
+        0.003,
+        0.004,
+    )
+    assert log_linear_bounds(1.0, 5.0, sub_buckets=1) == (1.0, 2.0, 4.0, 8.0)
+
+
+def test_log_linear_bounds_relative_error() -> None:
+    bounds = log_linear_bounds(0.0001, 120.0, sub_buckets=4)
+
+    assert bounds[-1] >= 120.0
+    # Each bucket is at most a quarter of its lower bound wide.
+    for lower, upper in zip(bounds, bounds[1:]):
+        assert (upper - lower) / lower <= 0.25 + 1e-9
+
+
+@pytest.mark.parametrize(
+    "lowest, highest, sub_buckets",
+    [(0.0, 1.0, 4), (1.0, 1.0, 4), (0.1, 1.0, 0)],
+)
+def test_log_linear_bounds_invalid(
+    lowest: float, highest: float, sub_buckets: int
+) -> None:
+    with pytest.raises(ValueError):
+        log_linear_bounds(lowest, highest, sub_buckets)
+
+
+def test_histogram_invalid_bounds() -> None:
+    with pytest.raises(ValueError):
+        Histogram("latency_seconds", "Latency.", bounds=(0.2, 0.1))
+
+
+def test_histogram_buckets_are_inclusive_and_cumulative() -> None:
+    histogram = Histogram("latency_seconds", "Latency.", bounds=(0.1, 0.2))
+
+    for value in (0.05, 0.1, 0.15, 0.5):
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(0.8)
+    assert histogram.samples() == [
+        ("_bucket", 'le="0.1"', 2),
+        ("_bucket", 'le="0.2"', 3),
+        ("_bucket", 'le="+Inf"', 4),
+        ("_sum", "", pytest.approx(0.8)),
+        ("_count", "", 4),
+    ]
+
+
+def test_gauge() -> None:
+    gauge = Gauge("in_flight", "In flight.")
+
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.value == 1.0
+
+    gauge.set(0.25)
+    assert gauge.samples() == [("", "", 0.25)]
+
+
+def test_labeled_gauge() -> None:
+    gauge = Gauge("in_flight", "In flight.", label="channel")
+
+    gauge.inc("1")
+    gauge.inc("0")
+    gauge.inc("0")
+    gauge.dec("0")
+    gauge.set(3, "2")
+
+    assert gauge.get("0") == 1.0
+    assert gauge.samples() == [
+        ("", 'channel="0"', 1.0),
+        ("", 'channel="1"', 1.0),
+        ("", 'channel="2"', 3),
+    ]
+
+
+def test_unlabeled_counter() -> None:
+    counter = Counter("requests", "Requests.")
+
+    assert counter.samples() == [("_total", "", 0.0)]
+    counter.inc()
+    counter.inc(amount=2)
+
+    assert counter.get() == 3.0
+    assert counter.samples() == [("_total", "", 3.0)]
+
+
+def test_counter_escapes_label_values() -> None:
+    counter = Counter("errors", "Errors.", label="type")
+
+    counter.inc("ValueError")
+    counter.inc("ValueError")
+    counter.inc('Bad"Name')
+
+    assert counter.get("ValueError") == 2.0
+    assert counter.get("KeyError") == 0.0
+    assert counter.samples() == [
+        ("_total", 'type="Bad\\"Name"', 1.0),
+        ("_total", 'type="ValueError"', 2.0),
+    ]
+
+
+def _registry() -> Registry:
+    registry = Registry()
+    registry.histogram("latency_seconds", "Latency.", lowest=0.1, highest=0.2)
+    registry.gauge("in_flight", "In flight.").inc()
+    registry.counter("errors", "Errors.", label="type").inc("ValueError")
+
+    return registry
+
+
+def test_registry_render_prometheus() -> None:
+    assert _registry().render() == (
+        "# HELP latency_seconds Latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 0.0\n'
+        'latency_seconds_bucket{le="0.125"} 0.0\n'
+        'latency_seconds_bucket{le="0.15"} 0.0\n'
+        'latency_seconds_bucket{le="0.175"} 0.0\n'
+        'latency_seconds_bucket{le="0.2"} 0.0\n'
+        'latency_seconds_bucket{le="+Inf"} 0.0\n'
+        "latency_seconds_sum 0.0\n"
+        "latency_seconds_count 0.0\n"
+        "# HELP in_flight In flight.\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 1.0\n"
+        "# HELP errors_total Errors.\n"
+        "# TYPE errors_total counter\n"
+        'errors_total{type="ValueError"} 1.0\n'
+    )
+
+
+def test_registry_render_openmetrics() -> None:
+    text = _registry().render(openmetrics=True)
+
+    assert "# TYPE errors counter\n" in text
+    assert 'errors_total{type="ValueError"} 1.0\n' in text
+    assert text.endswith("# EOF\n")
+
+
+def test_registry_duplicate_name() -> None:
+    registry = Registry()
+    registry.gauge("in_flight", "In flight.")
+
+    with pytest.raises(ValueError):
+        registry.gauge("in_flight", "In flight.")
+
+
+def test_histogram_buffers_values_until_collected() -> None:
+    histogram = Histogram("latency_seconds", "Latency.", bounds=(0.1,))
+
+    histogram.observe(0.05)
+    assert histogram._counts == [0, 0]
+
+    histogram.collect()
+    assert histogram._pending == []
+    assert histogram._counts == [1, 0]
+
+
+def test_registry_collect() -> None:
+    registry = _registry()
+    histogram = registry._metrics["latency_seconds"]
+    histogram.observe(0.15)
+
+    registry.collect()
+
+    assert histogram._pending == []
+    assert histogram.samples()[2] == ("_bucket", 'le="0.15"', 1)
+
+
+def test_metrics_collector_invalid_interval() -> None:
+    with pytest.raises(ValueError):
+        MetricsCollector(Registry(), Gauge("lag_seconds", "Lag."), interval_seconds=0)
+
+
+@pytest.mark.asyncio
+async def test_metrics_collector() -> None:
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", 0.1, 0.2)
+    gauge = Gauge("lag_seconds", "Lag.")
+    collector = MetricsCollector(registry, gauge, interval_seconds=0.01)
+    collector.start()
+    histogram.observe(0.15)
+
+    # Let the collector sleep, then hold the loop past its wake-up time. The
+    # collector's timer is due first, so it runs before this test wakes up.
+    await asyncio.sleep(0)
+    time.sleep(0.05)
+    await asyncio.sleep(0.005)
+    await collector.stop()
+
+    assert gauge.value >= 0.03
+    assert histogram._pending == []
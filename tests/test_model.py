@@ -1,9 +1,11 @@
+import base64
+
 import pytest
 
 from pydantic import ValidationError
 
+from answer_app.model import AnswerFormat
 from answer_app.model import AnswerResponse
-from answer_app.model import ClientCitation
 from answer_app.model import EnvVarResponse
 from answer_app.model import FeedbackRequest
 from answer_app.model import FeedbackResponse
@@ -66,6 +68,26 @@ def test_answer_response() -> None:
     assert response.answer_query_token == "token1"
 
 
+def test_answer_response_in_format() -> None:
+    response = AnswerResponse(
+        question="What is the capital of France?",
+        markdown=base64.b64encode(b"**Paris**").decode("utf-8"),
+        latency=0.1,
+        answer={"answer_text": "Paris"},
+        answer_query_token="token1",
+    )
+
+    # Without a cached rendering the markdown is decoded from base64.
+    assert response.rendered.markdown == "**Paris**"
+    assert response.in_format(AnswerFormat.BASE64) is response
+    assert response.in_format(AnswerFormat.MARKDOWN).markdown == "**Paris**"
+    html_response = response.in_format(AnswerFormat.HTML)
+    assert html_response.markdown == "<p><strong>Paris</strong></p>\n"
+    assert html_response.answer == response.answer
+    # The original response keeps its base64 markdown.
+    assert response.markdown == base64.b64encode(b"**Paris**").decode("utf-8")
+
+
 def test_health_check_response() -> None:
     # Valid input.
     health_check = HealthCheckResponse()
@@ -84,60 +106,6 @@ def test_env_var_response() -> None:
     assert env_var.value is None
 
 
-def test_client_citation() -> None:
-    # Valid input.
-    citation = ClientCitation(
-        start_index=0,
-        end_index=10,
-        ref_index=1,
-        content='Test "content"',
-        score=0.9,
-        title="Test Title",
-        citation_index=1,
-        uri="gs://bucket/file.txt",
-    )
-    assert citation.start_index == 0
-    assert citation.end_index == 10
-    assert citation.ref_index == 1
-    assert citation.content == 'Test "content"'
-    assert citation.score == 0.9
-    assert citation.title == "Test Title"
-    assert citation.citation_index == 1
-    assert citation.uri == "gs://bucket/file.txt"
-
-    # Test get_inline_link method.
-    assert (
-        citation.get_inline_link()
-        == " _[[1](https://storage.cloud.google.com/bucket/file.txt \"Test 'content'\")]_"
-    )
-
-    # Test get_footer_link method.
-    assert (
-        citation.get_footer_link() == "https://storage.cloud.google.com/bucket/file.txt"
-    )
-
-    # Test count_chars method.
-    assert citation.count_chars() == len(
-        " _[[1](https://storage.cloud.google.com/bucket/file.txt \"Test 'content'\")]_"
-    )
-
-    # Test without citation_index.
-    citation.citation_index = None
-    with pytest.raises(ValueError):
-        citation.get_inline_link()
-
-    # Test update_citation_index method.
-    citation.update_citation_index(2)
-    assert citation.citation_index == 2
-    assert (
-        citation.get_inline_link()
-        == " _[[2](https://storage.cloud.google.com/bucket/file.txt \"Test 'content'\")]_"
-    )
-    assert citation.count_chars() == len(
-        " _[[2](https://storage.cloud.google.com/bucket/file.txt \"Test 'content'\")]_"
-    )
-
-
 def test_feedback_request() -> None:
     # Valid input thumbs up.
     feedback = FeedbackRequest(
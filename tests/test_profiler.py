@@ -0,0 +1,92 @@
+from collections import Counter
+import threading
+
+import pytest
+
+from answer_app.profiler import SPEEDSCOPE_SCHEMA
+from answer_app.profiler import Profile
+from answer_app.profiler import sample_stacks
+
+
+def spin(stopped: threading.Event) -> None:
+    """Keep a thread busy until stopped."""
+    while not stopped.is_set():
+        sum(range(1000))
+
+
+def outer() -> None:
+    return
+
+
+def inner() -> None:
+    return
+
+
+def test_sample_stacks() -> None:
+    stopped = threading.Event()
+    thread = threading.Thread(target=spin, args=(stopped,), name="spinner")
+    thread.start()
+    try:
+        profile = sample_stacks(0.1, interval_seconds=0.01)
+    finally:
+        stopped.set()
+        thread.join()
+
+    spinner = {
+        stack: count
+        for (thread_name, stack), count in profile.samples.items()
+        if thread_name == "spinner"
+    }
+    assert 5 <= sum(spinner.values()) <= 11
+    # Stacks run from the outermost frame to the innermost, which is spin or the
+    # Event.is_set it calls.
+    assert all(
+        stack[-1].co_name == "spin" or stack[-2].co_name == "spin" for stack in spinner
+    )
+    # The sampler never samples its own thread.
+    assert {thread_name for thread_name, _ in profile.samples} == {"spinner"}
+
+
+@pytest.mark.parametrize("seconds, interval_seconds", [(0, 0.01), (61, 0.01), (1, 0)])
+def test_sample_stacks_invalid(seconds: float, interval_seconds: float) -> None:
+    with pytest.raises(ValueError):
+        sample_stacks(seconds, interval_seconds=interval_seconds)
+
+
+@pytest.fixture
+def profile() -> Profile:
+    samples = Counter(
+        {
+            ("MainThread", (outer.__code__, inner.__code__)): 3,
+            ("MainThread", (outer.__code__,)): 1,
+            ("worker", (inner.__code__,)): 2,
+        }
+    )
+    return Profile(samples, interval_seconds=0.01, seconds=1.0)
+
+
+def test_collapsed(profile: Profile) -> None:
+    lines = profile.collapsed().splitlines()
+
+    assert len(lines) == 3
+    first, count = lines[0].rsplit(" ", 1)
+    assert count == "3"
+    thread_name, outer_frame, inner_frame = first.split(";")
+    assert thread_name == "MainThread"
+    assert outer_frame.startswith("outer (")
+    assert outer_frame.endswith(f":{outer.__code__.co_firstlineno})")
+    assert inner_frame.startswith("inner (")
+
+
+def test_speedscope(profile: Profile) -> None:
+    data = profile.speedscope()
+
+    assert data["$schema"] == SPEEDSCOPE_SCHEMA
+    frames = data["shared"]["frames"]
+    assert [frame["name"] for frame in frames] == ["outer", "inner"]
+    main, worker = data["profiles"]
+    assert main["name"] == "MainThread"
+    assert main["samples"] == [[0, 1], [0]]
+    assert main["weights"] == pytest.approx([0.03, 0.01])
+    assert main["endValue"] == pytest.approx(0.04)
+    assert worker["samples"] == [[1]]
@@ -0,0 +1,102 @@
+from google.cloud.discoveryengine_v1.types import Answer
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+import pytest
+
+from answer_app.projection import parse_fields
+from answer_app.projection import project_response
+
+
+def test_parse_fields() -> None:
+    assert parse_fields(None) is None
+    assert parse_fields("") is None
+    assert parse_fields("full") is None
+    assert parse_fields("minimal,full") is None
+    assert parse_fields("minimal") == {
+        "markdown": True,
+        "latency": True,
+        "answer": {"answer_text": True},
+        "session": {"name": True},
+        "answer_query_token": True,
+        "timings": True,
+    }
+    assert parse_fields("markdown,timings") == {"markdown": True, "timings": True}
+    assert parse_fields(" markdown , answer.references.chunk_info.content ") == {
+        "markdown": True,
+        "answer": {"references": {"__all__": {"chunk_info": {"content": True}}}},
+    }
+    assert parse_fields("answer.references.chunk_info.content,answer.references") == {
+        "answer": {"references": True}
+    }
+    # An enclosing field wins over its subfields, in either order.
+    assert parse_fields("answer.answer_text,answer") == {"answer": True}
+    assert parse_fields("answer,answer.answer_text") == {"answer": True}
+
+
+@pytest.mark.parametrize(
+    "fields",
+    ["unknown", "answer.unknown", "session.name.unknown", "markdown.unknown"],
+)
+def test_parse_fields_unknown(fields: str) -> None:
+    with pytest.raises(ValueError, match="Unknown response field"):
+        parse_fields(fields)
+
+
+@pytest.mark.parametrize(
+    "names",
+    [
+        ["answer_text"],
+        ["state", "create_time", "citations"],
+        ["references", "query_understanding_info", "steps"],
+    ],
+)
+def test_project_response_matches_to_dict(
+    sample_answer_query_response: AnswerQueryResponse, names: list[str]
+) -> None:
+    response = sample_answer_query_response
+    full = AnswerQueryResponse.to_dict(response, use_integers_for_enums=False)
+    fields = ",".join(f"answer.{name}" for name in names)
+
+    projected = project_response(response, parse_fields(fields))
+
+    # Unset messages, such as query_understanding_info, are left out as in to_dict().
+    expected = {name: full["answer"][name] for name in names if name in full["answer"]}
+    assert projected == {"answer": expected}
+
+
+def test_project_response_nested_fields(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    response = sample_answer_query_response
+    full = AnswerQueryResponse.to_dict(response, use_integers_for_enums=False)
+
+    projected = project_response(
+        response,
+        parse_fields("session,answer.references.chunk_info.document_metadata"),
+    )
+
+    assert projected == {
+        "answer": {
+            "references": [
+                {
+                    "chunk_info": {
+                        "document_metadata": reference["chunk_info"][
+                            "document_metadata"
+                        ]
+                    }
+                }
+                for reference in full["answer"]["references"]
+            ]
+        },
+        "session": full["session"],
+    }
+
+
+def test_project_response_skips_unset_messages() -> None:
+    response = AnswerQueryResponse(answer=Answer(answer_text="Paris"))
+
+    projected = project_response(response, parse_fields("minimal"))
+
+    assert projected == {
+        "answer": {"answer_text": "Paris"},
+        "answer_query_token": "",
+    }
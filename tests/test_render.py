@@ -0,0 +1,339 @@
+import base64
+import random
+
+from google.cloud.discoveryengine_v1 import Answer
+import pytest
+
+from answer_app.metrics import citation_link_cache_hits
+from answer_app.metrics import citation_link_cache_misses
+from answer_app.metrics import citation_link_cache_size
+from answer_app.render import LinkCache
+from answer_app.render import RenderedAnswer
+from answer_app.render import _citation_records
+from answer_app.render import _insert_links
+from answer_app.render import _splice_links
+from answer_app.render import footer_link
+from answer_app.render import inline_link
+from answer_app.render import link_cache
+from answer_app.render import markdown_to_html
+from answer_app.render import render_markdown
+
+
+def test_rendered_answer_base64() -> None:
+    answer = Answer(
+        answer_text="This is an answer",
+        citations=[
+            Answer.Citation(
+                start_index=0,
+                end_index=17,
+                sources=[Answer.CitationSource(reference_id="0")],
+            )
+        ],
+        references=[
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content="Reference content",
+                    relevance_score=0.9,
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title="Reference title", uri="http://example.com"
+                    ),
+                )
+            )
+        ],
+    )
+    markdown = RenderedAnswer.from_answer(answer).base64
+    expected_markdown = (
+        'This is an answer _[[1](http://example.com "Reference content")]_\n\n**Citations:**\n\n'
+        "[1] [Reference title](http://example.com)\n\n"
+    )
+    encoded_expected_markdown = base64.b64encode(
+        expected_markdown.encode("utf-8")
+    ).decode("utf-8")
+    assert markdown == encoded_expected_markdown
+
+
+def test_rendered_answer_base64_multiple_citations() -> None:
+    answer = Answer(
+        answer_text="This is an answer. It has multiple citations. Some are repeated. Some are not.",
+        citations=[
+            Answer.Citation(
+                start_index=0,
+                end_index=18,
+                sources=[Answer.CitationSource(reference_id="0")],
+            ),
+            Answer.Citation(
+                start_index=19,
+                end_index=45,
+                sources=[Answer.CitationSource(reference_id="0")],
+            ),
+            Answer.Citation(
+                start_index=46,
+                end_index=64,
+                sources=[Answer.CitationSource(reference_id="4")],
+            ),
+            Answer.Citation(
+                start_index=65,
+                end_index=78,
+                sources=[Answer.CitationSource(reference_id="1")],
+            ),
+        ],
+        references=[
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content="Reference content 0",
+                    relevance_score=0.9,
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title="Reference 0 title", uri="http://example.com"
+                    ),
+                )
+            ),
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content="Reference content 1",
+                    relevance_score=0.9,
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title="Reference 1 title", uri="http://exemplar.com"
+                    ),
+                )
+            ),
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content="Reference content 2",
+                    relevance_score=0.9,
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title="Reference 0 title", uri="http://example.com"
+                    ),
+                )
+            ),
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content="Reference content 3",
+                    relevance_score=0.9,
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title="Reference 1 title", uri="http://exemplar.com"
+                    ),
+                )
+            ),
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content="Reference content 4",
+                    relevance_score=0.9,
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title="Reference 2 title", uri="http://anotherexample.com"
+                    ),
+                )
+            ),
+        ],
+    )
+    markdown = RenderedAnswer.from_answer(answer).base64
+    expected_markdown = (
+        'This is an answer. _[[1](http://example.com "Reference content 0")]_ '
+        'It has multiple citations. _[[1](http://example.com "Reference content 0")]_ '
+        'Some are repeated. _[[2](http://anotherexample.com "Reference content 4")]_ '
+        'Some are not. _[[3](http://exemplar.com "Reference content 1")]_'
+        "\n\n**Citations:**\n\n"
+        "[1] [Reference 0 title](http://example.com)\n\n"
+        "[2] [Reference 2 title](http://anotherexample.com)\n\n"
+        "[3] [Reference 1 title](http://exemplar.com)\n\n"
+    )
+    encoded_expected_markdown = base64.b64encode(
+        expected_markdown.encode("utf-8")
+    ).decode("utf-8")
+    assert markdown == encoded_expected_markdown
+
+
+@pytest.mark.parametrize(
+    "links",
+    [
+        [],
+        [(4, "[a]"), (9, "[b]")],
+        [(4, "[a]"), (4, "[b]"), (4, "[c]")],
+        [(0, "[a]"), (14, "[b]")],
+        [(20, "[a]"), (14, "[b]"), (30, "[c]")],
+        [(9, "[a]"), (4, "[b]")],
+        [(9, "[a]"), (-2, "[b]")],
+    ],
+)
+def test_insert_links_matches_splicing(links: list[tuple[int, str]]) -> None:
+    text = "This is a test"
+    assert _insert_links(text, links) == _splice_links(text, links)
+
+
+def test_insert_links_matches_splicing_random() -> None:
+    rng = random.Random(0)
+    for _ in range(500):
+        text = "".join(rng.choice("ab é") for _ in range(rng.randint(0, 40)))
+        ends = [rng.randint(-2, 45) for _ in range(rng.randint(0, 8))]
+        if rng.random() < 0.5:
+            ends.sort()
+        links = [(end, f"[{index}]" * rng.randint(1, 3)) for index, end in enumerate(ends)]
+        assert _insert_links(text, links) == _splice_links(text, links)
+
+
+def test_footer_link() -> None:
+    assert (
+        footer_link("gs://bucket/folder name/file.pdf")
+        == "https://storage.cloud.google.com/bucket/folder%20name/file.pdf"
+    )
+    assert footer_link("http://example.com") == "http://example.com"
+
+
+def test_inline_link() -> None:
+    assert (
+        inline_link(2, "http://example.com", 'Some "quoted" content')
+        == " _[[2](http://example.com \"Some 'quoted' content\")]_"
+    )
+
+
+def test_citation_records() -> None:
+    answer = Answer(
+        answer_text="First. Second. Third.",
+        citations=[
+            Answer.Citation(
+                start_index=7,
+                end_index=14,
+                sources=[
+                    Answer.CitationSource(reference_id="1"),
+                    Answer.CitationSource(reference_id="0"),
+                ],
+            ),
+            Answer.Citation(
+                start_index=0,
+                end_index=6,
+                sources=[Answer.CitationSource(reference_id="1")],
+            ),
+        ],
+        references=[
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content=f"Content {index}",
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title=f"Title {index}", uri=f"gs://bucket/{index}.pdf"
+                    ),
+                )
+            )
+            for index in range(2)
+        ],
+    )
+
+    records = _citation_records(answer)
+
+    assert [(record.start_index, record.end_index) for record in records] == [
+        (0, 6),
+        (7, 14),
+        (7, 14),
+    ]
+    assert [record.reference.title for record in records] == [
+        "Title 1",
+        "Title 1",
+        "Title 0",
+    ]
+    # Each cited reference is read once however many times it is cited.
+    assert records[0].reference is records[1].reference
+    assert records[0].reference.link == "https://storage.cloud.google.com/bucket/1.pdf"
+
+
+def test_link_cache() -> None:
+    cache = LinkCache(max_size=2)
+
+    link = cache.footer_link("gs://bucket/a b.pdf")
+    assert link == "https://storage.cloud.google.com/bucket/a%20b.pdf"
+    assert cache.footer_link("gs://bucket/a b.pdf") is link
+    assert cache.footer_line("gs://bucket/a b.pdf", "A") == f" [A]({link})\n\n"
+    assert cache.footer_line("gs://bucket/a b.pdf", "A") == f" [A]({link})\n\n"
+
+    stats = cache.stats()
+    assert stats["link_hits"] == 2
+    assert stats["link_misses"] == 1
+    assert stats["line_hits"] == 1
+    assert stats["line_misses"] == 1
+    assert stats["line_hit_rate"] == 0.5
+
+
+def test_link_cache_eviction_and_resize() -> None:
+    cache = LinkCache(max_size=2)
+    for uri in ("a", "b", "a", "c"):
+        cache.footer_link(uri)
+
+    # "b" is the least recently used link.
+    assert list(cache._links) == ["a", "c"]
+
+    cache.resize(1)
+    assert list(cache._links) == ["c"]
+    assert cache.max_size == 1
+
+    cache.resize(0)
+    cache.footer_link("d")
+    assert cache.stats()["links"] == 0
+
+    cache.clear()
+    assert cache.stats()["lines"] == 0
+
+
+def test_rendered_answer_uses_link_cache() -> None:
+    link_cache.clear()
+    answer = Answer(
+        answer_text="This is an answer",
+        citations=[
+            Answer.Citation(
+                start_index=0,
+                end_index=17,
+                sources=[Answer.CitationSource(reference_id="0")],
+            )
+        ],
+        references=[
+            Answer.Reference(
+                chunk_info=Answer.Reference.ChunkInfo(
+                    content="Reference content",
+                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
+                        title="Reference title", uri="http://example.com"
+                    ),
+                )
+            )
+        ],
+    )
+    hits = link_cache.link_hits
+    line_hits = citation_link_cache_hits.get("line")
+    line_misses = citation_link_cache_misses.get("line")
+
+    first = RenderedAnswer.from_answer(answer).base64
+    assert RenderedAnswer.from_answer(answer).base64 == first
+    assert link_cache.link_hits > hits
+    assert link_cache.line_hits >= 1
+
+    # The process-wide memo is exported at /metrics.
+    assert citation_link_cache_hits.get("line") == line_hits + 1
+    assert citation_link_cache_misses.get("line") == line_misses + 1
+    assert citation_link_cache_size.get("line") == 1
+
+
+def test_markdown_to_html_is_sanitized() -> None:
+    html = markdown_to_html(
+        "**Bold** <img src=x onerror=alert(1)> [link](javascript:alert(1))"
+    )
+
+    assert "<strong>Bold</strong>" in html
+    assert "<img" not in html
+    assert 'href="javascript' not in html
+
+
+def test_rendered_answer() -> None:
+    rendered = RenderedAnswer("**Paris**")
+
+    assert rendered.to_format("markdown") == "**Paris**"
+    assert rendered.to_format("base64") == base64.b64encode(b"**Paris**").decode("utf-8")
+    html = rendered.to_format("html")
+    assert html == "<p><strong>Paris</strong></p>\n"
+    # Each format is rendered once.
+    assert rendered.to_format("html") is html
+
+    with pytest.raises(ValueError):
+        rendered.to_format("pdf")
+
+
+def test_rendered_answer_from_answer() -> None:
+    answer = Answer(answer_text="Paris")
+    rendered = RenderedAnswer.from_answer(answer)
+
+    assert rendered.markdown == render_markdown(answer)
+    assert base64.b64decode(rendered.base64).decode("utf-8") == rendered.markdown
@@ -0,0 +1,47 @@
+import json
+
+from google.cloud.discoveryengine_v1.types import AnswerQueryResponse
+from starlette.responses import JSONResponse
+
+from answer_app.model import AnswerResponse
+from answer_app.responses import ModelJSONResponse
+
+
+def _answer_response(response: AnswerQueryResponse) -> AnswerResponse:
+    response_dict = AnswerQueryResponse.to_dict(response, use_integers_for_enums=False)
+
+    return AnswerResponse.model_construct(
+        question="What is the capital of France? ✓",
+        markdown="KipQYXJpcyoq",
+        latency=0.1,
+        answer=response_dict["answer"],
+        session=response_dict["session"],
+        answer_query_token=response_dict["answer_query_token"],
+    )
+
+
+def test_model_json_response_matches_json_response(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    answer_response = _answer_response(sample_answer_query_response)
+
+    response = ModelJSONResponse(answer_response, headers={"Vary": "Accept"})
+
+    assert response.body == JSONResponse(answer_response.model_dump()).body
+    assert response.media_type == "application/json"
+    assert response.headers["Vary"] == "Accept"
+    assert response.headers["Content-Length"] == str(len(response.body))
+
+
+def test_model_json_response_include(
+    sample_answer_query_response: AnswerQueryResponse,
+) -> None:
+    response = ModelJSONResponse(
+        _answer_response(sample_answer_query_response),
+        include={"markdown": True, "answer": {"answer_text": True}},
+    )
+
+    assert json.loads(response.body) == {
+        "markdown": "KipQYXJpcyoq",
+        "answer": {"answer_text": "Test answer."},
+    }
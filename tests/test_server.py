@@ -0,0 +1,165 @@
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+import uvicorn
+
+from answer_app.server import available_cpus
+from answer_app.server import cgroup_cpu_limit
+from answer_app.server import load_server_settings
+from answer_app.server import main
+from answer_app.server import serve
+from answer_app.server import server_config
+
+
+@pytest.mark.parametrize(
+    "files, expected",
+    [
+        ({"cpu.max": "200000 100000\n"}, 2.0),
+        ({"cpu.max": "150000 100000\n"}, 1.5),
+        ({"cpu.max": "max 100000\n"}, None),
+        (
+            {"cpu/cpu.cfs_quota_us": "400000\n", "cpu/cpu.cfs_period_us": "100000\n"},
+            4.0,
+        ),
+        (
+            {"cpu/cpu.cfs_quota_us": "-1\n", "cpu/cpu.cfs_period_us": "100000\n"},
+            None,
+        ),
+        ({}, None),
+    ],
+)
+def test_cgroup_cpu_limit(
+    tmp_path: Path,
+    files: dict[str, str],
+    expected: float | None,
+) -> None:
+    for name, content in files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(content)
+
+    assert cgroup_cpu_limit(str(tmp_path)) == expected
+
+
+@pytest.mark.parametrize(
+    "affinity, limit, expected",
+    [
+        (8, None, 8),
+        (8, 2.0, 2),
+        (8, 1.5, 2),
+        (8, 0.5, 1),
+        (2, 4.0, 2),
+    ],
+)
+def test_available_cpus(affinity: int, limit: float | None, expected: int) -> None:
+    with (
+        patch(
+            "answer_app.server.os.sched_getaffinity",
+            return_value=set(range(affinity)),
+        ),
+        patch("answer_app.server.cgroup_cpu_limit", return_value=limit),
+    ):
+        assert available_cpus() == expected
+
+
+def test_server_config_defaults() -> None:
+    with (
+        patch("answer_app.server.available_cpus", return_value=4),
+        patch("answer_app.server._installed", return_value=False),
+    ):
+        config = server_config()
+
+    assert isinstance(config, uvicorn.Config)
+    assert config.app == "answer_app.main:app"
+    assert config.host == "0.0.0.0"
+    assert config.port == 8080
+    assert config.workers == 4
+    assert config.loop == "asyncio"
+    assert config.http == "h11"
+    assert config.backlog == 2048
+    assert config.timeout_keep_alive == 620
+    assert config.timeout_graceful_shutdown == 8
+
+
+def test_server_config_uses_uvloop_and_httptools_when_installed() -> None:
+    with patch("answer_app.server._installed", return_value=True):
+        config = server_config(workers=1)
+
+    assert config.loop == "uvloop"
+    assert config.http == "httptools"
+
+
+def test_server_config_explicit_settings() -> None:
+    config = server_config(
+        port="9000", workers="3", loop="asyncio", http="h11", log_level="DEBUG"
+    )
+
+    assert config.port == 9000
+    assert config.workers == 3
+    assert config.loop == "asyncio"
+    assert config.http == "h11"
+    assert config.log_level == "debug"
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        ({"loop": "trio"}, "loop must be one of"),
+        ({"http": "h2"}, "http must be one of"),
+        ({"workers": 0}, "workers must be at least 1"),
+    ],
+)
+def test_server_config_invalid(kwargs: dict[str, str | int], message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        server_config(**kwargs)
+
+
+def test_load_server_settings() -> None:
+    settings = load_server_settings(environ={})
+
+    assert settings["port"] == 8080
+    assert settings["workers"] == "auto"
+    assert settings["timeout_keep_alive"] == 620
+
+
+def test_load_server_settings_environment_overrides() -> None:
+    settings = load_server_settings(
+        environ={"PORT": "8081", "WEB_CONCURRENCY": "2", "LOG_LEVEL": "DEBUG"}
+    )
+
+    assert settings["port"] == "8081"
+    assert settings["workers"] == "2"
+    assert settings["log_level"] == "DEBUG"
+    assert server_config(**settings).port == 8081
+
+
+def test_serve_runs_supervisor() -> None:
+    config = server_config(workers=2)
+    sock = MagicMock()
+
+    with (
+        patch.object(uvicorn.Config, "bind_socket", return_value=sock),
+        patch("answer_app.server.Multiprocess") as mock_multiprocess,
+    ):
+        serve(config)
+
+    # uvicorn 0.34 runs the worker function of the server in each process.
+    mock_multiprocess.assert_called_once()
+    assert mock_multiprocess.call_args.args == (config,)
+    assert mock_multiprocess.call_args.kwargs["sockets"] == [sock]
+    target = mock_multiprocess.call_args.kwargs["target"]
+    assert isinstance(target.__self__, uvicorn.Server)
+    assert target.__self__.config is config
+    mock_multiprocess.return_value.run.assert_called_once()
+    sock.close.assert_called_once()
+
+
+def test_main() -> None:
+    with (
+        patch("answer_app.server.serve") as mock_serve,
+        patch.dict("os.environ", {"WEB_CONCURRENCY": "2"}),
+    ):
+        main()
+
+    config = mock_serve.call_args.args[0]
+    assert config.workers == 2
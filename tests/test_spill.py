@@ -0,0 +1,120 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from answer_app.spill import SpillLog
+
+
+def _record(n: int) -> dict:
+    return {"table": "table", "insert_id": str(n), "row": {"n": n}, "attempts": 0}
+
+
+def test_invalid_fsync_policy(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="sometimes")
+
+
+def test_creates_directory(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "nested" / "spill.log"))
+    assert (tmp_path / "nested").is_dir()
+    assert spill_log.path == str(tmp_path / "nested" / "spill.log")
+
+
+def test_append_and_take(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+
+    assert spill_log.take() == []
+    assert spill_log.append([_record(1), _record(2)]) == 2
+    assert spill_log.append([]) == 0
+    assert spill_log.size() > 0
+
+    assert spill_log.take() == [_record(1), _record(2)]
+
+
+def test_take_without_ack_returns_records_again(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    spill_log.append([_record(1)])
+
+    assert spill_log.take() == [_record(1)]
+
+    # Records appended during an unacknowledged replay are merged.
+    spill_log.append([_record(2)])
+    assert spill_log.take() == [_record(1), _record(2)]
+
+    spill_log.ack()
+    assert spill_log.take() == []
+    assert spill_log.size() == 0
+
+
+def test_ack_without_take(tmp_path: Path) -> None:
+    spill_log = SpillLog(path=str(tmp_path / "spill.log"), fsync_policy="never")
+    spill_log.ack()
+
+
+def test_truncated_record_is_skipped(tmp_path: Path) -> None:
+    path = tmp_path / "spill.log"
+    spill_log = SpillLog(path=str(path), fsync_policy="never")
+    spill_log.append([_record(1), _record(2)])
+
+    # Simulate a crash in the middle of the last append.
+    data = path.read_bytes()
+    path.write_bytes(data[:-5])
+
+    assert spill_log.take() == [_record(1)]
+
+
+def test_corrupt_record_is_skipped(tmp_path: Path) -> None:
+    path = tmp_path / "spill.log"
+    spill_log = SpillLog(path=str(path), fsync_policy="never")
+    spill_log.append([_record(1)])
+    with open(path, "ab") as file:
+        file.write(b"\x00\x00\x00\x03abc")
+    spill_log.append([_record(2)])
+
+    assert spill_log.take() == [_record(1), _record(2)]
+
+
+@pytest.mark.parametrize(
+    "fsync_policy,expected_fsyncs",
+    [("always", 3), ("interval", 1), ("never", 0)],
+)
+def test_fsync_policy(tmp_path: Path, fsync_policy: str, expected_fsyncs: int) -> None:
+    spill_log = SpillLog(
+        path=str(tmp_path / "spill.log"),
+        fsync_policy=fsync_policy,
+        fsync_interval_seconds=60,
+    )
+
+    with patch("answer_app.spill.os.fsync") as mock_fsync:
+        for n in range(3):
+            spill_log.append([_record(n)])
+
+    assert mock_fsync.call_count == expected_fsyncs
+
+
+def test_each_process_claims_its_own_spill_file(tmp_path: Path) -> None:
+    path = str(tmp_path / "spill.log")
+    first = SpillLog(path=path, fsync_policy="never")
+    second = SpillLog(path=path, fsync_policy="never")
+
+    assert first.path == path
+    assert second.path == f"{path}.1"
+
+    first.append([_record(1)])
+    second.append([_record(2)])
+    assert second.take() == [_record(2)]
+    assert first.take() == [_record(1)]
+
+
+def test_released_spill_file_is_taken_over(tmp_path: Path) -> None:
+    path = str(tmp_path / "spill.log")
+    first = SpillLog(path=path, fsync_policy="never")
+    first.append([_record(1)])
+
+    # The lock is released when the process holding it exits.
+    first._slot_lock.close()
+    replacement = SpillLog(path=path, fsync_policy="never")
+
+    assert replacement.path == path
+    assert replacement.take() == [_record(1)]
@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+import pytest
+
+from answer_app.metrics import Histogram
+from answer_app.timing import RequestTimings
+from answer_app.timing import _current
+from answer_app.timing import request_timings
+from answer_app.timing import stage
+
+
+def test_stages_accumulate_in_order() -> None:
+    timings = RequestTimings()
+    timings.add("discoveryengine", 0.5)
+    timings.add("render", 0.25)
+    timings.add("discoveryengine", 0.5)
+
+    assert timings.stages == {"discoveryengine": 1.0, "render": 0.25}
+
+
+def test_stage_context() -> None:
+    timings = RequestTimings()
+
+    with patch("answer_app.timing.time.perf_counter", side_effect=[1.0, 1.5]):
+        with timings.stage("render"):
+            pass
+
+    assert timings.stages == {"render": 0.5}
+
+
+def test_stage_records_on_error() -> None:
+    timings = RequestTimings()
+
+    with pytest.raises(RuntimeError):
+        with timings.stage("discoveryengine"):
+            raise RuntimeError("failed")
+
+    assert "discoveryengine" in timings.stages
+
+
+def test_server_timing() -> None:
+    with patch("answer_app.timing.time.perf_counter", side_effect=[10.0, 10.5]):
+        timings = RequestTimings()
+        timings.add("discoveryengine", 0.4)
+        timings.add("render", 0.00125)
+
+        assert timings.server_timing() == (
+            "discoveryengine;dur=400.00, render;dur=1.25, total;dur=500.00"
+        )
+
+
+def test_request_timings_collects_stages() -> None:
+    with request_timings() as timings:
+        with stage("to_dict"):
+            pass
+        with request_timings() as inner:
+            with stage("render"):
+                pass
+        with stage("serialize"):
+            pass
+
+    assert list(timings.stages) == ["to_dict", "serialize"]
+    assert list(inner.stages) == ["render"]
+    assert _current.get() is None
+
+
+def test_stage_without_request_timings() -> None:
+    with stage("render"):
+        pass
+
+    assert _current.get() is None
+
+
+def test_stage_observes_histogram() -> None:
+    histogram = Histogram("render_seconds", "Render time.", bounds=(1.0,))
+
+    # The histogram records the duration with or without request timings.
+    with patch("answer_app.timing.time.perf_counter", side_effect=[1.0, 1.5]):
+        with stage("render", histogram):
+            pass
+    with request_timings() as timings:
+        with stage("render", histogram):
+            pass
+
+    assert histogram.count == 2
+    assert histogram.sum >= 0.5
+    assert list(timings.stages) == ["render"]
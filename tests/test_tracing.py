@@ -0,0 +1,152 @@
+import sys
+from typing import Any, Iterator
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from answer_app import tracing
+from answer_app.tracing import TracingMiddleware
+from answer_app.tracing import configure_tracing
+from answer_app.tracing import shutdown_tracing
+from answer_app.tracing import span
+
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+PARENT_ID = "b7ad6b7169203331"
+TRACEPARENT = f"00-{TRACE_ID}-{PARENT_ID}-01"
+
+
+def test_configure_tracing_disabled() -> None:
+    assert not configure_tracing(enabled=False)
+    assert tracing._tracer is None
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [{"exporter": "zipkin"}, {"sample_ratio": 1.5}, {"sample_ratio": -0.1}],
+)
+def test_configure_tracing_invalid(settings: dict[str, Any]) -> None:
+    with pytest.raises(ValueError):
+        configure_tracing(enabled=True, **settings)
+
+
+def test_configure_tracing_without_sdk(caplog: pytest.LogCaptureFixture) -> None:
+    # A None entry in sys.modules makes the import fail.
+    with patch.dict(sys.modules, {"opentelemetry.sdk.trace": None}):
+        assert not configure_tracing(enabled=True, exporter="console")
+
+    assert tracing._tracer is None
+    assert "OpenTelemetry is not installed" in caplog.text
+
+
+def test_span_without_tracing() -> None:
+    with span("discoveryengine.answer_query", attributes={"session": False}) as s:
+        assert s is None
+    with span("discoveryengine.stream_answer_query", current=False) as s:
+        assert s is None
+
+
+def _traced_app() -> FastAPI:
+    """An app that returns the trace ID of the current span in its handler."""
+    from opentelemetry import trace
+
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/trace")
+    def current_trace() -> dict[str, str]:
+        span_context = trace.get_current_span().get_span_context()
+        return {"trace_id": format(span_context.trace_id, "032x")}
+
+    return app
+
+
+def test_middleware_without_tracing() -> None:
+    pytest.importorskip("opentelemetry.trace")
+    client = TestClient(_traced_app())
+
+    response = client.get("/trace", headers={"traceparent": TRACEPARENT})
+
+    assert response.status_code == 200
+    assert response.json()["trace_id"] == "0" * 32
+
+
+def test_middleware_continues_trace() -> None:
+    trace = pytest.importorskip("opentelemetry.trace")
+    client = TestClient(_traced_app())
+
+    # The API's tracer records nothing but keeps the extracted parent current.
+    with patch("answer_app.tracing._tracer", trace.NoOpTracer()):
+        response = client.get("/trace", headers={"traceparent": TRACEPARENT})
+
+    assert response.status_code == 200
+    assert response.json()["trace_id"] == TRACE_ID
+
+
+@pytest.fixture
+def exported_spans() -> Iterator[Any]:
+    """Record the spans of the app with the OpenTelemetry SDK, if installed."""
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    with patch("answer_app.tracing._tracer", provider.get_tracer("test")):
+        yield exporter
+
+
+def test_server_span_is_parent_of_handler_spans(exported_spans: Any) -> None:
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/answer")
+    def answer() -> dict[str, str]:
+        with span("discoveryengine.answer_query"):
+            return {}
+
+    response = TestClient(app).get("/answer", headers={"traceparent": TRACEPARENT})
+
+    assert response.status_code == 200
+    child, server = exported_spans.get_finished_spans()
+    assert server.name == "GET /answer"
+    assert format(server.context.trace_id, "032x") == TRACE_ID
+    assert format(server.parent.span_id, "016x") == PARENT_ID
+    assert server.attributes["http.response.status_code"] == 200
+    assert child.parent.span_id == server.context.span_id
+
+
+def test_detached_span_records_errors(exported_spans: Any) -> None:
+    from opentelemetry import trace
+
+    with pytest.raises(RuntimeError):
+        with span("discoveryengine.stream_answer_query", current=False):
+            assert not trace.get_current_span().get_span_context().is_valid
+            raise RuntimeError("stream failed")
+
+    (detached,) = exported_spans.get_finished_spans()
+    assert not detached.status.is_ok
+    assert detached.events[0].name == "exception"
+
+
+def test_file_exporter_closes_file(tmp_path: Any) -> None:
+    pytest.importorskip("opentelemetry.sdk.trace")
+    file_path = tmp_path / "traces" / "traces.jsonl"
+
+    assert configure_tracing(
+        enabled=True, exporter="file", sample_ratio=1.0, file_path=str(file_path)
+    )
+    trace_file = tracing._trace_file
+    with span("discoveryengine.answer_query"):
+        pass
+    shutdown_tracing()
+
+    assert trace_file is not None and trace_file.closed
+    assert tracing._trace_file is None
+    (line,) = file_path.read_text().splitlines()
+    assert '"name": "discoveryengine.answer_query"' in line
@@ -0,0 +1,156 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from google.api_core.client_options import ClientOptions
+from google.cloud.discoveryengine_v1 import AnswerQueryRequest
+from google.cloud.discoveryengine_v1 import AnswerQueryResponse
+from google.cloud.discoveryengine_v1 import DeleteSessionRequest
+from google.cloud.discoveryengine_v1 import ListSessionsRequest
+from google.cloud.discoveryengine_v1 import Session
+from google.cloud.discoveryengine_v1.services.conversational_search_service.transports import (
+    ConversationalSearchServiceGrpcAsyncIOTransport,
+)
+import grpc
+import pytest
+
+from answer_app.transport import ClientTransport
+from answer_app.transport import RestAsyncClient
+
+
+def test_invalid_settings() -> None:
+    with pytest.raises(ValueError, match="kind"):
+        ClientTransport(kind="http3")
+
+    with pytest.raises(ValueError, match="compression"):
+        ClientTransport(compression="br")
+
+
+def test_create_grpc_client() -> None:
+    transport = ClientTransport()
+    client_options = ClientOptions(api_endpoint="us-discoveryengine.googleapis.com")
+
+    with patch(
+        "answer_app.transport.discoveryengine.ConversationalSearchServiceAsyncClient"
+    ) as mock_client:
+        client = transport.create_client(client_options=client_options)
+
+    assert client == mock_client.return_value
+    mock_client.assert_called_once_with(
+        client_options=client_options,
+        credentials=None,
+        transport=transport._grpc_transport,
+    )
+
+
+def test_grpc_transport_uses_the_channel_settings() -> None:
+    transport = ClientTransport()
+
+    with patch(
+        "answer_app.transport.ConversationalSearchServiceGrpcAsyncIOTransport"
+    ) as mock_transport:
+        grpc_transport = transport._grpc_transport(host="test-host")
+
+    assert grpc_transport == mock_transport.return_value
+    mock_transport.assert_called_once_with(
+        channel=transport._create_channel, host="test-host"
+    )
+
+
+def test_create_channel() -> None:
+    transport = ClientTransport(
+        compression="gzip",
+        keepalive_time_ms=30_000,
+        keepalive_permit_without_calls=True,
+        max_receive_message_bytes=8_000_000,
+    )
+
+    with patch.object(
+        ConversationalSearchServiceGrpcAsyncIOTransport, "create_channel"
+    ) as mock_create_channel:
+        transport._create_channel(
+            "test-host",
+            credentials="credentials",
+            options=[
+                ("grpc.max_send_message_length", -1),
+                ("grpc.max_receive_message_length", -1),
+                ("grpc.primary_user_agent", "test-agent"),
+            ],
+        )
+
+    args, kwargs = mock_create_channel.call_args
+    assert args == ("test-host",)
+    assert kwargs["credentials"] == "credentials"
+    assert kwargs["compression"] == grpc.Compression.Gzip
+    options = dict(kwargs["options"])
+    # The transport's options are kept unless the settings override them.
+    assert len(kwargs["options"]) == len(options)
+    assert options["grpc.primary_user_agent"] == "test-agent"
+    assert options["grpc.max_send_message_length"] == -1
+    assert options["grpc.max_receive_message_length"] == 8_000_000
+    assert options["grpc.keepalive_time_ms"] == 30_000
+    assert options["grpc.keepalive_timeout_ms"] == 20_000
+    assert options["grpc.keepalive_permit_without_calls"] == 1
+    assert options["grpc.client_idle_timeout_ms"] == 300_000
+    assert options["grpc.use_local_subchannel_pool"] == 1
+
+
+def test_settings() -> None:
+    settings = ClientTransport(kind="rest").settings()
+
+    assert settings["kind"] == "rest"
+    assert settings["compression"] == "NoCompression"
+    assert settings["channel_options"]["grpc.keepalive_time_ms"] == 60_000
+
+
+def test_create_rest_client() -> None:
+    with patch(
+        "answer_app.transport.discoveryengine.ConversationalSearchServiceClient"
+    ) as mock_client:
+        client = ClientTransport(kind="rest").create_client(credentials="credentials")
+
+    assert isinstance(client, RestAsyncClient)
+    assert client.transport == mock_client.return_value.transport
+    mock_client.assert_called_once_with(
+        client_options=None, credentials="credentials", transport="rest"
+    )
+
+
+@pytest.mark.asyncio
+async def test_connect() -> None:
+    client = MagicMock()
+    client.transport.grpc_channel.channel_ready = AsyncMock()
+
+    await ClientTransport().connect(client)
+    client.transport.grpc_channel.channel_ready.assert_awaited_once()
+
+    client.transport.grpc_channel.channel_ready.reset_mock()
+    await ClientTransport(kind="rest").connect(client)
+    client.transport.grpc_channel.channel_ready.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_rest_async_client() -> None:
+    sync_client = MagicMock()
+    sync_client.answer_query.return_value = AnswerQueryResponse(
+        answer_query_token="token"
+    )
+    sync_client.stream_answer_query.return_value = iter(
+        [AnswerQueryResponse(answer_query_token=str(i)) for i in range(3)]
+    )
+    sync_client.list_sessions.return_value = [Session(name="s1"), Session(name="s2")]
+    client = RestAsyncClient(sync_client)
+    request = AnswerQueryRequest(query={"text": "q"})
+
+    response = await client.answer_query(request)
+    stream = await client.stream_answer_query(request)
+    chunks = [chunk.answer_query_token async for chunk in stream]
+    pager = await client.list_sessions(request=ListSessionsRequest(parent="p"))
+    sessions = [session.name async for session in pager]
+    await client.delete_session(request=DeleteSessionRequest(name="s1"))
+
+    assert response.answer_query_token == "token"
+    sync_client.answer_query.assert_called_once_with(request)
+    assert chunks == ["0", "1", "2"]
+    assert sessions == ["s1", "s2"]
+    sync_client.delete_session.assert_called_once_with(
+        request=DeleteSessionRequest(name="s1")
+    )
@@ -1,16 +1,26 @@
+import asyncio
 import base64
-from unittest.mock import MagicMock, AsyncMock
+from pathlib import Path
+from typing import Any, AsyncIterator
+from unittest.mock import MagicMock, AsyncMock, patch
 
 from google.cloud.discoveryengine_v1 import Answer
 from google.cloud.discoveryengine_v1 import AnswerQueryResponse
 from google.cloud.discoveryengine_v1 import Session
 import pytest
 
+from answer_app.cache import AnswerCache
+from answer_app.metrics import discoveryengine_seconds
+from answer_app.metrics import render_seconds
 from answer_app.model import AnswerResponse
 from answer_app.model import GetSessionResponse
+from answer_app.model import ReadinessResponse
+from answer_app.model import StageTiming
+from answer_app.timing import request_timings
 from answer_app.utils import UtilHandler
-from answer_app.utils import _answer_to_markdown
+from answer_app.utils import response_compression_settings
 from answer_app.utils import sanitize
+from answer_app.watchdog import LoopWatchdog
 
 
 def test_sanitize() -> None:
@@ -27,129 +37,6 @@ def test_sanitize() -> None:
     assert sanitize(input_text) == expected_output
 
 
-def test_answer_to_markdown() -> None:
-    answer = Answer(
-        answer_text="This is an answer",
-        citations=[
-            Answer.Citation(
-                start_index=0,
-                end_index=17,
-                sources=[Answer.CitationSource(reference_id="0")],
-            )
-        ],
-        references=[
-            Answer.Reference(
-                chunk_info=Answer.Reference.ChunkInfo(
-                    content="Reference content",
-                    relevance_score=0.9,
-                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
-                        title="Reference title", uri="http://example.com"
-                    ),
-                )
-            )
-        ],
-    )
-    markdown = _answer_to_markdown(answer)
-    expected_markdown = (
-        'This is an answer _[[1](http://example.com "Reference content")]_\n\n**Citations:**\n\n'
-        "[1] [Reference title](http://example.com)\n\n"
-    )
-    encoded_expected_markdown = base64.b64encode(
-        expected_markdown.encode("utf-8")
-    ).decode("utf-8")
-    assert markdown == encoded_expected_markdown
-
-
-def test_answer_to_markdown_multiple_citations() -> None:
-    answer = Answer(
-        answer_text="This is an answer. It has multiple citations. Some are repeated. Some are not.",
-        citations=[
-            Answer.Citation(
-                start_index=0,
-                end_index=18,
-                sources=[Answer.CitationSource(reference_id="0")],
-            ),
-            Answer.Citation(
-                start_index=19,
-                end_index=45,
-                sources=[Answer.CitationSource(reference_id="0")],
-            ),
-            Answer.Citation(
-                start_index=46,
-                end_index=64,
-                sources=[Answer.CitationSource(reference_id="4")],
-            ),
-            Answer.Citation(
-                start_index=65,
-                end_index=78,
-                sources=[Answer.CitationSource(reference_id="1")],
-            ),
-        ],
-        references=[
-            Answer.Reference(
-                chunk_info=Answer.Reference.ChunkInfo(
-                    content="Reference content 0",
-                    relevance_score=0.9,
-                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
-                        title="Reference 0 title", uri="http://example.com"
-                    ),
-                )
-            ),
-            Answer.Reference(
-                chunk_info=Answer.Reference.ChunkInfo(
-                    content="Reference content 1",
-                    relevance_score=0.9,
-                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
-                        title="Reference 1 title", uri="http://exemplar.com"
-                    ),
-                )
-            ),
-            Answer.Reference(
-                chunk_info=Answer.Reference.ChunkInfo(
-                    content="Reference content 2",
-                    relevance_score=0.9,
-                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
-                        title="Reference 0 title", uri="http://example.com"
-                    ),
-                )
-            ),
-            Answer.Reference(
-                chunk_info=Answer.Reference.ChunkInfo(
-                    content="Reference content 3",
-                    relevance_score=0.9,
-                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
-                        title="Reference 1 title", uri="http://exemplar.com"
-                    ),
-                )
-            ),
-            Answer.Reference(
-                chunk_info=Answer.Reference.ChunkInfo(
-                    content="Reference content 4",
-                    relevance_score=0.9,
-                    document_metadata=Answer.Reference.ChunkInfo.DocumentMetadata(
-                        title="Reference 2 title", uri="http://anotherexample.com"
-                    ),
-                )
-            ),
-        ],
-    )
-    markdown = _answer_to_markdown(answer)
-    expected_markdown = (
-        'This is an answer. _[[1](http://example.com "Reference content 0")]_ '
-        'It has multiple citations. _[[1](http://example.com "Reference content 0")]_ '
-        'Some are repeated. _[[2](http://anotherexample.com "Reference content 4")]_ '
-        'Some are not. _[[3](http://exemplar.com "Reference content 1")]_'
-        "\n\n**Citations:**\n\n"
-        "[1] [Reference 0 title](http://example.com)\n\n"
-        "[2] [Reference 2 title](http://anotherexample.com)\n\n"
-        "[3] [Reference 1 title](http://exemplar.com)\n\n"
-    )
-    encoded_expected_markdown = base64.b64encode(
-        expected_markdown.encode("utf-8")
-    ).decode("utf-8")
-    assert markdown == encoded_expected_markdown
-
-
 def test_initialization(mock_answer_app_util_handler: UtilHandler) -> None:
     handler = mock_answer_app_util_handler
     assert handler._project == "test-project-id"
@@ -222,6 +109,33 @@ async def test_answer_query_no_session_id(
     )
 
 
+@pytest.mark.asyncio
+async def test_answer_query_records_stages(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._vais_handler.answer_query = AsyncMock(
+        return_value=AnswerQueryResponse(
+            answer=Answer(answer_text="Paris"),
+            answer_query_token="token1",
+        )
+    )
+
+    calls = discoveryengine_seconds.count
+    renders = render_seconds.count
+
+    with request_timings() as timings:
+        await handler.answer_query(
+            query_text="What is the capital of France?",
+            session_id=None,
+            user_pseudo_id="",
+        )
+
+    assert list(timings.stages) == ["discoveryengine", "render", "to_dict"]
+    assert discoveryengine_seconds.count == calls + 1
+    assert render_seconds.count == renders + 1
+
+
 @pytest.mark.asyncio
 async def test_answer_query_with_session_id(
     mock_answer_app_util_handler: UtilHandler,
@@ -251,6 +165,248 @@ async def test_answer_query_with_session_id(
     )
 
 
+def test_answer_cache_disabled_by_default(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    assert mock_answer_app_util_handler._answer_cache is None
+
+
+def test_load_answer_cache(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._config["answer_cache"] = {
+        "enabled": True,
+        "max_size": 10,
+        "ttl_seconds": 30,
+    }
+
+    cache = handler._load_answer_cache()
+
+    assert isinstance(cache, AnswerCache)
+    assert cache._max_size == 10
+    assert cache._ttl_seconds == 30
+
+
+def test_response_compression_settings() -> None:
+    config: dict[str, Any] = {
+        "response_compression": {
+            "enabled": True,
+            "minimum_size": 512,
+            "gzip_level": 5,
+        }
+    }
+
+    assert response_compression_settings(config) == {
+        "minimum_size": 512,
+        "gzip_level": 5,
+    }
+    # The configuration is not modified.
+    assert config["response_compression"]["enabled"]
+
+    config["response_compression"]["enabled"] = False
+    assert response_compression_settings(config) is None
+
+    del config["response_compression"]
+    assert response_compression_settings(config) is None
+
+
+@pytest.mark.asyncio
+async def test_answer_query_cache_hit(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._answer_cache = AnswerCache(max_size=10, ttl_seconds=60)
+    handler._vais_handler.preamble = "test-preamble"
+    handler._vais_handler.model_version = "test-model"
+    handler._vais_handler.engine = "test-engine"
+    handler._vais_handler.answer_query = AsyncMock(
+        return_value=AnswerQueryResponse(
+            answer=Answer(answer_text="Paris"),
+            answer_query_token="token1",
+        )
+    )
+
+    first = await handler.answer_query(
+        query_text="What is the capital of France?",
+        session_id=None,
+        user_pseudo_id="",
+    )
+    second = await handler.answer_query(
+        query_text="what is the capital of  France?",
+        session_id=None,
+        user_pseudo_id="",
+    )
+
+    handler._vais_handler.answer_query.assert_called_once()
+    assert second is not first
+    assert second.question == "what is the capital of  France?"
+    assert second.markdown == first.markdown
+    assert second.answer == first.answer
+    assert second.answer_query_token == "token1"
+    assert not first.cached
+    assert second.cached
+    assert not second.coalesced
+    assert handler._answer_cache.stats()["hits"] == 1
+    assert handler._answer_cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_answer_query_fields(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._answer_cache = AnswerCache(max_size=10, ttl_seconds=60)
+    handler._vais_handler.answer_query = AsyncMock(
+        return_value=AnswerQueryResponse(
+            answer=Answer(answer_text="Paris", related_questions=["Why?"]),
+            session=Session(name="test-session", user_pseudo_id="user"),
+            answer_query_token="token1",
+        )
+    )
+    fields = {"answer": {"answer_text": True}, "session": {"name": True}}
+
+    # A cache miss and a cache hit both convert only the requested fields.
+    for _ in range(2):
+        response = await handler.answer_query(
+            query_text="What is the capital of France?",
+            session_id=None,
+            user_pseudo_id="",
+            fields=fields,
+        )
+
+        assert response.answer == {"answer_text": "Paris"}
+        assert response.session == {"name": "test-session"}
+        assert response.answer_query_token == "token1"
+
+        # The BigQuery row still has the full record.
+        row = handler._answer_row(response)
+        assert row["question"] == "What is the capital of France?"
+        assert row["markdown"] == response.markdown
+        assert row["answer"]["related_questions"] == ["Why?"]
+        assert row["session"]["user_pseudo_id"] == "user"
+
+    assert handler._answer_cache.stats()["hits"] == 1
+
+    # A full response from the cache matches a full response from the service.
+    full = await handler.answer_query(
+        query_text="What is the capital of France?",
+        session_id=None,
+        user_pseudo_id="",
+    )
+    assert full.answer["related_questions"] == ["Why?"]
+    assert handler._answer_row(full)["answer"] == {
+        key: value
+        for key, value in full.answer.items()
+        if key not in ("grounding_supports", "safety_ratings")
+    }
+
+
+@pytest.mark.asyncio
+async def test_answer_query_cache_skips_sessions(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._answer_cache = AnswerCache(max_size=10, ttl_seconds=60)
+    handler._vais_handler.answer_query = AsyncMock(
+        return_value=AnswerQueryResponse(
+            answer=Answer(answer_text="Paris"),
+            session=Session(name="test-session"),
+            answer_query_token="token1",
+        )
+    )
+
+    for _ in range(2):
+        await handler.answer_query(
+            query_text="What is the capital of France?",
+            session_id="test-session",
+            user_pseudo_id="",
+        )
+
+    assert handler._vais_handler.answer_query.call_count == 2
+    assert handler._answer_cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_query(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+
+    async def stream(**kwargs: Any) -> AsyncIterator[AnswerQueryResponse]:
+        yield AnswerQueryResponse(answer=Answer(answer_text="Paris "))
+        yield AnswerQueryResponse(answer=Answer(answer_text="is the capital."))
+        yield AnswerQueryResponse(
+            answer=Answer(answer_text=""),
+            session=Session(name="test-session"),
+            answer_query_token="token1",
+        )
+
+    handler._vais_handler.stream_answer_query = MagicMock(side_effect=stream)
+
+    items = [
+        item
+        async for item in handler.stream_answer_query(
+            query_text="What is the capital of France?",
+            session_id=None,
+            user_pseudo_id="",
+        )
+    ]
+
+    assert items[:2] == ["Paris ", "is the capital."]
+    response = items[-1]
+    assert isinstance(response, AnswerResponse)
+    assert response.answer["answer_text"] == "Paris is the capital."
+    assert response.session["name"] == "test-session"
+    assert response.answer_query_token == "token1"
+    assert base64.b64decode(response.markdown).decode("utf-8").startswith(
+        "Paris is the capital."
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_query_chunk_repeats_text(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+
+    # Chunks are incremental, so a chunk that starts with the text so far is kept whole.
+    async def stream(**kwargs: Any) -> AsyncIterator[AnswerQueryResponse]:
+        yield AnswerQueryResponse(answer=Answer(answer_text="1"))
+        yield AnswerQueryResponse(answer=Answer(answer_text="1. Step one."))
+
+    handler._vais_handler.stream_answer_query = MagicMock(side_effect=stream)
+
+    items = [
+        item
+        async for item in handler.stream_answer_query(
+            query_text="q", session_id=None, user_pseudo_id=""
+        )
+    ]
+
+    assert items[:2] == ["1", "1. Step one."]
+    assert items[-1].answer["answer_text"] == "11. Step one."
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_query_empty_stream(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+
+    async def stream(**kwargs: Any) -> AsyncIterator[AnswerQueryResponse]:
+        return
+        yield
+
+    handler._vais_handler.stream_answer_query = MagicMock(side_effect=stream)
+
+    with pytest.raises(RuntimeError):
+        async for _ in handler.stream_answer_query(
+            query_text="q", session_id=None, user_pseudo_id=""
+        ):
+            pass
+
+
 @pytest.mark.asyncio
 async def test_get_user_sessions(
     mock_answer_app_util_handler: UtilHandler,
@@ -288,54 +444,217 @@ async def test_delete_session(
 
 
 @pytest.mark.asyncio
-async def test_bq_insert_row_data(
+async def test_bq_insert_rows(
     mock_answer_app_util_handler: UtilHandler,
 ) -> None:
     handler = mock_answer_app_util_handler
-    handler._bq_client.insert_rows_json = MagicMock(return_value=[])
+    errors = [{"index": 0, "errors": [{"reason": "invalid", "message": "Invalid"}]}]
+    handler._bq_client.insert_rows_json = MagicMock(return_value=errors)
 
-    data = {"key": "value"}
-    errors = await handler.bq_insert_row_data(data=data)
+    rows = [{"key": "value"}, {"key": "other"}]
+    result = await handler._bq_insert_rows(
+        table="test-project-id.test-dataset.test-table", rows=rows, row_ids=["a", "b"]
+    )
 
-    assert errors == []
+    assert result == errors
     handler._bq_client.insert_rows_json.assert_called_once_with(
-        table="test-project-id.test-dataset.test-table", json_rows=[data]
+        table="test-project-id.test-dataset.test-table",
+        json_rows=rows,
+        row_ids=["a", "b"],
     )
 
 
 @pytest.mark.asyncio
-async def test_bq_insert_row_data_feedback(
+async def test_bq_enqueue_row_data(
     mock_answer_app_util_handler: UtilHandler,
 ) -> None:
     handler = mock_answer_app_util_handler
     handler._bq_client.insert_rows_json = MagicMock(return_value=[])
 
-    data = {"key": "value"}
-    errors = await handler.bq_insert_row_data(data=data, feedback=True)
+    assert handler.bq_enqueue_row_data(data={"key": "value"})
+    assert handler.bq_enqueue_row_data(data={"key": "feedback"}, feedback=True)
+    handler._bq_client.insert_rows_json.assert_not_called()
 
-    assert errors == []
-    handler._bq_client.insert_rows_json.assert_called_once_with(
-        table="test-project-id.test-dataset.test-feedback-table", json_rows=[data]
+    await handler.startup()
+    await handler.shutdown()
+
+    inserted = {
+        call.kwargs["table"]: call.kwargs["json_rows"]
+        for call in handler._bq_client.insert_rows_json.call_args_list
+    }
+    assert inserted == {
+        "test-project-id.test-dataset.test-table": [{"key": "value"}],
+        "test-project-id.test-dataset.test-feedback-table": [{"key": "feedback"}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_bq_enqueue_answer(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._bq_client.insert_rows_json = MagicMock(return_value=[])
+    handler._vais_handler.answer_query = AsyncMock(
+        return_value=AnswerQueryResponse(
+            answer=Answer(answer_text="Paris", state=Answer.State.SUCCEEDED),
+            session=Session(name="test-session"),
+            answer_query_token="token1",
+        )
     )
+    response = await handler.answer_query(
+        query_text="What is the capital of France?",
+        session_id="test-session",
+        user_pseudo_id="",
+    )
+    response.timings = [StageTiming(name="discoveryengine", seconds=0.5)]
+
+    assert handler.bq_enqueue_answer(response)
+    # A response without a service response, such as a test double, is dumped.
+    plain = AnswerResponse(
+        question="Plain?", markdown="", latency=0.1, answer={}, answer_query_token=""
+    )
+    assert handler.bq_enqueue_answer(plain)
+
+    await handler.startup()
+    await handler.shutdown()
+
+    handler._vais_handler.close.assert_awaited_once()
+    rows = handler._bq_client.insert_rows_json.call_args.kwargs["json_rows"]
+    assert rows[0]["question"] == "What is the capital of France?"
+    assert rows[0]["markdown"] == response.markdown
+    assert rows[0]["answer"]["state"] == "SUCCEEDED"
+    assert rows[0]["answer"]["answer_text"] == "Paris"
+    assert rows[0]["session"]["name"] == "test-session"
+    assert rows[0]["timings"] == [{"name": "discoveryengine", "seconds": 0.5}]
+    assert rows[0]["cached"] is False
+    assert rows[0]["coalesced"] is False
+    assert rows[1] == plain.model_dump()
 
 
 @pytest.mark.asyncio
-async def test_bq_insert_row_data_error(
+async def test_answer_query_coalesced(
     mock_answer_app_util_handler: UtilHandler,
 ) -> None:
     handler = mock_answer_app_util_handler
-    handler._bq_client.insert_rows_json = MagicMock(
-        return_value=[
-            {"index": 0, "errors": [{"reason": "invalid", "message": "Invalid data"}]}
-        ]
+    handler._vais_handler.answer_query = AsyncMock(
+        return_value=AnswerQueryResponse(
+            answer=Answer(answer_text="Paris"), answer_query_token="token1"
+        )
     )
 
-    data = {"key": "value"}
-    errors = await handler.bq_insert_row_data(data=data)
+    with patch("answer_app.utils.answer_was_coalesced", return_value=True):
+        response = await handler.answer_query(
+            query_text="What is the capital of France?",
+            session_id=None,
+            user_pseudo_id="",
+        )
+
+    assert response.coalesced
+    assert not response.cached
+    assert handler._answer_row(response)["coalesced"] is True
+
+
+def test_readiness_without_warm_up(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+
+    assert handler._warm_up is None
+    assert handler.readiness() == ReadinessResponse(ready=True)
+
 
-    assert errors == [
-        {"index": 0, "errors": [{"reason": "invalid", "message": "Invalid data"}]}
+@pytest.mark.asyncio
+async def test_warm_up(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._config["warm_up"] = {"enabled": True, "timeout_seconds": 5}
+    handler._warm_up = handler._load_warm_up()
+    handler._bq_client.get_table.side_effect = RuntimeError("Not found")
+
+    assert handler.readiness() == ReadinessResponse(ready=False)
+
+    await handler.startup()
+    await asyncio.wait_for(handler._warm_up.wait(), timeout=1)
+    await handler.shutdown()
+
+    handler._credentials.refresh.assert_called_once()
+    handler._vais_handler.warm_up.assert_awaited_once()
+    handler._bq_client.get_table.assert_called_once_with(handler._table)
+    readiness = handler.readiness()
+    assert readiness.ready
+    assert [(step.name, step.error) for step in readiness.steps] == [
+        ("credentials", None),
+        ("discoveryengine_channels", None),
+        ("bigquery_session", "RuntimeError: Not found"),
     ]
-    handler._bq_client.insert_rows_json.assert_called_once_with(
-        table="test-project-id.test-dataset.test-table", json_rows=[data]
-    )
+
+
+def test_load_bq_writer_with_spill_log(
+    mock_answer_app_util_handler: UtilHandler,
+    tmp_path: Path,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._config["bigquery_writer"] = {"overflow_policy": "spill"}
+    handler._config["bigquery_spill"] = {
+        "enabled": True,
+        "path": str(tmp_path / "spill.log"),
+        "fsync_policy": "never",
+    }
+
+    writer = handler._load_bq_writer()
+
+    assert writer._spill_log is not None
+    assert writer._spill_log.path == str(tmp_path / "spill.log")
+    assert writer._overflow_policy == "spill"
+
+
+def test_load_bq_sink(mock_answer_app_util_handler: UtilHandler) -> None:
+    handler = mock_answer_app_util_handler
+
+    assert handler._load_bq_sink() == handler._bq_insert_rows
+
+    handler._config["bigquery_sink"] = "storage_write"
+    with patch("answer_app.bq_storage.big_query_write.BigQueryWriteAsyncClient"):
+        sink = handler._load_bq_sink()
+    assert sink.__self__._streams == {
+        handler._table: "projects/test-project-id/datasets/test-dataset/tables/test-table/streams/_default",
+        handler._feedback_table: "projects/test-project-id/datasets/test-dataset/tables/test-feedback-table/streams/_default",
+    }
+
+    handler._config["bigquery_sink"] = "unknown"
+    with pytest.raises(ValueError):
+        handler._load_bq_sink()
+
+
+def test_configure_link_cache(mock_answer_app_util_handler: UtilHandler) -> None:
+    handler = mock_answer_app_util_handler
+    handler._config["citation_link_cache"] = {"max_size": 16}
+
+    with patch("answer_app.utils.link_cache") as mock_link_cache:
+        handler._configure_link_cache()
+
+    mock_link_cache.resize.assert_called_once_with(16)
+
+
+def test_metrics_collector_config(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    handler._config["metrics"] = {"interval_seconds": 0}
+
+    with pytest.raises(ValueError):
+        handler._load_metrics_collector()
+
+
+def test_loop_watchdog_config(
+    mock_answer_app_util_handler: UtilHandler,
+) -> None:
+    handler = mock_answer_app_util_handler
+    assert handler._load_loop_watchdog() is None
+
+    handler._config["loop_watchdog"] = {"enabled": True, "threshold_seconds": 0.2}
+    watchdog = handler._load_loop_watchdog()
+
+    assert isinstance(watchdog, LoopWatchdog)
+    assert watchdog._threshold_seconds == 0.2
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from answer_app.warmup import WarmUp
+
+
+@pytest.mark.asyncio
+async def test_run_steps_in_order(caplog: pytest.LogCaptureFixture) -> None:
+    calls: list[str] = []
+
+    def step(name: str):
+        async def run() -> None:
+            calls.append(name)
+
+        return run
+
+    warm_up = WarmUp(steps={"first": step("first"), "second": step("second")})
+    assert not warm_up.ready
+
+    with caplog.at_level("INFO"):
+        await warm_up.run()
+
+    assert warm_up.ready
+    assert calls == ["first", "second"]
+    assert [result.name for result in warm_up.results] == ["first", "second"]
+    assert all(result.error is None for result in warm_up.results)
+    assert "Warm-up first:" in caplog.text
+    assert "Warm-up complete:" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_failed_and_slow_steps_are_skipped(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    async def fail() -> None:
+        raise RuntimeError("No credentials")
+
+    async def hang() -> None:
+        await asyncio.Event().wait()
+
+    async def succeed() -> None:
+        return
+
+    warm_up = WarmUp(
+        steps={"fail": fail, "hang": hang, "succeed": succeed}, timeout_seconds=0.01
+    )
+
+    await warm_up.run()
+
+    assert warm_up.ready
+    errors = {result.name: result.error for result in warm_up.results}
+    assert errors == {
+        "fail": "RuntimeError: No credentials",
+        "hang": "Timed out after 0.01 seconds.",
+        "succeed": None,
+    }
+    assert "Warm-up fail failed after" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_start_in_background_and_stop() -> None:
+    release = asyncio.Event()
+
+    async def wait_for_release() -> None:
+        await release.wait()
+
+    warm_up = WarmUp(steps={"wait": wait_for_release})
+    warm_up.start()
+    await asyncio.sleep(0)
+    assert not warm_up.ready
+
+    release.set()
+    await asyncio.wait_for(warm_up.wait(), timeout=1)
+    assert warm_up.ready
+
+    # Stopping a finished warm-up does nothing; stopping a running one cancels it.
+    await warm_up.stop()
+    hanging = WarmUp(steps={"wait": asyncio.Event().wait})
+    hanging.start()
+    await asyncio.sleep(0)
+    await hanging.stop()
+    assert not hanging.ready
@@ -0,0 +1,105 @@
+import asyncio
+import sys
+import time
+from types import FrameType
+from typing import Any
+
+import pytest
+
+from answer_app.metrics import Counter
+from answer_app.metrics import Histogram
+from answer_app.watchdog import LoopWatchdog
+from answer_app.watchdog import blocking_site
+
+
+def _define(module: str, source: str, **names: Any) -> Any:
+    """Define a function as if in another module."""
+    namespace: dict[str, Any] = {"__name__": module, "sys": sys, **names}
+    exec(source, namespace)
+    return namespace["function"]
+
+
+def test_blocking_site_prefers_app_frames() -> None:
+    library = _define("json.encoder", "def function():\n    return sys._getframe()")
+    app = _define(
+        "answer_app.render",
+        "def function():\n    return library()",
+        library=library,
+    )
+
+    frame: FrameType = app()
+
+    assert blocking_site(frame) == "answer_app.render:function"
+
+
+def test_blocking_site_without_app_frames() -> None:
+    library = _define("json.encoder", "def function():\n    return sys._getframe()")
+
+    assert blocking_site(library()) == "json.encoder:function"
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [{"threshold_seconds": 0}, {"interval_seconds": -1}],
+)
+def test_invalid_settings(settings: dict[str, float]) -> None:
+    with pytest.raises(ValueError):
+        LoopWatchdog(
+            Histogram("blocked_seconds", "Blocked.", bounds=(0.1,)),
+            Counter("blocked", "Blocked.", label="site"),
+            **settings,
+        )
+
+
+def hold_loop(seconds: float) -> None:
+    """Block the event loop, like synchronous code in a request handler."""
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_reports_blocking_code(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    blocked_seconds = Histogram("blocked_seconds", "Blocked.", bounds=(0.1,))
+    blocked_sites = Counter("blocked", "Blocked.", label="site")
+    watchdog = LoopWatchdog(
+        blocked_seconds,
+        blocked_sites,
+        threshold_seconds=0.05,
+        interval_seconds=0.01,
+    )
+    watchdog.start()
+
+    with caplog.at_level("WARNING"):
+        await asyncio.sleep(0.03)
+        hold_loop(0.2)
+        await asyncio.sleep(0.03)
+    await watchdog.stop()
+
+    assert blocked_seconds.count == 1
+    assert 0.1 < blocked_seconds.sum < 0.3
+    assert blocked_sites.get("tests.test_watchdog:hold_loop") == 1
+    # The stack logged during the stall shows the blocking call.
+    assert "in tests.test_watchdog:hold_loop:\n" in caplog.text
+    assert "time.sleep(seconds)" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_watchdog_ignores_short_callbacks() -> None:
+    blocked_seconds = Histogram("blocked_seconds", "Blocked.", bounds=(0.1,))
+    blocked_sites = Counter("blocked", "Blocked.", label="site")
+    watchdog = LoopWatchdog(
+        blocked_seconds,
+        blocked_sites,
+        threshold_seconds=0.1,
+        interval_seconds=0.01,
+    )
+    watchdog.start()
+
+    await asyncio.sleep(0.02)
+    hold_loop(0.01)
+    await asyncio.sleep(0.02)
+    await watchdog.stop()
+
+    assert blocked_seconds.count == 0
+    assert blocked_sites.samples() == []